@@ -1,7 +1,8 @@
 from fastapi import FastAPI, Request, Depends, UploadFile, File, Form, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 
-from starlette.responses import JSONResponse, Response, FileResponse
+from starlette.background import BackgroundTask
+from starlette.responses import JSONResponse, Response, FileResponse, StreamingResponse
 from pydantic import BaseModel
 
 import httpx
@@ -58,6 +59,27 @@ PRODUCAO_TIMEOUT = float(os.getenv("PRODUCAO_TIMEOUT", "120"))
 COMERCIAL_BACKEND_URL = os.getenv("COMERCIAL_BACKEND_URL", "http://127.0.0.1:8070")
 COMERCIAL_TIMEOUT = float(os.getenv("COMERCIAL_TIMEOUT", "300"))
 FINANCE_BACKEND_URL = os.getenv("FINANCE_BACKEND_URL", "http://127.0.0.1:8080")
+# Downloads de zips do backend de Produção: o corpo é repassado em partes
+# conforme chega do bucket, em vez de esperar a transferência inteira.
+PRODUCAO_DOWNLOADS = ("download-lote/", "download-nesting/", "download-lote-ocorrencia/")
+# Prévia binária do nesting (``preview_binario.py``), negociada pelo ``Accept``
+TIPO_PREVIEW_BINARIO = "application/vnd.nesting-preview"
+
+
+def repassar_sem_decodificar(path: str, response: httpx.Response) -> bool:
+    """Se a resposta do backend de Produção segue como veio, sem ser lida.
+
+    Além dos downloads, a prévia binária e as respostas que o backend já
+    compactou (``Content-Encoding``) chegam ao navegador com o gzip original,
+    em vez de descompactadas pelo httpx.
+    """
+    if path.startswith(PRODUCAO_DOWNLOADS):
+        return True
+    if response.is_error:
+        return False
+    return response.headers.get("content-type", "").startswith(
+        TIPO_PREVIEW_BINARIO
+    ) or "content-encoding" in response.headers
 
 
 def create_response(response: httpx.Response):
@@ -65,9 +87,41 @@ def create_response(response: httpx.Response):
     content_type = response.headers.get("content-type", "")
     if content_type.startswith("application/json"):
         return JSONResponse(response.json(), status_code=response.status_code)
-    headers = dict(response.headers)
+    # ``response.content`` já vem descompactado pelo httpx; repassar
+    # Content-Encoding/Content-Length originais corromperia a resposta.
+    headers = {
+        k: v
+        for k, v in response.headers.items()
+        if k.lower() not in ("content-encoding", "content-length", "transfer-encoding")
+    }
     return Response(content=response.content, status_code=response.status_code, headers=headers)
 
+
+def stream_response(response: httpx.Response, client: httpx.AsyncClient) -> StreamingResponse:
+    """Repassa uma resposta aberta com ``stream=True`` sem ler o corpo inteiro.
+
+    O corpo segue sem decodificar (``aiter_raw``), então status (200, 206,
+    416...) e cabeçalhos como ``Content-Length``, ``Content-Range``,
+    ``Accept-Ranges``, ``ETag`` e ``Content-Encoding`` continuam válidos. A
+    conexão com o backend é fechada ao fim do envio.
+    """
+    headers = {
+        k: v
+        for k, v in response.headers.items()
+        if k.lower() not in ("transfer-encoding", "connection", "keep-alive")
+    }
+
+    async def fechar():
+        await response.aclose()
+        await client.aclose()
+
+    return StreamingResponse(
+        response.aiter_raw(),
+        status_code=response.status_code,
+        headers=headers,
+        background=BackgroundTask(fechar),
+    )
+
 @app.get("/")
 async def read_root():
     return {"message": "Radha ERP Gateway API is running!"}
@@ -252,23 +306,36 @@ async def call_marketing_ia_backend(path: str, request: Request):
 @app.api_route("/producao/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
 async def call_producao_backend(path: str, request: Request):
     timeout = httpx.Timeout(PRODUCAO_TIMEOUT)
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        url = f"{PRODUCAO_BACKEND_URL}/{path}"
-        try:
-            headers = {k: v for k, v in request.headers.items() if k.lower() not in ["host"]}
-            response = await client.request(
-                method=request.method,
-                url=url,
-                headers=headers,
-                params=request.query_params,
-                content=await request.body()
-            )
-            response.raise_for_status()
-            return create_response(response)
-        except httpx.HTTPStatusError as e:
-            return JSONResponse({"detail": e.response.text}, status_code=e.response.status_code)
-        except httpx.RequestError as e:
-            return JSONResponse({"detail": f"Erro de conexão com o backend de Produção: {e}"}, status_code=503)
+    # O cliente não usa ``async with``: nos downloads ele fica aberto até o
+    # fim do envio e é fechado por ``stream_response``.
+    client = httpx.AsyncClient(timeout=timeout)
+    url = f"{PRODUCAO_BACKEND_URL}/{path}"
+    try:
+        headers = {k: v for k, v in request.headers.items() if k.lower() not in ["host"]}
+        backend_request = client.build_request(
+            method=request.method,
+            url=url,
+            headers=headers,
+            params=request.query_params,
+            content=await request.body()
+        )
+        response = await client.send(backend_request, stream=True)
+    except httpx.RequestError as e:
+        await client.aclose()
+        return JSONResponse({"detail": f"Erro de conexão com o backend de Produção: {e}"}, status_code=503)
+    if repassar_sem_decodificar(path, response):
+        return stream_response(response, client)
+    try:
+        await response.aread()
+        response.raise_for_status()
+        return create_response(response)
+    except httpx.HTTPStatusError as e:
+        return JSONResponse({"detail": e.response.text}, status_code=e.response.status_code)
+    except httpx.RequestError as e:
+        return JSONResponse({"detail": f"Erro de conexão com o backend de Produção: {e}"}, status_code=503)
+    finally:
+        await response.aclose()
+        await client.aclose()
 
 # Rota para o módulo Comercial
 @app.api_route("/comercial/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
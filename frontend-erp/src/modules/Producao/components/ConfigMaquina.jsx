@@ -68,6 +68,7 @@ const modeloConfigMaquina = {
   posicaoXRotacaoEtiqueta: "",
   posicaoYRotacaoEtiqueta: "",
   formatoImagemEtiqueta: "BMP",
+  etiquetasPorChapa: "",
   rotacionarEtiquetaHorario: false,
   tamanhoMinimoPeca: "",
   mostrarNomeMaterial: false,
@@ -504,6 +505,14 @@ const ConfigMaquina = () => {
               <option>BMP</option>
             </select>
           </label>
+          <label className="block">
+            <span className="text-sm">Arquivos de etiqueta</span>
+            <select className="input" value={configMaquina.etiquetasPorChapa} onChange={handleConfig('etiquetasPorChapa')}>
+              <option value="">Uma imagem por peça</option>
+              <option value="TIFF">TIFF multipágina por chapa</option>
+              <option value="PDF">PDF por chapa</option>
+            </select>
+          </label>
           <label className="flex items-center gap-2">
             <input type="checkbox" checked={configMaquina.rotacionarEtiquetaHorario} onChange={handleConfig('rotacionarEtiquetaHorario')} />
             <span className="text-sm">Rotacionar etiqueta no sentido horário</span>
@@ -5,6 +5,7 @@ import FiltroChapa from './FiltroChapa';
 import ChapaViewer, { Chapa, Operacao } from './ChapaViewer';
 import OperacaoList from './OperacaoList';
 import OperacaoDetailModal from './OperacaoDetailModal';
+import { TIPO_PREVIEW_BINARIO, lerPreview } from './previewBinario';
 
 const VisualizacaoNesting: React.FC = () => {
   const [chapas, setChapas] = useState<Chapa[]>([]);
@@ -36,8 +37,11 @@ const VisualizacaoNesting: React.FC = () => {
         }
 
         try {
-          const remoto = await fetchComAuth(
-            `/carregar-nesting-preview?obj_key=${encodeURIComponent(objKey)}`
+          const remoto = await lerPreview(
+            await fetchComAuth(
+              `/carregar-nesting-preview?obj_key=${encodeURIComponent(objKey)}`,
+              { raw: true, headers: { Accept: `${TIPO_PREVIEW_BINARIO}, application/json` } }
+            )
           );
           if (Array.isArray(remoto?.chapas)) {
             setChapas(remoto.chapas);
@@ -0,0 +1,49 @@
+import { Chapa } from './ChapaViewer';
+
+// Formato gerado por producao/backend/src/preview_binario.py:
+// "NPV1" | uint32 n | cabeçalho JSON (n bytes) | uint32 offsets | float32 coords
+export const TIPO_PREVIEW_BINARIO = 'application/vnd.nesting-preview';
+
+export function decodificarPreview(buffer: ArrayBuffer): Chapa[] {
+  const view = new DataView(buffer);
+  const magico = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+  if (magico !== 'NPV1') {
+    throw new Error('Formato de prévia desconhecido');
+  }
+  const tamanho = view.getUint32(4, true);
+  const chapas: Chapa[] = JSON.parse(
+    new TextDecoder().decode(new Uint8Array(buffer, 8, tamanho))
+  );
+  const inicio = 8 + tamanho;
+  const total = chapas.reduce((n, c) => n + (c.operacoes?.length || 0), 0);
+  const offsets = new Uint32Array(buffer, inicio, total + 1);
+  const coords = new Float32Array(buffer, inicio + 4 * (total + 1));
+  let i = 0;
+  for (const chapa of chapas) {
+    for (const op of chapa.operacoes || []) {
+      const a = offsets[i];
+      const b = offsets[i + 1];
+      if (b > a) {
+        const pontos: [number, number][] = new Array(b - a);
+        for (let k = a; k < b; k++) {
+          pontos[k - a] = [coords[2 * k], coords[2 * k + 1]];
+        }
+        op.coords = pontos;
+      }
+      i++;
+    }
+  }
+  return chapas;
+}
+
+// Lê a resposta de uma requisição feita com Accept: TIPO_PREVIEW_BINARIO;
+// respostas JSON (erros ou servidores antigos) continuam sendo aceitas.
+export async function lerPreview(
+  resposta: Response
+): Promise<{ chapas?: Chapa[]; erro?: string }> {
+  const tipo = resposta.headers.get('content-type') || '';
+  if (tipo.includes(TIPO_PREVIEW_BINARIO)) {
+    return { chapas: decodificarPreview(await resposta.arrayBuffer()) };
+  }
+  return resposta.json();
+}
@@ -0,0 +1,183 @@
+"""Gerador determinístico de lotes sintéticos para os benchmarks do nesting.
+
+O lote tem o mesmo formato do importado pela API: uma pasta ``Lote_<n>``
+com um DXF por peça e o ``Lote_<n>.dxt``. Os DXF são gerados pelas mesmas
+funções da importação: ``gerar_dxf_base`` (contorno em ``borda_externa``,
+com raios nos cantos) e ``aplicar_usinagem_retangular`` (furos, rebaixos,
+fresagens circulares e fitas de borda). A mesma ``seed`` produz sempre as
+mesmas peças, medidas e usinagens.
+
+Uso::
+
+    python producao/backend/benchmarks/lote_sintetico.py destino [--pecas 200] [--seed 1]
+"""
+
+import argparse
+import contextlib
+import io
+import random
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from gerador_dxf import gerar_dxf_base, gerar_dxt_final  # noqa: E402
+from leitor_dxf import aplicar_usinagem_retangular  # noqa: E402
+
+# Cadastro de chapas (tabela ``chapas``) dos materiais do lote
+MATERIAIS: List[Dict] = [
+    {"id": 1, "propriedade": "MDF Branco 15mm", "possui_veio": False,
+     "comprimento": 2750, "largura": 1850, "custo_m2": 48.0},
+    {"id": 2, "propriedade": "MDF Carvalho 18mm", "possui_veio": True,
+     "comprimento": 2750, "largura": 1850, "custo_m2": 72.5},
+    {"id": 3, "propriedade": "MDP Cinza 18mm", "possui_veio": False,
+     "comprimento": 2750, "largura": 1840, "custo_m2": 39.9},
+    {"id": 4, "propriedade": "MDF Cru 6mm", "possui_veio": False,
+     "comprimento": 2750, "largura": 1850, "custo_m2": 21.0},
+]
+
+# (diâmetro, profundidade) dos furos: cavilha, minifix, dobradiça
+FUROS: List[Tuple[float, float]] = [(5.0, 12.0), (8.0, 12.0), (15.0, 13.0), (35.0, 13.0)]
+# Camadas geradas por ``aplicar_usinagem_retangular`` para as demais operações
+REBAIXO = {"prefixo": "USINAR", "profundidade": 5.0, "estrategia": "Desbaste"}
+FRESAGEM = {"prefixo": "USINAR", "profundidade": 8.0, "estrategia": "Contorno"}
+FITA = {"prefixo": "FITA", "profundidade": 0.5, "estrategia": "Borda"}
+
+FERRAMENTAS: List[Dict] = [
+    {"codigo": "1", "descricao": "Fresa 6mm", "tipo": "Fresa", "comandoExtra": "M3 S[S] [T]",
+     "velocidadeRotacao": 18000, "velocidadeCorte": 8000},
+    {"codigo": "2", "descricao": "Broca 5mm", "tipo": "Broca", "comandoExtra": "M15 [X]"},
+    {"codigo": "3", "descricao": "Broca 8mm", "tipo": "Broca", "comandoExtra": "M15 [X]"},
+    {"codigo": "4", "descricao": "Broca 15mm", "tipo": "Broca", "comandoExtra": "M15 [X]"},
+    {"codigo": "5", "descricao": "Broca 35mm", "tipo": "Broca", "comandoExtra": "M15 [X]"},
+]
+
+CONFIG_MAQUINA: Dict = {
+    "espacoEntrePecas": 6,
+    "refiloInferior": 10,
+    "refiloSuperior": 10,
+    "refiloEsquerda": 10,
+    "refiloDireita": 10,
+    "movRapida": "G0 X[X] Y[Y] Z[Z]",
+    "zHoming": 100,
+    "casasDecimais": 3,
+    "layoutEtiqueta": [
+        {"campo": "PartName", "x": 2, "y": 2},
+        {"campo": "Material", "x": 2, "y": 10},
+        {"campo": "Client", "x": 30, "y": 2},
+        {"campo": "Length", "x": 30, "y": 20},
+    ],
+    "tamanhoEtiquetadoraX": 60,
+    "tamanhoEtiquetadoraY": 30,
+}
+
+
+def _camada(op: Dict) -> str:
+    return f"{op['prefixo']}_{op['profundidade']}_{op['estrategia']}"
+
+
+def config_layers() -> List[Dict]:
+    """Configuração de layers que associa cada camada gerada a uma ferramenta."""
+    layers = [
+        {"nome": f"FURO_{d}_{p}", "tipo": "Operação", "ferramenta": str(i), "profundidade": p}
+        for i, (d, p) in enumerate(FUROS, start=2)
+    ]
+    for op in (REBAIXO, FRESAGEM, FITA):
+        layers.append(
+            {"nome": _camada(op), "tipo": "Operação", "ferramenta": "1",
+             "profundidade": op["profundidade"]}
+        )
+    return layers
+
+
+def _raios(rng: random.Random, comprimento: float, largura: float) -> Dict[str, float]:
+    if rng.random() > 0.3:
+        return {}
+    limite = min(comprimento, largura) / 3
+    cantos = rng.sample(["topLeft", "topRight", "bottomRight", "bottomLeft"], rng.randint(1, 4))
+    return {c: round(rng.uniform(10, min(80, limite)), 1) for c in cantos}
+
+
+def _operacoes(rng: random.Random, comprimento: float, largura: float) -> List[Dict]:
+    ops: List[Dict] = []
+    for _ in range(rng.choice([0, 2, 4, 4, 6, 8])):
+        diametro, profundidade = rng.choice(FUROS)
+        margem = diametro + 10
+        if comprimento <= 2 * margem or largura <= 2 * margem:
+            continue
+        ops.append({
+            "tipo": "Furo",
+            "x": round(rng.uniform(margem, comprimento - margem), 1),
+            "y": round(rng.uniform(margem, largura - margem), 1),
+            "diametro": diametro,
+            "profundidade": profundidade,
+        })
+    if rng.random() < 0.2 and comprimento > 200 and largura > 150:
+        w = round(rng.uniform(50, comprimento / 2), 1)
+        h = round(rng.uniform(30, largura / 2), 1)
+        ops.append({"tipo": "Retângulo", "x": 40, "y": 40, "comprimento": w, "largura": h,
+                    **REBAIXO})
+    if rng.random() < 0.1 and min(comprimento, largura) > 200:
+        ops.append({"tipo": "Círculo", "x": comprimento / 2, "y": largura / 2,
+                    "diametro": round(rng.uniform(40, min(comprimento, largura) / 2), 1),
+                    **FRESAGEM})
+    # Fitas de borda: faixas finas junto às bordas com fita
+    for borda in rng.sample(["inferior", "superior", "esquerda", "direita"], rng.randint(0, 4)):
+        if borda in ("inferior", "superior"):
+            y = 1 if borda == "inferior" else largura - 2
+            ops.append({"tipo": "Linha", "x": 0, "y": y, "comprimento": comprimento,
+                        "largura": 1, **FITA})
+        else:
+            x = 1 if borda == "esquerda" else comprimento - 2
+            ops.append({"tipo": "Linha", "x": x, "y": 0, "comprimento": 1,
+                        "largura": largura, **FITA})
+    return ops
+
+
+def gerar_lote(destino: Path, pecas: int = 200, seed: int = 1, numero: int = 1) -> Path:
+    """Cria ``destino/Lote_<numero>`` com ``pecas`` peças e retorna a pasta."""
+    rng = random.Random(seed)
+    pasta = Path(destino) / f"Lote_{numero}"
+    pasta.mkdir(parents=True, exist_ok=True)
+    registros: Dict[str, Dict] = {}
+    # As funções da importação imprimem uma linha por arquivo gerado
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(pecas):
+            material = rng.choice(MATERIAIS)["propriedade"]
+            comprimento = float(rng.randrange(100, 1200, 5))
+            largura = float(rng.randrange(80, 700, 5))
+            nome = f"{i + 1:04d}.DXF"
+            caminho = pasta / nome
+            gerar_dxf_base(comprimento, largura, str(caminho), _raios(rng, comprimento, largura))
+            for op in _operacoes(rng, comprimento, largura):
+                aplicar_usinagem_retangular(str(caminho), str(caminho), op, {})
+            registros[nome] = {
+                "info": {
+                    "PartName": rng.choice(["Lateral", "Base", "Prateleira", "Porta", "Fundo"]),
+                    "Length": comprimento,
+                    "Width": largura,
+                    "Thickness": 6 if "6mm" in material else 18,
+                    "Material": material,
+                    "Client": f"Cliente {rng.randint(1, 20)}",
+                    "Project": rng.choice(["Cozinha", "Dormitório", "Banheiro"]),
+                    "Program1": f"{numero:03d}{i + 1:05d}",
+                }
+            }
+        gerar_dxt_final(registros, str(pasta), pasta.name)
+    return pasta
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("destino", type=Path)
+    parser.add_argument("--pecas", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--numero", type=int, default=1)
+    args = parser.parse_args()
+    pasta = gerar_lote(args.destino, args.pecas, args.seed, args.numero)
+    print(f"{args.pecas} peças em {pasta}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""Benchmark do pipeline de produção do nesting, etapa por etapa.
+
+Gera um lote sintético (``lote_sintetico.py``), publica o ``.zip`` em um
+bucket local e executa ``api._nesting_final`` como o endpoint
+``/executar-nesting-final``, com o S3 e o Postgres substituídos pelos de
+``servicos_locais.py`` (roda sem rede). As funções de cada etapa são
+envolvidas por cronômetros; o tempo de uma etapa não inclui o das etapas
+chamadas dentro dela (``poligonos`` não conta a ``leitura_dxt``).
+
+O lote é lido direto do zip no bucket (``lote_zip``); ``download`` soma as
+leituras por intervalo e os downloads completos. Por padrão cada repetição
+começa com os caches de DXF e de nesting vazios e sem zips abertos;
+com ``--cache`` eles são mantidos e as repetições seguintes medem o caminho
+quente. ``zip_upload`` é a compactação da saída, feita durante o upload
+multipart (``storage.upload_pasta_zip``). Com ``--workers`` > 1 as etapas
+executadas no pool de processos (imagens e etiquetas) não são cronometradas
+individualmente e as etapas em threads se sobrepõem.
+
+O resultado (parâmetros, tempos e vazão do upload de cada repetição, resumo e
+métricas do bucket) é gravado em JSON para acompanhar regressões.
+
+Uso::
+
+    python producao/backend/benchmarks/pipeline_nesting.py [--pecas 200] [--engine rectpack]
+        [--repeticoes 3] [--workers 1] [--cache] [--saida resultados/pipeline.json]
+"""
+
+import argparse
+import functools
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+BENCHMARKS = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCHMARKS.parent / "src"))
+sys.path.insert(0, str(BENCHMARKS))
+
+import api  # noqa: E402
+import cache_nesting  # noqa: E402
+import cache_pastas  # noqa: E402
+import dxf_cache  # noqa: E402
+import lote_zip  # noqa: E402
+import nesting  # noqa: E402
+import storage  # noqa: E402
+from cache_disco import CacheDisco  # noqa: E402
+from lote_sintetico import CONFIG_MAQUINA, FERRAMENTAS, MATERIAIS, config_layers, gerar_lote  # noqa: E402
+from servicos_locais import ArmazenamentoLocal, BancoLocal, instalar  # noqa: E402
+
+# (etapa, módulo, função) na ordem do pipeline
+ETAPAS = [
+    ("download", cache_pastas, "download_file"),
+    ("download", lote_zip, "download_range"),
+    ("extracao", shutil, "unpack_archive"),
+    ("leitura_dxt", nesting, "_ler_dxt"),
+    ("poligonos", nesting, "_ler_dxt_polygons"),
+    ("nesting", nesting, "_executar_por_material"),
+    ("sobras", nesting, "_calcular_sobras_chapas"),
+    ("gcode", nesting, "_gerar_gcodes"),
+    ("cyc", nesting, "_gerar_cyc"),
+    ("xml", nesting, "_gerar_xml_chapas"),
+    ("imagens", nesting, "_gerar_imagens_chapas"),
+    ("etiquetas", nesting, "_gerar_etiquetas"),
+    ("zip_upload", api, "upload_pasta_zip"),
+    ("upload", api, "upload_bytes"),
+]
+# Executadas no pool de processos quando há mais de um worker
+_ETAPAS_PROCESSO = {"imagens", "etiquetas"}
+
+
+class Cronometro:
+    """Acumula o tempo exclusivo de cada etapa (descontando as aninhadas)."""
+
+    def __init__(self):
+        self.tempos: Dict[str, float] = defaultdict(float)
+        self._pilha = threading.local()
+
+    def envolver(self, etapa: str, func: Callable) -> Callable:
+        @functools.wraps(func)
+        def cronometrada(*args, **kwargs):
+            pilha = self._pilha.__dict__.setdefault("filhos", [])
+            pilha.append(0.0)
+            inicio = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                decorrido = time.perf_counter() - inicio
+                filhos = pilha.pop()
+                self.tempos[etapa] += decorrido - filhos
+                if pilha:
+                    pilha[-1] += decorrido
+
+        return cronometrada
+
+
+def _instalar_cronometro(cronometro: Cronometro, workers: int) -> Callable[[], None]:
+    originais = []
+    for etapa, modulo, nome in ETAPAS:
+        if workers > 1 and etapa in _ETAPAS_PROCESSO:
+            continue
+        original = getattr(modulo, nome)
+        originais.append((modulo, nome, original))
+        setattr(modulo, nome, cronometro.envolver(etapa, original))
+
+    def desfazer() -> None:
+        for modulo, nome, original in reversed(originais):
+            setattr(modulo, nome, original)
+
+    return desfazer
+
+
+def _aproveitamento(chapas: List[Dict]) -> float:
+    """Área (retângulos) das peças sobre a área das chapas."""
+    pecas = sum(
+        op["largura"] * op["altura"]
+        for c in chapas
+        for op in c.get("operacoes", [])
+        if op.get("tipo") == "Peca"
+    )
+    area = sum(c["largura"] * c["altura"] for c in chapas)
+    return pecas / area if area else 0.0
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, cwd=BENCHMARKS, check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def _usar_caches(pasta: Path) -> None:
+    lote_zip.fechar_lotes()
+    dxf_cache.cache = CacheDisco(pasta / "dxf", 1 << 30, dxf_cache.DXF_CACHE_MEMORIA)
+    cache_nesting.cache = CacheDisco(pasta / "nesting", 1 << 30, 0)
+
+
+def executar(
+    pecas: int = 200,
+    seed: int = 1,
+    engine: str = "rectpack",
+    repeticoes: int = 3,
+    workers: int = 1,
+    manter_cache: bool = False,
+) -> Dict:
+    """Executa o benchmark e retorna o resultado (o mesmo gravado em JSON)."""
+    tmp = Path(tempfile.mkdtemp(prefix="bench_nesting_"))
+    armazenamento = ArmazenamentoLocal(tmp / "bucket")
+    banco = BancoLocal({"chapas": [dict(m) for m in MATERIAIS]})
+    desfazer_servicos = instalar(armazenamento, banco)
+    cronometro = Cronometro()
+    desfazer_cronometro = _instalar_cronometro(cronometro, workers)
+    originais = (api.SAIDA_DIR, api.gerar_nesting, nesting.NESTING_WORKERS,
+                 dxf_cache.cache, cache_nesting.cache)
+    resultados: List[Dict] = []
+    capturado: Dict = {}
+
+    def gerar_nesting(*args, **kwargs):
+        retorno = nesting.gerar_nesting(*args, engine=engine, **kwargs)
+        capturado["chapas"] = retorno[2]
+        return retorno
+
+    try:
+        inicio = time.perf_counter()
+        pasta = gerar_lote(tmp / "lotes", pecas, seed)
+        zip_lote = shutil.make_archive(
+            str(pasta), "zip", root_dir=pasta.parent, base_dir=pasta.name
+        )
+        storage.upload_file(zip_lote, f"lotes/{pasta.name}.zip")
+        armazenamento.zerar_metricas()
+        tempo_geracao = time.perf_counter() - inicio
+
+        api.SAIDA_DIR = tmp / "saida"
+        api.gerar_nesting = gerar_nesting
+        nesting.NESTING_WORKERS = workers
+        dados = {
+            "pasta_lote": f"lotes/{pasta.name}.zip",
+            "ferramentas": FERRAMENTAS,
+            "config_layers": config_layers(),
+            "config_maquina": CONFIG_MAQUINA,
+        }
+        for n in range(repeticoes):
+            if n == 0 or not manter_cache:
+                _usar_caches(tmp / f"cache_{n}")
+            cronometro.tempos.clear()
+            storage.metricas_upload(zerar=True)
+            inicio = time.perf_counter()
+            resposta = api._nesting_final(dados)
+            total = time.perf_counter() - inicio
+            if "erro" in resposta:
+                raise RuntimeError(resposta["erro"])
+            etapas = dict(cronometro.tempos)
+            etapas["outros"] = max(0.0, total - sum(etapas.values()))
+            chapas = capturado.get("chapas") or []
+            resultados.append(
+                {
+                    "total": round(total, 4),
+                    "etapas": {k: round(v, 4) for k, v in etapas.items()},
+                    "chapas": len(chapas),
+                    "aproveitamento": round(_aproveitamento(chapas), 4),
+                    "upload": storage.metricas_upload(),
+                }
+            )
+    finally:
+        desfazer_cronometro()
+        desfazer_servicos()
+        (api.SAIDA_DIR, api.gerar_nesting, nesting.NESTING_WORKERS,
+         dxf_cache.cache, cache_nesting.cache) = originais
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    nomes = list(dict.fromkeys([e for e, _, _ in ETAPAS] + ["outros"]))
+    resumo = {}
+    for nome in nomes + ["total"]:
+        valores = [
+            r["total"] if nome == "total" else r["etapas"][nome]
+            for r in resultados
+            if nome == "total" or nome in r["etapas"]
+        ]
+        if valores:
+            resumo[nome] = {
+                "min": round(min(valores), 4),
+                "mediana": round(statistics.median(valores), 4),
+            }
+    return {
+        "benchmark": "pipeline_nesting",
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit(),
+        "ambiente": {
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "parametros": {
+            "pecas": pecas,
+            "seed": seed,
+            "engine": engine,
+            "repeticoes": repeticoes,
+            "workers": workers,
+            "cache": manter_cache,
+        },
+        "geracao_lote": round(tempo_geracao, 4),
+        "repeticoes": resultados,
+        "resumo": resumo,
+        "armazenamento": armazenamento.metricas(),
+        "banco": {"comandos": len(banco.comandos)},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pecas", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--engine", default="rectpack")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--cache", action="store_true", help="mantém os caches entre repetições")
+    parser.add_argument(
+        "--saida", type=Path, default=BENCHMARKS / "resultados" / "pipeline_nesting.json"
+    )
+    args = parser.parse_args()
+
+    resultado = executar(
+        args.pecas, args.seed, args.engine, args.repeticoes, args.workers, args.cache
+    )
+    args.saida.parent.mkdir(parents=True, exist_ok=True)
+    args.saida.write_text(json.dumps(resultado, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    r = resultado["repeticoes"][-1]
+    print(f"lote: {args.pecas} peças, {r['chapas']} chapas, "
+          f"aproveitamento {r['aproveitamento']:.1%} (gerado em {resultado['geracao_lote']:.1f}s)")
+    for nome, valores in resultado["resumo"].items():
+        print(f"{nome:>12}: {valores['mediana']:8.3f}s (mín {valores['min']:.3f}s)")
+    print(f"resultado gravado em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Benchmark de ``_retangulos_sobra`` contra a implementação anterior.
+
+A versão anterior testava com ``within`` todos os retângulos formados pelos
+pares de coordenadas dos vértices (O(n⁴) predicados). Ela é mantida aqui
+apenas como referência para comparar tempo e resultado.
+
+Uso::
+
+    python producao/backend/benchmarks/retangulos_sobra.py [--casos 20] [--vertices 40]
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+from shapely.geometry import Polygon, box
+from shapely.ops import unary_union
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from nesting import (  # noqa: E402
+    AREA_MIN_SOBRA,
+    MIN_LARGURA_SOBRA,
+    _retangulo_sobra,
+    _retangulos_sobra,
+)
+
+
+def retangulos_sobra_legado(g: Polygon, tol: float = 1e-6) -> List[Polygon]:
+    """Implementação original (busca exaustiva), usada como referência."""
+    rect = _retangulo_sobra(g, tol)
+    if rect:
+        return [rect]
+
+    if not isinstance(g, Polygon) or g.is_empty:
+        return []
+
+    xs = {c[0] for c in g.exterior.coords}
+    ys = {c[1] for c in g.exterior.coords}
+    for ring in g.interiors:
+        for c in ring.coords:
+            xs.add(c[0])
+            ys.add(c[1])
+
+    minx, miny, maxx, maxy = g.bounds
+    xs.update([minx, maxx])
+    ys.update([miny, maxy])
+    xs = sorted(xs)
+    ys = sorted(ys)
+
+    gb = g.buffer(tol)
+    rects: List[Polygon] = []
+    for i, x1 in enumerate(xs[:-1]):
+        for x2 in xs[i + 1 :]:
+            for j, y1 in enumerate(ys[:-1]):
+                for y2 in ys[j + 1 :]:
+                    r = box(x1, y1, x2, y2)
+                    if r.area < AREA_MIN_SOBRA:
+                        continue
+                    minx_r, miny_r, maxx_r, maxy_r = r.bounds
+                    if (
+                        maxx_r - minx_r < MIN_LARGURA_SOBRA
+                        or maxy_r - miny_r < MIN_LARGURA_SOBRA
+                    ):
+                        continue
+                    if r.within(gb):
+                        rects.append(r)
+
+    rects.sort(key=lambda r: r.area, reverse=True)
+    final: List[Polygon] = []
+    union = None
+    for r in rects:
+        if union and r.intersects(union):
+            continue
+        final.append(r)
+        union = r if union is None else union.union(r)
+    return final
+
+
+def sobra_irregular(
+    rng: random.Random, vertices: int, largura: float = 2750, altura: float = 1850
+) -> Polygon:
+    """Gera uma sobra irregular: a chapa menos peças retangulares espalhadas.
+
+    A quantidade de peças é ajustada para que o contorno resultante tenha
+    aproximadamente ``vertices`` vértices.
+    """
+    pecas = []
+    for _ in range(max(1, vertices // 4)):
+        w = rng.randrange(150, 900, 10)
+        h = rng.randrange(150, 700, 10)
+        x = rng.randrange(0, int(largura - w), 10)
+        y = rng.randrange(0, int(altura - h), 10)
+        pecas.append(box(x, y, x + w, y + h))
+    sobra = box(0, 0, largura, altura).difference(unary_union(pecas))
+    if sobra.geom_type == "MultiPolygon":
+        sobra = max(sobra.geoms, key=lambda g: g.area)
+    return sobra
+
+
+def _assinatura(rects: List[Polygon]):
+    return [tuple(round(v, 6) for v in r.bounds) for r in rects]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--casos", type=int, default=20)
+    parser.add_argument("--vertices", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    sobras = [sobra_irregular(rng, args.vertices) for _ in range(args.casos)]
+
+    t0 = time.perf_counter()
+    legado = [retangulos_sobra_legado(g) for g in sobras]
+    t_legado = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    novo = [_retangulos_sobra(g) for g in sobras]
+    t_novo = time.perf_counter() - t0
+
+    iguais = sum(_assinatura(a) == _assinatura(b) for a, b in zip(legado, novo))
+    media = sum(
+        len(g.exterior.coords) + sum(len(r.coords) for r in g.interiors)
+        for g in sobras
+    ) / len(sobras)
+    print(f"casos: {len(sobras)} (média de {media:.0f} vértices)")
+    print(f"legado: {t_legado:.3f}s ({t_legado / len(sobras) * 1000:.1f} ms/caso)")
+    print(f"grade:  {t_novo:.3f}s ({t_novo / len(sobras) * 1000:.1f} ms/caso)")
+    print(f"speedup: {t_legado / t_novo:.1f}x")
+    print(f"resultados idênticos: {iguais}/{len(sobras)}")
+
+
+if __name__ == "__main__":
+    main()
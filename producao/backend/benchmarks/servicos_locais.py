@@ -0,0 +1,333 @@
+"""Substitutos locais do bucket S3 e do Postgres para os benchmarks.
+
+Permitem executar o pipeline de produção inteiro sem rede:
+
+* :class:`ArmazenamentoLocal` implementa as chamadas do cliente ``boto3``
+  usadas por ``storage.py`` gravando os objetos em uma pasta, e conta as
+  chamadas e os bytes trafegados;
+* :class:`BancoLocal` responde às consultas do pipeline a partir de tabelas
+  em memória (listas de dicts) e registra os comandos de escrita.
+
+``instalar(armazenamento, banco)`` troca o cliente de ``storage`` e a
+conexão de ``api``/``nesting`` e devolve uma função que desfaz a troca.
+"""
+
+import hashlib
+import io
+import re
+import shutil
+import threading
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from botocore.exceptions import ClientError
+
+
+def _erro(codigo: str, operacao: str) -> ClientError:
+    return ClientError({"Error": {"Code": codigo, "Message": codigo}}, operacao)
+
+
+class ArmazenamentoLocal:
+    """Cliente S3 mínimo sobre uma pasta local (uma entrada por chave)."""
+
+    def __init__(self, pasta: Path):
+        self.pasta = Path(pasta)
+        self.pasta.mkdir(parents=True, exist_ok=True)
+        self.chamadas: Counter = Counter()
+        self.bytes_enviados = 0
+        self.bytes_recebidos = 0
+        self._multipart: Dict[str, Dict[int, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def _caminho(self, chave: str) -> Path:
+        return self.pasta / chave
+
+    def _gravar(self, chave: str, dados: bytes) -> None:
+        caminho = self._caminho(chave)
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        caminho.write_bytes(dados)
+        self.bytes_enviados += len(dados)
+
+    def _existente(self, chave: str, operacao: str) -> Path:
+        caminho = self._caminho(chave)
+        if not caminho.is_file():
+            raise _erro("NoSuchKey" if operacao == "GetObject" else "404", operacao)
+        return caminho
+
+    @staticmethod
+    def _etag(caminho: Path) -> str:
+        return '"%s"' % hashlib.md5(caminho.read_bytes()).hexdigest()
+
+    def put_object(self, Bucket: str, Key: str, Body, **_) -> Dict:
+        self.chamadas["put_object"] += 1
+        dados = Body.read() if hasattr(Body, "read") else bytes(Body)
+        self._gravar(Key, dados)
+        return {"ETag": self._etag(self._caminho(Key))}
+
+    def upload_fileobj(self, Fileobj, Bucket: str, Key: str, **_) -> None:
+        self.chamadas["upload_fileobj"] += 1
+        self._gravar(Key, Fileobj.read())
+
+    def upload_file(self, Filename: str, Bucket: str, Key: str, **_) -> None:
+        self.chamadas["upload_file"] += 1
+        self._gravar(Key, Path(Filename).read_bytes())
+
+    def create_multipart_upload(self, Bucket: str, Key: str, **_) -> Dict:
+        self.chamadas["create_multipart_upload"] += 1
+        upload_id = uuid.uuid4().hex
+        self._multipart[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(
+        self, Bucket: str, Key: str, PartNumber: int, UploadId: str, Body, **_
+    ) -> Dict:
+        dados = Body.read() if hasattr(Body, "read") else bytes(Body)
+        with self._lock:
+            self.chamadas["upload_part"] += 1
+            self._multipart[UploadId][PartNumber] = dados
+        return {"ETag": '"%s"' % hashlib.md5(dados).hexdigest()}
+
+    def complete_multipart_upload(
+        self, Bucket: str, Key: str, UploadId: str, MultipartUpload: Dict, **_
+    ) -> Dict:
+        self.chamadas["complete_multipart_upload"] += 1
+        partes = self._multipart.pop(UploadId)
+        numeros = [p["PartNumber"] for p in MultipartUpload["Parts"]]
+        if numeros != sorted(partes):
+            raise _erro("InvalidPart", "CompleteMultipartUpload")
+        self._gravar(Key, b"".join(partes[n] for n in numeros))
+        return {"ETag": self._etag(self._caminho(Key))}
+
+    def abort_multipart_upload(self, Bucket: str, Key: str, UploadId: str, **_) -> Dict:
+        self.chamadas["abort_multipart_upload"] += 1
+        self._multipart.pop(UploadId, None)
+        return {}
+
+    def head_object(self, Bucket: str, Key: str, **_) -> Dict:
+        self.chamadas["head_object"] += 1
+        caminho = self._existente(Key, "HeadObject")
+        info = caminho.stat()
+        return {
+            "ContentLength": info.st_size,
+            "ETag": self._etag(caminho),
+            "LastModified": datetime.fromtimestamp(info.st_mtime, timezone.utc),
+        }
+
+    def get_object(
+        self,
+        Bucket: str,
+        Key: str,
+        Range: Optional[str] = None,
+        IfMatch: Optional[str] = None,
+        **_,
+    ) -> Dict:
+        self.chamadas["get_object"] += 1
+        caminho = self._existente(Key, "GetObject")
+        dados = caminho.read_bytes()
+        total = len(dados)
+        resposta: Dict = {"ETag": self._etag(caminho)}
+        if IfMatch and IfMatch != resposta["ETag"]:
+            raise _erro("PreconditionFailed", "GetObject")
+        if Range:
+            inicio, _, fim = Range.removeprefix("bytes=").partition("-")
+            if not inicio:
+                a, b = max(0, total - int(fim)), total - 1
+            else:
+                a, b = int(inicio), min(int(fim) if fim else total - 1, total - 1)
+            if a > b:
+                raise _erro("InvalidRange", "GetObject")
+            dados = dados[a : b + 1]
+            resposta["ContentRange"] = f"bytes {a}-{b}/{total}"
+        self.bytes_recebidos += len(dados)
+        resposta.update({"Body": io.BytesIO(dados), "ContentLength": len(dados)})
+        return resposta
+
+    def download_file(self, Bucket: str, Key: str, Filename: str, **_) -> None:
+        self.chamadas["download_file"] += 1
+        caminho = self._existente(Key, "HeadObject")
+        shutil.copyfile(caminho, Filename)
+        self.bytes_recebidos += caminho.stat().st_size
+
+    def generate_presigned_url(
+        self, ClientMethod: str, Params: Dict, ExpiresIn: int = 3600, **_
+    ) -> str:
+        self.chamadas["generate_presigned_url"] += 1
+        return f"{self.pasta.as_uri()}/{Params['Key']}?expira={ExpiresIn}"
+
+    def delete_object(self, Bucket: str, Key: str, **_) -> Dict:
+        self.chamadas["delete_object"] += 1
+        self._caminho(Key).unlink(missing_ok=True)
+        return {}
+
+    def list_objects_v2(
+        self,
+        Bucket: str,
+        Prefix: str = "",
+        ContinuationToken: Optional[str] = None,
+        MaxKeys: int = 1000,
+        **_,
+    ) -> Dict:
+        self.chamadas["list_objects_v2"] += 1
+        chaves = sorted(
+            p.relative_to(self.pasta).as_posix()
+            for p in self.pasta.rglob("*")
+            if p.is_file()
+        )
+        chaves = [c for c in chaves if c.startswith(Prefix)]
+        if ContinuationToken:
+            chaves = [c for c in chaves if c > ContinuationToken]
+        pagina = chaves[:MaxKeys]
+        conteudo = []
+        for chave in pagina:
+            info = self._caminho(chave).stat()
+            conteudo.append(
+                {
+                    "Key": chave,
+                    "Size": info.st_size,
+                    "ETag": self._etag(self._caminho(chave)),
+                    "LastModified": datetime.fromtimestamp(info.st_mtime, timezone.utc),
+                }
+            )
+        resposta: Dict = {
+            "Contents": conteudo,
+            "KeyCount": len(conteudo),
+            "IsTruncated": len(chaves) > MaxKeys,
+        }
+        if resposta["IsTruncated"]:
+            resposta["NextContinuationToken"] = pagina[-1]
+        return resposta
+
+    def zerar_metricas(self) -> None:
+        self.chamadas.clear()
+        self.bytes_enviados = self.bytes_recebidos = 0
+
+    def metricas(self) -> Dict:
+        return {
+            "chamadas": dict(self.chamadas),
+            "bytes_enviados": self.bytes_enviados,
+            "bytes_recebidos": self.bytes_recebidos,
+        }
+
+
+class _Linha(dict):
+    """Linha de resultado acessível por nome, posição e ``_mapping``."""
+
+    def __getitem__(self, chave):
+        if isinstance(chave, int):
+            return list(self.values())[chave]
+        return super().__getitem__(chave)
+
+    @property
+    def _mapping(self) -> Dict:
+        return self
+
+
+class _Resultado:
+    def __init__(self, linhas: List[Dict]):
+        self.linhas = [_Linha(linha) for linha in linhas]
+
+    def fetchall(self) -> List[_Linha]:
+        return self.linhas
+
+    def fetchone(self) -> Optional[_Linha]:
+        return self.linhas[0] if self.linhas else None
+
+    def scalar(self):
+        return next(iter(self.linhas[0].values())) if self.linhas else None
+
+    def first(self) -> Optional[_Linha]:
+        return self.fetchone()
+
+    def mappings(self) -> "_Resultado":
+        return self
+
+    def all(self) -> List[_Linha]:
+        return self.linhas
+
+    def __iter__(self):
+        return iter(self.linhas)
+
+
+_SELECT = re.compile(
+    r"^\s*SELECT\s+(.+?)\s+FROM\s+(?:\w+\.)?(\w+)(?:\s+WHERE\s+(\w+)\s*=\s*%s\b)?",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+class BancoLocal:
+    """Postgres em memória para o pipeline de nesting.
+
+    ``SELECT colunas FROM tabela`` devolve as colunas pedidas de todas as
+    linhas da tabela; o único filtro aplicado é ``WHERE coluna = %s`` (os
+    demais são ignorados, as tabelas do benchmark já contêm apenas o que o
+    lote usa). Os outros comandos são apenas registrados em ``comandos``.
+    """
+
+    def __init__(self, tabelas: Optional[Dict[str, List[Dict]]] = None):
+        self.tabelas = tabelas or {}
+        self.comandos: List[tuple] = []
+
+    def conectar(self) -> "_ConexaoLocal":
+        return _ConexaoLocal(self)
+
+
+class _ConexaoLocal:
+    def __init__(self, banco: BancoLocal):
+        self.banco = banco
+
+    def __enter__(self) -> "_ConexaoLocal":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+    def exec_driver_sql(self, sql: str, params=None) -> _Resultado:
+        sql = str(sql)
+        consulta = _SELECT.match(sql)
+        if consulta:
+            colunas, tabela, filtro = consulta.groups()
+            linhas = self.banco.tabelas.get(tabela, [])
+            if filtro and params:
+                linhas = [linha for linha in linhas if linha.get(filtro) == params[0]]
+            if colunas.strip() != "*":
+                nomes = [c.strip() for c in colunas.split(",")]
+                linhas = [{n: linha.get(n) for n in nomes} for linha in linhas]
+            return _Resultado(linhas)
+        if sql.lstrip().upper().startswith("SELECT"):
+            return _Resultado([])
+        self.banco.comandos.append((sql, params))
+        return _Resultado([])
+
+    def execute(self, sql, params=None) -> _Resultado:
+        return self.exec_driver_sql(str(sql), params)
+
+    def commit(self) -> None:
+        pass
+
+    def rollback(self) -> None:
+        pass
+
+
+def instalar(armazenamento: ArmazenamentoLocal, banco: BancoLocal) -> Callable[[], None]:
+    """Direciona ``storage``, ``api`` e ``nesting`` para os substitutos."""
+    import api
+    import nesting
+    import storage
+
+    originais = [
+        (storage, "client", storage.client),
+        (api, "get_db_connection", api.get_db_connection),
+        (nesting, "get_db_connection", nesting.get_db_connection),
+    ]
+    storage.client = armazenamento
+    api.get_db_connection = banco.conectar
+    nesting.get_db_connection = banco.conectar
+
+    def desfazer() -> None:
+        for modulo, nome, valor in originais:
+            setattr(modulo, nome, valor)
+
+    return desfazer
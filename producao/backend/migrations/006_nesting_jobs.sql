@@ -0,0 +1,9 @@
+SET search_path TO producao;
+
+ALTER TABLE nestings ADD COLUMN IF NOT EXISTS job_id TEXT;
+ALTER TABLE nestings ADD COLUMN IF NOT EXISTS tipo TEXT;
+ALTER TABLE nestings ADD COLUMN IF NOT EXISTS status TEXT;
+ALTER TABLE nestings ADD COLUMN IF NOT EXISTS progresso TEXT;
+ALTER TABLE nestings ADD COLUMN IF NOT EXISTS erro TEXT;
+ALTER TABLE nestings ADD COLUMN IF NOT EXISTS resultado TEXT;
+CREATE UNIQUE INDEX IF NOT EXISTS nestings_job_id_idx ON nestings (job_id);
@@ -0,0 +1,3 @@
+SET search_path TO producao;
+
+ALTER TABLE nestings ADD COLUMN IF NOT EXISTS finalizado_em TEXT;
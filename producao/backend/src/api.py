@@ -1,13 +1,16 @@
-from fastapi import FastAPI, File, UploadFile, Request, BackgroundTasks, Form, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, File, UploadFile, Request, Form, HTTPException
+from fastapi.responses import RedirectResponse, Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from storage import (
-    upload_file,
-    download_stream,
+    upload_bytes,
+    upload_pasta_zip,
+    download_bytes,
+    abrir_objeto,
+    url_assinada,
     delete_file,
-    download_file,
     object_exists,
+    object_info,
     get_public_url,
-    get_object_size,
 )
 import logging
 import xml.etree.ElementTree as ET
@@ -44,9 +47,22 @@ from nesting import (
     _ler_dxt,
     _encontrar_dxt,
     _sanitize_material_name,
+    sobras_estoque_utilizadas,
 )
 from seccionadora import gerar_seccionadora, gerar_seccionadora_preview
-import ezdxf
+import nesting_jobs
+import cache_pastas
+from inventario_bucket import INVENTARIO_INTERVALO, inventario
+from dxf_cache import geometria_dxf
+from lote_zip import PastaZip, abrir_lote, caminho_lote
+from preview_binario import (
+    TIPO_MIDIA as TIPO_PREVIEW_BINARIO,
+    codificar_preview,
+    comprimir,
+    decodificar_preview,
+    descomprimir,
+)
+from nesting_jobs import JobCancelado
 from typing import Union, Dict, List
 
 
@@ -82,10 +98,14 @@ async def _startup() -> None:
         init_db()
     except Exception as e:  # pragma: no cover - init failures only logged
         logging.error(f"Falha ao inicializar o banco: {e}")
+    nesting_jobs.marcar_interrompidos()
     from storage import storage_config_summary, client
 
     if client:
         logging.info("Storage configurado: %s", storage_config_summary())
+        inventario.iniciar_reconciliacao(
+            ("lotes/", "nestings/", "ocorrencias/"), INVENTARIO_INTERVALO
+        )
     else:
         logging.warning(
             "Storage NÃO configurado corretamente: %s", storage_config_summary()
@@ -105,47 +125,39 @@ OBJECT_PREFIX = "producao/"
 # sejam apagados caso a propagação para o armazenamento ainda não tenha
 # ocorrido completamente.
 LOT_CHECK_GRACE = int(os.getenv("LOT_CHECK_GRACE", "60"))
+# Downloads de zips: proxy (repassa o corpo do bucket) ou redirect (URL assinada)
+DOWNLOAD_MODO = os.getenv("DOWNLOAD_MODO", "proxy").lower()
+DOWNLOAD_BLOCO_KB = int(os.getenv("DOWNLOAD_BLOCO_KB", "256"))
+DOWNLOAD_URL_EXPIRA = int(os.getenv("DOWNLOAD_URL_EXPIRA", "300"))
 
 
 def ensure_pasta_local(key: str) -> Path:
-    """Garantir que ``key`` esteja extraído localmente em ``SAIDA_DIR``.
+    """Garantir que ``key`` esteja extraído localmente (``cache_pastas``).
 
-    Retorna o caminho da pasta extraída.
+    Retorna o caminho da pasta extraída, conferida com o objeto no bucket.
     """
     key_no_prefix = key[len(OBJECT_PREFIX) :] if key.startswith(OBJECT_PREFIX) else key
 
-    if key_no_prefix.startswith("lotes/"):
-        pasta = SAIDA_DIR / Path(key_no_prefix).stem
-        extract_to = SAIDA_DIR
+    if key_no_prefix.startswith(("lotes/", "ocorrencias/")):
+        subpasta = Path(key_no_prefix).stem
     elif key_no_prefix.startswith("nestings/"):
-        pasta = SAIDA_DIR / Path(key_no_prefix).stem / "nesting"
-        extract_to = pasta.parent
-    elif key_no_prefix.startswith("ocorrencias/"):
-        pasta = SAIDA_DIR / Path(key_no_prefix).stem
-        extract_to = SAIDA_DIR
+        subpasta = "nesting"
     else:
         raise ValueError("Chave de objeto invalida")
 
-    if pasta.is_dir():
-        return pasta
+    return cache_pastas.cache.obter(key) / subpasta
 
-    status = object_exists(key)
-    if status is False:
-        logging.error("Objeto %s não encontrado no bucket", key)
-        raise FileNotFoundError(f"Objeto {key} nao encontrado")
-    if status is None:
-        logging.error("Falha ao verificar existência do objeto %s", key)
-        raise FileNotFoundError(f"Objeto {key} nao encontrado")
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".zip")
-    tmp.close()
-    try:
-        download_file(key, tmp.name)
-        shutil.unpack_archive(tmp.name, extract_to)
-    finally:
-        os.remove(tmp.name)
-    logging.info("Pasta %s extraída para %s", key, extract_to)
 
-    return pasta
+def abrir_pasta_lote(key: str) -> Union[Path, PastaZip]:
+    """Pasta de um lote ou ocorrência para leitura, sem extraí-la.
+
+    Os arquivos são lidos direto do zip no bucket (``lote_zip``); outras
+    chaves seguem para ``ensure_pasta_local``.
+    """
+    key_no_prefix = key[len(OBJECT_PREFIX) :] if key.startswith(OBJECT_PREFIX) else key
+    if not key_no_prefix.startswith(("lotes/", "ocorrencias/")):
+        return ensure_pasta_local(key)
+    return abrir_lote(key)
 
 
 # Helper to check column existence
@@ -184,36 +196,25 @@ def proximo_oc_numero() -> int:
         return max_val + 1
 
 
-def coletar_layers(pasta_lote: str) -> list[str]:
+def coletar_layers(pasta_lote: Union[str, Path, PastaZip]) -> list[str]:
     """Percorre os arquivos DXF do lote e coleta todos os nomes de layers."""
-    pasta = Path(pasta_lote)
+    pasta = caminho_lote(pasta_lote)
     layers: set[str] = set()
     # Busca recursivamente por arquivos DXF na pasta do lote (case-insensitive)
     for arquivo in pasta.rglob("*"):
         if arquivo.is_file() and arquivo.suffix.lower() == ".dxf":
-            try:
-                doc = ezdxf.readfile(arquivo)
-            except Exception:
-                continue
-
-            # Inclui também os layers definidos no arquivo, não apenas os utilizados
-            for layer in doc.layers:
-                nome = layer.dxf.name
-                if nome and nome.upper() not in {"CONTORNO", "0", "DEFPOINTS"}:
-                    layers.add(nome)
-
-            msp = doc.modelspace()
-            for ent in msp:
-                nome = ent.dxf.layer
+            # Inclui também os layers definidos no arquivo, não apenas os
+            # utilizados; a leitura vem do cache de geometria compartilhado.
+            for nome in geometria_dxf(arquivo)["layers"]:
                 if nome and nome.upper() not in {"CONTORNO", "0", "DEFPOINTS"}:
                     layers.add(nome)
 
     return sorted(layers)
 
 
-def coletar_chapas(pasta_lote: str) -> list[str]:
+def coletar_chapas(pasta_lote: Union[str, Path, PastaZip]) -> list[str]:
     """Retorna os materiais das pecas descritos no DXT do lote."""
-    pasta = Path(pasta_lote)
+    pasta = caminho_lote(pasta_lote)
     dxt = _encontrar_dxt(pasta)
     if not dxt:
         raise FileNotFoundError("Arquivo DXT não encontrado na pasta do lote")
@@ -400,12 +401,8 @@ async def gerar_lote_final(request: Request):
             f.write("     </Part>\n")
         f.write("   </PartData>\n</ListInformation>\n")
 
-    zip_path = shutil.make_archive(
-        str(pasta_saida), "zip", root_dir=pasta_saida.parent, base_dir=pasta_saida.name
-    )
-
     try:
-        upload_file(zip_path, obj_key)
+        upload_pasta_zip(pasta_saida, obj_key)
         with get_db_connection() as conn:
             sql = (
                 f"INSERT INTO {SCHEMA_PREFIX}lotes (obj_key, criado_em) "
@@ -418,7 +415,6 @@ async def gerar_lote_final(request: Request):
         logging.error(f"Erro ao salvar lote: {e}")
         return {"erro": f"Erro ao salvar lote: {e}"}
     finally:
-        os.remove(zip_path)
         shutil.rmtree(pasta_saida, ignore_errors=True)
 
         time.sleep(2)
@@ -431,7 +427,7 @@ async def carregar_lote_final(pasta: str):
     """Lê o lote final identificado pela chave de objeto ``pasta``."""
 
     try:
-        pasta_path = ensure_pasta_local(pasta)
+        pasta_path = abrir_pasta_lote(pasta)
     except FileNotFoundError as e:
         return {"erro": str(e)}
 
@@ -446,191 +442,155 @@ async def carregar_lote_final(pasta: str):
     return {"pacotes": pacotes}
 
 
-@app.post("/executar-nesting")
-async def executar_nesting(request: Request):
-    dados = await request.json()
-    pasta_lote = dados.get("pasta_lote")
-    largura_chapa = float(dados.get("largura_chapa", 2750))
-    altura_chapa = float(dados.get("altura_chapa", 1850))
-    ferramentas = dados.get("ferramentas", [])
-    config_maquina = dados.get("config_maquina")
-    config_layers = dados.get("config_layers")
+def _parametros_nesting(dados: dict) -> dict:
+    """Extrai os parâmetros comuns aos endpoints de nesting."""
     sobras_ids_raw = dados.get("sobras_ids", [])
     try:
         sobras_ids = [int(s) for s in sobras_ids_raw if str(s).strip()]
     except Exception:
         sobras_ids = []
-    if not pasta_lote:
-        return {"erro": "Parâmetro 'pasta_lote' não informado."}
-
-    try:
-        pasta_lote_resolved = ensure_pasta_local(pasta_lote)
-    except FileNotFoundError as e:
-        return {"erro": str(e)}
-
     try:
-        estoque_sel: Dict[str, List[Dict]] = {}
-        if sobras_ids:
-            with get_db_connection() as conn:
-                rows = (
-                    conn.exec_driver_sql(
-                        f"SELECT id, chapa_id, descricao, comprimento, largura FROM {SCHEMA_PREFIX}chapas_estoque WHERE id = ANY({PLACEHOLDER})",
-                        (sobras_ids,),
-                    )
-                    .mappings()
-                    .all()
+        orcamento = float(dados.get("orcamento") or 0) or None
+    except (TypeError, ValueError):
+        orcamento = None
+    return {
+        "pasta_lote": dados.get("pasta_lote"),
+        "largura_chapa": float(dados.get("largura_chapa", 2750)),
+        "altura_chapa": float(dados.get("altura_chapa", 1850)),
+        "ferramentas": dados.get("ferramentas", []),
+        "config_maquina": dados.get("config_maquina"),
+        "config_layers": dados.get("config_layers"),
+        "sobras_ids": sobras_ids,
+        # Ignora o arranjo guardado em cache e refaz o nesting
+        "recalcular": bool(dados.get("recalcular", False)),
+        # Refaz apenas os materiais e chapas alterados desde o último nesting
+        "incremental": bool(dados.get("incremental", False)),
+        # Segundos de busca do Deepnest por material (anytime)
+        "orcamento": orcamento,
+    }
+
+
+def _estoque_selecionado(sobras_ids: list[int]) -> Dict[str, List[Dict]]:
+    """Carrega as sobras escolhidas agrupadas pela descrição do material."""
+    estoque_sel: Dict[str, List[Dict]] = {}
+    if sobras_ids:
+        with get_db_connection() as conn:
+            rows = (
+                conn.exec_driver_sql(
+                    f"SELECT id, chapa_id, descricao, comprimento, largura FROM {SCHEMA_PREFIX}chapas_estoque WHERE id = ANY({PLACEHOLDER})",
+                    (sobras_ids,),
                 )
-                for r in rows:
-                    desc = (r.get("descricao") or "").split("(")[0].strip()
-                    estoque_sel.setdefault(desc, []).append(dict(r))
-
-        chapas = gerar_nesting_preview(
-            str(pasta_lote_resolved),
-            largura_chapa,
-            altura_chapa,
-            ferramentas,
-            config_layers,
-            config_maquina,
-            estoque_sel or None,
-        )
-        layers = coletar_layers(str(pasta_lote_resolved))
-    except Exception as e:
-        return {"erro": str(e)}
-    return {"status": "ok", "preview": chapas, "layers": layers}
+                .mappings()
+                .all()
+            )
+            for r in rows:
+                desc = (r.get("descricao") or "").split("(")[0].strip()
+                estoque_sel.setdefault(desc, []).append(dict(r))
+    return estoque_sel
 
 
-@app.post("/nesting-preview")
-async def nesting_preview(request: Request):
-    """Retorna a disposição das chapas para visualização."""
-    try:
-        dados = await request.json()
-    except Exception:
-        dados = {}
-    pasta_lote = dados.get("pasta_lote")
-    largura_chapa = float(dados.get("largura_chapa", 2750))
-    altura_chapa = float(dados.get("altura_chapa", 1850))
-    ferramentas = dados.get("ferramentas", [])
-    config_maquina = dados.get("config_maquina")
-    sobras_ids_raw = dados.get("sobras_ids", [])
-    try:
-        sobras_ids = [int(s) for s in sobras_ids_raw if str(s).strip()]
-    except Exception:
-        sobras_ids = []
-
-    config_layers = dados.get("config_layers")
+def _nesting_preview(dados: dict, progresso=None, incluir_layers: bool = False) -> dict:
+    """Calcula a disposição das chapas (executado fora do loop de eventos)."""
+    params = _parametros_nesting(dados)
+    pasta_lote = params["pasta_lote"]
     if not pasta_lote:
         return {"erro": "Parâmetro 'pasta_lote' não informado."}
 
     try:
-        pasta_lote_resolved = ensure_pasta_local(pasta_lote)
+        pasta_lote_resolved = abrir_pasta_lote(pasta_lote)
     except FileNotFoundError as e:
         return {"erro": str(e)}
 
     try:
-        estoque_sel: Dict[str, List[Dict]] = {}
-        if sobras_ids:
-            with get_db_connection() as conn:
-                rows = (
-                    conn.exec_driver_sql(
-                        f"SELECT id, chapa_id, descricao, comprimento, largura FROM {SCHEMA_PREFIX}chapas_estoque WHERE id = ANY({PLACEHOLDER})",
-                        (sobras_ids,),
-                    )
-                    .mappings()
-                    .all()
-                )
-                for r in rows:
-                    desc = (r.get("descricao") or "").split("(")[0].strip()
-                    estoque_sel.setdefault(desc, []).append(dict(r))
-
+        estoque_sel = _estoque_selecionado(params["sobras_ids"])
         chapas = gerar_nesting_preview(
-            str(pasta_lote_resolved),
-            largura_chapa,
-            altura_chapa,
-            ferramentas,
-            config_layers,
-            config_maquina,
-            estoque_sel or None,
+            pasta_lote_resolved,
+            params["largura_chapa"],
+            params["altura_chapa"],
+            params["ferramentas"],
+            params["config_layers"],
+            params["config_maquina"],
+            estoque_sel,
+            progresso=progresso,
+            recalcular=params["recalcular"],
+            incremental=params["incremental"],
+            orcamento=params["orcamento"],
         )
+        resultado = {"chapas": chapas}
+        if incluir_layers:
+            resultado["layers"] = coletar_layers(pasta_lote_resolved)
+    except JobCancelado:
+        raise
     except Exception as e:
         return {"erro": str(e)}
-    return {"chapas": chapas}
+    return resultado
 
 
-@app.post("/executar-nesting-final")
-async def executar_nesting_final(request: Request):
-    """Executa o nesting definitivo usando os parâmetros informados."""
-    try:
-        dados = await request.json()
-    except Exception:
-        dados = {}
-    pasta_lote = dados.get("pasta_lote")
-    largura_chapa = float(dados.get("largura_chapa", 2750))
-    altura_chapa = float(dados.get("altura_chapa", 1850))
-    ferramentas = dados.get("ferramentas", [])
-    config_maquina = dados.get("config_maquina")
-    config_layers = dados.get("config_layers")
-    sobras_ids_raw = dados.get("sobras_ids", [])
-    try:
-        sobras_ids = [int(s) for s in sobras_ids_raw if str(s).strip()]
-    except Exception:
-        sobras_ids = []
+def _nesting_final(dados: dict, progresso=None, registrar: bool = True) -> dict:
+    """Executa o nesting definitivo, envia o resultado ao bucket e registra.
+
+    Com ``registrar=False`` a linha em ``nestings`` não é criada aqui; os
+    jobs assíncronos já possuem a sua e apenas a atualizam ao final.
+    """
+    params = _parametros_nesting(dados)
+    pasta_lote = params["pasta_lote"]
+    sobras_ids = params["sobras_ids"]
     if not pasta_lote:
         return {"erro": "Parâmetro 'pasta_lote' não informado."}
 
     try:
-        pasta_lote_resolved = ensure_pasta_local(pasta_lote)
+        pasta_lote_resolved = abrir_pasta_lote(pasta_lote)
     except FileNotFoundError as e:
         return {"erro": str(e)}
+    # A saída vai para uma pasta temporária em ``SAIDA_DIR``, removida ao
+    # final. Pastas extraídas por ``cache_pastas`` continuam intactas (e
+    # válidas para o selo); só a cache as descarta.
+    SAIDA_DIR.mkdir(parents=True, exist_ok=True)
+    pasta_limpar = Path(tempfile.mkdtemp(prefix="nesting_", dir=SAIDA_DIR))
+    pasta_saida = pasta_limpar / pasta_lote_resolved.name / "nesting"
 
     try:
-        estoque_sel: Dict[str, List[Dict]] = {}
-        if sobras_ids:
-            with get_db_connection() as conn:
-                rows = (
-                    conn.exec_driver_sql(
-                        f"SELECT id, chapa_id, descricao, comprimento, largura FROM {SCHEMA_PREFIX}chapas_estoque WHERE id = ANY({PLACEHOLDER})",
-                        (sobras_ids,),
-                    )
-                    .mappings()
-                    .all()
-                )
-                for r in rows:
-                    desc = (r.get("descricao") or "").split("(")[0].strip()
-                    estoque_sel.setdefault(desc, []).append(dict(r))
-
+        estoque_sel = _estoque_selecionado(sobras_ids)
         pasta_resultado, sobras, preview_chapas = gerar_nesting(
-            str(pasta_lote_resolved),
-            largura_chapa,
-            altura_chapa,
-            ferramentas,
-            config_layers,
-            config_maquina,
+            pasta_lote_resolved,
+            params["largura_chapa"],
+            params["altura_chapa"],
+            params["ferramentas"],
+            params["config_layers"],
+            params["config_maquina"],
             estoque_sel,
+            progresso=progresso,
+            recalcular=params["recalcular"],
+            incremental=params["incremental"],
+            orcamento=params["orcamento"],
+            pasta_saida=pasta_saida,
         )
+    except JobCancelado:
+        shutil.rmtree(pasta_limpar, ignore_errors=True)
+        raise
     except Exception as e:
+        shutil.rmtree(pasta_limpar, ignore_errors=True)
         return {"erro": str(e)}
+    if progresso:
+        # Último ponto de cancelamento: a partir daqui o resultado é publicado
+        try:
+            progresso("compactando", chapas=len(preview_chapas))
+        except JobCancelado:
+            shutil.rmtree(pasta_limpar, ignore_errors=True)
+            raise
     pasta_resultado_path = Path(pasta_resultado)
 
-    zip_path = shutil.make_archive(
-        str(pasta_resultado_path),
-        "zip",
-        root_dir=pasta_resultado_path.parent,
-        base_dir=pasta_resultado_path.name,
-    )
-
+    # O zip é gerado direto no upload, sem uma segunda cópia em disco
     obj_key = f"nestings/Nesting_{pasta_resultado_path.parent.name}.zip"
-    upload_file(zip_path, obj_key)
-    preview_key = obj_key.replace(".zip", "_preview.json")
     try:
-        tmp_prev = tempfile.NamedTemporaryFile(delete=False, suffix=".json")
-        with open(tmp_prev.name, "w", encoding="utf-8") as f:
-            json.dump(preview_chapas, f)
-        upload_file(tmp_prev.name, preview_key)
+        upload_pasta_zip(pasta_resultado_path, obj_key)
+        # A prévia é guardada no formato binário já compactado com gzip
+        upload_bytes(
+            comprimir(codificar_preview(preview_chapas)),
+            obj_key.replace(".zip", "_preview.bin"),
+        )
     finally:
-        os.remove(tmp_prev.name)
-    os.remove(zip_path)
-    shutil.rmtree(pasta_resultado_path, ignore_errors=True)
-    shutil.rmtree(pasta_lote_resolved, ignore_errors=True)
+        shutil.rmtree(pasta_limpar, ignore_errors=True)
     try:
         with get_db_connection() as conn:
             origem_lote = Path(pasta_lote).stem
@@ -682,6 +642,12 @@ async def executar_nesting_final(request: Request):
                     sql = f"INSERT INTO {SCHEMA_PREFIX}chapas_estoque ({', '.join(cols)}) VALUES ({placeholders})"
                     conn.exec_driver_sql(sql, tuple(params))
 
+            # Apenas as sobras selecionadas que receberam peças são consumidas
+            sobras_ids = [
+                s["id"]
+                for s in sobras_estoque_utilizadas(preview_chapas)
+                if s.get("id") is not None
+            ]
             if sobras_ids:
                 sel_cols = [
                     "chapa_id",
@@ -739,20 +705,99 @@ async def executar_nesting_final(request: Request):
             conn.commit()
     except Exception as e:
         logging.error("Falha ao registrar sobras: %s", e)
+    if registrar:
+        try:
+            with get_db_connection() as conn:
+                conn.exec_driver_sql(
+                    f"INSERT INTO {SCHEMA_PREFIX}nestings (lote, obj_key, criado_em) VALUES ({PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER})",
+                    (
+                        pasta_lote,
+                        obj_key,
+                        datetime.now().isoformat(),
+                    ),
+                )
+                conn.commit()
+        except Exception:
+            pass
+    return {"status": "ok", "pasta_resultado": obj_key}
+
+
+@app.post("/executar-nesting")
+async def executar_nesting(request: Request):
+    dados = await request.json()
+    resultado = await run_in_threadpool(_nesting_preview, dados, None, True)
+    if "erro" in resultado:
+        return resultado
+    return {"status": "ok", "preview": resultado["chapas"], "layers": resultado["layers"]}
+
+
+@app.post("/nesting-preview")
+async def nesting_preview(request: Request):
+    """Retorna a disposição das chapas para visualização."""
     try:
-        with get_db_connection() as conn:
-            conn.exec_driver_sql(
-                f"INSERT INTO {SCHEMA_PREFIX}nestings (lote, obj_key, criado_em) VALUES ({PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER})",
-                (
-                    pasta_lote,
-                    obj_key,
-                    datetime.now().isoformat(),
-                ),
-            )
-            conn.commit()
+        dados = await request.json()
     except Exception:
-        pass
-    return {"status": "ok", "pasta_resultado": obj_key}
+        dados = {}
+    resultado = await run_in_threadpool(_nesting_preview, dados)
+    if "erro" in resultado:
+        return resultado
+    return await run_in_threadpool(_resposta_preview, request, resultado["chapas"])
+
+
+@app.post("/executar-nesting-final")
+async def executar_nesting_final(request: Request):
+    """Executa o nesting definitivo usando os parâmetros informados."""
+    try:
+        dados = await request.json()
+    except Exception:
+        dados = {}
+    return await run_in_threadpool(_nesting_final, dados)
+
+
+@app.post("/nesting-jobs")
+async def criar_nesting_job(request: Request):
+    """Agenda um nesting (``tipo`` = ``preview`` ou ``final``) em segundo plano.
+
+    Retorna imediatamente o ``job_id``; o andamento é consultado em
+    ``GET /nesting-jobs/{job_id}``.
+    """
+    try:
+        dados = await request.json()
+    except Exception:
+        dados = {}
+    tipo = dados.get("tipo", "preview")
+    if tipo not in ("preview", "final"):
+        return {"erro": "Parâmetro 'tipo' deve ser 'preview' ou 'final'."}
+    if not dados.get("pasta_lote"):
+        return {"erro": "Parâmetro 'pasta_lote' não informado."}
+
+    def executar(progresso):
+        if tipo == "final":
+            return _nesting_final(dados, progresso, registrar=False)
+        return _nesting_preview(dados, progresso, incluir_layers=True)
+
+    job = await run_in_threadpool(
+        nesting_jobs.submeter, tipo, executar, dados.get("pasta_lote")
+    )
+    return job.to_dict()
+
+
+@app.get("/nesting-jobs/{job_id}")
+async def status_nesting_job(job_id: str):
+    """Retorna status, progresso e, se concluído, o resultado do job."""
+    job = await run_in_threadpool(nesting_jobs.obter, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
+
+
+@app.post("/nesting-jobs/{job_id}/cancelar")
+async def cancelar_nesting_job(job_id: str):
+    """Solicita o cancelamento de um job pendente ou em execução."""
+    job = nesting_jobs.cancelar(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
 
 
 @app.post("/coletar-layers")
@@ -764,12 +809,12 @@ async def api_coletar_layers(request: Request):
         return {"erro": "Parâmetro 'pasta_lote' não informado."}
 
     try:
-        pasta_lote_resolved = ensure_pasta_local(pasta_lote)
+        pasta_lote_resolved = abrir_pasta_lote(pasta_lote)
     except FileNotFoundError as e:
         return {"erro": str(e)}
 
     try:
-        layers = coletar_layers(str(pasta_lote_resolved))
+        layers = coletar_layers(pasta_lote_resolved)
     except Exception as e:
         return {"erro": str(e)}
     return {"layers": layers}
@@ -784,12 +829,12 @@ async def api_coletar_chapas(request: Request):
         return {"erro": "Parâmetro 'pasta_lote' não informado."}
 
     try:
-        pasta_lote_resolved = ensure_pasta_local(pasta_lote)
+        pasta_lote_resolved = abrir_pasta_lote(pasta_lote)
     except FileNotFoundError as e:
         return {"erro": str(e)}
 
     try:
-        materiais = coletar_chapas(str(pasta_lote_resolved))
+        materiais = coletar_chapas(pasta_lote_resolved)
     except Exception as e:
         return {"erro": str(e)}
     return {"materiais": materiais}
@@ -803,12 +848,12 @@ async def seccionadora_preview(request: Request):
     if not pasta_lote:
         return {"erro": "Parâmetro 'pasta_lote' não informado."}
     try:
-        pasta_resolvida = ensure_pasta_local(pasta_lote)
+        pasta_resolvida = abrir_pasta_lote(pasta_lote)
     except FileNotFoundError as e:
         return {"erro": str(e)}
     try:
         chapas = gerar_seccionadora_preview(
-            str(pasta_resolvida),
+            pasta_resolvida,
             float(dados.get("largura_chapa", 2750)),
             float(dados.get("altura_chapa", 1850)),
             None,
@@ -833,7 +878,7 @@ async def executar_seccionadora(request: Request):
     if not pasta_lote:
         return {"erro": "Parâmetro 'pasta_lote' não informado."}
     try:
-        pasta_resolvida = ensure_pasta_local(pasta_lote)
+        pasta_resolvida = abrir_pasta_lote(pasta_lote)
     except FileNotFoundError as e:
         return {"erro": str(e)}
 
@@ -855,18 +900,14 @@ async def executar_seccionadora(request: Request):
                     estoque_sel.setdefault(desc, []).append(dict(r))
 
         pasta_resultado, sobras, preview = gerar_seccionadora(
-            str(pasta_resolvida), largura_chapa, altura_chapa, estoque_sel
+            pasta_resolvida, largura_chapa, altura_chapa, estoque_sel
         )
     except Exception as e:
         return {"erro": str(e)}
 
     pasta_path = Path(pasta_resultado)
-    zip_path = shutil.make_archive(
-        str(pasta_path), "zip", root_dir=pasta_path.parent, base_dir=pasta_path.name
-    )
     obj_key = f"seccionadoras/Seccionadora_{pasta_path.name}.zip"
-    upload_file(zip_path, obj_key)
-    os.remove(zip_path)
+    upload_pasta_zip(pasta_path, obj_key)
     shutil.rmtree(pasta_path, ignore_errors=True)
 
     # registra sobras no estoque
@@ -930,6 +971,7 @@ async def listar_lotes():
     """
 
     lotes_validos: list[str] = []
+    existentes = await run_in_threadpool(inventario.chaves, "lotes/")
     try:
         with get_db_connection() as conn:
             rows = (
@@ -943,23 +985,17 @@ async def listar_lotes():
             logging.info("%d lotes encontrados no banco", len(dados))
 
             novos: list[str] = []
-            logging.info("LISTANDO LOTES:")
             for d in dados:
                 key = d["obj_key"]
-                logging.info(" - Verificando: %s", key)
-                status = object_exists(key)
-                if status is True:
-                    logging.info("   ✓ Existe no bucket")
-                elif status is False:
+                # Os lotes são listados mesmo ausentes: a ausência só é registrada
+                if inventario.status(key, existentes, confirmar=False) is False:
                     age = _age_seconds(d.get("criado_em"))
                     if age is not None and age < LOT_CHECK_GRACE:
                         logging.info(
-                            "   ⚠ Lote recente (%ds), aguardando upload", int(age)
+                            " - %s: lote recente (%ds), aguardando upload", key, int(age)
                         )
                     else:
-                        logging.info("   ✗ NÃO encontrado no bucket")
-                else:
-                    logging.info("   ⚠ Erro ao verificar no bucket")
+                        logging.info(" - %s: NÃO encontrado no bucket", key)
                 novos.append(key)
 
             conn.commit()
@@ -981,11 +1017,12 @@ async def listar_nestings():
     estejam registradas no banco de dados, elas são adicionadas automaticamente.
     """
     dados: list[dict] = []
+    existentes = await run_in_threadpool(inventario.chaves, "nestings/")
     try:
         with get_db_connection() as conn:
             rows = (
                 conn.exec_driver_sql(
-                    f"SELECT id, lote, obj_key, criado_em FROM {SCHEMA_PREFIX}nestings ORDER BY id DESC"
+                    f"SELECT id, lote, obj_key, criado_em FROM {SCHEMA_PREFIX}nestings WHERE obj_key IS NOT NULL ORDER BY id DESC"
                 )
                 .mappings()
                 .all()
@@ -996,7 +1033,7 @@ async def listar_nestings():
             novos: list[dict] = []
             for d in dados:
                 key = d["obj_key"]
-                status = object_exists(key)
+                status = inventario.status(key, existentes)
                 if status is True:
                     d["arquivo_url"] = get_public_url(key)
                     novos.append(d)
@@ -1022,8 +1059,74 @@ async def listar_nestings():
     return {"nestings": dados}
 
 
+_RANGE_SIMPLES = re.compile(r"^bytes=(\d+-\d*|-\d+)$")
+
+
+def _blocos(corpo):
+    try:
+        for bloco in iter(lambda: corpo.read(DOWNLOAD_BLOCO_KB * 1024), b""):
+            yield bloco
+    finally:
+        corpo.close()
+
+
+async def _download_objeto(request: Request, object_name: str) -> Response:
+    """Resposta de download de ``object_name`` sem passar pelo disco.
+
+    Com ``DOWNLOAD_MODO=redirect`` o cliente é redirecionado para uma URL
+    assinada do bucket. Caso contrário o corpo do ``get_object`` é repassado
+    em blocos de ``DOWNLOAD_BLOCO_KB`` assim que chega, com suporte a
+    ``Range``/``If-Range`` (um único intervalo) para retomar downloads.
+
+    Raises:
+        FileNotFoundError: o objeto não existe no bucket.
+    """
+    filename = Path(object_name).name
+    disposicao = f"attachment; filename={filename}"
+    if DOWNLOAD_MODO == "redirect":
+        if object_exists(object_name) is False:
+            raise FileNotFoundError(f"Objeto {object_name} nao encontrado")
+        url = url_assinada(object_name, DOWNLOAD_URL_EXPIRA, disposicao)
+        if url:
+            return RedirectResponse(url, status_code=307)
+
+    # Vários intervalos ou outras unidades: responde com o objeto inteiro
+    intervalo = request.headers.get("range", "").replace(" ", "")
+    if not _RANGE_SIMPLES.match(intervalo):
+        intervalo = None
+    se_etag = request.headers.get("if-range") if intervalo else None
+    if se_etag and not se_etag.startswith('"'):
+        # Datas e ETags fracos nunca conferem com o objeto atual
+        intervalo = se_etag = None
+    try:
+        obj = await run_in_threadpool(abrir_objeto, object_name, intervalo, se_etag)
+    except ValueError:
+        info = await run_in_threadpool(object_info, object_name)
+        total = info["tamanho"] if info else "*"
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{total}"})
+
+    headers: dict[str, str] = {
+        "Content-Disposition": disposicao,
+        "Accept-Ranges": "bytes",
+    }
+    if obj["tamanho"] is not None:
+        headers["Content-Length"] = str(obj["tamanho"])
+    if obj["etag"]:
+        headers["ETag"] = obj["etag"]
+    status = 200
+    if obj["intervalo"]:
+        headers["Content-Range"] = obj["intervalo"]
+        status = 206
+    return StreamingResponse(
+        _blocos(obj["corpo"]),
+        status_code=status,
+        media_type="application/zip",
+        headers=headers,
+    )
+
+
 @app.get("/download-lote/{lote_id}")
-async def download_lote(lote_id: int, background_tasks: BackgroundTasks):
+async def download_lote(lote_id: int, request: Request):
     """
     Realiza o download do arquivo zip pré-gerado para o lote identificado pelo ID.
     """
@@ -1042,31 +1145,17 @@ async def download_lote(lote_id: int, background_tasks: BackgroundTasks):
     except Exception:
         object_name = None
 
-    if not object_name or object_exists(object_name) is False:
+    if not object_name:
+        raise HTTPException(status_code=404, detail="Lote não encontrado")
+    try:
+        return await _download_objeto(request, object_name)
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Lote não encontrado")
-
-    # Prepara streaming no arquivo temporário e define remoção pós-resposta
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".zip")
-    tmp.close()
-    background_tasks.add_task(os.remove, tmp.name)
-
-    # Monta headers de download com nome de arquivo e tamanho
-    filename = Path(object_name).name
-    headers: dict[str, str] = {"Content-Disposition": f"attachment; filename={filename}"}
-    size = get_object_size(object_name)
-    if size is not None:
-        headers["Content-Length"] = str(size)
-
-    return StreamingResponse(
-        download_stream(object_name, tmp.name),
-        media_type="application/zip",
-        headers=headers,
-    )
 
 
 @app.get("/download-nesting/{nid}")
-async def download_nesting(nid: int, background_tasks: BackgroundTasks):
-    """Compacta e faz o download dos arquivos de uma otimização."""
+async def download_nesting(nid: int, request: Request):
+    """Faz o download do zip com os arquivos de uma otimização."""
     try:
         with get_db_connection() as conn:
             row = (
@@ -1083,42 +1172,80 @@ async def download_nesting(nid: int, background_tasks: BackgroundTasks):
 
     if not object_name:
         return {"erro": "Nesting não encontrado"}
-
-    status = object_exists(object_name)
-    if status is False:
+    try:
+        return await _download_objeto(request, object_name)
+    except FileNotFoundError:
         return {"erro": "Pasta não encontrada"}
 
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".zip")
-    tmp.close()
-    filename = Path(object_name).name
-    background_tasks.add_task(os.remove, tmp.name)
-    return StreamingResponse(
-        download_stream(object_name, tmp.name),
-        media_type="application/zip",
-        headers={"Content-Disposition": f"attachment; filename={filename}"},
+
+def _aceita_gzip(request: Request) -> bool:
+    return "gzip" in request.headers.get("accept-encoding", "").lower()
+
+
+def _resposta_preview(request: Request, chapas=None, binario_gz: bytes | None = None):
+    """Responde a prévia no formato pedido pelo cabeçalho ``Accept``.
+
+    Clientes que aceitam ``application/vnd.nesting-preview`` recebem o formato
+    binário; os demais, o JSON ``{"chapas": [...]}``. Ambos são enviados com
+    gzip quando o cliente aceita. ``binario_gz`` é a prévia já codificada e
+    compactada (como guardada no bucket), evitando refazer o trabalho.
+    """
+    gzip_ok = _aceita_gzip(request)
+    if TIPO_PREVIEW_BINARIO in request.headers.get("accept", ""):
+        corpo = binario_gz if binario_gz is not None else comprimir(codificar_preview(chapas))
+        if not gzip_ok:
+            return Response(descomprimir(corpo), media_type=TIPO_PREVIEW_BINARIO)
+        return Response(
+            corpo,
+            media_type=TIPO_PREVIEW_BINARIO,
+            headers={"Content-Encoding": "gzip", "Vary": "Accept, Accept-Encoding"},
+        )
+    if chapas is None:
+        chapas = decodificar_preview(descomprimir(binario_gz))
+    corpo = json.dumps({"chapas": chapas}, separators=(",", ":")).encode("utf-8")
+    if not gzip_ok:
+        return Response(corpo, media_type="application/json")
+    return Response(
+        comprimir(corpo),
+        media_type="application/json",
+        headers={"Content-Encoding": "gzip", "Vary": "Accept, Accept-Encoding"},
     )
 
 
-@app.get("/carregar-nesting-preview")
-async def carregar_nesting_preview(obj_key: str):
-    """Retorna o preview salvo para a otimização identificada por ``obj_key``."""
-    preview_key = obj_key.replace(".zip", "_preview.json")
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".json")
-    tmp.close()
-    try:
+def _carregar_preview(obj_key: str):
+    """Lê a prévia salva: binária (``_preview.bin``) ou JSON de versões antigas.
+
+    Retorna ``(chapas, binario_gz)`` com apenas um dos dois preenchido, ou um
+    dicionário ``{"erro": ...}``.
+    """
+    for sufixo in ("_preview.bin", "_preview.json"):
+        preview_key = obj_key.replace(".zip", sufixo)
         status = object_exists(preview_key)
-        if status is False:
-            return {"erro": "Prévia não encontrada"}
         if status is None:
             return {"erro": "Falha ao acessar armazenamento"}
-        download_file(preview_key, tmp.name)
-        with open(tmp.name, "r", encoding="utf-8") as f:
-            dados = json.load(f)
-        return {"chapas": dados}
+        if status is False:
+            continue
+        dados = download_bytes(preview_key)
+        if sufixo == "_preview.bin":
+            return None, dados
+        return json.loads(dados), None
+    return {"erro": "Prévia não encontrada"}
+
+
+@app.get("/carregar-nesting-preview")
+async def carregar_nesting_preview(obj_key: str, request: Request):
+    """Retorna o preview salvo para a otimização identificada por ``obj_key``.
+
+    Veja ``_resposta_preview`` para os formatos aceitos.
+    """
+    try:
+        carregado = await run_in_threadpool(_carregar_preview, obj_key)
+        if isinstance(carregado, dict):
+            return carregado
+        chapas, binario_gz = carregado
+        return await run_in_threadpool(_resposta_preview, request, chapas, binario_gz)
     except Exception as e:
         return {"erro": str(e)}
-    finally:
-        os.remove(tmp.name)
 
 
 @app.post("/remover-nesting")
@@ -1165,14 +1292,7 @@ async def remover_nesting(request: Request):
     except Exception as e:
         return {"erro": str(e)}
     if obj_key:
-
-        try:
-            pasta_local = ensure_pasta_local(obj_key)
-        except FileNotFoundError:
-            pasta_local = None
-        if pasta_local:
-            shutil.rmtree(pasta_local, ignore_errors=True)
-
+        cache_pastas.cache.descartar(obj_key)
         delete_file(obj_key)
 
     if lote_nome:
@@ -1200,6 +1320,7 @@ async def excluir_lote(request: Request):
         shutil.rmtree(pasta, ignore_errors=True)
 
     key = f"lotes/Lote_{numero_lote}.zip"
+    cache_pastas.cache.descartar(key)
     delete_file(key)
     try:
         with get_db_connection() as conn:
@@ -1236,11 +1357,12 @@ async def limpar_nesting_preview(request: Request):
     else:
         pasta = SAIDA_DIR / Path(key_no_prefix).name
 
+    removido = cache_pastas.cache.descartar(pasta_lote)
     if pasta.is_dir():
         shutil.rmtree(pasta, ignore_errors=True)
-        return {"status": "ok", "removido": True}
+        removido = True
 
-    return {"status": "ok", "removido": False}
+    return {"status": "ok", "removido": removido}
 
 
 @app.get("/config-maquina")
@@ -1658,6 +1780,7 @@ async def remover_chapa_estoque(item_id: int, request: Request):
 async def listar_lotes_ocorrencias():
     """Retorna os lotes de ocorrências cadastrados."""
     dados: list[dict] = []
+    existentes = await run_in_threadpool(inventario.chaves, "ocorrencias/")
     try:
         with get_db_connection() as conn:
             rows = (
@@ -1676,7 +1799,9 @@ async def listar_lotes_ocorrencias():
             for d in dados:
                 key = d["obj_key"]
                 pasta_oc = Path(SAIDA_DIR / Path(key).stem)
-                status = object_exists(key) if not pasta_oc.is_dir() else True
+                status = (
+                    inventario.status(key, existentes) if not pasta_oc.is_dir() else True
+                )
                 if status is True:
                     d["arquivo_url"] = get_public_url(key)
                     novos.append(d)
@@ -1833,12 +1958,7 @@ async def gerar_lote_ocorrencia(request: Request):
     except Exception as e:
         return {"erro": str(e)}
 
-    zip_path = shutil.make_archive(
-        str(pasta_saida), "zip", root_dir=pasta_saida.parent, base_dir=pasta_saida.name
-    )
-
-    upload_file(zip_path, key_oc)
-    os.remove(zip_path)
+    upload_pasta_zip(pasta_saida, key_oc)
     shutil.rmtree(pasta_saida, ignore_errors=True)
     return {"status": "ok", "oc_numero": numero_oc}
 
@@ -1858,14 +1978,7 @@ async def excluir_lote_ocorrencia(oc_id: int):
             )
             if row:
                 key = row.get("obj_key")
-
-                try:
-                    pasta = ensure_pasta_local(key)
-                except FileNotFoundError:
-                    pasta = None
-                if pasta and pasta.is_dir():
-
-                    shutil.rmtree(pasta, ignore_errors=True)
+                cache_pastas.cache.descartar(key)
                 delete_file(key)
                 conn.exec_driver_sql(
                     f"DELETE FROM {SCHEMA_PREFIX}lotes_ocorrencias WHERE id={PLACEHOLDER}",
@@ -1878,7 +1991,7 @@ async def excluir_lote_ocorrencia(oc_id: int):
         raise HTTPException(status_code=500, detail="Erro ao excluir lote de ocorrência")
 
 @app.get("/download-lote-ocorrencia/{oc_id}")
-async def download_lote_ocorrencia(oc_id: int, background_tasks: BackgroundTasks):
+async def download_lote_ocorrencia(oc_id: int, request: Request):
     """Download do arquivo ZIP do lote de ocorrência especificado."""
     try:
         with get_db_connection() as conn:
@@ -1894,24 +2007,12 @@ async def download_lote_ocorrencia(oc_id: int, background_tasks: BackgroundTasks
     except Exception:
         object_name = None
 
-    if not object_name or object_exists(object_name) is False:
+    if not object_name:
+        raise HTTPException(status_code=404, detail="Lote de ocorrência não encontrado")
+    try:
+        return await _download_objeto(request, object_name)
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Lote de ocorrência não encontrado")
-
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".zip")
-    tmp.close()
-    background_tasks.add_task(os.remove, tmp.name)
-
-    filename = Path(object_name).name
-    headers: dict[str, str] = {"Content-Disposition": f"attachment; filename={filename}"}
-    size = get_object_size(object_name)
-    if size is not None:
-        headers["Content-Length"] = str(size)
-
-    return StreamingResponse(
-        download_stream(object_name, tmp.name),
-        media_type="application/zip",
-        headers=headers,
-    )
 
 @app.get("/apontamentos")
 async def obter_apontamentos(lote: str, pacote: str):
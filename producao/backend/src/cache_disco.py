@@ -0,0 +1,236 @@
+"""Cache em disco endereçado por conteúdo.
+
+Os valores são serializados com msgpack; geometrias shapely são gravadas em
+WKB dentro de um ``ExtType``. Cada entrada é um arquivo em
+``<diretorio>/<chave[:2]>/<chave>.msgpack`` escrito de forma atômica, de
+modo que vários processos (API, pool de nesting) podem compartilhar o mesmo
+diretório. Um LRU em memória evita desserializar repetidamente as entradas
+mais usadas e o diretório é limitado em tamanho, removendo primeiro os
+arquivos acessados há mais tempo.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import zipfile
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import msgpack
+from shapely import wkb
+from shapely.geometry.base import BaseGeometry
+
+_EXT_GEOMETRIA = 1
+
+
+def _default(obj: Any):
+    if isinstance(obj, BaseGeometry):
+        return msgpack.ExtType(_EXT_GEOMETRIA, wkb.dumps(obj))
+    if isinstance(obj, Path):
+        return str(obj)
+    raise TypeError(f"Tipo não serializável no cache: {type(obj)!r}")
+
+
+def _ext_hook(code: int, data: bytes):
+    if code == _EXT_GEOMETRIA:
+        return wkb.loads(data)
+    return msgpack.ExtType(code, data)
+
+
+def empacotar(valor: Any) -> bytes:
+    """Serializa ``valor`` (tipos básicos e geometrias shapely).
+
+    Tuplas são gravadas como listas.
+    """
+    return msgpack.packb(valor, default=_default, use_bin_type=True)
+
+
+def desempacotar(dados: bytes) -> Any:
+    return msgpack.unpackb(dados, ext_hook=_ext_hook, raw=False, strict_map_key=False)
+
+
+def chave(*partes: Any) -> str:
+    """Gera uma chave estável (blake2b) a partir de ``partes``."""
+    h = hashlib.blake2b(digest_size=20)
+    for parte in partes:
+        if isinstance(parte, bytes):
+            h.update(parte)
+        else:
+            h.update(repr(parte).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+_hashes: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+_hashes_lock = threading.Lock()
+_HASHES_MAX = 4096
+
+
+def hash_arquivo(caminho: Path) -> str:
+    """Retorna o hash do conteúdo de ``caminho``.
+
+    O resultado é memorizado por (caminho, mtime, tamanho) para que o mesmo
+    arquivo não seja lido novamente enquanto não for alterado. Para um membro
+    de um lote aberto do bucket (``lote_zip``) o hash identifica o objeto
+    (chave e ETag) e o caminho do membro, sem ler o conteúdo; nomes como
+    ``1.dxf`` se repetem entre lotes e o CRC-32 não distingue conteúdos. Os
+    membros de outros zips têm o conteúdo lido.
+    """
+    if isinstance(caminho, zipfile.Path):
+        try:
+            info = caminho.root.getinfo(caminho.at)
+        except KeyError:
+            raise FileNotFoundError(str(caminho)) from None
+        origem = getattr(caminho.root, "origem", None)
+        if origem:
+            _, chave_objeto, etag, tamanho = origem
+            return chave(
+                "zip", chave_objeto, etag, tamanho, caminho.at, info.CRC, info.file_size
+            )
+        h = hashlib.blake2b(digest_size=20)
+        with caminho.root.open(info) as f:
+            for bloco in iter(lambda: f.read(1 << 20), b""):
+                h.update(bloco)
+        return h.hexdigest()
+    st = os.stat(caminho)
+    ident = (str(caminho), st.st_mtime_ns, st.st_size)
+    with _hashes_lock:
+        if ident in _hashes:
+            _hashes.move_to_end(ident)
+            return _hashes[ident]
+    h = hashlib.blake2b(digest_size=20)
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloco)
+    digest = h.hexdigest()
+    with _hashes_lock:
+        _hashes[ident] = digest
+        while len(_hashes) > _HASHES_MAX:
+            _hashes.popitem(last=False)
+    return digest
+
+
+class CacheDisco:
+    """Cache chave → valor persistido em disco com LRU em memória."""
+
+    def __init__(self, diretorio: Path, limite_bytes: int, itens_memoria: int = 256):
+        self.diretorio = Path(diretorio)
+        self.limite_bytes = limite_bytes
+        self.itens_memoria = itens_memoria
+        self._memoria: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._tamanho_disco: Optional[int] = None
+
+    def _arquivo(self, chave: str) -> Path:
+        return self.diretorio / chave[:2] / f"{chave}.msgpack"
+
+    def _lembrar(self, chave: str, valor: Any) -> None:
+        with self._lock:
+            self._memoria[chave] = valor
+            self._memoria.move_to_end(chave)
+            while len(self._memoria) > self.itens_memoria:
+                self._memoria.popitem(last=False)
+
+    def obter(self, chave: str, padrao: Any = None) -> Any:
+        with self._lock:
+            if chave in self._memoria:
+                self._memoria.move_to_end(chave)
+                return self._memoria[chave]
+        arquivo = self._arquivo(chave)
+        try:
+            dados = arquivo.read_bytes()
+        except OSError:
+            return padrao
+        try:
+            valor = desempacotar(dados)
+        except Exception as e:
+            logging.warning("Entrada de cache corrompida %s: %s", arquivo, e)
+            arquivo.unlink(missing_ok=True)
+            return padrao
+        try:
+            # Atualiza o mtime para que a remoção siga a ordem de uso (LRU)
+            os.utime(arquivo)
+        except OSError:
+            pass
+        self._lembrar(chave, valor)
+        return valor
+
+    def gravar(self, chave: str, valor: Any) -> None:
+        self._lembrar(chave, valor)
+        try:
+            dados = empacotar(valor)
+        except TypeError as e:
+            logging.warning("Valor não pôde ser gravado no cache: %s", e)
+            return
+        arquivo = self._arquivo(chave)
+        try:
+            arquivo.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=arquivo.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(dados)
+            os.replace(tmp, arquivo)
+        except OSError as e:
+            logging.warning("Falha ao gravar cache em %s: %s", arquivo, e)
+            return
+        self._contabilizar(len(dados))
+
+    def obter_ou_calcular(self, chave: str, calcular: Callable[[], Any]) -> Any:
+        """Retorna o valor em cache ou calcula, grava e retorna."""
+        ausente = object()
+        valor = self.obter(chave, ausente)
+        if valor is ausente:
+            valor = calcular()
+            self.gravar(chave, valor)
+        return valor
+
+    def _contabilizar(self, novos_bytes: int) -> None:
+        with self._lock:
+            if self._tamanho_disco is None:
+                self._tamanho_disco = sum(
+                    f.stat().st_size for f in self.diretorio.rglob("*.msgpack")
+                )
+            else:
+                self._tamanho_disco += novos_bytes
+            excedeu = self._tamanho_disco > self.limite_bytes
+        if excedeu:
+            self._podar()
+
+    def _podar(self) -> None:
+        """Remove os arquivos menos usados até ficar em 80% do limite."""
+        arquivos: list = []
+        for f in self.diretorio.rglob("*.msgpack"):
+            try:
+                st = f.stat()
+            except OSError:
+                continue
+            arquivos.append((st.st_mtime, st.st_size, f))
+        arquivos.sort(key=lambda a: a[0])
+        total = sum(a[1] for a in arquivos)
+        alvo = int(self.limite_bytes * 0.8)
+        for _, tamanho, f in arquivos:
+            if total <= alvo:
+                break
+            try:
+                f.unlink()
+                total -= tamanho
+            except OSError:
+                continue
+        with self._lock:
+            self._tamanho_disco = total
+
+    def limpar(self) -> None:
+        """Esvazia o LRU em memória (o disco é mantido)."""
+        with self._lock:
+            self._memoria.clear()
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "diretorio": str(self.diretorio),
+                "itens_memoria": len(self._memoria),
+                "bytes_disco": self._tamanho_disco,
+                "limite_bytes": self.limite_bytes,
+            }
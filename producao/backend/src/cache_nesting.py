@@ -0,0 +1,118 @@
+"""Cache dos resultados do nesting.
+
+Dois níveis, ambos em ``NESTING_CACHE_DIR`` (msgpack + WKB, limitado a
+``NESTING_CACHE_MAX_MB``):
+
+* **arranjo** de um material: as placas devolvidas por
+  ``nesting.arranjar_poligonos`` e o orçamento de tempo usado na busca do
+  Deepnest (``{"placas": ..., "orcamento": ...}``). A chave é o conteúdo das peças (campos do
+  DXT e contorno em WKB) mais todos os parâmetros do arranjo, então a prévia
+  e o nesting final do mesmo lote compartilham a entrada e o final reproduz
+  exatamente a disposição aprovada. Para o modo incremental, a chave do
+  **lote** (nome do lote + parâmetros, sem as peças) aponta para o último
+  arranjo calculado do material, que serve de base quando as peças mudam;
+* **prévia** completa do lote: a lista de chapas de ``gerar_nesting_preview``,
+  com chave formada pelas chaves dos arranjos mais o hash dos DXF, de onde
+  saem as usinagens exibidas. O resultado de um job de prévia
+  (``nesting_jobs``) também é guardado, pela chave do job.
+
+As entradas não ficam em memória: cada leitura desempacota uma cópia nova, o
+que permite a quem chama alterar o resultado livremente.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from cache_disco import CacheDisco, chave, hash_arquivo
+
+# Incrementar quando o formato dos resultados ou o algoritmo mudar.
+_VERSAO = 3
+
+NESTING_CACHE_DIR = Path(
+    os.getenv(
+        "NESTING_CACHE_DIR", str(Path(__file__).resolve().parent / "cache" / "nesting")
+    )
+)
+NESTING_CACHE_MAX_MB = int(os.getenv("NESTING_CACHE_MAX_MB", "512"))
+
+cache = CacheDisco(NESTING_CACHE_DIR, NESTING_CACHE_MAX_MB * 1024 * 1024, 0)
+
+# Campos das peças que não são conteúdo do lote
+_IGNORAR = ("geometria", "polygon", "_assinatura")
+
+
+def _json(valor: Any) -> str:
+    return json.dumps(valor, sort_keys=True, default=str, separators=(",", ":"))
+
+
+def assinatura_peca(p: Dict) -> str:
+    """Identifica o conteúdo de uma peça: campos do DXT e contorno."""
+    poligono = p.get("polygon")
+    return chave(
+        _json({k: v for k, v in p.items() if k not in _IGNORAR}),
+        poligono.wkb if poligono is not None else b"",
+    )
+
+
+def chave_arranjo(pecas: List[Dict], *parametros: Any) -> Optional[str]:
+    """Chave do arranjo de ``pecas`` com os ``parametros`` do material.
+
+    Retorna ``None`` com o cache desabilitado (``NESTING_CACHE_MAX_MB=0``).
+    """
+    if NESTING_CACHE_MAX_MB <= 0:
+        return None
+    return chave(
+        _VERSAO, "arranjo", _json(parametros), *(assinatura_peca(p) for p in pecas)
+    )
+
+
+def chave_lote(lote: str, *parametros: Any) -> Optional[str]:
+    """Chave do último arranjo de um material do lote, qualquer que seja o
+    conteúdo das peças."""
+    if NESTING_CACHE_MAX_MB <= 0:
+        return None
+    return chave(_VERSAO, "lote", lote, _json(parametros))
+
+
+def chave_preview(
+    chaves_arranjo: List[Optional[str]], pecas: List[Dict], pasta: Path, *parametros: Any
+) -> Optional[str]:
+    """Chave da prévia completa: chaves dos arranjos, conteúdo dos DXF e
+    ``parametros`` que não entram nos arranjos (orçamento do Deepnest).
+
+    Os parâmetros da prévia (layers, ferramentas, máquina) já fazem parte das
+    chaves dos arranjos.
+    """
+    if NESTING_CACHE_MAX_MB <= 0 or None in chaves_arranjo:
+        return None
+    arquivos = sorted({p["Filename"] for p in pecas if p.get("Filename")})
+    hashes = []
+    for nome in arquivos:
+        try:
+            hashes.append(hash_arquivo(pasta / nome))
+        except OSError:
+            hashes.append("")
+    return chave(
+        _VERSAO, "preview", _json(parametros), *chaves_arranjo, *arquivos, *hashes
+    )
+
+
+def obter(chave_cache: Optional[str]) -> Any:
+    """Resultado guardado em ``chave_cache`` ou ``None``."""
+    if not chave_cache:
+        return None
+    return cache.obter(chave_cache)
+
+
+def gravar(chave_cache: Optional[str], valor: Any) -> None:
+    if chave_cache:
+        cache.gravar(chave_cache, valor)
+
+
+def chave_job(job_id: str) -> Optional[str]:
+    """Chave do resultado completo de um job de prévia (``nesting_jobs``)."""
+    if NESTING_CACHE_MAX_MB <= 0:
+        return None
+    return chave(_VERSAO, "job", job_id)
@@ -0,0 +1,178 @@
+"""Cache local das pastas extraídas dos zips do bucket.
+
+Lotes, nestings e ocorrências que precisam ser extraídos (ajustes do lote,
+exclusões) ficam em ``PASTAS_CACHE_DIR/<entrada>``, uma entrada por chave de
+objeto. Cada entrada guarda o selo ``.selo.json`` com o ETag e o tamanho do
+zip extraído; a cada acesso o selo é conferido com ``head_object`` e a pasta
+é extraída de novo se o objeto mudou no bucket.
+
+A extração é atômica: o zip é extraído em uma pasta temporária, o selo é
+gravado por último e só então a pasta é renomeada para o lugar da entrada.
+Uma extração interrompida nunca é vista como válida. Requisições simultâneas
+pelo mesmo objeto compartilham um único download.
+
+O total é limitado a ``PASTAS_CACHE_MAX_MB``: após cada extração são
+removidas as entradas acessadas há mais tempo. Entradas usadas nos últimos
+``PASTAS_CACHE_RETENCAO`` segundos não são removidas, para não apagar uma
+pasta que outra requisição ainda está lendo.
+"""
+
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Optional
+
+from storage import PREFIX as OBJECT_PREFIX, download_file, object_info
+
+PASTAS_CACHE_DIR = Path(
+    os.getenv(
+        "PASTAS_CACHE_DIR", str(Path(__file__).resolve().parent / "cache" / "pastas")
+    )
+)
+PASTAS_CACHE_MAX_MB = int(os.getenv("PASTAS_CACHE_MAX_MB", "2048"))
+PASTAS_CACHE_RETENCAO = float(os.getenv("PASTAS_CACHE_RETENCAO", "600"))
+
+_SELO = ".selo.json"
+
+
+def _tamanho_pasta(pasta: Path) -> int:
+    return sum(f.stat().st_size for f in pasta.rglob("*") if f.is_file())
+
+
+class CachePastas:
+    """Pastas extraídas de objetos do bucket, validadas pelo ETag."""
+
+    def __init__(self, diretorio: Path, limite_bytes: int, retencao: float = 600):
+        self.diretorio = Path(diretorio)
+        self.limite_bytes = limite_bytes
+        self.retencao = retencao
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    def _entrada(self, chave_objeto: str) -> Path:
+        if chave_objeto.startswith(OBJECT_PREFIX):
+            chave_objeto = chave_objeto[len(OBJECT_PREFIX) :]
+        nome = Path(chave_objeto.strip("/")).with_suffix("").as_posix()
+        return self.diretorio / re.sub(r"[^\w.-]+", "__", nome)
+
+    def _lock(self, nome: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(nome, threading.Lock())
+
+    @staticmethod
+    def _selo(entrada: Path) -> Optional[Dict]:
+        try:
+            return json.loads((entrada / _SELO).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def obter(self, chave_objeto: str) -> Path:
+        """Pasta com o conteúdo atual de ``chave_objeto``, extraindo se preciso.
+
+        Raises:
+            FileNotFoundError: o objeto não existe ou o bucket está indisponível.
+        """
+        info = object_info(chave_objeto)
+        if not info:
+            logging.error("Objeto %s não encontrado no bucket", chave_objeto)
+            raise FileNotFoundError(f"Objeto {chave_objeto} nao encontrado")
+        entrada = self._entrada(chave_objeto)
+        with self._lock(entrada.name):
+            selo = self._selo(entrada)
+            if selo and (selo.get("etag"), selo.get("tamanho")) == (
+                info["etag"],
+                info["tamanho"],
+            ):
+                os.utime(entrada / _SELO)
+                return entrada
+            self._extrair(chave_objeto, entrada, info)
+        self._limitar(entrada)
+        return entrada
+
+    def _extrair(self, chave_objeto: str, entrada: Path, info: Dict) -> None:
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(prefix=f".{entrada.name}.", dir=self.diretorio))
+        arquivo = tmp.with_name(f"{tmp.name}.zip")
+        try:
+            download_file(chave_objeto, str(arquivo))
+            shutil.unpack_archive(str(arquivo), str(tmp), "zip")
+            selo = {
+                "chave": chave_objeto,
+                "etag": info["etag"],
+                "tamanho": info["tamanho"],
+                "bytes": _tamanho_pasta(tmp),
+            }
+            (tmp / _SELO).write_text(json.dumps(selo), encoding="utf-8")
+            # Versão anterior ou extração incompleta sai do lugar antes da troca
+            if entrada.exists():
+                self._remover(entrada)
+            try:
+                os.rename(tmp, entrada)
+            except OSError:
+                # Outro processo publicou a entrada entre a remoção e a troca
+                if self._selo(entrada) is None:
+                    raise
+                shutil.rmtree(tmp, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        finally:
+            arquivo.unlink(missing_ok=True)
+        logging.info("Objeto %s extraído em %s", chave_objeto, entrada)
+
+    def _remover(self, entrada: Path) -> None:
+        descartada = entrada.with_name(f".{entrada.name}.{uuid.uuid4().hex}.old")
+        try:
+            os.rename(entrada, descartada)
+        except OSError:
+            return
+        shutil.rmtree(descartada, ignore_errors=True)
+
+    def _limitar(self, atual: Path) -> None:
+        agora = time.time()
+        entradas = []
+        total = 0
+        for pasta in self.diretorio.iterdir():
+            try:
+                if pasta.name.startswith("."):
+                    # Extrações interrompidas (inclusive de outros processos)
+                    if agora - pasta.stat().st_mtime > self.retencao:
+                        if pasta.is_dir():
+                            shutil.rmtree(pasta, ignore_errors=True)
+                        else:
+                            pasta.unlink(missing_ok=True)
+                    continue
+                selo = self._selo(pasta)
+                if selo is None:
+                    continue
+                acesso = (pasta / _SELO).stat().st_mtime
+            except OSError:
+                continue
+            total += selo.get("bytes", 0)
+            entradas.append((acesso, selo.get("bytes", 0), pasta))
+        for acesso, tamanho, pasta in sorted(entradas):
+            if total <= self.limite_bytes:
+                break
+            if pasta == atual or agora - acesso < self.retencao:
+                continue
+            self._remover(pasta)
+            total -= tamanho
+
+    def descartar(self, chave_objeto: str) -> bool:
+        """Remove a pasta de ``chave_objeto``; retorna se ela existia."""
+        entrada = self._entrada(chave_objeto)
+        with self._lock(entrada.name):
+            if not entrada.exists():
+                return False
+            self._remover(entrada)
+        return True
+
+
+cache = CachePastas(PASTAS_CACHE_DIR, PASTAS_CACHE_MAX_MB * 1024 * 1024, PASTAS_CACHE_RETENCAO)
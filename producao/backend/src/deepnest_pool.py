@@ -0,0 +1,337 @@
+"""Pool persistente de processos Node.js executando o ``deepnest_runner.js``.
+
+Cada worker é iniciado uma única vez em modo ``--worker`` e recebe os jobs
+por stdio usando frames com prefixo de tamanho (4 bytes big-endian seguidos
+do JSON em UTF-8): o custo de inicialização do Node é pago uma vez por
+worker. Com ``DEEPNEST_SERVE=1`` o worker também mantém uma única instância
+headless do Electron/Deepnest (``--serve``), iniciada no primeiro job; sem
+ela cada job inicia o Electron (``electron . --headless``).
+
+Workers que travam (timeout) ou morrem durante um job são descartados e
+substituídos automaticamente.
+
+Com um orçamento de tempo (``orcamento``) o job roda em modo *anytime*: o
+worker envia frames parciais (``partial: true``) a cada solução melhor
+encontrada pelo algoritmo genético e encerra a busca ao fim do orçamento. Se
+a resposta final não chegar dentro de ``orcamento + DEEPNEST_FOLGA``, a
+melhor solução parcial é devolvida no lugar do erro de timeout.
+"""
+
+import atexit
+import itertools
+import json
+import logging
+import os
+import queue
+import struct
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+DEEPNEST_SCRIPT = Path(__file__).parent / "deepnest_runner.js"
+DEEPNEST_DIR = Path(__file__).resolve().parents[3] / "deepnest"
+
+# Quantidade de processos Node mantidos vivos e tempo máximo por job.
+DEEPNEST_WORKERS = int(os.getenv("DEEPNEST_WORKERS", str(min(4, os.cpu_count() or 1))))
+DEEPNEST_TIMEOUT = float(os.getenv("DEEPNEST_TIMEOUT", "300"))
+# Reciclar o worker após este número de jobs limita vazamentos de memória
+# do processo Node/Electron em execuções longas.
+DEEPNEST_MAX_JOBS = int(os.getenv("DEEPNEST_MAX_JOBS", "200"))
+# Tolerância, além do orçamento do job, para a resposta final chegar.
+DEEPNEST_FOLGA = float(os.getenv("DEEPNEST_FOLGA", "5"))
+
+_HEADER = struct.Struct(">I")
+
+
+class DeepnestWorkerError(RuntimeError):
+    """Falha do worker Deepnest (processo encerrado ou resposta inválida)."""
+
+
+class _Worker:
+    """Processo Node único com leitura assíncrona das respostas."""
+
+    def __init__(self, script: Path, cwd: Path):
+        self.proc = subprocess.Popen(
+            ["node", str(script), "--worker"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=cwd,
+            env={**os.environ, "DEEPNEST_DIR": str(cwd)},
+        )
+        self.jobs = 0
+        self.falhou = False
+        self.respostas: "queue.Queue[Optional[Dict]]" = queue.Queue()
+        threading.Thread(target=self._ler_stdout, daemon=True).start()
+        threading.Thread(target=self._ler_stderr, daemon=True).start()
+
+    @property
+    def pid(self) -> int:
+        return self.proc.pid
+
+    def vivo(self) -> bool:
+        return self.proc.poll() is None
+
+    def _ler_exato(self, tamanho: int) -> Optional[bytes]:
+        partes: List[bytes] = []
+        restante = tamanho
+        while restante:
+            chunk = self.proc.stdout.read(restante)
+            if not chunk:
+                return None
+            partes.append(chunk)
+            restante -= len(chunk)
+        return b"".join(partes)
+
+    def _ler_stdout(self) -> None:
+        while True:
+            header = self._ler_exato(_HEADER.size)
+            if header is None:
+                break
+            corpo = self._ler_exato(_HEADER.unpack(header)[0])
+            if corpo is None:
+                break
+            try:
+                self.respostas.put(json.loads(corpo.decode("utf-8")))
+            except ValueError:
+                logging.error("Deepnest worker %s enviou frame inválido", self.pid)
+                break
+        # ``None`` sinaliza EOF para quem estiver aguardando uma resposta.
+        self.respostas.put(None)
+
+    def _ler_stderr(self) -> None:
+        for linha in iter(self.proc.stderr.readline, b""):
+            logging.warning(
+                "deepnest[%s]: %s", self.pid, linha.decode("utf-8", "replace").rstrip()
+            )
+
+    def enviar(self, mensagem: Dict) -> None:
+        corpo = json.dumps(mensagem).encode("utf-8")
+        self.proc.stdin.write(_HEADER.pack(len(corpo)) + corpo)
+        self.proc.stdin.flush()
+
+    def encerrar(self) -> None:
+        try:
+            self.proc.stdin.close()
+        except Exception:
+            pass
+        try:
+            self.proc.wait(timeout=2)
+        except Exception:
+            self.proc.kill()
+            try:
+                self.proc.wait(timeout=2)
+            except Exception:
+                pass
+
+
+class DeepnestPool:
+    """Pool de workers Deepnest com suporte a jobs concorrentes.
+
+    Os workers são criados sob demanda até ``tamanho``; cada job ocupa um
+    worker de forma exclusiva enquanto é processado.
+    """
+
+    def __init__(
+        self,
+        tamanho: int = DEEPNEST_WORKERS,
+        script: Path = DEEPNEST_SCRIPT,
+        cwd: Path = DEEPNEST_DIR,
+        timeout: float = DEEPNEST_TIMEOUT,
+        max_jobs: int = DEEPNEST_MAX_JOBS,
+        folga: float = DEEPNEST_FOLGA,
+    ):
+        self.tamanho = max(1, tamanho)
+        self.script = script
+        self.cwd = cwd
+        self.timeout = timeout
+        self.max_jobs = max_jobs
+        self.folga = folga
+        self._livres: "queue.LifoQueue[_Worker]" = queue.LifoQueue()
+        self._criados = 0
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._fechado = False
+
+    def _adquirir(self) -> _Worker:
+        while True:
+            try:
+                worker = self._livres.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    if self._fechado:
+                        raise DeepnestWorkerError("Pool Deepnest encerrado")
+                    if self._criados < self.tamanho:
+                        self._criados += 1
+                        criar = True
+                    else:
+                        criar = False
+                if criar:
+                    try:
+                        return _Worker(self.script, self.cwd)
+                    except Exception:
+                        with self._lock:
+                            self._criados -= 1
+                        raise
+                # Espera com timeout curto: se um worker ocupado for
+                # descartado, a vaga liberada permite criar outro.
+                try:
+                    worker = self._livres.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+            if worker.vivo():
+                return worker
+            self._descartar(worker)
+
+    def _devolver(self, worker: _Worker) -> None:
+        if (
+            self._fechado
+            or worker.falhou
+            or worker.jobs >= self.max_jobs
+            or not worker.vivo()
+        ):
+            self._descartar(worker)
+        else:
+            self._livres.put(worker)
+
+    def _descartar(self, worker: _Worker) -> None:
+        worker.encerrar()
+        with self._lock:
+            self._criados -= 1
+
+    def executar(
+        self,
+        payload: Dict,
+        timeout: Optional[float] = None,
+        orcamento: Optional[float] = None,
+        ao_melhorar: Optional[Callable[[Dict, float], None]] = None,
+    ) -> Tuple[Dict, Dict]:
+        """Executa ``payload`` em um worker e retorna ``(resultado, tempos)``.
+
+        ``tempos`` contém, em segundos, a espera por um worker livre
+        (``fila``), o tempo total do job (``total``) e os tempos medidos no
+        próprio worker (``parse`` e ``nest``).
+
+        Com ``orcamento`` (segundos) a busca é limitada a esse tempo e
+        ``ao_melhorar(resultado, aproveitamento)`` é chamado a cada solução
+        parcial melhor. Se o worker não responder a tempo, a melhor parcial é
+        retornada com ``tempos["parcial"] = True``; sem nenhuma parcial a
+        resposta final é aguardada até ``timeout``. Uma exceção levantada por
+        ``ao_melhorar`` (ex.: cancelamento do job) interrompe o worker.
+        """
+        inicio = time.perf_counter()
+        worker = self._adquirir()
+        adquirido = time.perf_counter()
+        job_id = next(self._ids)
+        limite = self.timeout if timeout is None else timeout
+        prazo_final = time.monotonic() + limite
+        if orcamento:
+            payload = {**payload, "timeBudgetMs": int(orcamento * 1000)}
+            limite_parcial = min(limite, orcamento + self.folga)
+        else:
+            limite_parcial = limite
+        prazo = time.monotonic() + limite_parcial
+        melhor: Optional[Dict] = None
+        try:
+            worker.jobs += 1
+            worker.enviar({"id": job_id, "payload": payload})
+            while True:
+                try:
+                    resposta = worker.respostas.get(
+                        timeout=max(0.0, prazo - time.monotonic())
+                    )
+                except queue.Empty:
+                    if melhor is None and prazo < prazo_final:
+                        # Sem solução parcial: aguarda a resposta final até
+                        # o tempo limite do job
+                        prazo = prazo_final
+                        continue
+                    worker.falhou = True
+                    worker.proc.kill()
+                    if melhor is None:
+                        logging.error(
+                            "Deepnest job %s excedeu %.0fs; reciclando worker %s",
+                            job_id,
+                            limite,
+                            worker.pid,
+                        )
+                        raise TimeoutError(
+                            f"Deepnest excedeu o tempo limite de {limite:.0f}s"
+                        )
+                    logging.warning(
+                        "Deepnest job %s excedeu %.0fs; usando a melhor solução parcial",
+                        job_id,
+                        limite_parcial,
+                    )
+                    resposta = melhor
+                    break
+                if resposta is None:
+                    worker.falhou = True
+                    raise DeepnestWorkerError(
+                        f"Deepnest worker {worker.pid} encerrou durante o job {job_id}"
+                    )
+                if not resposta.get("partial"):
+                    break
+                if resposta.get("id") == job_id:
+                    melhor = resposta
+                    if ao_melhorar:
+                        ao_melhorar(
+                            resposta.get("result") or {},
+                            float(resposta.get("utilisation") or 0),
+                        )
+        except (TimeoutError, DeepnestWorkerError):
+            raise
+        except OSError as e:
+            worker.falhou = True
+            worker.proc.kill()
+            raise DeepnestWorkerError(f"Falha de comunicação com o Deepnest: {e}")
+        except BaseException:
+            # O worker continua ocupado com o job abandonado
+            worker.falhou = True
+            worker.proc.kill()
+            raise
+        finally:
+            self._devolver(worker)
+
+        if resposta.get("id") != job_id:
+            raise DeepnestWorkerError("Resposta do Deepnest fora de ordem")
+        if not resposta.get("ok"):
+            raise RuntimeError(f"Deepnest runner failed: {resposta.get('error', '')}")
+        fim = time.perf_counter()
+        tempos_worker = resposta.get("timings") or {}
+        tempos = {
+            "fila": adquirido - inicio,
+            "total": fim - inicio,
+            "parse": float(tempos_worker.get("parseMs", 0)) / 1000,
+            "nest": float(tempos_worker.get("nestMs", 0)) / 1000,
+            "pid": worker.pid,
+            "parcial": resposta is melhor,
+        }
+        return resposta.get("result") or {}, tempos
+
+    def encerrar(self) -> None:
+        """Finaliza todos os workers ociosos e impede novos jobs."""
+        with self._lock:
+            self._fechado = True
+        while True:
+            try:
+                worker = self._livres.get_nowait()
+            except queue.Empty:
+                break
+            self._descartar(worker)
+
+
+_pool: Optional[DeepnestPool] = None
+_pool_lock = threading.Lock()
+
+
+def obter_pool() -> DeepnestPool:
+    """Retorna o pool global, criando-o na primeira chamada."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DeepnestPool()
+            atexit.register(_pool.encerrar)
+        return _pool
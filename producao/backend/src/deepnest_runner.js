@@ -1,16 +1,316 @@
 #!/usr/bin/env node
 const fs = require('fs');
+const path = require('path');
+const { spawn } = require('child_process');
 
 /**
  * Simple wrapper to integrate Deepnest engine.
- * Reads JSON from stdin:
- *   { pieces: [ { polygon: [ [x,y], ... ] }, ... ], width, height, spacing, rotations }
- * Writes to stdout JSON:
- *   { placements: [ { polygon: [ [x,y],... ], x, y, rotationAngle }, ... ] }
  *
- * TODO: replace stub logic with actual deepnest API calls
+ * One-shot mode (default) reads JSON from stdin:
+ *   { pieces: [ { polygon: [ [x,y], ... ] }, ... ], width, height, spacing, rotations,
+ *     timeBudgetMs? }
+ * and writes to stdout JSON:
+ *   { placements: [ { polygon: [ [x,y],... ], x, y, rotationAngle }, ... ], utilisation }
+ *
+ * Worker mode (`--worker`) keeps the process alive and exchanges framed
+ * messages over stdio. Each frame is a 4-byte big-endian length followed by
+ * a UTF-8 JSON document:
+ *   request:  { id, payload }
+ *   response: { id, ok: true, result: { placements, utilisation }, timings: { parseMs, nestMs } }
+ *             { id, ok: false, error }
+ *
+ * Anytime mode: with `timeBudgetMs` the engine keeps improving the nest with
+ * its genetic algorithm and reports every better solution. Each one is
+ * forwarded as a partial frame ({ id, ok: true, partial: true, result,
+ * utilisation }) and the search is stopped when the budget runs out; the
+ * final frame carries the best solution found. If no solution has arrived
+ * by then the engine is left running until it prints its result.
+ *
+ * Engine: each job spawns `electron . --headless`, which reads the input
+ * from stdin and prints its solution as JSON (one document, or one line per
+ * better solution). With DEEPNEST_SERVE=1 a worker instead starts a single
+ * headless Electron/Deepnest instance on the first job
+ * (`electron . --headless --serve`) and reuses it for every job, so Electron
+ * and Deepnest load once per worker. It talks newline-delimited JSON over
+ * stdio:
+ *   to engine:   { id, input }            start a job
+ *                { id, stop: true }       end the search (time budget)
+ *   from engine: { id, placements, utilisation }          better solution
+ *                { id, done: true, placements?, utilisation? }  job finished
+ *                { id, error }                             job failed
+ * and must exit when its stdin is closed. If it dies it is started again on
+ * the next job.
+ *
+ * The headless entrypoint lives in the deepnest/ checkout, outside this
+ * repository.
  */
-(async function main() {
+
+const deepnestDir = process.env.DEEPNEST_DIR || path.resolve(__dirname, '..', '..', 'deepnest');
+const electronBin = process.env.DEEPNEST_ELECTRON
+  || path.join(deepnestDir, 'node_modules', '.bin', 'electron');
+// `--serve` is opt-in until the deepnest entrypoint implements it
+const serveMode = process.env.DEEPNEST_SERVE === '1';
+
+function polygonArea(points) {
+  let area = 0;
+  for (let i = 0, j = points.length - 1; i < points.length; j = i++) {
+    area += (points[j][0] + points[i][0]) * (points[j][1] - points[i][1]);
+  }
+  return Math.abs(area) / 2;
+}
+
+function utilisation(input, placements) {
+  const sheet = (Number(input.width) || 0) * (Number(input.height) || 0);
+  if (!sheet) return 0;
+  const used = placements.reduce((sum, p) => sum + polygonArea(p.polygon || []), 0);
+  return used / sheet;
+}
+
+// Keeps the best solution reported by the engine for one job
+function bestTracker(input, onImprove) {
+  const tracker = {
+    best: null,
+    accept(result) {
+      const placements = result.placements || [];
+      const value = typeof result.utilisation === 'number'
+        ? result.utilisation : utilisation(input, placements);
+      if (!tracker.best || value > tracker.best.utilisation) {
+        tracker.best = { placements, utilisation: value };
+        if (onImprove) onImprove(tracker.best);
+      }
+    },
+  };
+  return tracker;
+}
+
+class Engine {
+  constructor() {
+    this.proc = spawn(electronBin, ['.', '--headless', '--serve'], { cwd: deepnestDir });
+    this.jobs = new Map();
+    this.nextId = 1;
+    this.dead = false;
+    let pending = '';
+    this.proc.stdout.setEncoding('utf8');
+    this.proc.stdout.on('data', chunk => {
+      pending += chunk;
+      let nl;
+      while ((nl = pending.indexOf('\n')) >= 0) {
+        const line = pending.slice(0, nl).trim();
+        pending = pending.slice(nl + 1);
+        if (line) this.dispatch(line);
+      }
+    });
+    // The pool logs the worker's stderr
+    this.proc.stderr.on('data', chunk => process.stderr.write(chunk));
+    const fail = err => {
+      this.dead = true;
+      for (const job of this.jobs.values()) job.fail(err);
+      this.jobs.clear();
+    };
+    this.proc.on('error', fail);
+    this.proc.on('close', code => fail(new Error(`Deepnest engine exited with status ${code}`)));
+    this.proc.stdin.on('error', () => {});
+  }
+
+  dispatch(line) {
+    let message;
+    try {
+      message = JSON.parse(line);
+    } catch (e) {
+      process.stderr.write(`Invalid line from Deepnest engine: ${line}\n`);
+      return;
+    }
+    const job = this.jobs.get(message.id);
+    if (job) job.handle(message);
+  }
+
+  send(message) {
+    this.proc.stdin.write(`${JSON.stringify(message)}\n`);
+  }
+
+  run(input, onImprove) {
+    const id = this.nextId++;
+    const budgetMs = Number(input.timeBudgetMs) || 0;
+    const tracker = bestTracker(input, onImprove);
+    return new Promise((resolve, reject) => {
+      let timer = null;
+      const finish = () => {
+        clearTimeout(timer);
+        this.jobs.delete(id);
+      };
+      this.jobs.set(id, {
+        handle: message => {
+          if (message.error) {
+            finish();
+            reject(new Error(`Deepnest engine: ${message.error}`));
+            return;
+          }
+          if (message.placements) tracker.accept(message);
+          if (message.done) {
+            finish();
+            if (tracker.best) resolve(tracker.best);
+            else reject(new Error('Deepnest engine returned no solution'));
+          }
+        },
+        fail: err => {
+          finish();
+          // Budget already spent: the best partial solution is the answer
+          if (tracker.best && timer === 'stopped') resolve(tracker.best);
+          else reject(err);
+        },
+      });
+      if (budgetMs > 0) {
+        timer = setTimeout(() => {
+          timer = 'stopped';
+          this.send({ id, stop: true });
+        }, budgetMs);
+      }
+      this.send({ id, input });
+    });
+  }
+
+  close() {
+    this.proc.stdin.end();
+  }
+}
+
+let engine = null;
+
+function runDeepnest(input, onImprove) {
+  if (!serveMode) return runDeepnestOnce(input, onImprove);
+  if (!engine || engine.dead) engine = new Engine();
+  return engine.run(input, onImprove);
+}
+
+function runDeepnestOnce(input, onImprove) {
+  // A fresh headless Electron instance for this job only
+  const budgetMs = Number(input.timeBudgetMs) || 0;
+  const tracker = bestTracker(input, onImprove);
+  return new Promise((resolve, reject) => {
+    const proc = spawn(electronBin, ['.', '--headless'], { cwd: deepnestDir });
+    let stdout = '';
+    let pending = '';
+    let stderr = '';
+    let expired = false;
+    let stopped = false;
+
+    const stop = () => {
+      stopped = true;
+      proc.kill('SIGTERM');
+    };
+
+    const accept = text => {
+      try {
+        tracker.accept(JSON.parse(text));
+      } catch (e) {
+        return false;
+      }
+      // First solution after the budget ran out: no reason to keep searching
+      if (expired && !stopped && tracker.best) stop();
+      return true;
+    };
+
+    // At the deadline the search is stopped only if there is a solution to
+    // return; engines that print a single document at the end are awaited.
+    const timer = budgetMs > 0 ? setTimeout(() => {
+      expired = true;
+      if (tracker.best) stop();
+    }, budgetMs) : null;
+
+    proc.stdout.setEncoding('utf8');
+    proc.stdout.on('data', chunk => {
+      stdout += chunk;
+      pending += chunk;
+      let nl;
+      while ((nl = pending.indexOf('\n')) >= 0) {
+        const line = pending.slice(0, nl).trim();
+        pending = pending.slice(nl + 1);
+        if (line) accept(line);
+      }
+    });
+    proc.stderr.setEncoding('utf8');
+    proc.stderr.on('data', chunk => { stderr += chunk; });
+    proc.on('error', err => {
+      clearTimeout(timer);
+      reject(err);
+    });
+    proc.on('close', code => {
+      clearTimeout(timer);
+      // Last line without newline, or a single (possibly pretty-printed) document
+      if (pending.trim() && !accept(pending.trim()) && !tracker.best) accept(stdout);
+      if (tracker.best && (code === 0 || stopped)) {
+        resolve(tracker.best);
+      } else if (code !== 0 && !stopped) {
+        reject(new Error(`Deepnest engine exited with status ${code}: ${stderr}`));
+      } else {
+        reject(new Error('Invalid JSON from Deepnest engine'));
+      }
+    });
+    proc.stdin.end(JSON.stringify(input));
+  });
+}
+
+function writeFrame(message) {
+  const body = Buffer.from(JSON.stringify(message), 'utf8');
+  const header = Buffer.alloc(4);
+  header.writeUInt32BE(body.length, 0);
+  process.stdout.write(Buffer.concat([header, body]));
+}
+
+async function handleFrame(raw) {
+  const t0 = process.hrtime.bigint();
+  let request;
+  try {
+    request = JSON.parse(raw.toString('utf8'));
+  } catch (e) {
+    writeFrame({ id: null, ok: false, error: `Invalid request frame: ${e.message}` });
+    return;
+  }
+  const t1 = process.hrtime.bigint();
+  const payload = request.payload || {};
+  const onImprove = payload.timeBudgetMs
+    ? best => writeFrame({
+      id: request.id, ok: true, partial: true, result: best, utilisation: best.utilisation,
+    })
+    : null;
+  try {
+    const result = await runDeepnest(payload, onImprove);
+    const t2 = process.hrtime.bigint();
+    writeFrame({
+      id: request.id,
+      ok: true,
+      result,
+      timings: {
+        parseMs: Number(t1 - t0) / 1e6,
+        nestMs: Number(t2 - t1) / 1e6,
+      },
+    });
+  } catch (err) {
+    writeFrame({ id: request.id, ok: false, error: String(err && err.stack || err) });
+  }
+}
+
+function workerLoop() {
+  let buffer = Buffer.alloc(0);
+  // Jobs are processed one at a time, in arrival order
+  let queue = Promise.resolve();
+  process.stdin.on('data', chunk => {
+    buffer = Buffer.concat([buffer, chunk]);
+    while (buffer.length >= 4) {
+      const size = buffer.readUInt32BE(0);
+      if (buffer.length < 4 + size) break;
+      const frame = buffer.subarray(4, 4 + size);
+      buffer = buffer.subarray(4 + size);
+      queue = queue.then(() => handleFrame(frame));
+    }
+  });
+  process.stdin.on('end', () => queue.then(() => {
+    if (engine) engine.close();
+    process.exit(0);
+  }));
+}
+
+async function oneShot() {
   try {
     const input = JSON.parse(await new Promise((res, rej) => {
       let data = '';
@@ -19,31 +319,15 @@ const fs = require('fs');
       process.stdin.on('end', () => res(data));
       process.stdin.on('error', err => rej(err));
     }));
-    const { pieces = [], width, height, spacing, rotations } = input;
-    // Invoke Deepnest engine via its headless CLI (requires prior `npm install && npm run build` in deepnest/)
-    const { spawnSync } = require('child_process');
-    const deepnestDir = require('path').resolve(__dirname, '..', '..', 'deepnest');
-    // Electron-based headless entrypoint must be implemented in deepnest to accept JSON via stdin and output placements
-    // Invoke local Electron binary in headless mode
-    const electronBin = require('path').join(deepnestDir, 'node_modules', '.bin', 'electron');
-    const proc = spawnSync(
-      electronBin, ['.', '--headless'],
-      { cwd: deepnestDir, input: JSON.stringify(input), encoding: 'utf8' }
-    );
-    if (proc.error) throw proc.error;
-    if (proc.status !== 0) {
-      console.error(proc.stderr);
-      process.exit(proc.status);
-    }
-    let result;
-    try {
-      result = JSON.parse(proc.stdout);
-    } catch (e) {
-      throw new Error(`Invalid JSON from Deepnest engine: ${e.message}`);
-    }
-    process.stdout.write(JSON.stringify({ placements: result.placements || [] }));
+    process.stdout.write(JSON.stringify(await runDeepnestOnce(input)));
   } catch (err) {
     console.error(err && err.stack || err);
     process.exit(1);
   }
-})();
+}
+
+if (process.argv.includes('--worker')) {
+  workerLoop();
+} else {
+  oneShot();
+}
@@ -0,0 +1,306 @@
+"""Cache de geometria dos arquivos DXF das peças.
+
+Cada DXF é lido com ``ezdxf`` uma única vez por versão de conteúdo: a chave
+é o hash do arquivo, então renomear/copiar o lote reaproveita o cache e
+qualquer alteração no arquivo gera uma nova entrada. Os DXF lidos direto do
+zip do lote (``lote_zip``) usam como hash o nome, o CRC-32 e o tamanho do
+membro, já presentes no diretório central do zip. O registro guardado
+contém tudo o que as etapas do nesting consultam:
+
+* ``dims``: largura/altura do contorno externo (``None`` se não houver);
+* ``poligono``: contorno já descontado dos furos (``None`` se não houver);
+* ``furos``: polígonos das camadas ``furo*``/``usinar*``;
+* ``layers``: camadas definidas na tabela e usadas nas entidades;
+* ``entidades``: ``[tipo, layer, dados]`` de LINE/LWPOLYLINE/POLYLINE
+  (lista de pontos), CIRCLE (``[cx, cy, r]``) e ARC
+  (``[cx, cy, r, inicio, fim]``), na ordem do modelspace.
+
+Os registros ficam em ``DXF_CACHE_DIR`` (msgpack + WKB), limitados a
+``DXF_CACHE_MAX_MB``, e são compartilhados entre a API e os processos do
+pool de nesting.
+"""
+
+import io
+import math
+import os
+import zipfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import ezdxf
+from ezdxf.document import Drawing
+from ezdxf.filemanagement import dxf_stream_info
+from ezdxf.lldxf.tagger import binary_tags_loader
+from ezdxf.math import ConstructionArc
+from shapely.geometry import MultiPolygon, Point, Polygon
+from shapely.ops import unary_union
+
+from cache_disco import CacheDisco, chave, hash_arquivo
+
+# Incrementar quando o formato do registro mudar.
+_VERSAO = 1
+
+DXF_CACHE_DIR = Path(
+    os.getenv("DXF_CACHE_DIR", str(Path(__file__).resolve().parent / "cache" / "dxf"))
+)
+DXF_CACHE_MAX_MB = int(os.getenv("DXF_CACHE_MAX_MB", "256"))
+DXF_CACHE_MEMORIA = int(os.getenv("DXF_CACHE_MEMORIA", "1024"))
+
+cache = CacheDisco(DXF_CACHE_DIR, DXF_CACHE_MAX_MB * 1024 * 1024, DXF_CACHE_MEMORIA)
+
+_CAMADAS_CONTORNO = ("borda_externa", "contorno")
+
+
+def _entity_polygon(ent) -> Optional[Polygon]:
+    """Return a shapely polygon approximation of a DXF entity."""
+    try:
+        if ent.dxftype() in {"LWPOLYLINE", "POLYLINE"}:
+            if ent.dxftype() == "POLYLINE":
+                pts = [(float(v.dxf.location.x), float(v.dxf.location.y)) for v in ent.vertices]
+            else:
+                pts = [(float(p[0]), float(p[1])) for p in ent.get_points("xy")]
+            if len(pts) >= 3:
+                return Polygon(pts)
+        elif ent.dxftype() == "LINE":
+            start = ent.dxf.start
+            end = ent.dxf.end
+            return Polygon([(start.x, start.y), (end.x, end.y)])
+        elif ent.dxftype() == "CIRCLE":
+            cx = float(ent.dxf.center.x)
+            cy = float(ent.dxf.center.y)
+            r = float(ent.dxf.radius)
+            return Point(cx, cy).buffer(r, resolution=32)
+        elif ent.dxftype() == "ARC":
+            c = ent.dxf.center
+            r = float(ent.dxf.radius)
+            a0 = math.radians(float(ent.dxf.start_angle))
+            a1 = math.radians(float(ent.dxf.end_angle))
+            if a1 < a0:
+                a1 += 2 * math.pi
+            steps = max(8, int(r))
+            pts = [
+                (
+                    c.x + r * math.cos(a0 + (a1 - a0) * i / steps),
+                    c.y + r * math.sin(a0 + (a1 - a0) * i / steps),
+                )
+                for i in range(steps + 1)
+            ]
+            return Polygon(pts)
+    except Exception:
+        return None
+    return None
+
+
+def _entidade_registro(ent) -> Optional[List]:
+    tipo = ent.dxftype()
+    if tipo == "CIRCLE":
+        c = ent.dxf.center
+        return [float(c.x), float(c.y), float(ent.dxf.radius)]
+    if tipo == "ARC":
+        c = ent.dxf.center
+        return [
+            float(c.x),
+            float(c.y),
+            float(ent.dxf.radius),
+            float(ent.dxf.start_angle),
+            float(ent.dxf.end_angle),
+        ]
+    if tipo == "LINE":
+        s, e = ent.dxf.start, ent.dxf.end
+        return [[float(s.x), float(s.y)], [float(e.x), float(e.y)]]
+    if tipo == "POLYLINE":
+        return [
+            [float(v.dxf.location.x), float(v.dxf.location.y)] for v in ent.vertices
+        ]
+    if tipo == "LWPOLYLINE":
+        return [[float(p[0]), float(p[1])] for p in ent.get_points("xy")]
+    return None
+
+
+def _extremos(ent, xs: List[float], ys: List[float]) -> None:
+    tipo = ent.dxftype()
+    if tipo == "LINE":
+        xs.extend([float(ent.dxf.start.x), float(ent.dxf.end.x)])
+        ys.extend([float(ent.dxf.start.y), float(ent.dxf.end.y)])
+    elif tipo == "POLYLINE":
+        for v in ent.vertices:
+            xs.append(float(v.dxf.location.x))
+            ys.append(float(v.dxf.location.y))
+    elif tipo == "LWPOLYLINE":
+        for pt in ent.get_points("xy"):
+            xs.append(float(pt[0]))
+            ys.append(float(pt[1]))
+    elif tipo == "CIRCLE":
+        cx = float(ent.dxf.center.x)
+        cy = float(ent.dxf.center.y)
+        r = float(ent.dxf.radius)
+        xs.extend([cx - r, cx + r])
+        ys.extend([cy - r, cy + r])
+    elif tipo == "ARC":
+        arc = ConstructionArc(
+            ent.dxf.center,
+            ent.dxf.radius,
+            ent.dxf.start_angle,
+            ent.dxf.end_angle,
+        )
+        bbox = arc.bounding_box
+        xs.extend([float(bbox.extmin.x), float(bbox.extmax.x)])
+        ys.extend([float(bbox.extmin.y), float(bbox.extmax.y)])
+
+
+def _caminho(caminho) -> Union[Path, zipfile.Path]:
+    return caminho if isinstance(caminho, zipfile.Path) else Path(caminho)
+
+
+def _ler_documento(caminho: Union[Path, zipfile.Path]) -> Drawing:
+    """Lê o DXF do disco ou de um membro do zip do lote, sem extraí-lo."""
+    if not isinstance(caminho, zipfile.Path):
+        return ezdxf.readfile(caminho)
+    dados = caminho.read_bytes()
+    if dados.startswith(b"AutoCAD Binary DXF"):
+        return Drawing.load(binary_tags_loader(dados))
+    # Mesma detecção de codificação de ``ezdxf.readfile``
+    info = dxf_stream_info(io.StringIO(dados.decode("utf-8", errors="ignore")))
+    return ezdxf.read(io.StringIO(dados.decode(info.encoding, errors="surrogateescape")))
+
+
+def _ler_geometria(caminho: Path) -> Dict[str, Any]:
+    """Percorre o modelspace uma única vez extraindo todos os dados."""
+    registro: Dict[str, Any] = {
+        "dims": None,
+        "poligono": None,
+        "furos": [],
+        "layers": [],
+        "entidades": [],
+    }
+    try:
+        doc = _ler_documento(caminho)
+    except Exception:
+        return registro
+
+    layers: List[str] = [layer.dxf.name for layer in doc.layers]
+    vistos = set(layers)
+    xs: List[float] = []
+    ys: List[float] = []
+    contornos: List[Polygon] = []
+    furos: List[Polygon] = []
+    for ent in doc.modelspace():
+        layer = str(ent.dxf.layer)
+        if layer not in vistos:
+            vistos.add(layer)
+            layers.append(layer)
+        try:
+            dados = _entidade_registro(ent)
+        except Exception:
+            dados = None
+        if dados is not None:
+            registro["entidades"].append([ent.dxftype(), layer, dados])
+
+        layer_lower = layer.lower()
+        if layer_lower in _CAMADAS_CONTORNO:
+            try:
+                _extremos(ent, xs, ys)
+            except Exception:
+                pass
+        poly_ent = _entity_polygon(ent)
+        if not poly_ent:
+            continue
+        if layer_lower in _CAMADAS_CONTORNO:
+            contornos.append(poly_ent)
+        elif layer_lower.startswith("furo") or layer_lower.startswith("usinar"):
+            furos.append(poly_ent)
+
+    registro["layers"] = layers
+    if xs and ys:
+        registro["dims"] = [max(xs) - min(xs), max(ys) - min(ys)]
+    registro["furos"] = furos
+    if contornos:
+        try:
+            p_union = unary_union(contornos)
+            for f in furos:
+                p_union = p_union.difference(f)
+            if isinstance(p_union, MultiPolygon):
+                p_union = max(p_union.geoms, key=lambda g: g.area)
+            registro["poligono"] = p_union
+        except Exception:
+            registro["poligono"] = None
+    return registro
+
+
+def geometria_dxf(caminho: Path) -> Dict[str, Any]:
+    """Retorna o registro de geometria de ``caminho`` (lido no máximo uma vez).
+
+    ``caminho`` pode ser um membro do zip do lote (``zipfile.Path``). O
+    registro é compartilhado: quem o consome não deve alterá-lo.
+    """
+    caminho = _caminho(caminho)
+    try:
+        digest = hash_arquivo(caminho)
+    except OSError:
+        return _ler_geometria(caminho)
+    return cache.obter_ou_calcular(
+        chave("dxf", _VERSAO, digest), lambda: _ler_geometria(caminho)
+    )
+
+
+def memorizar_dxf(
+    caminho: Path, nome: str, calcular: Callable[[], Any], *parametros: Any
+) -> Any:
+    """Guarda no mesmo cache um resultado derivado do conteúdo de ``caminho``.
+
+    ``nome`` e ``parametros`` distinguem resultados diferentes calculados a
+    partir do mesmo arquivo.
+    """
+    try:
+        digest = hash_arquivo(_caminho(caminho))
+    except OSError:
+        return calcular()
+    return cache.obter_ou_calcular(chave(nome, _VERSAO, digest, *parametros), calcular)
+
+
+# Entidades que geram operações de usinagem (furos, fresas)
+_TIPOS_OPERACAO = {"CIRCLE", "LINE", "LWPOLYLINE", "POLYLINE"}
+
+
+@dataclass
+class PecaGeometria:
+    """Tudo o que o nesting usa do DXF de uma peça, obtido em uma leitura.
+
+    ``entidades`` mantém a ordem do modelspace, que define a ordem das
+    operações no G-code; ``operacoes_por_layer`` agrupa as mesmas entidades
+    por camada.
+    """
+
+    arquivo: str
+    dims: Optional[Tuple[float, float]] = None
+    contorno: Optional[Polygon] = None
+    furos: List[Polygon] = field(default_factory=list)
+    layers: List[str] = field(default_factory=list)
+    entidades: List[Tuple[str, str, list]] = field(default_factory=list)
+
+    @property
+    def operacoes(self) -> List[Tuple[str, str, list]]:
+        """Entidades de usinagem (círculos, linhas e polilinhas) em ordem."""
+        return [e for e in self.entidades if e[0] in _TIPOS_OPERACAO]
+
+    @property
+    def operacoes_por_layer(self) -> Dict[str, List[Tuple[str, list]]]:
+        grupos: Dict[str, List[Tuple[str, list]]] = {}
+        for tipo, layer, dados in self.operacoes:
+            grupos.setdefault(layer, []).append((tipo, dados))
+        return grupos
+
+
+def peca_geometria(caminho: Path) -> PecaGeometria:
+    """Monta a :class:`PecaGeometria` de ``caminho`` a partir do cache."""
+    registro = geometria_dxf(caminho)
+    dims = registro["dims"]
+    return PecaGeometria(
+        arquivo=str(caminho),
+        dims=(dims[0], dims[1]) if dims else None,
+        contorno=registro["poligono"],
+        furos=list(registro["furos"]),
+        layers=list(registro["layers"]),
+        entidades=[(e[0], e[1], e[2]) for e in registro["entidades"]],
+    )
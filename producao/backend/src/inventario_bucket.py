@@ -0,0 +1,108 @@
+"""Inventário das chaves existentes no bucket, por prefixo.
+
+As listagens de lotes, nestings e ocorrências conferem se cada registro do
+banco ainda tem o zip no bucket. Em vez de um ``head_object`` por linha, as
+chaves de cada prefixo (``lotes/``, ``nestings/``...) são obtidas com um
+``list_objects_v2`` paginado e mantidas por ``INVENTARIO_TTL`` segundos; a
+conferência das linhas é feita em memória.
+
+Uma chave ausente da listagem pode ter sido enviada depois dela: antes de um
+registro ser tratado como órfão a ausência é confirmada com ``head_object``
+(só para essas chaves). Com ``INVENTARIO_INTERVALO`` > 0 uma thread atualiza
+os prefixos em segundo plano, e as requisições encontram o inventário pronto.
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from storage import PREFIX as OBJECT_PREFIX, listar_chaves, object_exists
+
+INVENTARIO_TTL = float(os.getenv("INVENTARIO_TTL", "120"))
+INVENTARIO_INTERVALO = float(os.getenv("INVENTARIO_INTERVALO", "60"))
+
+
+def _normalizar(chave: str) -> str:
+    chave = chave.lstrip("/")
+    return chave[len(OBJECT_PREFIX) :] if chave.startswith(OBJECT_PREFIX) else chave
+
+
+class InventarioBucket:
+    """Chaves do bucket por prefixo, listadas de uma vez e guardadas por ``ttl``."""
+
+    def __init__(self, ttl: float = 120):
+        self.ttl = ttl
+        self._listas: Dict[str, Tuple[float, Set[str]]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._parar: Optional[threading.Event] = None
+
+    def _lock_prefixo(self, prefixo: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(prefixo, threading.Lock())
+
+    def atualizar(self, prefixo: str) -> Optional[Set[str]]:
+        """Lista ``prefixo`` no bucket agora; ``None`` se o bucket falhar."""
+        chaves = listar_chaves(prefixo)
+        if chaves is not None:
+            with self._lock:
+                self._listas[prefixo] = (time.monotonic(), chaves)
+        return chaves
+
+    def chaves(self, prefixo: str) -> Optional[Set[str]]:
+        """Chaves sob ``prefixo`` (sem o prefixo do bucket), da cache se recente.
+
+        Requisições simultâneas com a cache vencida compartilham uma listagem.
+        """
+        with self._lock_prefixo(prefixo):
+            with self._lock:
+                lista = self._listas.get(prefixo)
+            if lista and time.monotonic() - lista[0] < self.ttl:
+                return lista[1]
+            return self.atualizar(prefixo)
+
+    def status(
+        self, chave: str, existentes: Optional[Set[str]], confirmar: bool = True
+    ) -> Optional[bool]:
+        """Se ``chave`` existe no bucket, conforme a listagem ``existentes``.
+
+        ``None`` quando a listagem falhou. Com ``confirmar`` uma chave ausente
+        é conferida com ``head_object`` antes de retornar ``False``.
+        """
+        if existentes is None:
+            return None
+        normalizada = _normalizar(chave)
+        if normalizada in existentes:
+            return True
+        if not confirmar:
+            return False
+        status = object_exists(chave)
+        if status:
+            # Enviada depois da listagem
+            existentes.add(normalizada)
+        return status
+
+    def iniciar_reconciliacao(self, prefixos: Iterable[str], intervalo: float) -> None:
+        """Atualiza ``prefixos`` a cada ``intervalo`` segundos em uma thread."""
+        if self._parar is not None or intervalo <= 0:
+            return
+        prefixos = list(prefixos)
+        parar = self._parar = threading.Event()
+
+        def reconciliar() -> None:
+            while not parar.is_set():
+                for prefixo in prefixos:
+                    with self._lock_prefixo(prefixo):
+                        self.atualizar(prefixo)
+                parar.wait(intervalo)
+
+        threading.Thread(target=reconciliar, name="inventario-bucket", daemon=True).start()
+
+    def parar_reconciliacao(self) -> None:
+        if self._parar is not None:
+            self._parar.set()
+            self._parar = None
+
+
+inventario = InventarioBucket(INVENTARIO_TTL)
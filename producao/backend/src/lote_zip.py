@@ -0,0 +1,212 @@
+"""Leitura dos lotes direto do ``.zip`` no bucket, sem extraí-los.
+
+``abrir_lote(chave)`` devolve uma :class:`PastaZip`: a pasta do lote dentro
+do zip com a interface de ``pathlib`` usada pelo nesting e pela importação
+(``/``, ``iterdir``, ``rglob``, ``read_text``, ``open``...). Os membros são
+lidos sob demanda, de uma de duas origens:
+
+* ``LOTE_ACESSO=range`` (padrão): leituras por intervalo (``Range``) do
+  objeto no bucket. Trafegam apenas o diretório central do zip e os membros
+  lidos; leituras próximas são agrupadas em blocos de ``LOTE_RANGE_BLOCO_KB``;
+* ``LOTE_ACESSO=local``: o zip é baixado uma vez para ``LOTE_ZIP_DIR`` e
+  mapeado em memória (``mmap``); a cópia é reaproveitada enquanto o ETag do
+  objeto não mudar.
+
+Os últimos ``LOTE_ZIP_ABERTOS`` zips ficam abertos, com o diretório central
+já lido; cada abertura apenas confere o ETag do objeto. Uma ``PastaZip``
+pode ser enviada ao pool de processos: no processo filho o zip é reaberto da
+mesma origem e versão.
+"""
+
+import fnmatch
+import io
+import logging
+import mmap
+import os
+import posixpath
+import tempfile
+import threading
+import zipfile
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterator, Tuple, Union
+
+from storage import PREFIX as OBJECT_PREFIX, download_file, download_range, object_info
+
+LOTE_ACESSO = os.getenv("LOTE_ACESSO", "range").lower()
+LOTE_RANGE_BLOCO_KB = int(os.getenv("LOTE_RANGE_BLOCO_KB", "1024"))
+LOTE_ZIP_ABERTOS = int(os.getenv("LOTE_ZIP_ABERTOS", "8"))
+LOTE_ZIP_DIR = Path(
+    os.getenv("LOTE_ZIP_DIR", str(Path(__file__).resolve().parent / "cache" / "lotes"))
+)
+
+# (modo, chave do objeto, ETag, tamanho)
+Origem = Tuple[str, str, str, int]
+
+
+class _Leitor(io.RawIOBase):
+    """Arquivo somente leitura de ``tamanho`` bytes com acesso aleatório."""
+
+    def __init__(self, tamanho: int):
+        self.tamanho = tamanho
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, pos: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: self.tamanho}[whence]
+        self._pos = max(0, base + pos)
+        return self._pos
+
+    def readinto(self, destino) -> int:
+        n = min(len(destino), self.tamanho - self._pos)
+        if n <= 0:
+            return 0
+        dados = self._ler(self._pos, n)
+        destino[: len(dados)] = dados
+        self._pos += len(dados)
+        return len(dados)
+
+    def _ler(self, inicio: int, n: int) -> bytes:
+        raise NotImplementedError
+
+
+class _LeitorRemoto(_Leitor):
+    """Lê o objeto do bucket por intervalos, fixado no ``etag`` aberto."""
+
+    def __init__(self, chave: str, tamanho: int, etag: str):
+        super().__init__(tamanho)
+        self.chave = chave
+        self.etag = etag
+
+    def _ler(self, inicio: int, n: int) -> bytes:
+        return download_range(self.chave, inicio, inicio + n - 1, self.etag)
+
+
+class _LeitorMapeado(_Leitor):
+    """Lê a cópia local do zip mapeada em memória."""
+
+    def __init__(self, caminho: Path):
+        with open(caminho, "rb") as f:
+            self._mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        super().__init__(len(self._mapa))
+
+    def _ler(self, inicio: int, n: int) -> bytes:
+        return self._mapa[inicio : inicio + n]
+
+    def close(self) -> None:
+        if not self.closed:
+            self._mapa.close()
+        super().close()
+
+
+class PastaZip(zipfile.Path):
+    """``zipfile.Path`` com o restante da interface de ``Path`` usada nos
+    leitores do lote e que pode ser enviada a outros processos."""
+
+    def rglob(self, padrao: str) -> Iterator["PastaZip"]:
+        base = self.at
+        for nome in self.root.namelist():
+            if nome.startswith(base) and nome != base:
+                if fnmatch.fnmatch(posixpath.basename(nome.rstrip("/")), padrao):
+                    yield self._next(nome)
+
+    def resolve(self) -> "PastaZip":
+        return self
+
+    def with_suffix(self, sufixo: str) -> "PastaZip":
+        return self._next(posixpath.splitext(self.at)[0] + sufixo)
+
+    def __reduce__(self):
+        return _reabrir, (self.root.origem, self.at)
+
+
+_abertos: "OrderedDict[Origem, zipfile.ZipFile]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _copia_local(chave: str, etag: str) -> Path:
+    """Baixa o zip para ``LOTE_ZIP_DIR`` (uma cópia por versão do objeto)."""
+    base = LOTE_ZIP_DIR / Path(chave).with_suffix("")
+    versao = etag.strip('"')
+    destino = base.parent / f"{base.name}.{versao}.zip"
+    if destino.is_file():
+        return destino
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=destino.parent, suffix=".tmp")
+    os.close(fd)
+    try:
+        download_file(chave, tmp)
+        os.replace(tmp, destino)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    # Versões anteriores do mesmo lote não serão mais usadas
+    for antiga in destino.parent.glob(f"{base.name}.*.zip"):
+        if antiga != destino:
+            antiga.unlink(missing_ok=True)
+    return destino
+
+
+def _abrir_zip(origem: Origem) -> zipfile.ZipFile:
+    with _lock:
+        zf = _abertos.get(origem)
+        if zf is not None:
+            _abertos.move_to_end(origem)
+            return zf
+    modo, chave, etag, tamanho = origem
+    if modo == "local":
+        leitor: io.IOBase = _LeitorMapeado(_copia_local(chave, etag))
+    else:
+        leitor = io.BufferedReader(
+            _LeitorRemoto(chave, tamanho, etag), LOTE_RANGE_BLOCO_KB * 1024
+        )
+    zf = zipfile.ZipFile(leitor)
+    zf.filename = chave
+    zf.origem = origem
+    with _lock:
+        _abertos[origem] = zf
+        # Os zips descartados são fechados quando ninguém mais os usa
+        while len(_abertos) > max(LOTE_ZIP_ABERTOS, 1):
+            _abertos.popitem(last=False)
+    return zf
+
+
+def _reabrir(origem: Origem, at: str) -> PastaZip:
+    return PastaZip(_abrir_zip(origem), at)
+
+
+def abrir_lote(chave: str) -> PastaZip:
+    """Abre a pasta do lote (ou ocorrência) guardado em ``chave`` no bucket.
+
+    Raises:
+        FileNotFoundError: o objeto não existe ou o bucket está indisponível.
+    """
+    info = object_info(chave)
+    if not info or not info.get("tamanho"):
+        logging.error("Objeto %s não encontrado no bucket", chave)
+        raise FileNotFoundError(f"Objeto {chave} nao encontrado")
+    chave = chave[len(OBJECT_PREFIX) :] if chave.startswith(OBJECT_PREFIX) else chave
+    modo = "local" if LOTE_ACESSO == "local" else "range"
+    zf = _abrir_zip((modo, chave, info["etag"] or "", info["tamanho"]))
+    # Os lotes são compactados com a pasta ``Lote_<n>`` na raiz do zip
+    pasta = PastaZip(zf, f"{Path(chave).stem}/")
+    return pasta if pasta.is_dir() else PastaZip(zf)
+
+
+def caminho_lote(pasta: Union[str, Path, PastaZip]) -> Union[Path, PastaZip]:
+    """Normaliza a pasta de um lote: ``PastaZip`` como está, demais em ``Path``."""
+    return pasta if isinstance(pasta, zipfile.Path) else Path(pasta)
+
+
+def fechar_lotes() -> None:
+    """Esquece os zips abertos (a próxima abertura relê o diretório central)."""
+    with _lock:
+        _abertos.clear()
@@ -9,13 +9,13 @@ from pathlib import Path
 from typing import Union
 import xml.etree.ElementTree as ET
 
+import cache_pastas
 from database import get_db_connection, PLACEHOLDER, schema
 from storage import (
-    upload_file,
-    download_file,
-    object_exists,
+    upload_pasta_zip,
     PREFIX as OBJECT_PREFIX,
 )
+from lote_zip import abrir_lote
 from operacoes import parse_dxt_producao
 from nesting import _encontrar_dxt
 
@@ -23,36 +23,19 @@ from nesting import _encontrar_dxt
 router = APIRouter()
 
 SCHEMA_PREFIX = f"{schema}." if schema else ""
-BASE_DIR = Path(__file__).resolve().parent.parent
-SAIDA_DIR = BASE_DIR / "saida"
 
 
 def ensure_lote_local(key: str) -> Path:
-    """Garante que o lote identificado por ``key`` esteja extraído localmente."""
+    """Garante que o lote identificado por ``key`` esteja extraído localmente.
+
+    A pasta pertence ao ``cache_pastas`` e não deve ser alterada.
+    """
 
     key_no_prefix = key[len(OBJECT_PREFIX) :] if key.startswith(OBJECT_PREFIX) else key
     if not key_no_prefix.startswith("lotes/"):
         raise ValueError("Chave de lote invalida")
 
-    pasta = SAIDA_DIR / Path(key_no_prefix).stem
-    if pasta.is_dir():
-        return pasta
-
-    status = object_exists(key)
-    if status is False:
-        raise FileNotFoundError(f"Objeto {key} nao encontrado")
-    if status is None:
-        raise FileNotFoundError(f"Objeto {key} nao encontrado")
-
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".zip")
-    tmp.close()
-    try:
-        download_file(key, tmp.name)
-        shutil.unpack_archive(tmp.name, SAIDA_DIR)
-    finally:
-        os.remove(tmp.name)
-
-    return pasta
+    return cache_pastas.cache.obter(key) / Path(key_no_prefix).stem
 
 
 def salvar_lote_db(ident: Union[str, int], pacotes: list, pasta_arquivos: str | None = None) -> int:
@@ -66,6 +49,7 @@ def salvar_lote_db(ident: Union[str, int], pacotes: list, pasta_arquivos: str |
     pacotes_json = json.dumps(pacotes)
     obj_key = f"lotes/Lote_{nome}.zip"
 
+    pasta_copia = None
     if pasta_arquivos:
         pasta_tmp = Path(pasta_arquivos)
         pasta_lote = pasta_tmp / f"Lote_{nome}"
@@ -75,21 +59,21 @@ def salvar_lote_db(ident: Union[str, int], pacotes: list, pasta_arquivos: str |
                 continue
             shutil.move(str(child), pasta_lote / child.name)
     else:
+        # Cópia de trabalho: a pasta do cache corresponde ao zip atual
+        pasta_copia = Path(tempfile.mkdtemp(prefix="lote_"))
+        pasta_lote = pasta_copia / f"Lote_{nome}"
         try:
-            pasta_lote = ensure_lote_local(obj_key)
+            shutil.copytree(ensure_lote_local(obj_key), pasta_lote)
         except Exception:
-            pasta_lote = SAIDA_DIR / f"Lote_{nome}"
             os.makedirs(pasta_lote, exist_ok=True)
 
-    (pasta_lote / "pacotes.json").write_text(pacotes_json, encoding="utf-8")
-
-    zip_path = shutil.make_archive(
-        str(pasta_lote), "zip", root_dir=pasta_lote.parent, base_dir=pasta_lote.name
-    )
     try:
-        upload_file(zip_path, obj_key)
+        (pasta_lote / "pacotes.json").write_text(pacotes_json, encoding="utf-8")
+
+        upload_pasta_zip(pasta_lote, obj_key)
     finally:
-        os.remove(zip_path)
+        if pasta_copia:
+            shutil.rmtree(pasta_copia, ignore_errors=True)
 
     with get_db_connection() as conn:
         result = conn.exec_driver_sql(
@@ -161,7 +145,8 @@ async def obter_lote_producao(ident: str):
 
     pacotes: list = []
     try:
-        pasta = ensure_lote_local(obj_key)
+        # Só leitura: sem extrair, os arquivos vêm direto do zip no bucket
+        pasta = abrir_lote(obj_key)
         pacotes_path = pasta / "pacotes.json"
         if pacotes_path.exists():
             pacotes = json.loads(pacotes_path.read_text(encoding="utf-8"))
@@ -32,6 +32,14 @@ class Nesting(Base):
     lote = Column(String)
     obj_key = Column(String)
     criado_em = Column(String)
+    # Execuções assíncronas (ver nesting_jobs.py)
+    job_id = Column(String, unique=True)
+    tipo = Column(String)
+    status = Column(String)
+    progresso = Column(Text)
+    erro = Column(Text)
+    resultado = Column(Text)
+    finalizado_em = Column(String)
 
 
 class Seccionadora(Base):
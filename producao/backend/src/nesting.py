@@ -1,42 +1,64 @@
 import xml.etree.ElementTree as ET
-from collections import OrderedDict
+from xml.sax.saxutils import escape
+from collections import Counter, OrderedDict
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import Callable, List, Dict, Optional, Tuple, Union
+import functools
 import itertools
 import re
 from datetime import datetime
 
 from shapely.geometry import box, CAP_STYLE, JOIN_STYLE
 from shapely.ops import unary_union
+from shapely.strtree import STRtree
 from shapely.geometry import Polygon, MultiPolygon
 from shapely import affinity
+import shapely
+import numpy as np
 
 from rectpack import newPacker
 """Removido uso de nest2D; agora usa apenas rectpack."""
-import ezdxf
 import math
-from ezdxf.math import ConstructionArc
-from shapely.geometry import Point
-from PIL import Image, ImageDraw
-import subprocess
-import json
+from PIL import Image, ImageDraw, ImageFont, features
+import logging
+import atexit
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import cache_nesting
+from deepnest_pool import DEEPNEST_SCRIPT, obter_pool as obter_pool_deepnest
+from dxf_cache import PecaGeometria, peca_geometria
+from lote_zip import caminho_lote
+from nfp import posicionar_blf
+from sequenciamento import _chave_ferramenta, agendar_operacoes
+from tempo_ciclo import EstimadorCiclo
 
 # Área mínima aproveitável para registrar sobras (0,1 m² em mm²)
 AREA_MIN_SOBRA = 0.1 * 1000 * 1000
 # Largura mínima para registrar sobras (100 mm)
 MIN_LARGURA_SOBRA = 100
 
-# Caches to avoid re-reading the same DXF files multiple times during
-# a single request. Keys are absolute paths to the DXF files.
-DXF_DIMENSIONS_CACHE: Dict[Path, Optional[Tuple[float, float]]] = {}
-DXF_POLYGON_CACHE: Dict[Path, Optional[Polygon]] = {}
+# Motor de nesting padrão usado por ``arranjar_poligonos``
+NESTING_ENGINE = os.getenv("NESTING_ENGINE", "deepnest")
 
-# Backwards compatibility: old code imported `medidas_cache`
-# Backwards compatibility: old code imported `medidas_cache`
-medidas_cache = DXF_DIMENSIONS_CACHE
+# Gera as imagens BMP das chapas referenciadas no XML da etiquetadora
+NESTING_IMAGENS_BMP = os.getenv("NESTING_IMAGENS_BMP", "1").lower() not in ("0", "false", "nao")
+# Textos rasterizados guardados por etiquetadora (LRU): valores que se repetem
+# entre as peças ficam, os únicos de cada peça (ID, medidas) vão sendo trocados.
+NESTING_ETIQUETA_CARIMBOS = int(os.getenv("NESTING_ETIQUETA_CARIMBOS", "256"))
 
-# Deepnest integration via Node.js wrapper
-_DEEPNEST_SCRIPT = Path(__file__).parent / 'deepnest_runner.js'
+# Deepnest integration via pool of long-lived Node.js workers
+_DEEPNEST_SCRIPT = DEEPNEST_SCRIPT
+
+# Orçamento de tempo (segundos) da busca do Deepnest por material na prévia e
+# no nesting final. 0 desativa: o motor roda até entregar a solução (o modo
+# anytime exige um motor que envie cada solução melhor em uma linha).
+DEEPNEST_ORCAMENTO_PREVIEW = float(os.getenv("DEEPNEST_ORCAMENTO_PREVIEW", "0"))
+DEEPNEST_ORCAMENTO_FINAL = float(os.getenv("DEEPNEST_ORCAMENTO_FINAL", "0"))
 
 def _arranjar_poligonos_deepnest(
     pecas: List[Dict],
@@ -48,8 +70,15 @@ def _arranjar_poligonos_deepnest(
     config_maquina: Optional[Dict],
     config_layers: Optional[List[Dict]],
     ferramentas: Optional[List[Dict]],
+    orcamento: Optional[float] = None,
+    ao_melhorar: Optional[Callable[[float], None]] = None,
 ) -> List[List[Dict]]:
-    """Invoke the Deepnest engine via Node.js and return nested plates."""
+    """Invoke the Deepnest engine via the worker pool and return nested plates.
+
+    With ``orcamento`` the search stops after that many seconds and returns
+    the best nest found; ``ao_melhorar(aproveitamento)`` receives each better
+    partial solution.
+    """
     payload = {
         'pieces': [
             {'polygon': list(p['polygon'].exterior.coords)} for p in pecas
@@ -59,19 +88,24 @@ def _arranjar_poligonos_deepnest(
         'spacing': espaco,
         'rotations': rotacionar,
     }
-    # Invoke Deepnest engine in its project directory (built manually via npm)
-    deepnest_dir = Path(__file__).resolve().parents[3] / 'deepnest'
-    proc = subprocess.run(
-        ['node', str(_DEEPNEST_SCRIPT)],
-        input=json.dumps(payload),
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True,
-        cwd=deepnest_dir,
+    result, tempos = obter_pool_deepnest().executar(
+        payload,
+        orcamento=orcamento,
+        ao_melhorar=(lambda _, aproveitamento: ao_melhorar(aproveitamento))
+        if ao_melhorar
+        else None,
+    )
+    logging.info(
+        "Deepnest: %d peças em %.2fs (fila %.2fs, nest %.2fs, worker %s, "
+        "aproveitamento %.1f%%%s)",
+        len(pecas),
+        tempos["total"],
+        tempos["fila"],
+        tempos["nest"],
+        tempos["pid"],
+        100 * float(result.get("utilisation") or 0),
+        ", parcial" if tempos.get("parcial") else "",
     )
-    if proc.returncode != 0:
-        raise RuntimeError(f"Deepnest runner failed: {proc.stderr.strip()}")
-    result = json.loads(proc.stdout)
     placements = result.get('placements', [])
     nested = []
     for p, out in zip(pecas, placements):
@@ -113,10 +147,20 @@ def arranjar_poligonos(
     config_maquina: Optional[Dict] = None,
     config_layers: Optional[List[Dict]] = None,
     ferramentas: Optional[List[Dict]] = None,
-    engine: str = 'deepnest',
+    engine: str = NESTING_ENGINE,
+    orcamento: Optional[float] = None,
+    ao_melhorar: Optional[Callable[[float], None]] = None,
 ) -> List[List[Dict]]:
     """
-    Gera nesting usando apenas rectpack para todas as peças via seus bounding boxes.
+    Gera nesting com o motor indicado em ``engine``:
+
+    - ``deepnest``: worker Node.js (formas livres). ``orcamento`` limita, em
+      segundos, a busca de cada arranjo, que devolve a melhor solução
+      encontrada no prazo; ``ao_melhorar(aproveitamento)`` acompanha as
+      soluções parciais;
+    - ``blf``: bottom-left-fill com no-fit polygons em Python (formas livres,
+      sem depender do Node);
+    - qualquer outro valor: rectpack sobre os bounding boxes das peças.
 
     Suporta múltiplas chapas (placas) conforme necessário, sem limitar a apenas uma,
     empacotando automaticamente peças excedentes em chapas adicionais.
@@ -124,11 +168,19 @@ def arranjar_poligonos(
     Retorna lista de placas, cada placa é lista de dicts de peça com x, y,
     rotationAngle e polygon atualizados, mantendo as operações internas.
     """
+    # Sobras de estoque selecionadas são preenchidas antes das chapas novas
+    if estoque:
+        return _arranjar_com_estoque(
+            pecas, largura, altura, espaco, rotacionar, estoque,
+            config_maquina, config_layers, ferramentas, engine,
+            orcamento, ao_melhorar
+        )
     # Se especificado engine deepnest, delega ao wrapper Node.js
     if engine == 'deepnest':
         return _arranjar_poligonos_deepnest(
             pecas, largura, altura, espaco, rotacionar,
-            estoque, config_maquina, config_layers, ferramentas
+            estoque, config_maquina, config_layers, ferramentas,
+            orcamento, ao_melhorar
         )
     # Extrair refilos da configuração da máquina
     ref_inf = ref_sup = ref_esq = ref_dir = 0.0
@@ -140,6 +192,16 @@ def arranjar_poligonos(
         ref_esq = _cfg_val(config_maquina, "refiloEsquerda", "refilo_esquerda")
         ref_dir = _cfg_val(config_maquina, "refiloDireita", "refilo_direita")
 
+    if engine == "blf":
+        # Coordenadas relativas à área útil; quem chama soma os refilos.
+        return _arranjar_poligonos(
+            pecas,
+            largura - ref_esq - ref_dir,
+            altura - ref_inf - ref_sup,
+            espaco,
+            rotacionar,
+        )
+
     # Limites internos da chapa
     wbin = largura - ref_esq - ref_dir - 2 * espaco
     hbin = altura - ref_inf - ref_sup - 2 * espaco
@@ -153,7 +215,7 @@ def arranjar_poligonos(
         minx, miny, maxx, maxy = p["polygon"].bounds
         packer.add_rect(maxx - minx, maxy - miny, ridx)
     # adiciona bins com dimensão da chapa, sem limite de quantidade (multi-placa)
-    packer.add_bin(wbin, hbin)
+    packer.add_bin(wbin, hbin, count=float("inf"))
     packer.pack()
     # agrupa resultados por índice de bin para gerar placas separadas
     from collections import defaultdict
@@ -183,13 +245,177 @@ def arranjar_poligonos(
     return placas
 
 
+def _arranjar_com_estoque(
+    pecas: List[Dict],
+    largura: float,
+    altura: float,
+    espaco: float,
+    rotacionar: bool,
+    estoque: List[Dict],
+    config_maquina: Optional[Dict],
+    config_layers: Optional[List[Dict]],
+    ferramentas: Optional[List[Dict]],
+    engine: str,
+    orcamento: Optional[float] = None,
+    ao_melhorar: Optional[Callable[[float], None]] = None,
+) -> List[List[Dict]]:
+    """Preenche primeiro as sobras de ``estoque`` e depois abre chapas novas.
+
+    Cada sobra é um bin com as próprias medidas (``comprimento`` x
+    ``largura``) e recebe no máximo uma placa, começando pelas maiores. As
+    peças posicionadas em uma sobra recebem ``sobraEstoque`` com os dados da
+    sobra utilizada.
+    """
+    restantes = [dict(p, _indice=i) for i, p in enumerate(pecas)]
+    placas: List[List[Dict]] = []
+    tol = 1e-6
+    for sobra in sorted(
+        estoque,
+        key=lambda s: float(s.get("comprimento") or 0) * float(s.get("largura") or 0),
+        reverse=True,
+    ):
+        if not restantes:
+            break
+        comp = float(sobra.get("comprimento") or 0)
+        larg = float(sobra.get("largura") or 0)
+        if comp <= 0 or larg <= 0:
+            continue
+        resultado = arranjar_poligonos(
+            restantes, comp, larg, espaco, rotacionar, None,
+            config_maquina, config_layers, ferramentas, engine,
+            orcamento, ao_melhorar
+        )
+        placa = []
+        for p in resultado[0] if resultado else []:
+            minx, miny, maxx, maxy = p["polygon"].bounds
+            x, y = float(p.get("x", 0)), float(p.get("y", 0))
+            if (
+                x >= -tol
+                and y >= -tol
+                and x + maxx - minx <= comp + tol
+                and y + maxy - miny <= larg + tol
+            ):
+                placa.append(p)
+        if not placa:
+            continue
+        info = {
+            "id": sobra.get("id"),
+            "descricao": sobra.get("descricao"),
+            "comprimento": comp,
+            "largura": larg,
+        }
+        for p in placa:
+            p["sobraEstoque"] = info
+        placas.append(placa)
+        usados = {p["_indice"] for p in placa}
+        restantes = [p for p in restantes if p["_indice"] not in usados]
+
+    if restantes:
+        placas.extend(
+            arranjar_poligonos(
+                restantes, largura, altura, espaco, rotacionar, None,
+                config_maquina, config_layers, ferramentas, engine,
+                orcamento, ao_melhorar
+            )
+        )
+    for placa in placas:
+        for p in placa:
+            p.pop("_indice", None)
+    return placas
+
+
+def sobras_estoque_utilizadas(chapas: List[Dict]) -> List[Dict]:
+    """Sobras de estoque ocupadas pelas chapas (uma entrada por sobra)."""
+    usadas: Dict = {}
+    for chapa in chapas:
+        sobra = chapa.get("sobraEstoque")
+        if sobra and sobra.get("id") not in usadas:
+            usadas[sobra.get("id")] = sobra
+    return list(usadas.values())
+
+
+def _grade_livre(g: Polygon, xs: np.ndarray, ys: np.ndarray, tol: float) -> np.ndarray:
+    """Return a boolean grid marking the compressed cells contained in ``g``.
+
+    ``livre[i, j]`` refers to the cell ``[xs[i], xs[i+1]] x [ys[j], ys[j+1]]``.
+    Since every vertex lies on a grid line, a rectangle made of whole cells
+    is inside ``g`` exactly when all of its cells are.
+    """
+    gx0 = np.repeat(xs[:-1], len(ys) - 1)
+    gx1 = np.repeat(xs[1:], len(ys) - 1)
+    gy0 = np.tile(ys[:-1], len(xs) - 1)
+    gy1 = np.tile(ys[1:], len(xs) - 1)
+    gb = g.buffer(tol)
+    shapely.prepare(gb)
+    celulas = shapely.box(gx0, gy0, gx1, gy1)
+    return shapely.within(celulas, gb).reshape(len(xs) - 1, len(ys) - 1)
+
+
+def _maior_retangulo_livre(
+    livre: np.ndarray, xs: np.ndarray, ys: np.ndarray
+) -> Optional[Tuple[int, int, int, int]]:
+    """Return grid indices ``(ix0, ix1, iy0, iy1)`` of the best free rectangle.
+
+    Only rectangles that cannot grow sideways are enumerated: for every
+    starting row ``iy0`` the free columns are AND-accumulated upwards and each
+    run of free cells is a candidate. The maximum-area rectangle honouring
+    ``AREA_MIN_SOBRA``/``MIN_LARGURA_SOBRA`` is always maximal, so it is among
+    them. Ties are broken by the smallest ``(ix0, ix1, iy0, iy1)``.
+    """
+    nx, ny = livre.shape
+    melhor: Optional[Tuple[float, int, int, int, int]] = None
+    for iy0 in range(ny):
+        if not livre[:, iy0].any():
+            continue
+        acumulado = np.logical_and.accumulate(livre[:, iy0:], axis=1)
+        # Início/fim das sequências de colunas livres para cada altura
+        borda = np.diff(
+            np.pad(acumulado.astype(np.int8), ((1, 1), (0, 0))), axis=0
+        )
+        ini_x, ini_h = np.nonzero(borda == 1)
+        fim_x, fim_h = np.nonzero(borda == -1)
+        if not len(ini_x):
+            continue
+        # ``nonzero`` percorre por linha (x); ordenar por altura alinha inícios e fins
+        oi = np.lexsort((ini_x, ini_h))
+        of = np.lexsort((fim_x, fim_h))
+        ix0, ix1, h = ini_x[oi], fim_x[of], ini_h[oi]
+        iy1 = iy0 + h + 1
+        larg = xs[ix1] - xs[ix0]
+        alt = ys[iy1] - ys[iy0]
+        area = larg * alt
+        ok = (
+            (area >= AREA_MIN_SOBRA)
+            & (larg >= MIN_LARGURA_SOBRA)
+            & (alt >= MIN_LARGURA_SOBRA)
+        )
+        if not ok.any():
+            continue
+        ix0, ix1, iy1, area = ix0[ok], ix1[ok], iy1[ok], area[ok]
+        ordem = np.lexsort((iy1, ix1, ix0, -area))
+        k = ordem[0]
+        cand = (float(area[k]), int(ix0[k]), int(ix1[k]), iy0, int(iy1[k]))
+        if (
+            melhor is None
+            or cand[0] > melhor[0]
+            or (cand[0] == melhor[0] and cand[1:] < melhor[1:])
+        ):
+            melhor = cand
+    return melhor[1:] if melhor else None
+
+
 def _retangulos_sobra(g: Polygon, tol: float = 1e-6) -> List[Polygon]:
     """Return a list of rectangular polygons representing usable scraps.
 
-    If ``g`` is already a rectangle, a single-element list is returned. The
-    function attempts to split irregular shapes into the largest axis-aligned
-    rectangles possible using a simple guillotine approach based on existing
-    vertex coordinates.
+    If ``g`` is already a rectangle, a single-element list is returned.
+    Otherwise the shape is split greedily into the largest axis-aligned
+    rectangles whose corners lie on the polygon's vertex coordinates; each
+    chosen rectangle may not touch the previous ones.
+
+    The search runs over the compressed coordinate grid: cells inside ``g``
+    are classified once (vectorised) and each step picks the largest free
+    maximal rectangle, then blocks it together with the ring of cells around
+    it so later picks cannot touch it.
     """
 
     rect = _retangulo_sobra(g, tol)
@@ -209,35 +435,20 @@ def _retangulos_sobra(g: Polygon, tol: float = 1e-6) -> List[Polygon]:
     minx, miny, maxx, maxy = g.bounds
     xs.update([minx, maxx])
     ys.update([miny, maxy])
-    xs = sorted(xs)
-    ys = sorted(ys)
-
-    gb = g.buffer(tol)
-    rects: List[Polygon] = []
-    for i, x1 in enumerate(xs[:-1]):
-        for x2 in xs[i + 1 :]:
-            for j, y1 in enumerate(ys[:-1]):
-                for y2 in ys[j + 1 :]:
-                    r = box(x1, y1, x2, y2)
-                    if r.area < AREA_MIN_SOBRA:
-                        continue
-                    minx_r, miny_r, maxx_r, maxy_r = r.bounds
-                    if (
-                        maxx_r - minx_r < MIN_LARGURA_SOBRA
-                        or maxy_r - miny_r < MIN_LARGURA_SOBRA
-                    ):
-                        continue
-                    if r.within(gb):
-                        rects.append(r)
+    xs = np.array(sorted(xs), dtype=float)
+    ys = np.array(sorted(ys), dtype=float)
+    if len(xs) < 2 or len(ys) < 2:
+        return []
 
-    rects.sort(key=lambda r: r.area, reverse=True)
+    livre = _grade_livre(g, xs, ys, tol)
     final: List[Polygon] = []
-    union = None
-    for r in rects:
-        if union and r.intersects(union):
-            continue
-        final.append(r)
-        union = r if union is None else union.union(r)
+    while True:
+        escolhido = _maior_retangulo_livre(livre, xs, ys)
+        if escolhido is None:
+            break
+        ix0, ix1, iy0, iy1 = escolhido
+        final.append(box(xs[ix0], ys[iy0], xs[ix1], ys[iy1]))
+        livre[max(ix0 - 1, 0) : ix1 + 1, max(iy0 - 1, 0) : iy1 + 1] = False
     return final
 
 
@@ -284,6 +495,53 @@ DEFAULT_FOOTER = (
 
 DEFAULT_COMANDO_FUROS = "(####### Desliga Magazine de Furação #######)\n" "M15\n"
 
+_CAMPO_TEMPLATE = re.compile(r"\[([^\[\]]+)\]")
+
+
+@functools.lru_cache(maxsize=256)
+def _compilar_template(texto: str) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """Split ``texto`` once into literal chunks and ``[CAMPO]`` names."""
+    partes = _CAMPO_TEMPLATE.split(texto)
+    return tuple(partes[0::2]), tuple(partes[1::2])
+
+
+def _substituir(texto: str, valores: Dict) -> str:
+    """Fill ``[CAMPO]`` placeholders of a template; unknown ones are removed."""
+    literais, campos = _compilar_template(texto)
+    if not campos:
+        return texto
+    saida = [literais[0]]
+    for campo, literal in zip(campos, literais[1:]):
+        if campo in valores:
+            valor = str(valores[campo])
+            if "[" in valor:
+                valor = _CAMPO_TEMPLATE.sub("", valor)
+            saida.append(valor)
+        saida.append(literal)
+    return "".join(saida)
+
+
+class _EscritorGcode:
+    """Write G-code lines straight to a file, separated by CRLF.
+
+    When an ``estimador`` is given every written block is also fed to it.
+    """
+
+    def __init__(self, arquivo, estimador: Optional[EstimadorCiclo] = None):
+        self._arquivo = arquivo
+        self._estimador = estimador
+        self._vazio = True
+
+    def escrever(self, linhas: List[str]) -> None:
+        if not linhas:
+            return
+        if self._estimador is not None:
+            self._estimador.consumir(linhas)
+        if not self._vazio:
+            self._arquivo.write("\r\n")
+        self._arquivo.write("\r\n".join(linhas))
+        self._vazio = False
+
 
 def _parse_angle(value: Optional[str]) -> int:
     """Return rotation angle in degrees extracted from a string."""
@@ -454,58 +712,8 @@ def _invert_x(x: float, width: float, chapa_width: float) -> float:
 
 
 def _medidas_dxf(path: Path) -> Optional[Tuple[float, float]]:
-    """Return DXF outer dimensions using a global cache."""
-    path = path.resolve()
-    if path in DXF_DIMENSIONS_CACHE:
-        return DXF_DIMENSIONS_CACHE[path]
-    try:
-        doc = ezdxf.readfile(path)
-    except Exception:
-        DXF_DIMENSIONS_CACHE[path] = None
-        return None
-    msp = doc.modelspace()
-    xs: List[float] = []
-    ys: List[float] = []
-    for ent in msp:
-        layer = str(ent.dxf.layer).lower()
-        if layer in ("borda_externa", "contorno"):
-            try:
-                if ent.dxftype() == "LINE":
-                    xs.extend([float(ent.dxf.start.x), float(ent.dxf.end.x)])
-                    ys.extend([float(ent.dxf.start.y), float(ent.dxf.end.y)])
-                elif ent.dxftype() in ("LWPOLYLINE", "POLYLINE"):
-                    if ent.dxftype() == "POLYLINE":
-                        for v in ent.vertices:
-                            xs.append(float(v.dxf.location.x))
-                            ys.append(float(v.dxf.location.y))
-                    else:
-                        for pt in ent.get_points("xy"):
-                            xs.append(float(pt[0]))
-                            ys.append(float(pt[1]))
-                elif ent.dxftype() == "CIRCLE":
-                    cx = float(ent.dxf.center.x)
-                    cy = float(ent.dxf.center.y)
-                    r = float(ent.dxf.radius)
-                    xs.extend([cx - r, cx + r])
-                    ys.extend([cy - r, cy + r])
-                elif ent.dxftype() == "ARC":
-                    arc = ConstructionArc(
-                        ent.dxf.center,
-                        ent.dxf.radius,
-                        ent.dxf.start_angle,
-                        ent.dxf.end_angle,
-                    )
-                    bbox = arc.bounding_box
-                    xs.extend([float(bbox.extmin.x), float(bbox.extmax.x)])
-                    ys.extend([float(bbox.extmin.y), float(bbox.extmax.y)])
-            except Exception:
-                continue
-    if not xs or not ys:
-        DXF_DIMENSIONS_CACHE[path] = None
-        return None
-    dims = max(xs) - min(xs), max(ys) - min(ys)
-    DXF_DIMENSIONS_CACHE[path] = dims
-    return dims
+    """Return DXF outer dimensions from the shared geometry cache."""
+    return peca_geometria(path).dims
 
 
 def _ler_dxt(dxt_path: Path) -> List[Dict]:
@@ -528,12 +736,9 @@ def _ler_dxt(dxt_path: Path) -> List[Dict]:
             length = float(fields.get("Length", 0))
             width = float(fields.get("Width", 0))
 
-            if filename:
-                if filename not in medidas_cache:
-                    medidas_cache[filename] = _medidas_dxf(pasta / filename)
-                medidas = medidas_cache.get(filename)
-                if medidas:
-                    length, width = medidas
+            geometria = peca_geometria(pasta / filename) if filename else None
+            if geometria and geometria.dims:
+                length, width = geometria.dims
 
             pecas.append(
                 {
@@ -546,6 +751,7 @@ def _ler_dxt(dxt_path: Path) -> List[Dict]:
                     "Filename": filename,
                     "Client": fields.get("Client", ""),
                     "Project": fields.get("Project", ""),
+                    "geometria": geometria,
                 }
             )
         except ValueError:
@@ -553,95 +759,18 @@ def _ler_dxt(dxt_path: Path) -> List[Dict]:
     return pecas
 
 
-def _entity_polygon(ent) -> Optional[Polygon]:
-    """Return a shapely polygon approximation of a DXF entity."""
-    try:
-        if ent.dxftype() in {"LWPOLYLINE", "POLYLINE"}:
-            if ent.dxftype() == "POLYLINE":
-                pts = [(float(v.dxf.location.x), float(v.dxf.location.y)) for v in ent.vertices]
-            else:
-                pts = [(float(p[0]), float(p[1])) for p in ent.get_points("xy")]
-            if len(pts) >= 3:
-                return Polygon(pts)
-        elif ent.dxftype() == "LINE":
-            start = ent.dxf.start
-            end = ent.dxf.end
-            return Polygon([(start.x, start.y), (end.x, end.y)])
-        elif ent.dxftype() == "CIRCLE":
-            cx = float(ent.dxf.center.x)
-            cy = float(ent.dxf.center.y)
-            r = float(ent.dxf.radius)
-            return Point(cx, cy).buffer(r, resolution=32)
-        elif ent.dxftype() == "ARC":
-            c = ent.dxf.center
-            r = float(ent.dxf.radius)
-            a0 = math.radians(float(ent.dxf.start_angle))
-            a1 = math.radians(float(ent.dxf.end_angle))
-            if a1 < a0:
-                a1 += 2 * math.pi
-            steps = max(8, int(r))
-            pts = [
-                (
-                    c.x + r * math.cos(a0 + (a1 - a0) * i / steps),
-                    c.y + r * math.sin(a0 + (a1 - a0) * i / steps),
-                )
-                for i in range(steps + 1)
-            ]
-            return Polygon(pts)
-    except Exception:
-        return None
-    return None
-
-
 def _ler_dxt_polygons(dxt_path: Path) -> List[Dict]:
-
     """Parse DXT and attach shapely polygons for each piece.
 
-    This function now reuses DXF data for pieces that reference the same file,
-    significantly reducing processing time and avoiding timeouts during nesting
-    execution.
+    The polygon comes from the piece's ``PecaGeometria`` built by ``_ler_dxt``,
+    so each DXF is traversed only once.
     """
 
     pecas = _ler_dxt(dxt_path)
-    pasta = dxt_path.parent
-
 
     for p in pecas:
-        poly: Optional[Polygon] = None
-        filename = p.get("Filename")
-        if filename:
-
-            path = (pasta / filename).resolve()
-            if path not in DXF_POLYGON_CACHE:
-                try:
-                    doc = ezdxf.readfile(path)
-
-                    msp = doc.modelspace()
-                    contornos: List[Polygon] = []
-                    furos: List[Polygon] = []
-                    for ent in msp:
-                        layer = str(ent.dxf.layer).lower()
-                        poly_ent = _entity_polygon(ent)
-                        if not poly_ent:
-                            continue
-                        if layer in {"borda_externa", "contorno"}:
-                            contornos.append(poly_ent)
-                        elif layer.startswith("furo") or layer.startswith("usinar"):
-                            furos.append(poly_ent)
-                    if contornos:
-                        p_union: Polygon = unary_union(contornos)
-                        for f in furos:
-                            p_union = p_union.difference(f)
-                        if isinstance(p_union, MultiPolygon):
-                            p_union = max(p_union.geoms, key=lambda g: g.area)
-
-                        DXF_POLYGON_CACHE[path] = p_union
-                    else:
-                        DXF_POLYGON_CACHE[path] = None
-                except Exception:
-                    DXF_POLYGON_CACHE[path] = None
-            poly = DXF_POLYGON_CACHE.get(path)
-
+        geometria = p.get("geometria")
+        poly: Optional[Polygon] = geometria.contorno if geometria else None
 
         if poly is None:
             poly = box(0, 0, p["Length"], p["Width"])
@@ -657,91 +786,204 @@ def _arranjar_poligonos(
     espaco: float = 0.0,
     rotacionar: bool = True,
 ) -> List[List[Dict]]:
-    """Arranje peças como polígonos dentro da chapa usando um algoritmo simples."""
+    """Arranje peças como polígonos dentro da chapa (bottom-left-fill com NFP).
+
+    As peças são tentadas da maior para a menor área; a posição de cada uma é
+    calculada por :func:`nfp.posicionar_blf`.
+    """
 
     restantes = sorted(pecas, key=lambda p: p.get("polygon").area if p.get("polygon") else 0, reverse=True)
+    poligonos = [
+        p.get("polygon") or box(0, 0, p.get("Length", 0), p.get("Width", 0))
+        for p in restantes
+    ]
     chapas: List[List[Dict]] = []
-    grid = max(10.0, espaco or 10.0)
-
-    while restantes:
+    for posicoes in posicionar_blf(
+        poligonos, largura, altura, espaco, [0, 90] if rotacionar else [0]
+    ):
         placa: List[Dict] = []
-        placa_union: Optional[Polygon] = None
-        i = 0
-        while i < len(restantes):
-            p = restantes[i]
-            poly_orig: Polygon = p.get("polygon")
-            colocado = False
-            for ang in ([0, 90] if rotacionar else [0]):
-                g = affinity.rotate(poly_orig, ang, origin=(0, 0))
-                minx, miny, maxx, maxy = g.bounds
-                w = maxx - minx
-                h = maxy - miny
-                y = 0.0
-                while y + h <= altura:
-                    x = 0.0
-                    while x + w <= largura:
-                        desloc = affinity.translate(g, x - minx, y - miny)
-                        if placa_union and desloc.buffer(espaco / 2).intersects(placa_union.buffer(espaco / 2)):
-                            x += grid
-                            continue
-                        if desloc.bounds[2] <= largura and desloc.bounds[3] <= altura:
-                            new_p = p.copy()
-                            new_p.update(
-                                {
-                                    "x": x,
-                                    "y": y,
-                                    "Length": w,
-                                    "Width": h,
-                                    "polygon": desloc,
-                                    "rotated": ang != 0,
-                                    "rotationAngle": ang,
-                                }
-                            )
-                            placa.append(new_p)
-                            placa_union = desloc if placa_union is None else placa_union.union(desloc)
-                            restantes.pop(i)
-                            colocado = True
-                            break
-                        x += grid
-                    if colocado:
-                        break
-                    y += grid
-                if colocado:
-                    break
-            if not colocado:
-                i += 1
-        if placa:
-            chapas.append(placa)
-        else:
-            break
+        for idx, ang, x, y in posicoes:
+            g = affinity.rotate(poligonos[idx], ang, origin=(0, 0))
+            minx, miny, maxx, maxy = g.bounds
+            new_p = restantes[idx].copy()
+            new_p.update(
+                {
+                    "x": x,
+                    "y": y,
+                    "Length": maxx - minx,
+                    "Width": maxy - miny,
+                    "polygon": affinity.translate(g, x - minx, y - miny),
+                    "rotated": ang != 0,
+                    "rotationAngle": ang,
+                }
+            )
+            placa.append(new_p)
+        chapas.append(placa)
     return chapas
 
 
-def _gcode_peca(
+def _geometria_peca(p: Dict, pasta_lote: Optional[Path]) -> Optional[PecaGeometria]:
+    """Return the piece geometry, loading it when not attached by ``_ler_dxt``."""
+    geometria = p.get("geometria")
+    if geometria is None and pasta_lote and p.get("Filename"):
+        geometria = peca_geometria(pasta_lote / p["Filename"])
+        p["geometria"] = geometria
+    return geometria
+
+
+def _gcode_peca(*args, **kwargs):
+    """Return ``(codigo, ferramenta_atual, usadas)`` for one piece or scrap.
+
+    Same arguments as :func:`_gcode_peca_linhas`, with the program lines
+    joined by newlines.
+    """
+    linhas, atual, usadas = _gcode_peca_linhas(*args, **kwargs)
+    return "\n".join(linhas), atual, usadas
+
+
+class _EmissorGcode:
+    """Format tool changes and machining moves from the machine config."""
+
+    def __init__(self, config_maquina: Optional[Dict] = None, troca_tpl: str = ""):
+        self.config_maquina = config_maquina
+        # ``troca_tpl`` define o bloco emitido sempre que ocorre mudança de
+        # ferramenta. Ele também é utilizado para a primeira ferramenta da peça.
+        self.troca_tpl = troca_tpl
+        self.z_seg = float(config_maquina.get("zSeguranca", 48)) if config_maquina else 48
+        self.z_pre = float(config_maquina.get("zAntesTrabalho", 20)) if config_maquina else 20
+        try:
+            self.casas_dec = int(config_maquina.get("casasDecimais", 4)) if config_maquina else 4
+        except (TypeError, ValueError):
+            self.casas_dec = 4
+        self.mov_rapida = config_maquina.get("movRapida", "") if config_maquina else ""
+        self.mov_corte_ini = config_maquina.get("primeiraMovCorte", "") if config_maquina else ""
+        self.mov_corte = config_maquina.get("movCorte", "") if config_maquina else ""
+
+    def fmt(self, val: float) -> str:
+        return f"{float(val):.{self.casas_dec}f}"
+
+    def g0(self, x: float, y: float, z: float) -> str:
+        """Return rapid move ensuring all axes are present."""
+        if self.mov_rapida:
+            return _substituir(
+                self.mov_rapida, {"X": self.fmt(x), "Y": self.fmt(y), "Z": self.fmt(z)}
+            )
+        return f"G0 X{self.fmt(x)} Y{self.fmt(y)} Z{self.fmt(z)}"
+
+    def g1_ini(self, x: float, y: float, z: float, f: float) -> str:
+        """Return first cut movement (G1) with all axes."""
+        if self.mov_corte_ini:
+            return _substituir(
+                self.mov_corte_ini,
+                {"X": self.fmt(x), "Y": self.fmt(y), "Z": self.fmt(z), "F": self.fmt(f)},
+            )
+        return f"G1 X{self.fmt(x)} Y{self.fmt(y)} Z{self.fmt(z)} F{self.fmt(f)}"
+
+    def g1(self, x: float, y: float, z: float, f: float) -> str:
+        """Return cut movement (G1) with all axes."""
+        if self.mov_corte:
+            return _substituir(
+                self.mov_corte,
+                {"X": self.fmt(x), "Y": self.fmt(y), "Z": self.fmt(z), "F": self.fmt(f)},
+            )
+        return f"G1 X{self.fmt(x)} Y{self.fmt(y)} Z{self.fmt(z)} F{self.fmt(f)}"
+
+    def troca(self, tool: Dict) -> List[str]:
+        cfg = self.config_maquina
+        valores = {
+            "T": tool.get("codigo", ""),
+            "TOOL_DESCRIPTION": tool.get("descricao", ""),
+            "ZH": cfg.get("zHoming", "") if cfg else "",
+            "XH": cfg.get("xHoming", "") if cfg else "",
+            "YH": cfg.get("yHoming", "") if cfg else "",
+            "CMD_EXTRA": _expand_cmd_extra(tool),
+        }
+        # Sempre utilizar o template de troca de ferramentas, inclusive para
+        # a primeira ferramenta. Isso garante que todos os blocos iniciem
+        # com o mesmo cabeçalho padronizado.
+        if not self.troca_tpl:
+            return []
+        return _substituir(self.troca_tpl, valores).splitlines() + [""]
+
+    def contorno(self, op: Dict) -> List[str]:
+        ox, oy, l, w = op["x"], op["y"], op["l"], op["w"]
+        tipo_lbl = str(op.get("tipo", "Peça")).upper()
+        if tipo_lbl == "PECA":
+            tipo_lbl = "PECAS"
+        elif tipo_lbl == "SOBRA":
+            tipo_lbl = "SOBRAS"
+        return [
+            f"({tipo_lbl} - {int(round(l))} x {int(round(w))})",
+            self.g0(ox, oy, self.z_seg),
+            self.g0(ox, oy, self.z_pre),
+            "(Step:1/1)",
+            self.g1_ini(ox + l, oy, 0.2, 3500.0),
+            self.g1(ox + l, oy + w, 0.2, 7000.0),
+            self.g1(ox, oy + w, 0.2, 7000.0),
+            self.g1(ox, oy, 0.2, 7000.0),
+            self.g0(ox, oy, self.z_seg),
+        ]
+
+    def usinagem(self, op: Dict) -> List[str]:
+        return [
+            self.g0(op["x"], op["y"], self.z_seg),
+            self.g0(op["x"], op["y"], self.z_pre),
+            "(Step:1/1)",
+            self.g1_ini(op["x"], op["y"], op["prof"], 5000.0),
+            self.g0(op["x"], op["y"], self.z_seg),
+        ]
+
+    def emitir(
+        self, ops: List[Dict], ferramenta_atual: Optional[Dict] = None
+    ) -> Tuple[List[str], Optional[Dict], List[str]]:
+        """Program lines for ``ops`` in the given order.
+
+        Returns ``(linhas, ferramenta_atual, usadas)``; a tool change block is
+        inserted whenever the tool differs from the current one.
+        """
+        linhas: List[str] = []
+        atual = ferramenta_atual
+        usadas: List[str] = []
+        last_layer: Optional[str] = None
+        for op in ops:
+            tool = op["tool"]
+            if tool:
+                desc = f"{tool.get('codigo')} - {tool.get('descricao','')}"
+                if desc not in usadas:
+                    usadas.append(desc)
+            if tool and tool != atual:
+                linhas.extend(self.troca(tool))
+                atual = tool
+            if op.get("contorno"):
+                linhas.extend(self.contorno(op))
+            else:
+                if op["layer"] != last_layer:
+                    linhas.append(f"({op['layer']})")
+                    last_layer = op["layer"]
+                linhas.extend(self.usinagem(op))
+        # Templates de movimento podem conter várias linhas
+        if any("\n" in linha for linha in linhas):
+            linhas = "\n".join(linhas).split("\n")
+        return linhas, atual, usadas
+
+
+def _operacoes_peca(
     p: Dict,
     ox: float = 0,
     oy: float = 0,
     ferramentas: Optional[List[Dict]] = None,
-    dxf_path: Optional[Path] = None,
+    geometria: Optional[PecaGeometria] = None,
     config_layers: Optional[List[Dict]] = None,
-    config_maquina: Optional[Dict] = None,
-    templates: Optional[Dict] = None,
     tipo: str = "Peça",
-    etapa: str = "todas",
-    ferramenta_atual: Optional[Dict] = None,
     rotated: bool = False,
-    orig_length: Optional[float] = None,
-    orig_width: Optional[float] = None,
     rotation_angle: int = 0,
-):
-    # (Sem alteração estrutural — função já estava em bom padrão, só pequenas correções de nomenclatura.)
-    _ = rotation_angle  # parâmetro reservado para uso futuro
+) -> Tuple[List[Dict], Dict]:
+    """Return ``(usinagens, contorno)`` of a piece in plate coordinates.
 
-    def substituir(texto: str, valores: dict) -> str:
-        for k, v in valores.items():
-            texto = texto.replace(f"[{k}]", str(v))
-        texto = re.sub(r"\[[^\[\]]+\]", "", texto)
-        return texto
+    Each machining operation has ``tool``, ``x``, ``y``, ``prof`` and
+    ``layer``; the contour has ``contorno=True``, the start corner in
+    ``x``/``y`` and the size in ``l``/``w``.
+    """
 
     def buscar_ferramenta(nome: str) -> Optional[Dict]:
         if not ferramentas:
@@ -751,60 +993,14 @@ def _gcode_peca(
                 return f
         return None
 
-    l = p["Length"]
-    w = p["Width"]
-    # A descrição da peça não é mais acrescentada automaticamente para evitar
-    # comentários extras nos códigos gerados.
-    linhas: List[str] = []
-    z_seg = float(config_maquina.get("zSeguranca", 48)) if config_maquina else 48
-    z_pre = float(config_maquina.get("zAntesTrabalho", 20)) if config_maquina else 20
-
-    try:
-        casas_dec = int(config_maquina.get("casasDecimais", 4)) if config_maquina else 4
-    except (TypeError, ValueError):
-        casas_dec = 4
-
-    def fmt(val: float) -> str:
-        return f"{float(val):.{casas_dec}f}"
-
-    mov_rapida = config_maquina.get("movRapida", "") if config_maquina else ""
-    mov_corte_ini = config_maquina.get("primeiraMovCorte", "") if config_maquina else ""
-    mov_corte = config_maquina.get("movCorte", "") if config_maquina else ""
-
-    def g0(x: float, y: float, z: float) -> str:
-        """Return rapid move ensuring all axes are present."""
-        if mov_rapida:
-            return substituir(mov_rapida, {"X": fmt(x), "Y": fmt(y), "Z": fmt(z)})
-        return f"G0 X{fmt(x)} Y{fmt(y)} Z{fmt(z)}"
-
-    def g1_ini(x: float, y: float, z: float, f: float) -> str:
-        """Return first cut movement (G1) with all axes."""
-        if mov_corte_ini:
-            return substituir(
-                mov_corte_ini,
-                {"X": fmt(x), "Y": fmt(y), "Z": fmt(z), "F": fmt(f)},
-            )
-        return f"G1 X{fmt(x)} Y{fmt(y)} Z{fmt(z)} F{fmt(f)}"
-
-    def g1(x: float, y: float, z: float, f: float) -> str:
-        """Return cut movement (G1) with all axes."""
-        if mov_corte:
-            return substituir(
-                mov_corte, {"X": fmt(x), "Y": fmt(y), "Z": fmt(z), "F": fmt(f)}
-            )
-        return f"G1 X{fmt(x)} Y{fmt(y)} Z{fmt(z)} F{fmt(f)}"
-
-    ops = []
+    ops: List[Dict] = []
     default_tool = ferramentas[0] if ferramentas else None
-    if dxf_path:
+    if geometria:
         try:
-            doc = ezdxf.readfile(dxf_path)
-            msp = doc.modelspace()
+            entidades = geometria.operacoes
             # rotation uses simple math instead of Matrix44
 
             if rotated:
-                import math
-
                 # Rotate point around piece origin (ox, oy) by rotation_angle degrees CCW
                 rad = math.radians(rotation_angle or 90)
 
@@ -818,8 +1014,7 @@ def _gcode_peca(
                 def rotacionar_ponto(x: float, y: float) -> tuple[float, float]:
                     return x, y
 
-            for ent in msp:
-                layer = ent.dxf.layer
+            for tipo_ent, layer, dados in entidades:
                 cfg = None
                 if config_layers:
                     cfg = next(
@@ -839,70 +1034,64 @@ def _gcode_peca(
                     prof = 1.0
                 if not ferramenta_cfg:
                     continue
-                if ent.dxftype() == "CIRCLE":
-                    cx0 = float(ent.dxf.center.x) + ox
-                    cy0 = float(ent.dxf.center.y) + oy
-                    x, y = rotacionar_ponto(cx0, cy0)
-                    ops.append(
-                        {
-                            "tool": ferramenta_cfg,
-                            "x": x,
-                            "y": y,
-                            "prof": prof,
-                            "layer": layer,
-                        }
-                    )
-                elif ent.dxftype() in {"LINE", "LWPOLYLINE", "POLYLINE"}:
-                    points = []
-                    if ent.dxftype() == "LINE":
-                        points = [ent.dxf.start, ent.dxf.end]
-                    elif ent.dxftype() == "POLYLINE":
-                        points = [
-                            (float(v.dxf.location.x), float(v.dxf.location.y))
-                            for v in ent.vertices
-                        ]
-                    else:
-                        points = list(ent.get_points("xy"))
-                    xs = [float(p[0]) for p in points]
-                    ys = [float(p[1]) for p in points]
-                    if xs and ys:
-                        x = min(xs)
-                        y = min(ys)
-                        x0 = x + ox
-                        y0 = y + oy
-                        x, y = rotacionar_ponto(x0, y0)
-                        ops.append(
-                            {
-                                "tool": ferramenta_cfg,
-                                "x": x,
-                                "y": y,
-                                "prof": prof,
-                                "layer": layer,
-                            }
-                        )
+                if tipo_ent == "CIRCLE":
+                    x, y = rotacionar_ponto(dados[0] + ox, dados[1] + oy)
+                elif tipo_ent in {"LINE", "LWPOLYLINE", "POLYLINE"}:
+                    xs = [pt[0] for pt in dados]
+                    ys = [pt[1] for pt in dados]
+                    if not (xs and ys):
+                        continue
+                    x, y = rotacionar_ponto(min(xs) + ox, min(ys) + oy)
+                else:
+                    continue
+                ops.append(
+                    {
+                        "tool": ferramenta_cfg,
+                        "x": x,
+                        "y": y,
+                        "prof": prof,
+                        "layer": layer,
+                    }
+                )
         except Exception:
             pass
 
     # Operação padrão - contorno (para peça ou sobra)
-    ferramenta_padrao = ferramentas[0] if ferramentas else None
     contorno_op = {
-        "tool": ferramenta_padrao,
+        "tool": default_tool,
         "contorno": True,
-        "l": l,
-        "w": w,
+        "tipo": tipo,
+        "x": ox,
+        "y": oy,
+        "l": p["Length"],
+        "w": p["Width"],
     }
-    ops.insert(0, contorno_op)
+    return ops, contorno_op
 
-    # ``troca_tpl`` define o bloco emitido sempre que ocorre mudança de
-    # ferramenta. Ele também é utilizado para a primeira ferramenta da peça.
-    troca_tpl = templates.get("troca", "") if templates else ""
 
-    # Ordenar e agrupar operações (para garantir ordem de furos, fresas, contorno)
-    if ops and ops[0].get("contorno"):
-        contorno_op = ops.pop(0)
-    else:
-        contorno_op = None
+def _gcode_peca_linhas(
+    p: Dict,
+    ox: float = 0,
+    oy: float = 0,
+    ferramentas: Optional[List[Dict]] = None,
+    geometria: Optional[PecaGeometria] = None,
+    config_layers: Optional[List[Dict]] = None,
+    config_maquina: Optional[Dict] = None,
+    templates: Optional[Dict] = None,
+    tipo: str = "Peça",
+    etapa: str = "todas",
+    ferramenta_atual: Optional[Dict] = None,
+    rotated: bool = False,
+    orig_length: Optional[float] = None,
+    orig_width: Optional[float] = None,
+    rotation_angle: int = 0,
+):
+    """G-code lines of one piece for ``etapa`` (furos, fresas, contorno, todas)."""
+    ops, contorno_op = _operacoes_peca(
+        p, ox, oy, ferramentas, geometria, config_layers, tipo, rotated, rotation_angle
+    )
 
+    # Ordenar e agrupar operações (para garantir ordem de furos, fresas, contorno)
     furos_ops = [o for o in ops if o.get("tool", {}).get("tipo") == "Broca"]
     fresa_ops = [o for o in ops if o.get("tool", {}).get("tipo") != "Broca"]
 
@@ -913,79 +1102,30 @@ def _gcode_peca(
     elif etapa == "fresas":
         ops = fresa_ops
     elif etapa == "contorno":
-        ops = [contorno_op] if contorno_op else []
+        ops = [contorno_op]
     else:
-        ops = furos_ops + fresa_ops
-        if contorno_op:
-            ops.append(contorno_op)
-
-    atual = ferramenta_atual
-    usadas: List[str] = []
-    last_layer: Optional[str] = None
-
-    for op in ops:
-        tool = op["tool"]
-        if tool:
-            desc = f"{tool.get('codigo')} - {tool.get('descricao','')}"
-            if desc not in usadas:
-                usadas.append(desc)
-        if tool and tool != atual:
-            valores = {
-                "T": tool.get("codigo", ""),
-                "TOOL_DESCRIPTION": tool.get("descricao", ""),
-                "ZH": config_maquina.get("zHoming", "") if config_maquina else "",
-                "XH": config_maquina.get("xHoming", "") if config_maquina else "",
-                "YH": config_maquina.get("yHoming", "") if config_maquina else "",
-                "CMD_EXTRA": _expand_cmd_extra(tool),
-            }
-            # Sempre utilizar o template de troca de ferramentas, inclusive para
-            # a primeira ferramenta. Isso garante que todos os blocos iniciem
-            # com o mesmo cabeçalho padronizado.
-            tpl = troca_tpl
-            if tpl:
-                linhas.extend(substituir(tpl, valores).splitlines())
-                linhas.append("")
-            atual = tool
-
-        if op.get("contorno"):
-            tipo_lbl = tipo.upper()
-            if tipo_lbl == "PECA":
-                tipo_lbl = "PECAS"
-            elif tipo_lbl == "SOBRA":
-                tipo_lbl = "SOBRAS"
-            linhas.append(f"({tipo_lbl} - {int(round(l))} x {int(round(w))})")
-            linhas.extend(
-                [
-                    g0(ox, oy, z_seg),
-                    g0(ox, oy, z_pre),
-                    "(Step:1/1)",
-                    g1_ini(ox + l, oy, 0.2, 3500.0),
-                    g1(ox + l, oy + w, 0.2, 7000.0),
-                    g1(ox, oy + w, 0.2, 7000.0),
-                    g1(ox, oy, 0.2, 7000.0),
-                    g0(ox, oy, z_seg),
-                ]
-            )
-        else:
-            if op["layer"] != last_layer:
-                linhas.append(f"({op['layer']})")
-                last_layer = op["layer"]
-            linhas.extend(
-                [
-                    g0(op["x"], op["y"], z_seg),
-                    g0(op["x"], op["y"], z_pre),
-                    "(Step:1/1)",
-                    g1_ini(op["x"], op["y"], op["prof"], 5000.0),
-                    g0(op["x"], op["y"], z_seg),
-                ]
-            )
+        ops = furos_ops + fresa_ops + [contorno_op]
 
-    return "\n".join(linhas), atual, usadas
+    emissor = _EmissorGcode(config_maquina, templates.get("troca", "") if templates else "")
+    return emissor.emitir(ops, ferramenta_atual)
 
 
 # (continua na próxima mensagem — Funções de geração de NC, sobras, etiquetas, etc)
 
 
+def _dimensoes_placa(
+    pecas: List[Dict], largura_chapa: float, altura_chapa: float
+) -> Tuple[float, float]:
+    """Return the plate size in the rotated frame used for the output files.
+
+    Plates nested on a stock remnant (``sobraEstoque``) use the remnant size.
+    """
+    sobra = pecas[0].get("sobraEstoque") if pecas else None
+    if not sobra:
+        return largura_chapa, altura_chapa
+    return float(sobra["largura"]), float(sobra["comprimento"])
+
+
 def _gerar_cyc(
     chapas: List[List[Dict]],
     saida: Path,
@@ -1000,6 +1140,7 @@ def _gerar_cyc(
         material = pecas[0].get("Material", "chapa") if pecas else "chapa"
         material = _sanitize_material_name(material)
         prefix = f"{i:03d}-{material}"
+        largura_placa, _ = _dimensoes_placa(pecas, largura_chapa, 0)
         root = ET.Element("CycleFile")
         for p in todas:
             cycle = ET.SubElement(root, "Cycle", Name="Cycle_Label")
@@ -1011,7 +1152,7 @@ def _gerar_cyc(
                     _invert_x(
                         p["x"],
                         p["Length"],
-                        largura_chapa,
+                        largura_placa,
                     )
                     + p["Length"] / 2
                 ),
@@ -1037,11 +1178,12 @@ def _gerar_xml_chapas(
 
     root = ET.Element("CycleFile")
 
-    orientacao = "Vertical" if largura_chapa >= altura_chapa else "Horizontal"
-    color_val = f"{orientacao}({altura_chapa/1000:.2f}X{largura_chapa/1000:.2f})"
     lote_fmt = nome_lote.replace("_", " ")
 
     for i, pecas in enumerate(chapas, start=1):
+        largura_placa, altura_placa = _dimensoes_placa(pecas, largura_chapa, altura_chapa)
+        orientacao = "Vertical" if largura_placa >= altura_placa else "Horizontal"
+        color_val = f"{orientacao}({altura_placa/1000:.2f}X{largura_placa/1000:.2f})"
         material = pecas[0].get("Material", "chapa") if pecas else "chapa"
         material = _sanitize_material_name(material)
         thickness = int(pecas[0].get("Thickness", 0)) if pecas else 0
@@ -1052,8 +1194,9 @@ def _gerar_xml_chapas(
         cycle = ET.SubElement(root, "Cycle", Name="Cycle_List")
         _add_field(cycle, "PlateID", f"{prefix}.nc")
         _add_field(cycle, "LabelName", f"{prefix}.cyc")
-        _add_field(cycle, "LargeImage", f"{prefix}_LargeImage.bmp")
-        _add_field(cycle, "SmallImage", f"{prefix}_SmallImage.bmp")
+        if NESTING_IMAGENS_BMP:
+            _add_field(cycle, "LargeImage", f"{prefix}_LargeImage.bmp")
+            _add_field(cycle, "SmallImage", f"{prefix}_SmallImage.bmp")
         _add_field(cycle, "Color", color_val)
         _add_field(cycle, "Thickness", str(thickness))
 
@@ -1066,6 +1209,92 @@ def _gerar_xml_chapas(
     tree.write(saida / f"{lote_fmt}.xml", encoding="utf-8", xml_declaration=True)
 
 
+# Tamanhos (largura, altura) das imagens BMP esperadas pela máquina
+TAMANHO_IMAGEM_GRANDE = (592, 890)
+TAMANHO_IMAGEM_PEQUENA = (122, 183)
+
+
+def _aneis_chapa(todas: List[Dict]) -> Tuple[np.ndarray, List[np.ndarray], np.ndarray]:
+    """Contornos de todas as peças/sobras de uma chapa em um único array.
+
+    Retorna ``(coords, aneis, dono)``: as coordenadas em mm, a lista de
+    anéis (fatias de ``coords``) e o índice em ``todas`` de cada anel. Peças
+    sem polígono usam o retângulo de ``x``/``y``/``Length``/``Width``.
+    """
+    geoms = [
+        p["polygon"]
+        if isinstance(p.get("polygon"), (Polygon, MultiPolygon))
+        else box(p["x"], p["y"], p["x"] + p["Length"], p["y"] + p["Width"])
+        for p in todas
+    ]
+    if not geoms:
+        return np.empty((0, 2)), [], np.empty(0, dtype=int)
+    partes, parte_geom = shapely.get_parts(geoms, return_index=True)
+    aneis, anel_parte = shapely.get_rings(partes, return_index=True)
+    coords, indice = shapely.get_coordinates(aneis, return_index=True)
+    cortes = np.flatnonzero(np.diff(indice)) + 1
+    return coords, np.split(coords, cortes), parte_geom[anel_parte]
+
+
+def _rasterizar_chapa(
+    coords: np.ndarray,
+    aneis: List[np.ndarray],
+    largura_placa: float,
+    altura_placa: float,
+    tamanho: Tuple[int, int],
+    config_maquina: Optional[Dict] = None,
+) -> Image.Image:
+    """Desenha os contornos direto no ``tamanho`` final, já orientado."""
+    ang = _parse_angle(config_maquina.get("anguloRotacaoChapa")) if config_maquina else 0
+    # Com rotação de 90/270 graus a imagem é desenhada "deitada" e girada
+    largura_img, altura_img = tamanho[::-1] if ang in (90, 270) else tamanho
+    img = Image.new("RGBA", (largura_img, altura_img), "white")
+    draw = ImageDraw.Draw(img)
+    escala = np.array([largura_img / largura_placa, -altura_img / altura_placa])
+    pixels = (np.array([0, altura_img]) + coords * escala).astype(np.int64)
+    inicio = 0
+    for anel in aneis:
+        fim = inicio + len(anel)
+        draw.polygon(pixels[inicio:fim].ravel().tolist(), outline="black")
+        inicio = fim
+    if config_maquina:
+        img = _apply_image_orientation(img, config_maquina)
+    return img
+
+
+def _svg_chapa(
+    todas: List[Dict],
+    aneis: List[np.ndarray],
+    dono: np.ndarray,
+    largura_placa: float,
+    altura_placa: float,
+) -> str:
+    """SVG vetorial da chapa em mm (origem no canto superior esquerdo)."""
+    caminhos: Dict[int, List[str]] = {}
+    for anel, idx in zip(aneis, dono.tolist()):
+        pts = np.round(anel * (1, -1) + (0, altura_placa), 2)
+        caminhos.setdefault(idx, []).append(
+            "M" + " ".join(map(str, pts.ravel().tolist())) + "Z"
+        )
+    linhas = [
+        '<svg xmlns="http://www.w3.org/2000/svg" '
+        f'viewBox="0 0 {largura_placa:g} {altura_placa:g}" '
+        f'width="{largura_placa:g}mm" height="{altura_placa:g}mm">',
+        f'<rect width="{largura_placa:g}" height="{altura_placa:g}" fill="white" stroke="black"/>',
+    ]
+    for idx, partes in caminhos.items():
+        p = todas[idx]
+        classe, cor = ("sobra", "#a3e635") if p.get("PartName") == "SB" else ("peca", "#60a5fa")
+        codigo = escape(str(p.get("Program1", "")), {'"': "&quot;"})
+        linhas.append(
+            f'<path class="{classe}" data-codigo="{codigo}" fill="{cor}" '
+            'fill-opacity="0.5" fill-rule="evenodd" stroke="black" '
+            f'vector-effect="non-scaling-stroke" d="{" ".join(partes)}"/>'
+        )
+    linhas.append("</svg>")
+    return "\n".join(linhas)
+
+
 def _gerar_imagens_chapas(
     chapas: List[List[Dict]],
     saida: Path,
@@ -1073,127 +1302,279 @@ def _gerar_imagens_chapas(
     altura_chapa: float,
     config_maquina: Optional[Dict] = None,
     sobras: Optional[List[List[Dict]]] = None,
+    inicio: int = 1,
 ) -> None:
-    escala = 800 / max(largura_chapa, altura_chapa)
-    largura_img = int(largura_chapa * escala)
-    altura_img = int(altura_chapa * escala)
-    tamanho_grande = (592, 890)
-    tamanho_pequeno = (122, 183)
-    for i, pecas in enumerate(chapas, start=1):
-        img = Image.new("RGBA", (largura_img, altura_img), "white")
-        draw = ImageDraw.Draw(img)
+    """Gera o SVG de cada chapa e, se habilitadas, as imagens BMP da máquina.
+
+    Os contornos são convertidos para NumPy de uma vez por chapa e os BMP
+    (grande e pequeno) são desenhados direto no tamanho final. ``inicio`` é
+    o número da primeira chapa de ``chapas`` (usado no nome dos arquivos
+    quando as chapas são divididas entre processos).
+    """
+    for i, pecas in enumerate(chapas, start=inicio):
+        largura_placa, altura_placa = _dimensoes_placa(pecas, largura_chapa, altura_chapa)
         todas = list(pecas)
-        if sobras and i - 1 < len(sobras):
-            todas.extend(sobras[i - 1])
-        for p in todas:
-            poly = p.get("polygon")
-            if isinstance(poly, (Polygon, MultiPolygon)):
-                geoms = [poly] if isinstance(poly, Polygon) else list(poly.geoms)
-                for geom in geoms:
-                    coords = [
-                        (
-                            int(c[0] * escala),
-                            altura_img - int(c[1] * escala),
-                        )
-                        for c in geom.exterior.coords
-                    ]
-                    draw.polygon(coords, outline="black")
-                    for interior in geom.interiors:
-                        coords = [
-                            (
-                                int(c[0] * escala),
-                                altura_img - int(c[1] * escala),
-                            )
-                            for c in interior.coords
-                        ]
-                        draw.polygon(coords, outline="black")
-            else:
-                x1 = int(p["x"] * escala)
-                y1 = int(p["y"] * escala)
-                x2 = int((p["x"] + p["Length"]) * escala)
-                y2 = int((p["y"] + p["Width"]) * escala)
-                y1 = altura_img - y1
-                y2 = altura_img - y2
-                draw.rectangle([x1, y2, x2, y1], outline="black", width=2)
-        if config_maquina:
-            img = _apply_image_orientation(img, config_maquina)
+        if sobras and i - inicio < len(sobras):
+            todas.extend(sobras[i - inicio])
+        coords, aneis, dono = _aneis_chapa(todas)
         material = pecas[0].get("Material", "chapa") if pecas else "chapa"
         material = _sanitize_material_name(material)
         prefix = f"{i:03d}-{material}"
-        img_large = img.resize(tamanho_grande)
-        img_small = img.resize(tamanho_pequeno)
-        img_large.save(saida / f"{prefix}_LargeImage.bmp")
-        img_small.save(saida / f"{prefix}_SmallImage.bmp")
+        (saida / f"{prefix}.svg").write_text(
+            _svg_chapa(todas, aneis, dono, largura_placa, altura_placa), encoding="utf-8"
+        )
+        if not NESTING_IMAGENS_BMP:
+            continue
+        for tamanho, nome in (
+            (TAMANHO_IMAGEM_GRANDE, "LargeImage"),
+            (TAMANHO_IMAGEM_PEQUENA, "SmallImage"),
+        ):
+            img = _rasterizar_chapa(
+                coords, aneis, largura_placa, altura_placa, tamanho, config_maquina
+            )
+            img.save(saida / f"{prefix}_{nome}.bmp")
 
 
-def _gerar_etiquetas(
-    chapas: List[List[Dict]],
-    saida: Path,
-    config_maquina: Optional[Dict] = None,
-    sobras: Optional[List[List[Dict]]] = None,
-) -> None:
-    if not config_maquina or not config_maquina.get("layoutEtiqueta"):
-        return
-    layout = config_maquina.get("layoutEtiqueta", [])
-    largura = float(config_maquina.get("tamanhoEtiquetadoraX", 50))
-    altura = float(config_maquina.get("tamanhoEtiquetadoraY", 30))
+# Etiquetas entregues por vez à thread que grava os arquivos
+ETIQUETAS_POR_LOTE = 64
+
+
+@functools.lru_cache(maxsize=None)
+def _fonte_etiqueta() -> ImageFont.ImageFont:
+    """Fonte das etiquetas, carregada uma vez por processo."""
+    return ImageFont.load_default()
+
+
+class _RenderizadorEtiqueta:
+    """Render labels from the machine layout, reusing canvas, font and text.
+
+    The blank label is created once and copied per piece; each field value
+    is rasterised once per layout position and then only pasted. Only the
+    last ``max_carimbos`` stamps are kept, so per-piece values do not grow
+    the cache.
+    """
+
     escala = 4
-    ext = _sanitize_extension(config_maquina.get("formatoImagemEtiqueta", "bmp"))
 
-    pecas = [pc for placa in chapas for pc in placa]
-    if sobras:
-        for s in sobras:
-            pecas.extend(s)
-    for p in pecas:
-        img = Image.new("RGB", (int(largura * escala), int(altura * escala)), "white")
-        draw = ImageDraw.Draw(img)
-        for item in layout:
-            campo = item.get("campo")
-            if not campo:
-                continue
-            valor = p.get(campo, "")
-            x = float(item.get("x", 0)) * escala
-            y = float(item.get("y", 0)) * escala
-            draw.text((x, y), str(valor), fill="black")
-        if config_maquina:
-            img = _apply_image_orientation(img, config_maquina)
-        nome = (
-            p.get("Program1")
-            or Path(p.get("Filename", p.get("PartName", "etiqueta"))).stem
+    def __init__(self, config_maquina: Dict):
+        self.config_maquina = config_maquina
+        largura = float(config_maquina.get("tamanhoEtiquetadoraX", 50))
+        altura = float(config_maquina.get("tamanhoEtiquetadoraY", 30))
+        self.fundo = Image.new(
+            "RGB", (int(largura * self.escala), int(altura * self.escala)), "white"
+        )
+        self.campos = [
+            (
+                item["campo"],
+                float(item.get("x", 0)) * self.escala,
+                float(item.get("y", 0)) * self.escala,
+            )
+            for item in config_maquina.get("layoutEtiqueta", [])
+            if item.get("campo")
+        ]
+        self.max_carimbos = NESTING_ETIQUETA_CARIMBOS
+        self._carimbos: "OrderedDict[Tuple[str, float, float], Tuple]" = OrderedDict()
+        self._medida = ImageDraw.Draw(Image.new("L", (1, 1)))
+
+    def _carimbo(self, texto: str, x: float, y: float) -> Tuple:
+        chave = (texto, x, y)
+        carimbo = self._carimbos.get(chave)
+        if carimbo is not None:
+            self._carimbos.move_to_end(chave)
+            return carimbo
+        fonte = _fonte_etiqueta()
+        esquerda, topo, direita, base = self._medida.textbbox((x, y), texto, font=fonte)
+        # Máscara do tamanho do texto, deslocada por inteiros até ficar à
+        # esquerda e acima de (x, y): a parte fracionária (positiva) é mantida
+        # e o resultado é o mesmo de ``draw.text`` direto na etiqueta,
+        # inclusive com subpixel.
+        origem = (
+            math.floor(min(x, esquerda)) - 1,
+            math.floor(min(y, topo)) - 1,
+        )
+        mascara = Image.new(
+            "L", (math.ceil(direita) - origem[0] + 1, math.ceil(base) - origem[1] + 1), 0
         )
-        path = saida / f"{nome}.{ext}"
+        ImageDraw.Draw(mascara).text(
+            (x - origem[0], y - origem[1]), texto, fill=255, font=fonte
+        )
+        caixa = mascara.getbbox()
+        if caixa:
+            carimbo = (mascara.crop(caixa), (origem[0] + caixa[0], origem[1] + caixa[1]))
+        else:
+            carimbo = (None, None)
+        self._carimbos[chave] = carimbo
+        while len(self._carimbos) > self.max_carimbos:
+            self._carimbos.popitem(last=False)
+        return carimbo
+
+    def renderizar(self, p: Dict) -> Image.Image:
+        img = self.fundo.copy()
+        for campo, x, y in self.campos:
+            mascara, posicao = self._carimbo(str(p.get(campo, "")), x, y)
+            if mascara is not None:
+                img.paste((0, 0, 0), posicao, mascara)
+        return _apply_image_orientation(img, self.config_maquina)
+
+
+def _salvar_etiquetas(lote: List[Tuple[Image.Image, Path]]) -> None:
+    for img, path in lote:
         try:
             img.save(path)
         except ValueError:
-            img.save(saida / f"{nome}.bmp")
+            img.save(path.with_suffix(".bmp"))
 
 
-def _gerar_gcodes(
+def _gerar_etiquetas(
     chapas: List[List[Dict]],
     saida: Path,
-    largura_chapa: float,
-    altura_chapa: float,
+    config_maquina: Optional[Dict] = None,
+    sobras: Optional[List[List[Dict]]] = None,
+    inicio: int = 1,
+) -> None:
+    """Gera as etiquetas das peças e sobras.
+
+    Com ``etiquetasPorChapa`` igual a ``tiff`` ou ``pdf`` é gravado um arquivo
+    multipágina por chapa (``inicio`` é o número da primeira chapa); caso
+    contrário, uma imagem por peça no ``formatoImagemEtiqueta``.
+    """
+    if not config_maquina or not config_maquina.get("layoutEtiqueta"):
+        return
+    renderizador = _RenderizadorEtiqueta(config_maquina)
+
+    multipagina = str(config_maquina.get("etiquetasPorChapa") or "").strip().lower()
+    if multipagina in ("tif", "tiff", "pdf"):
+        for i, pecas in enumerate(chapas, start=inicio):
+            todas = list(pecas)
+            if sobras and i - inicio < len(sobras):
+                todas.extend(sobras[i - inicio])
+            if not todas:
+                continue
+            paginas = [renderizador.renderizar(p) for p in todas]
+            material = pecas[0].get("Material", "chapa") if pecas else "chapa"
+            prefix = f"{i:03d}-{_sanitize_material_name(material)}"
+            if multipagina == "pdf":
+                paginas[0].save(
+                    saida / f"{prefix}_Etiquetas.pdf",
+                    save_all=True,
+                    append_images=paginas[1:],
+                    resolution=25.4 * renderizador.escala,
+                )
+            else:
+                paginas[0].save(
+                    saida / f"{prefix}_Etiquetas.tif",
+                    save_all=True,
+                    append_images=paginas[1:],
+                    compression="tiff_lzw" if features.check("libtiff") else None,
+                )
+        return
+
+    ext = _sanitize_extension(config_maquina.get("formatoImagemEtiqueta", "bmp"))
+    pecas = [pc for placa in chapas for pc in placa]
+    if sobras:
+        for s in sobras:
+            pecas.extend(s)
+
+    # Uma única thread grava os lotes na ordem em que foram renderizados
+    with ThreadPoolExecutor(max_workers=1) as escritor:
+        pendentes = []
+        for n in range(0, len(pecas), ETIQUETAS_POR_LOTE):
+            lote = []
+            for p in pecas[n : n + ETIQUETAS_POR_LOTE]:
+                nome = (
+                    p.get("Program1")
+                    or Path(p.get("Filename", p.get("PartName", "etiqueta"))).stem
+                )
+                lote.append((renderizador.renderizar(p), saida / f"{nome}.{ext}"))
+            pendentes.append(escritor.submit(_salvar_etiquetas, lote))
+        for fut in pendentes:
+            fut.result()
+
+
+def _operacoes_chapa(
+    pecas: List[Dict],
+    sobras: List[Dict],
+    ferramentas: Optional[List[Dict]] = None,
+    config_layers: Optional[List[Dict]] = None,
+    pasta_lote: Optional[Path] = None,
+    largura_placa: Optional[float] = None,
+) -> List[Dict]:
+    """Operações de usinagem e contornos de uma chapa, sem ordenação.
+
+    Com ``largura_placa`` o eixo X é invertido como nos programas ``.nc``;
+    sem ela as coordenadas das peças são usadas diretamente.
+    """
+
+    def origem_x(p: Dict) -> float:
+        if largura_placa is None:
+            return p["x"]
+        return _invert_x(p["x"], p["Length"], largura_placa)
+
+    operacoes: List[Dict] = []
+    for p in pecas:
+        usinagens, contorno = _operacoes_peca(
+            p,
+            origem_x(p),
+            p["y"],
+            ferramentas,
+            _geometria_peca(p, pasta_lote),
+            config_layers,
+            tipo="PECAS",
+            rotated=p.get("rotated", False),
+            rotation_angle=p.get("rotationAngle", 90 if p.get("rotated") else 0),
+        )
+        operacoes.extend(usinagens)
+        operacoes.append(contorno)
+    for sobra in sobras:
+        _, contorno = _operacoes_peca(
+            sobra, origem_x(sobra), sobra["y"], ferramentas, tipo="Sobra"
+        )
+        contorno["sobra"] = True
+        operacoes.append(contorno)
+    return operacoes
+
+
+def _tempo_ciclo_chapa(
+    pecas: List[Dict],
+    sobras: List[Dict],
     ferramentas: Optional[List[Dict]] = None,
     config_layers: Optional[List[Dict]] = None,
     config_maquina: Optional[Dict] = None,
     pasta_lote: Optional[Path] = None,
-):
-    def substituir(texto: str, valores: dict) -> str:
-        for k, v in valores.items():
-            texto = texto.replace(f"[{k}]", str(v))
-        texto = re.sub(r"\[[^\[\]]+\]", "", texto)
-        return texto
+) -> Dict:
+    """Estimate the cycle time of a plate without writing its program.
 
-    data_criacao = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+    The operations are scheduled and emitted as in :func:`_gerar_gcodes`;
+    header, drilling and footer templates are left out.
+    """
+    troca_tpl = (
+        config_maquina.get("trocaFerramenta") if config_maquina else None
+    ) or DEFAULT_TROCA
+    inicio = (
+        _cfg_val(config_maquina, "xHoming"),
+        _cfg_val(config_maquina, "yHoming"),
+    )
+    sequencia = agendar_operacoes(
+        _operacoes_chapa(pecas, sobras, ferramentas, config_layers, pasta_lote), inicio
+    )
+    linhas, _, _ = _EmissorGcode(config_maquina, troca_tpl).emitir(sequencia)
+    estimador = EstimadorCiclo(ferramentas, config_maquina)
+    estimador.consumir(linhas)
+    return estimador.resultado()
 
-    try:
-        casas_dec = int(config_maquina.get("casasDecimais", 4)) if config_maquina else 4
-    except (TypeError, ValueError):
-        casas_dec = 4
 
-    def fmt(val: float) -> str:
-        return f"{float(val):.{casas_dec}f}"
+def _calcular_sobras_chapas(
+    chapas: List[List[Dict]],
+    largura_chapa: float,
+    altura_chapa: float,
+    config_maquina: Optional[Dict] = None,
+) -> List[List[Dict]]:
+    """Sobras aproveitáveis de cada chapa, com códigos sequenciais.
 
+    Os códigos (``Program1``) continuam a numeração das peças do lote, por
+    isso as sobras de todas as chapas são calculadas de uma vez antes da
+    geração dos arquivos.
+    """
     # Gerador de IDs sequenciais para sobras
     max_id = 0
     for placa in chapas:
@@ -1206,38 +1587,102 @@ def _gerar_gcodes(
                 max_id = val
     proximo_id = itertools.count(max_id + 1)
 
-    def coletar_ferramentas(pecas: List[Dict]) -> Tuple[List[str], Optional[Dict]]:
-        usadas: List[str] = []
-        primeira: Optional[Dict] = None
-        for p in pecas:
-            dxf_path = None
-            if pasta_lote and p.get("Filename"):
-                dxf_path = pasta_lote / p["Filename"]
-            _, last_tool, used = _gcode_peca(
-                p,
-                _invert_x(p.get("x", 0), p.get("Length", 0), largura_chapa),
-                p.get("y", 0),
-                ferramentas,
-                dxf_path,
-                config_layers,
-                config_maquina,
-                {"header": "", "troca": ""},
-                etapa="todas",
-                rotated=p.get("rotated", False),
-                orig_length=p.get("originalLength"),
-                orig_width=p.get("originalWidth"),
-                rotation_angle=p.get("rotationAngle", 90 if p.get("rotated") else 0),
+    sobras_por_chapa: List[List[Dict]] = []
+    for pecas in chapas:
+        material = pecas[0].get("Material", "chapa") if pecas else "chapa"
+        material = _sanitize_material_name(material)
+        thickness = int(float(pecas[0].get("Thickness", 0))) if pecas else 0
+        largura_placa, altura_placa = _dimensoes_placa(pecas, largura_chapa, altura_chapa)
+
+        # Margens de refilo configuradas para a máquina
+        ref_inf = _cfg_val(config_maquina, "refiloInferior", "refilo_inferior")
+        ref_sup = _cfg_val(config_maquina, "refiloSuperior", "refilo_superior")
+        ref_esq = _cfg_val(config_maquina, "refiloEsquerda", "refilo_esquerda")
+        ref_dir = _cfg_val(config_maquina, "refiloDireita", "refilo_direita")
+        area_larg = largura_placa - ref_esq - ref_dir
+        area_alt = altura_placa - ref_inf - ref_sup
+        espaco = (
+            float(config_maquina.get("espacoEntrePecas", 0)) if config_maquina else 0
+        )
+
+        # Geração de sobras nas bordas da chapa
+        # As posições das peças já incluem a margem de refilo. Para gerar as
+        # sobras corretamente precisamos considerar apenas a área útil da
+        # chapa (sem o refilo), por isso subtraímos o refilo das coordenadas
+        # absolutas das peças.
+        x_min = min((p["x"] - ref_esq for p in pecas), default=0)
+        y_min = min((p["y"] - ref_inf for p in pecas), default=0)
+        x_max = max((p["x"] - ref_esq + p["Length"] + espaco for p in pecas), default=0)
+        y_max = max((p["y"] - ref_inf + p["Width"] + espaco for p in pecas), default=0)
+
+        pecas_polys = [
+            box(p["x"], p["y"], p["x"] + p["Length"], p["y"] + p["Width"])
+            for p in pecas
+        ]
+
+        # As sobras devem considerar apenas a área útil da chapa, logo é
+        # necessário aplicar o deslocamento dos refilos nas coordenadas.
+        cut_l = max(0.0, x_min)
+        cut_b = max(0.0, y_min)
+        cut_r = min(area_larg, x_max)
+        cut_t = min(area_alt, y_max)
+        bordas = [
+            (ref_esq, ref_inf, cut_l, area_alt),
+            (ref_esq + cut_r, ref_inf, area_larg - cut_r, area_alt),
+            (ref_esq, ref_inf, area_larg, cut_b),
+            (ref_esq, ref_inf + cut_t, area_larg, area_alt - cut_t),
+        ]
+        sobras_chapa: List[Dict] = []
+        for g_rect in _extrair_sobras(
+            pecas_polys, bordas, ref_esq, ref_inf, area_larg, area_alt, espaco
+        ):
+            minx, miny, maxx, maxy = g_rect.bounds
+            sobras_chapa.append(
+                {
+                    "PartName": "SB",
+                    "Length": maxx - minx,
+                    "Width": maxy - miny,
+                    "Thickness": thickness,
+                    "Material": material,
+                    "Observacao": f"Sobra da chapa original {largura_placa}x{altura_placa}",
+                    "Filename": "",
+                    "Program1": f"{next(proximo_id):08d}",
+                    "x": minx,
+                    "y": miny,
+                    "polygon": g_rect,
+                }
             )
-            if used and primeira is None:
-                code = used[0].split(" - ", 1)[0]
-                primeira = next(
-                    (f for f in (ferramentas or []) if str(f.get("codigo")) == code),
-                    None,
-                )
-            for u in used:
-                if u not in usadas:
-                    usadas.append(u)
-        return usadas, primeira
+        sobras_por_chapa.append(sobras_chapa)
+    return sobras_por_chapa
+
+
+def _gerar_gcodes(
+    chapas: List[List[Dict]],
+    saida: Path,
+    largura_chapa: float,
+    altura_chapa: float,
+    ferramentas: Optional[List[Dict]] = None,
+    config_layers: Optional[List[Dict]] = None,
+    config_maquina: Optional[Dict] = None,
+    pasta_lote: Optional[Path] = None,
+    sobras: Optional[List[List[Dict]]] = None,
+):
+    """Write one ``.nc`` program per plate.
+
+    Returns ``(sobras, tempos)``: the scraps of each plate (computed here
+    when not given) and the estimated cycle time of each program.
+    """
+    substituir = _substituir
+
+    data_criacao = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+
+    try:
+        casas_dec = int(config_maquina.get("casasDecimais", 4)) if config_maquina else 4
+    except (TypeError, ValueError):
+        casas_dec = 4
+
+    def fmt(val: float) -> str:
+        return f"{float(val):.{casas_dec}f}"
 
     intro_tpl = (
         config_maquina.get("introducao") if config_maquina else None
@@ -1259,33 +1704,46 @@ def _gerar_gcodes(
         config_maquina.get("comandoFinalFuros") if config_maquina else None
     ) or DEFAULT_COMANDO_FUROS
 
-    sobras_por_chapa: List[List[Dict]] = []
+    emissor = _EmissorGcode(config_maquina, troca_tpl)
+    # As rotas de usinagem partem da posição de referência da máquina
+    inicio = (
+        _cfg_val(config_maquina, "xHoming"),
+        _cfg_val(config_maquina, "yHoming"),
+    )
+
+    if sobras is None:
+        sobras = _calcular_sobras_chapas(chapas, largura_chapa, altura_chapa, config_maquina)
+
+    tempos_por_chapa: List[Dict] = []
     for i, pecas in enumerate(chapas, start=1):
         material = pecas[0].get("Material", "chapa") if pecas else "chapa"
         material = _sanitize_material_name(material)
-        thickness = int(float(pecas[0].get("Thickness", 0))) if pecas else 0
         prefix = f"{i:03d}-{material}"
-
-        # Margens de refilo configuradas para a máquina
-        ref_inf = _cfg_val(config_maquina, "refiloInferior", "refilo_inferior")
-        ref_sup = _cfg_val(config_maquina, "refiloSuperior", "refilo_superior")
-        ref_esq = _cfg_val(config_maquina, "refiloEsquerda", "refilo_esquerda")
-        ref_dir = _cfg_val(config_maquina, "refiloDireita", "refilo_direita")
-        area_larg = largura_chapa - ref_esq - ref_dir
-        area_alt = altura_chapa - ref_inf - ref_sup
-        espaco = (
-            float(config_maquina.get("espacoEntrePecas", 0)) if config_maquina else 0
+        largura_placa, altura_placa = _dimensoes_placa(pecas, largura_chapa, altura_chapa)
+        sobras_chapa = sobras[i - 1]
+
+        # Todas as operações da chapa (peças e sobras) são agrupadas por
+        # ferramenta e ordenadas pelo sequenciador: furos, fresas e, por
+        # último, os contornos (menores antes das vizinhas maiores, sobras no final).
+        operacoes = _operacoes_chapa(
+            pecas, sobras_chapa, ferramentas, config_layers, pasta_lote, largura_placa
         )
+        sequencia = agendar_operacoes(operacoes, inicio)
 
-        lista_ferramentas, primeira_ferramenta = coletar_ferramentas(pecas)
+        lista_ferramentas: List[str] = []
+        for op in sequencia:
+            tool = op.get("tool")
+            desc = f"{tool.get('codigo')} - {tool.get('descricao','')}" if tool else None
+            if desc and desc not in lista_ferramentas:
+                lista_ferramentas.append(desc)
+        primeira_ferramenta = next((op["tool"] for op in sequencia if op.get("tool")), None)
 
         # Garantir que sempre haja uma ferramenta inicial para preencher o
-        # cabeçalho. Quando não há operações de furação (Broca) a
-        # função ``coletar_ferramentas`` pode retornar ``None``.
+        # cabeçalho, mesmo quando a chapa não possui operações com ferramenta.
         if primeira_ferramenta is None and ferramentas:
             primeira_ferramenta = ferramentas[0]
 
-        material_desc = f"{prefix} [{largura_chapa}mm X {altura_chapa}mm]"
+        material_desc = f"{prefix} [{largura_placa}mm X {altura_placa}mm]"
         valores_intro = {
             "CREATION_DATE_TIME": data_criacao,
             "POST_PROCESSOR_NAME": (
@@ -1294,23 +1752,20 @@ def _gerar_gcodes(
             "BATCH_NAME": pasta_lote.name if pasta_lote else "",
             "MATERIAL": material_desc,
             "X_LENGHT": fmt(
-                config_maquina.get("comprimentoX", largura_chapa)
+                config_maquina.get("comprimentoX", largura_placa)
                 if config_maquina
-                else largura_chapa
+                else largura_placa
             ),
             "Y_LENGHT": fmt(
-                config_maquina.get("comprimentoY", altura_chapa)
+                config_maquina.get("comprimentoY", altura_placa)
                 if config_maquina
-                else altura_chapa
+                else altura_placa
             ),
             "Z_LENGHT": fmt(
                 config_maquina.get("movimentacaoZ", 0) if config_maquina else 0
             ),
             "LIST_OF_USED_TOOLS": "\n".join(f"({t})" for t in lista_ferramentas),
         }
-        linhas = substituir(intro_tpl, valores_intro).splitlines()
-        linhas.append("")
-
         valores_header = {
             "T": primeira_ferramenta.get("codigo") if primeira_ferramenta else "",
             "TOOL_DESCRIPTION": (
@@ -1321,247 +1776,35 @@ def _gerar_gcodes(
             "YH": config_maquina.get("yHoming", "") if config_maquina else "",
             "CMD_EXTRA": _expand_cmd_extra(primeira_ferramenta),
         }
-        linhas.extend(substituir(header_tpl, valores_header).splitlines())
-        linhas.append("G90")
-        linhas.append("")
-        if config_maquina and config_maquina.get("furos"):
-            linhas.extend(
-                substituir(config_maquina["furos"], valores_header).splitlines()
-            )
-
-        last_tool = primeira_ferramenta
-        tpl_troca = {"header": "", "troca": troca_tpl}
-
-        furos_lines: List[str] = []
-        for p in pecas:
-            dxf_path = None
-            if pasta_lote and p.get("Filename"):
-                dxf_path = pasta_lote / p["Filename"]
-            codigo, last_tool, _ = _gcode_peca(
-                p,
-                _invert_x(p["x"], p["Length"], largura_chapa),
-                p["y"],
-                ferramentas,
-                dxf_path,
-                config_layers,
-                config_maquina,
-                tpl_troca,
-                tipo="PECAS",
-                etapa="furos",
-                ferramenta_atual=last_tool,
-                rotated=p.get("rotated", False),
-                orig_length=p.get("originalLength"),
-                orig_width=p.get("originalWidth"),
-                rotation_angle=p.get("rotationAngle", 90 if p.get("rotated") else 0),
-            )
-            furos_lines.extend(codigo.split("\n")[1:])
-        if last_tool and last_tool.get("tipo") == "Broca":
-            furos_lines.extend(str(cmd_furos).splitlines())
-
-        fresas_lines: List[str] = []
-        primeira_fresa = True
-        tem_fresa_por_peca: List[bool] = []
-        for p in pecas:
-            dxf_path = None
-            if pasta_lote and p.get("Filename"):
-                dxf_path = pasta_lote / p["Filename"]
-            codigo, last_tool, _ = _gcode_peca(
-                p,
-                _invert_x(p["x"], p["Length"], largura_chapa),
-                p["y"],
-                ferramentas,
-                dxf_path,
-                config_layers,
-                config_maquina,
-                tpl_troca,
-                tipo="PECAS",
-                etapa="fresas",
-                ferramenta_atual=last_tool,
-                rotated=p.get("rotated", False),
-                orig_length=p.get("originalLength"),
-                orig_width=p.get("originalWidth"),
-                rotation_angle=p.get("rotationAngle", 90 if p.get("rotated") else 0),
-            )
-            if codigo.strip():
-                tem_fresa = True
-            else:
-                tem_fresa = False
-            tem_fresa_por_peca.append(tem_fresa)
-            if primeira_fresa:
-                fresas_lines.extend(codigo.split("\n"))
-                primeira_fresa = False
-            else:
-                fresas_lines.extend(codigo.split("\n")[1:])
-
-        contorno_lines: List[str] = []
-        for idx, p in enumerate(pecas):
-            dxf_path = None
-            if pasta_lote and p.get("Filename"):
-                dxf_path = pasta_lote / p["Filename"]
-            codigo, last_tool, _ = _gcode_peca(
-                p,
-                _invert_x(p["x"], p["Length"], largura_chapa),
-                p["y"],
-                ferramentas,
-                dxf_path,
-                config_layers,
-                config_maquina,
-                tpl_troca,
-                tipo="PECAS",
-                etapa="contorno",
-                ferramenta_atual=last_tool,
-                rotated=p.get("rotated", False),
-                orig_length=p.get("originalLength"),
-                orig_width=p.get("originalWidth"),
-                rotation_angle=p.get("rotationAngle", 90 if p.get("rotated") else 0),
-            )
-            if tem_fresa_por_peca[idx]:
-                contorno_lines.extend(codigo.split("\n")[1:])
-            else:
-                contorno_lines.extend(codigo.split("\n"))
-
-        linhas.extend(furos_lines)
-        linhas.extend(fresas_lines)
-        linhas.extend(contorno_lines)
-
-        # Geração de sobras nas bordas da chapa
-        # As posições das peças já incluem a margem de refilo. Para gerar as
-        # sobras corretamente precisamos considerar apenas a área útil da
-        # chapa (sem o refilo), por isso subtraímos o refilo das coordenadas
-        # absolutas das peças.
-        x_min = min((p["x"] - ref_esq for p in pecas), default=0)
-        y_min = min((p["y"] - ref_inf for p in pecas), default=0)
-        x_max = max((p["x"] - ref_esq + p["Length"] + espaco for p in pecas), default=0)
-        y_max = max((p["y"] - ref_inf + p["Width"] + espaco for p in pecas), default=0)
-
-        pecas_polys = [
-            box(p["x"], p["y"], p["x"] + p["Length"], p["y"] + p["Width"])
-            for p in pecas
-        ]
-        pecas_union = unary_union(pecas_polys) if pecas_polys else None
-
-        sobras_chapa: List[Dict] = []
-        sobras_polys: List[Polygon] = []
-
-        def add_sobra(px: float, py: float, w: float, h: float):
-            nonlocal last_tool, sobras_polys
-            if w <= 0 or h <= 0:
-                return
-            nova = box(px, py, px + w, py + h)
-            if pecas_union:
-                nova = nova.difference(pecas_union)
-            for p_exist in sobras_polys:
-                nova = nova.difference(p_exist)
-                if nova.is_empty:
-                    return
-            geoms = [nova] if isinstance(nova, Polygon) else list(nova.geoms)
-            for g in geoms:
-                if pecas_union:
-                    g = g.difference(pecas_union)
-                if g.is_empty:
-                    continue
-                for g_rect in _retangulos_sobra(g):
-                    minx, miny, maxx, maxy = g_rect.bounds
-                    sobra = {
-                        "PartName": "SB",
-                        "Length": maxx - minx,
-                        "Width": maxy - miny,
-                        "Thickness": thickness,
-                        "Material": material,
-                        "Observacao": f"Sobra da chapa original {largura_chapa}x{altura_chapa}",
-                        "Filename": "",
-                        "Program1": f"{next(proximo_id):08d}",
-                        "x": minx,
-                        "y": miny,
-                        "polygon": g_rect,
-                    }
-                    codigo, last_tool, _ = _gcode_peca(
-                        sobra,
-                        _invert_x(sobra["x"], sobra["Length"], largura_chapa),
-                        sobra["y"],
-                        ferramentas,
-                        None,
-                        None,
-                        config_maquina,
-                        tpl_troca,
-                        tipo="Sobra",
-                        etapa="contorno",
-                        ferramenta_atual=last_tool,
-                        rotation_angle=0,
-                    )
-                    sobras_chapa.append(sobra)
-                    sobras_polys.append(g_rect)
-                    linhas.extend(codigo.split("\n"))
-
-        # As sobras devem considerar apenas a área útil da chapa, logo é
-        # necessário aplicar o deslocamento dos refilos nas coordenadas.
-        cut_l = max(0.0, x_min)
-        cut_b = max(0.0, y_min)
-        cut_r = min(area_larg, x_max)
-        cut_t = min(area_alt, y_max)
-
-        add_sobra(ref_esq, ref_inf, cut_l, area_alt)
-        add_sobra(ref_esq + cut_r, ref_inf, area_larg - cut_r, area_alt)
-        add_sobra(ref_esq, ref_inf, area_larg, cut_b)
-        add_sobra(ref_esq, ref_inf + cut_t, area_larg, area_alt - cut_t)
-
-        # Sobras internas (vazios entre peças)
-        internas = _calcular_sobras_polys(
-            pecas_polys, ref_esq, ref_inf, area_larg, area_alt, espaco
-        )
-
-        if sobras_polys:
-            internas = [g.difference(unary_union(sobras_polys)) for g in internas]
-        if pecas_union:
-            internas = [g.difference(pecas_union) for g in internas]
-        for g in internas:
-            if g.is_empty:
-                continue
-            geoms = [g] if isinstance(g, Polygon) else list(g.geoms)
-            for geom in geoms:
-                if pecas_union:
-                    geom = geom.difference(pecas_union)
-                if geom.is_empty:
-                    continue
-                for g_rect in _retangulos_sobra(geom):
-                    minx, miny, maxx, maxy = g_rect.bounds
-                    sobra = {
-                        "PartName": "SB",
-                        "Length": maxx - minx,
-                        "Width": maxy - miny,
-                        "Thickness": thickness,
-                        "Material": material,
-                        "Observacao": f"Sobra da chapa original {largura_chapa}x{altura_chapa}",
-                        "Filename": "",
-                        "Program1": f"{next(proximo_id):08d}",
-                        "x": minx,
-                        "y": miny,
-                        "polygon": g_rect,
-                    }
-                    codigo, last_tool, _ = _gcode_peca(
-                        sobra,
-                        _invert_x(sobra["x"], sobra["Length"], largura_chapa),
-                        sobra["y"],
-                        ferramentas,
-                        None,
-                        None,
-                        config_maquina,
-                        tpl_troca,
-                        tipo="Sobra",
-                        etapa="contorno",
-                        ferramenta_atual=last_tool,
-                        rotation_angle=0,
-                    )
-                    sobras_chapa.append(sobra)
-                    sobras_polys.append(g_rect)
-                    linhas.extend(codigo.split("\n"))
-
-        sobras_por_chapa.append(sobras_chapa)
-
-        linhas.extend(substituir(footer_tpl, valores_header).splitlines())
-        (saida / f"{prefix}.nc").write_text("\r\n".join(linhas), encoding="utf-8")
-
-    return sobras_por_chapa
+        # O programa é gravado em blocos, um por grupo de ferramenta
+        with open(
+            saida / f"{prefix}.nc", "w", encoding="utf-8", newline="", buffering=1 << 16
+        ) as arquivo:
+            estimador = EstimadorCiclo(ferramentas, config_maquina)
+            nc = _EscritorGcode(arquivo, estimador)
+            nc.escrever(substituir(intro_tpl, valores_intro).splitlines() + [""])
+            nc.escrever(substituir(header_tpl, valores_header).splitlines() + ["G90", ""])
+            if config_maquina and config_maquina.get("furos"):
+                nc.escrever(substituir(config_maquina["furos"], valores_header).splitlines())
+
+            last_tool = primeira_ferramenta
+            for _, grupo in itertools.groupby(
+                sequencia, key=lambda op: (_chave_ferramenta(op.get("tool")), bool(op.get("contorno")))
+            ):
+                grupo = list(grupo)
+                broca_antes = bool(last_tool and last_tool.get("tipo") == "Broca")
+                if broca_antes and (grupo[0].get("tool") or {}).get("tipo") != "Broca":
+                    # Fim das furações: desliga o magazine de furação
+                    nc.escrever(str(cmd_furos).splitlines())
+                linhas, last_tool, _ = emissor.emitir(grupo, last_tool)
+                nc.escrever(linhas)
+            if last_tool and last_tool.get("tipo") == "Broca":
+                nc.escrever(str(cmd_furos).splitlines())
+
+            nc.escrever(substituir(footer_tpl, valores_header).splitlines())
+        tempos_por_chapa.append(estimador.resultado())
+
+    return sobras, tempos_por_chapa
 
 
 def _encontrar_dxt(pasta: Path) -> Optional[Path]:
@@ -1573,7 +1816,7 @@ def _encontrar_dxt(pasta: Path) -> Optional[Path]:
 
 
 def _ops_from_dxf(
-    caminho: Path,
+    geometria: Union[PecaGeometria, Path],
     config_layers: Optional[List[Dict]] = None,
     ox: float = 0.0,
     oy: float = 0.0,
@@ -1582,18 +1825,16 @@ def _ops_from_dxf(
     orig_width: Optional[float] = None,
     include_unknown: bool = True,
 ) -> List[Dict]:
-    """Retorna operações encontradas no DXF em ``caminho``.
+    """Retorna operações encontradas na geometria da peça.
 
     Atualmente apenas círculos, linhas e polilinhas são considerados. O
     ``ox``/``oy`` é aplicado como offset para posicionar a operação dentro da
-    chapa.
+    chapa. Aceita também o caminho do DXF.
     """
     config_layers = config_layers or []
-    try:
-        doc = ezdxf.readfile(caminho)
-    except Exception:
-        return []
-    msp = doc.modelspace()
+    if not isinstance(geometria, PecaGeometria):
+        geometria = peca_geometria(geometria)
+    entidades = geometria.operacoes
     ops: List[Dict] = []
     next_id = 1
     if rotated:
@@ -1612,8 +1853,7 @@ def _ops_from_dxf(
         def rot_point(ax: float, ay: float) -> tuple[float, float]:
             return ax, ay
 
-    for ent in msp:
-        layer = str(ent.dxf.layer)
+    for tipo_ent, layer, dados in entidades:
         cfg = next(
             (
                 c
@@ -1624,10 +1864,10 @@ def _ops_from_dxf(
         )
         if not cfg and not include_unknown:
             continue
-        if ent.dxftype() == "CIRCLE":
-            r = float(ent.dxf.radius)
-            cx = float(ent.dxf.center.x) + ox
-            cy = float(ent.dxf.center.y) + oy
+        if tipo_ent == "CIRCLE":
+            r = dados[2]
+            cx = dados[0] + ox
+            cy = dados[1] + oy
             cx, cy = rot_point(cx, cy)
             ops.append(
                 {
@@ -1643,19 +1883,9 @@ def _ops_from_dxf(
                 }
             )
             next_id += 1
-        elif ent.dxftype() in {"LINE", "LWPOLYLINE", "POLYLINE"}:
-            points = []
-            if ent.dxftype() == "LINE":
-                points = [ent.dxf.start, ent.dxf.end]
-            elif ent.dxftype() == "POLYLINE":
-                points = [
-                    (float(v.dxf.location.x), float(v.dxf.location.y))
-                    for v in ent.vertices
-                ]
-            else:
-                points = list(ent.get_points("xy"))
-            if points:
-                pts = [(float(p[0]) + ox, float(p[1]) + oy) for p in points]
+        elif tipo_ent in {"LINE", "LWPOLYLINE", "POLYLINE"}:
+            if dados:
+                pts = [(pt[0] + ox, pt[1] + oy) for pt in dados]
                 pts = [rot_point(p[0], p[1]) for p in pts]
                 xs = [p[0] for p in pts]
                 ys = [p[1] for p in pts]
@@ -1705,17 +1935,75 @@ def _calcular_sobras_polys(
             for p in pecas_polys
         ]
 
-    if pecas_polys:
-        pecas_union = unary_union(pecas_polys)
-        sobra = chapa.difference(pecas_union)
-    else:
-        pecas_union = None
-        sobra = chapa
+    sobra = chapa.difference(unary_union(pecas_polys)) if pecas_polys else chapa
+    return [g for g in _componentes(sobra) if not g.is_empty]
+
 
-    geoms = [sobra] if isinstance(sobra, Polygon) else list(sobra.geoms)
-    if pecas_union:
-        geoms = [g.difference(pecas_union) for g in geoms]
-    return [g for g in geoms if not g.is_empty]
+def _componentes(geom) -> List[Polygon]:
+    """Return the polygons that make up ``geom`` (ignoring lines/points)."""
+    if isinstance(geom, Polygon):
+        return [geom]
+    return [g for g in getattr(geom, "geoms", []) if isinstance(g, Polygon)]
+
+
+def _extrair_sobras(
+    pecas_polys: List[Polygon],
+    bordas: List[Tuple[float, float, float, float]],
+    ref_esq: float,
+    ref_inf: float,
+    area_larg: float,
+    area_alt: float,
+    espaco: float = 0.0,
+) -> List[Polygon]:
+    """Retorna os retângulos de sobra de uma chapa, na ordem de extração.
+
+    Primeiro são avaliadas as faixas de borda (``bordas`` = ``(x, y, w, h)``)
+    e depois os vazios internos entre as peças. Cada candidata é recortada
+    apenas pelas peças que a tocam (consultadas em um ``STRtree``) e pela
+    união incremental das sobras já aceitas, evitando diferenças contra todas
+    as peças e sobras da chapa a cada passo.
+    """
+    arvore = STRtree(pecas_polys) if pecas_polys else None
+    aceitas: List[Polygon] = []
+    uniao_aceitas = None
+
+    def sem_pecas(geom):
+        if arvore is None:
+            return geom
+        proximas = arvore.query(geom, predicate="intersects")
+        if not len(proximas):
+            return geom
+        return geom.difference(unary_union([pecas_polys[i] for i in proximas]))
+
+    def sem_aceitas(geom):
+        if uniao_aceitas is None or not geom.intersects(uniao_aceitas):
+            return geom
+        return geom.difference(uniao_aceitas)
+
+    def aceitar(geom) -> None:
+        nonlocal uniao_aceitas
+        for componente in _componentes(geom):
+            if componente.is_empty:
+                continue
+            for rect in _retangulos_sobra(componente):
+                aceitas.append(rect)
+                uniao_aceitas = rect if uniao_aceitas is None else uniao_aceitas.union(rect)
+
+    for px, py, w, h in bordas:
+        if w <= 0 or h <= 0:
+            continue
+        nova = sem_aceitas(sem_pecas(box(px, py, px + w, py + h)))
+        if not nova.is_empty:
+            aceitar(nova)
+
+    # Sobras internas (vazios entre peças)
+    for g in _calcular_sobras_polys(
+        pecas_polys, ref_esq, ref_inf, area_larg, area_alt, espaco
+    ):
+        g = sem_pecas(sem_aceitas(g))
+        if not g.is_empty:
+            aceitar(g)
+    return aceitas
 
 
 def _carregar_estoque(materiais: List[str]) -> Dict[str, List[Dict]]:
@@ -1750,6 +2038,584 @@ def _carregar_estoque(materiais: List[str]) -> Dict[str, List[Dict]]:
     return estoque
 
 
+# Número de processos usados para aninhar os grupos de material em paralelo.
+NESTING_WORKERS = int(os.getenv("NESTING_WORKERS", str(os.cpu_count() or 1)))
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+
+
+def _obter_process_pool() -> ProcessPoolExecutor:
+    """Retorna o pool de processos compartilhado, criando-o sob demanda.
+
+    Usa o contexto ``spawn`` porque o backend mantém threads ativas
+    (servidor, workers do Deepnest) e ``fork`` não é seguro nesse cenário.
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=NESTING_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            atexit.register(_process_pool.shutdown, wait=False, cancel_futures=True)
+        return _process_pool
+
+
+def _descartar_process_pool() -> None:
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+def _executar_em_serie(
+    func, tarefas: List[Dict], progresso: Optional[Callable[..., None]]
+) -> List:
+    resultados: List = []
+    chapas = 0
+    for n, kw in enumerate(tarefas, 1):
+        resultados.append(func(**kw))
+        chapas += len(resultados[-1])
+        if progresso:
+            progresso("nesting", material=n, total_materiais=len(tarefas), chapas=chapas)
+    return resultados
+
+
+def _aguardar_materiais(futuros: List, progresso: Optional[Callable[..., None]]) -> List:
+    """Aguarda ``futuros`` reportando cada material concluído.
+
+    Se ``progresso`` levantar uma exceção (ex.: cancelamento do job), os
+    materiais ainda não iniciados são cancelados.
+    """
+    total = len(futuros)
+    chapas = 0
+    try:
+        for n, fut in enumerate(as_completed(futuros), 1):
+            chapas += len(fut.result())
+            if progresso:
+                progresso("nesting", material=n, total_materiais=total, chapas=chapas)
+    except BaseException:
+        for fut in futuros:
+            fut.cancel()
+        raise
+    return [f.result() for f in futuros]
+
+
+def _executar_por_material(
+    func,
+    tarefas: List[Dict],
+    engine: str,
+    progresso: Optional[Callable[..., None]] = None,
+) -> List:
+    """Executa ``func(**kwargs)`` para cada item de ``tarefas`` em paralelo.
+
+    Os resultados são devolvidos na mesma ordem de ``tarefas`` para que a
+    numeração das chapas continue determinística. Com o motor Deepnest o
+    trabalho pesado acontece nos processos Node, então threads bastam; os
+    motores em Python usam o pool de processos.
+    """
+    total = len(tarefas)
+    if progresso:
+        progresso("nesting", material=0, total_materiais=total, chapas=0)
+    if NESTING_WORKERS <= 1 or total <= 1:
+        return _executar_em_serie(func, tarefas, progresso)
+    if engine == "deepnest":
+        ex = ThreadPoolExecutor(max_workers=min(NESTING_WORKERS, total))
+        try:
+            return _aguardar_materiais([ex.submit(func, **kw) for kw in tarefas], progresso)
+        finally:
+            ex.shutdown(wait=False, cancel_futures=True)
+    try:
+        pool = _obter_process_pool()
+        return _aguardar_materiais([pool.submit(func, **kw) for kw in tarefas], progresso)
+    except BrokenProcessPool:
+        logging.warning("Pool de processos do nesting falhou; executando em série")
+        _descartar_process_pool()
+        return _executar_em_serie(func, tarefas, progresso)
+
+
+def _sem_geometria(placa: List[Dict]) -> List[Dict]:
+    """Cópia rasa das peças sem a geometria DXF (leve para outros processos)."""
+    return [{k: v for k, v in p.items() if k != "geometria"} for p in placa]
+
+
+def _gerar_artefatos(
+    chapas: List[List[Dict]],
+    saida: Path,
+    largura_chapa: float,
+    altura_chapa: float,
+    ferramentas: Optional[List[Dict]] = None,
+    config_layers: Optional[List[Dict]] = None,
+    config_maquina: Optional[Dict] = None,
+    pasta_lote: Optional[Path] = None,
+    progresso: Optional[Callable[..., None]] = None,
+) -> Tuple[List[List[Dict]], List[Dict]]:
+    """Gera ``.nc``, ``.cyc``, XML, imagens e etiquetas das chapas em paralelo.
+
+    As sobras são calculadas antes, já que todas as saídas dependem delas.
+    Programas, ``.cyc`` e XML rodam em threads; imagens e etiquetas são
+    divididas em blocos de chapas no pool de processos. Retorna
+    ``(sobras, tempos)`` como :func:`_gerar_gcodes`.
+    """
+    sobras = _calcular_sobras_chapas(chapas, largura_chapa, altura_chapa, config_maquina)
+    # As demais saídas recebem cópias: o gerador de G-code anexa a geometria
+    # às peças originais enquanto as outras etapas leem os dados.
+    leves = [_sem_geometria(placa) for placa in chapas]
+    nome_lote = pasta_lote.name if pasta_lote else saida.name
+
+    gcodes = (
+        chapas,
+        saida,
+        largura_chapa,
+        altura_chapa,
+        ferramentas,
+        config_layers,
+        config_maquina,
+        pasta_lote,
+        sobras,
+    )
+    etapas_thread = [
+        (_gerar_gcodes, gcodes),
+        (_gerar_cyc, (leves, saida, largura_chapa, sobras)),
+        (_gerar_xml_chapas, (leves, saida, largura_chapa, altura_chapa, nome_lote)),
+    ]
+    # Um bloco de chapas por processo para imagens e etiquetas
+    etapas_processo = []
+    por_bloco = max(1, math.ceil(len(chapas) / max(1, NESTING_WORKERS)))
+    for a in range(0, len(chapas), por_bloco):
+        b = a + por_bloco
+        imagens = (leves[a:b], saida, largura_chapa, altura_chapa, config_maquina, sobras[a:b], a + 1)
+        etapas_processo.append((_gerar_imagens_chapas, imagens))
+        if config_maquina and config_maquina.get("layoutEtiqueta"):
+            etapas_processo.append(
+                (_gerar_etiquetas, (leves[a:b], saida, config_maquina, sobras[a:b], a + 1))
+            )
+    total = len(etapas_thread) + len(etapas_processo)
+
+    def concluida(n: int) -> None:
+        if progresso:
+            progresso("artefatos", concluidas=n, total_etapas=total, chapas=len(chapas))
+
+    concluida(0)
+    if NESTING_WORKERS <= 1 or len(chapas) <= 1:
+        resultado = None
+        for n, (func, args) in enumerate(etapas_thread + etapas_processo, 1):
+            r = func(*args)
+            if func is _gerar_gcodes:
+                resultado = r
+            concluida(n)
+        return resultado
+
+    ex = ThreadPoolExecutor(max_workers=len(etapas_thread))
+    futuros = [ex.submit(func, *args) for func, args in etapas_thread]
+    try:
+        pool = _obter_process_pool()
+        futuros += [pool.submit(func, *args) for func, args in etapas_processo]
+    except BrokenProcessPool:
+        _descartar_process_pool()
+        pool = None
+    try:
+        feitos = 0
+        for fut in as_completed(futuros):
+            try:
+                fut.result()
+            except BrokenProcessPool:
+                # Refaz em série as etapas que estavam no pool quebrado
+                logging.warning("Pool de processos falhou; gerando imagens e etiquetas em série")
+                _descartar_process_pool()
+                pool = None
+                break
+            feitos += 1
+            concluida(feitos)
+        if pool is None:
+            for fut in futuros[len(etapas_thread):]:
+                fut.cancel()
+            for func, args in etapas_processo:
+                func(*args)
+            for fut in futuros[: len(etapas_thread)]:
+                fut.result()
+            concluida(total)
+    except BaseException:
+        for fut in futuros:
+            fut.cancel()
+        raise
+    finally:
+        ex.shutdown(wait=False, cancel_futures=True)
+    return futuros[0].result()
+
+
+# Parâmetros de cada tarefa de material que entram na chave do arranjo
+_PARAMETROS_ARRANJO = (
+    "material",
+    "cfg",
+    "estoque",
+    "espaco",
+    "area_larg",
+    "area_alt",
+    "config_maquina",
+    "config_layers",
+    "ferramentas",
+    "engine",
+)
+
+
+def _preparar_cache(
+    tarefas: List[Dict], lote: str, recalcular: bool, incremental: bool
+) -> None:
+    """Acrescenta a cada tarefa de ``_executar_por_material`` as chaves de cache.
+
+    A prévia e o nesting final montam as tarefas com os mesmos valores, então
+    compartilham o arranjo guardado.
+    """
+    for tarefa in tarefas:
+        parametros = [tarefa[k] for k in _PARAMETROS_ARRANJO]
+        tarefa["chave_cache"] = cache_nesting.chave_arranjo(tarefa["lista"], *parametros)
+        tarefa["chave_lote"] = cache_nesting.chave_lote(lote, *parametros)
+        tarefa["recalcular"] = recalcular
+        tarefa["incremental"] = incremental
+
+
+def _preparar_orcamento(
+    tarefas: List[Dict],
+    orcamento: Optional[float],
+    exigir_orcamento: bool,
+    progresso: Optional[Callable[..., None]],
+) -> None:
+    """Acrescenta às tarefas do Deepnest o orçamento de tempo da busca.
+
+    Com ``exigir_orcamento`` um arranjo guardado que tenha usado orçamento
+    menor é refeito. As tarefas do Deepnest rodam em threads, então também
+    recebem ``progresso`` para relatar as soluções parciais.
+    """
+    for tarefa in tarefas:
+        if tarefa["engine"] == "deepnest":
+            tarefa["orcamento"] = orcamento
+            tarefa["exigir_orcamento"] = exigir_orcamento
+            tarefa["progresso"] = progresso
+
+
+def _acompanhar_deepnest(
+    progresso: Optional[Callable[..., None]], material: str
+) -> Optional[Callable[[float], None]]:
+    """Relata em ``progresso`` o aproveitamento de cada solução parcial."""
+    if not progresso:
+        return None
+
+    def ao_melhorar(aproveitamento: float) -> None:
+        progresso("deepnest", material=material, aproveitamento=round(aproveitamento, 4))
+
+    return ao_melhorar
+
+
+def _rearranjar(
+    anteriores: List[List[Dict]],
+    pecas: List[Dict],
+    arranjar: Callable[[List[Dict]], List[List[Dict]]],
+) -> Optional[Tuple[List[List[Dict]], List[bool]]]:
+    """Reaproveita as placas de ``anteriores`` cujas peças continuam no lote.
+
+    Placas com alguma peça removida ou alterada são desfeitas; as peças que
+    restaram nelas e as peças novas são arranjadas de novo com ``arranjar``
+    (havendo apenas peças novas, elas completam a última placa). Retorna as
+    placas e, para cada uma, se foi refeita, ou ``None`` quando é preciso
+    refazer tudo (placa afetada em uma sobra de estoque).
+    """
+    faltam = Counter(p["_assinatura"] for p in pecas)
+    mantidas: List[List[Dict]] = []
+    afetadas: List[List[Dict]] = []
+    for placa in anteriores:
+        usadas = Counter(p.get("_assinatura") for p in placa)
+        if all(faltam[a] >= n for a, n in usadas.items()):
+            faltam -= usadas
+            mantidas.append(placa)
+        else:
+            afetadas.append(placa)
+    if any(placa and placa[0].get("sobraEstoque") for placa in afetadas):
+        return None
+    if +faltam and not afetadas and mantidas and not mantidas[-1][0].get("sobraEstoque"):
+        faltam += Counter(p["_assinatura"] for p in mantidas.pop())
+    restantes: List[Dict] = []
+    for p in pecas:
+        if faltam[p["_assinatura"]] > 0:
+            faltam[p["_assinatura"]] -= 1
+            restantes.append(p)
+    novas = arranjar(restantes) if restantes else []
+    return mantidas + novas, [False] * len(mantidas) + [True] * len(novas)
+
+
+def _arranjar_material(
+    pecas: List[Dict],
+    largura: float,
+    altura: float,
+    espaco: float,
+    rotacionar: bool,
+    estoque: Optional[List[Dict]],
+    config_maquina: Optional[Dict],
+    config_layers: Optional[List[Dict]],
+    ferramentas: Optional[List[Dict]],
+    engine: str,
+    chave_cache: Optional[str] = None,
+    chave_lote: Optional[str] = None,
+    recalcular: bool = False,
+    incremental: bool = False,
+    orcamento: Optional[float] = None,
+    exigir_orcamento: bool = False,
+    ao_melhorar: Optional[Callable[[float], None]] = None,
+) -> Tuple[List[List[Dict]], List[bool]]:
+    """``arranjar_poligonos`` reaproveitando os arranjos guardados em cache.
+
+    Retorna as placas e, para cada uma, se ela difere do último arranjo
+    guardado. Com ``recalcular`` o arranjo é refeito e substitui o guardado;
+    com ``incremental`` um arranjo anterior do mesmo lote (``chave_lote``) é
+    atualizado por ``_rearranjar`` em vez de refeito. Com
+    ``exigir_orcamento`` o arranjo guardado só é aceito se a busca usou pelo
+    menos ``orcamento`` segundos. As peças vindas do cache não trazem
+    ``geometria``; ela é recarregada por ``_geometria_peca``.
+    """
+
+    def arranjar(lista: List[Dict], sobras: Optional[List[Dict]]) -> List[List[Dict]]:
+        return arranjar_poligonos(
+            lista,
+            largura,
+            altura,
+            espaco,
+            rotacionar,
+            sobras,
+            config_maquina=config_maquina,
+            config_layers=config_layers,
+            ferramentas=ferramentas,
+            engine=engine,
+            orcamento=orcamento,
+            ao_melhorar=ao_melhorar,
+        )
+
+    if not chave_cache:
+        placas = arranjar(pecas, estoque)
+        return placas, [True] * len(placas)
+    guardado = None if recalcular else cache_nesting.obter(chave_cache)
+    if guardado is not None:
+        if not exigir_orcamento or (guardado["orcamento"] or 0) >= (orcamento or 0):
+            cache_nesting.gravar(chave_lote, chave_cache)
+            return guardado["placas"], [False] * len(guardado["placas"])
+        # Refinamento: busca mais longa sobre as mesmas peças
+        incremental = False
+    for p in pecas:
+        p["_assinatura"] = cache_nesting.assinatura_peca(p)
+    resultado = None
+    if incremental and not recalcular:
+        anteriores = cache_nesting.obter(cache_nesting.obter(chave_lote))
+        if anteriores:
+            resultado = _rearranjar(
+                anteriores["placas"], pecas, lambda lista: arranjar(lista, None)
+            )
+    if resultado is None:
+        placas = arranjar(pecas, estoque)
+        resultado = placas, [True] * len(placas)
+    cache_nesting.gravar(
+        chave_cache,
+        {
+            "placas": [_sem_geometria(placa) for placa in resultado[0]],
+            "orcamento": orcamento,
+        },
+    )
+    cache_nesting.gravar(chave_lote, chave_cache)
+    return resultado
+
+
+def _preview_material(
+    material: str,
+    lista: List[Dict],
+    cfg: Dict,
+    pasta: Path,
+    estoque: Optional[List[Dict]],
+    espaco: float,
+    ref_esq: float,
+    ref_inf: float,
+    area_larg: float,
+    area_alt: float,
+    ferramentas: Optional[List[Dict]],
+    config_layers: Optional[List[Dict]],
+    config_maquina: Optional[Dict],
+    engine: str,
+    chave_cache: Optional[str] = None,
+    chave_lote: Optional[str] = None,
+    recalcular: bool = False,
+    incremental: bool = False,
+    orcamento: Optional[float] = None,
+    exigir_orcamento: bool = False,
+    progresso: Optional[Callable[..., None]] = None,
+) -> List[Dict]:
+    """Aninha um grupo de material e monta as chapas da pré-visualização.
+
+    As chapas retornadas ainda não possuem ``id``/``codigo``; a numeração é
+    atribuída por quem junta os resultados de todos os materiais.
+    """
+    rot = False if cfg.get("possui_veio") else True
+    largura = float(cfg.get("comprimento", area_larg))
+    altura = float(cfg.get("largura", area_alt))
+
+    chapas_polys, alteradas = _arranjar_material(
+        lista,
+        largura,
+        altura,
+        espaco,
+        rot,
+        estoque,
+        config_maquina,
+        config_layers,
+        ferramentas,
+        engine,
+        chave_cache,
+        chave_lote,
+        recalcular,
+        incremental,
+        orcamento,
+        exigir_orcamento,
+        _acompanhar_deepnest(progresso, material),
+    )
+
+    ref_dir = _cfg_val(config_maquina, "refiloDireita", "refilo_direita")
+    ref_sup = _cfg_val(config_maquina, "refiloSuperior", "refilo_superior")
+
+    chapas: List[Dict] = []
+    for placa, alterada in zip(chapas_polys, alteradas):
+        if not placa:
+            continue
+        # Placas em sobras de estoque usam as medidas da própria sobra
+        sobra_estoque = placa[0].get("sobraEstoque")
+        largura_placa, altura_placa = largura, altura
+        area_larg_placa, area_alt_placa = area_larg, area_alt
+        if sobra_estoque:
+            largura_placa = float(sobra_estoque["comprimento"])
+            altura_placa = float(sobra_estoque["largura"])
+            area_larg_placa = largura_placa - ref_esq - ref_dir
+            area_alt_placa = altura_placa - ref_inf - ref_sup
+        operacoes: List[Dict] = []
+        x_min = 1e9
+        y_min = 1e9
+        x_max = 0.0
+        y_max = 0.0
+        op_id = 1
+        pecas_polys: List[Polygon] = []
+        pecas_chapa: List[Dict] = []
+        sobras_chapa: List[Dict] = []
+        for p in placa:
+            orig_l = float(p.get("originalLength", p.get("Length", 0)))
+            orig_w = float(p.get("originalWidth", p.get("Width", 0)))
+            p_x = float(p.get("x", 0)) + ref_esq
+            p_y = float(p.get("y", 0)) + ref_inf
+            w = float(p.get("Length", 0))
+            h = float(p.get("Width", 0))
+            rotated_piece = bool(p.get("rotated"))
+            pecas_chapa.append({**p, "x": p_x, "y": p_y})
+            operacoes.append(
+                {
+                    "id": op_id,
+                    "nome": p.get("PartName", f"Peca {op_id}"),
+                    "tipo": "Peca",
+                    "x": p_x,
+                    "y": p_y,
+                    "largura": w,
+                    "altura": h,
+                    "cliente": p.get("Client", ""),
+                    "ambiente": p.get("Project", ""),
+                    "rotacao": 90 if rotated_piece else 0,
+                    "polygon": affinity.translate(p.get("polygon"), xoff=ref_esq, yoff=ref_inf),
+                }
+            )
+            op_id += 1
+            if p.get("Filename") and config_layers:
+                dxf_ops = _ops_from_dxf(
+                    _geometria_peca(p, pasta),
+                    config_layers,
+                    p_x,
+                    p_y,
+                    rotated_piece,
+                    orig_l,
+                    orig_w,
+                )
+                for d in dxf_ops:
+                    d["id"] = op_id
+                    d["cliente"] = p.get("Client", "")
+                    d["ambiente"] = p.get("Project", "")
+                    operacoes.append(d)
+                    op_id += 1
+            x_min = min(x_min, p_x)
+            y_min = min(y_min, p_y)
+            x_max = max(x_max, p_x + w)
+            y_max = max(y_max, p_y + h)
+            pecas_polys.append(
+                affinity.translate(p.get("polygon"), xoff=ref_esq, yoff=ref_inf)
+            )
+
+        # Ajusta as sobras considerando o deslocamento das margens de refilo
+        cut_l = max(0.0, x_min)
+        cut_b = max(0.0, y_min)
+        cut_r = min(area_larg_placa, x_max)
+        cut_t = min(area_alt_placa, y_max)
+        bordas = [
+            (ref_esq, ref_inf, cut_l, area_alt_placa),
+            (ref_esq + cut_r, ref_inf, area_larg_placa - cut_r, area_alt_placa),
+            (ref_esq, ref_inf, area_larg_placa, cut_b),
+            (ref_esq, ref_inf + cut_t, area_larg_placa, area_alt_placa - cut_t),
+        ]
+        for g_rect in _extrair_sobras(
+            pecas_polys,
+            bordas,
+            ref_esq,
+            ref_inf,
+            area_larg_placa,
+            area_alt_placa,
+            espaco,
+        ):
+            minx, miny, maxx, maxy = g_rect.bounds
+            sobras_chapa.append(
+                {"x": minx, "y": miny, "Length": maxx - minx, "Width": maxy - miny}
+            )
+            operacoes.append(
+                {
+                    "id": op_id,
+                    "nome": "Sobra",
+                    "tipo": "Sobra",
+                    "x": minx,
+                    "y": miny,
+                    "largura": maxx - minx,
+                    "altura": maxy - miny,
+                    "coords": [
+                        [float(c[0]), float(c[1])]
+                        for c in g_rect.exterior.coords
+                    ],
+                }
+            )
+            op_id += 1
+
+        if operacoes:
+            desc_chapa = cfg.get("propriedade", material)
+            desc_chapa = f"{desc_chapa} ({int(largura_placa)} x {int(altura_placa)})"
+            chapa = {
+                "descricao": desc_chapa,
+                "temVeio": bool(cfg.get("possui_veio")),
+                "largura": largura_placa,
+                "altura": altura_placa,
+                "operacoes": operacoes,
+                "alterada": alterada,
+                "tempoCiclo": _tempo_ciclo_chapa(
+                    pecas_chapa,
+                    sobras_chapa,
+                    ferramentas,
+                    config_layers,
+                    config_maquina,
+                    pasta,
+                ),
+            }
+            if sobra_estoque:
+                chapa["sobraEstoque"] = dict(sobra_estoque)
+            chapas.append(_rotate_plate_cw(chapa))
+    return chapas
+
+
 def gerar_nesting_preview(
     pasta_lote: str,
     largura_chapa: float = 2750,
@@ -1758,10 +2624,31 @@ def gerar_nesting_preview(
     config_layers: Optional[List[Dict]] = None,
     config_maquina: Optional[Dict] = None,
     estoque: Optional[Dict[str, List[Dict]]] = None,
+    engine: str = NESTING_ENGINE,
+    progresso: Optional[Callable[..., None]] = None,
+    recalcular: bool = False,
+    incremental: bool = False,
+    orcamento: Optional[float] = None,
 ) -> List[Dict]:
-    """Gera apenas a disposição das chapas sem criar arquivos."""
+    """Gera apenas a disposição das chapas sem criar arquivos.
+
+    ``progresso(etapa, **info)`` é chamado a cada material concluído. A
+    prévia e os arranjos de cada material ficam em ``cache_nesting``; com
+    ``recalcular`` o nesting é refeito e o resultado substitui o guardado.
+    Com ``incremental`` apenas os materiais e as chapas afetados por
+    alterações no lote são refeitos (veja ``_rearranjar``). Cada chapa traz
+    ``alterada`` indicando se difere do último resultado guardado.
+
+    Com o Deepnest cada material tem ``orcamento`` segundos de busca
+    (padrão ``DEEPNEST_ORCAMENTO_PREVIEW``) e ``progresso("deepnest", ...)``
+    informa o aproveitamento das soluções parciais. Um arranjo guardado com
+    orçamento menor que o pedido é refeito, o que permite refinar a prévia.
+
+    ``pasta_lote`` pode ser a pasta extraída ou a ``PastaZip`` de
+    ``lote_zip.abrir_lote`` (leitura direto do zip).
+    """
 
-    pasta = Path(pasta_lote)
+    pasta = caminho_lote(pasta_lote)
     if not pasta.is_dir():
         raise FileNotFoundError(f"Pasta '{pasta_lote}' não encontrada")
 
@@ -1792,9 +2679,6 @@ def gerar_nesting_preview(
     if estoque is None:
         estoque = _carregar_estoque(list(pecas_por_material.keys()))
 
-    # Nesting poligonal via svgnest-python (não usa empacotamento retangular)
-    chapas: List[Dict] = []
-    idx = 1
     espaco = float(config_maquina.get("espacoEntrePecas", 0)) if config_maquina else 0
     ref_inf = _cfg_val(config_maquina, "refiloInferior", "refilo_inferior")
     ref_sup = _cfg_val(config_maquina, "refiloSuperior", "refilo_superior")
@@ -1803,187 +2687,158 @@ def gerar_nesting_preview(
     area_larg = largura_chapa - ref_esq - ref_dir
     area_alt = altura_chapa - ref_inf - ref_sup
 
-    for material, lista in pecas_por_material.items():
-        cfg = chapas_cfg.get(material, {})
-        rot = False if cfg.get("possui_veio") else True
-        largura = float(cfg.get("comprimento", area_larg))
-        altura = float(cfg.get("largura", area_alt))
+    # Cada grupo de material é independente e pode ser aninhado em paralelo
+    tarefas = [
+        {
+            "material": material,
+            "lista": lista,
+            "cfg": chapas_cfg.get(material, {}),
+            "pasta": pasta,
+            "estoque": estoque.get(material) if estoque else None,
+            "espaco": espaco,
+            "ref_esq": ref_esq,
+            "ref_inf": ref_inf,
+            "area_larg": area_larg,
+            "area_alt": area_alt,
+            "ferramentas": ferramentas,
+            "config_layers": config_layers,
+            "config_maquina": config_maquina,
+            "engine": engine,
+        }
+        for material, lista in pecas_por_material.items()
+    ]
+    _preparar_cache(tarefas, pasta.name, recalcular, incremental)
+    orcamento = orcamento or DEEPNEST_ORCAMENTO_PREVIEW or None
+    _preparar_orcamento(tarefas, orcamento, True, progresso)
+    chave_preview = cache_nesting.chave_preview(
+        [t["chave_cache"] for t in tarefas],
+        pecas,
+        pasta,
+        orcamento if engine == "deepnest" else None,
+    )
+    if not recalcular:
+        chapas = cache_nesting.obter(chave_preview)
+        if chapas is not None:
+            for chapa in chapas:
+                chapa["alterada"] = False
+            if progresso:
+                progresso("cache", chapas=len(chapas))
+            return chapas
+    resultados = _executar_por_material(_preview_material, tarefas, engine, progresso)
 
-        chapas_polys = arranjar_poligonos(
-            lista,
-            largura,
-            altura,
-            espaco,
-            rot,
-            estoque.get(material) if estoque else None,
-            config_maquina=config_maquina,
-            config_layers=config_layers,
-            ferramentas=ferramentas,
-        )
+    chapas: List[Dict] = []
+    idx = 1
+    for chapas_material in resultados:
+        for chapa in chapas_material:
+            chapas.append({"id": idx, "codigo": f"{idx:03d}", **chapa})
+            idx += 1
 
-        for placa in chapas_polys:
-            if not placa:
-                continue
-            operacoes: List[Dict] = []
-            sobras_polys: List[Polygon] = []
-            x_min = 1e9
-            y_min = 1e9
-            x_max = 0.0
-            y_max = 0.0
-            op_id = 1
-            pecas_polys: List[Polygon] = []
-            for p in placa:
-                orig_l = float(p.get("originalLength", p.get("Length", 0)))
-                orig_w = float(p.get("originalWidth", p.get("Width", 0)))
-                p_x = float(p.get("x", 0)) + ref_esq
-                p_y = float(p.get("y", 0)) + ref_inf
-                w = float(p.get("Length", 0))
-                h = float(p.get("Width", 0))
-                rotated_piece = bool(p.get("rotated"))
-                operacoes.append(
-                    {
-                        "id": op_id,
-                        "nome": p.get("PartName", f"Peca {op_id}"),
-                        "tipo": "Peca",
-                        "x": p_x,
-                        "y": p_y,
-                        "largura": w,
-                        "altura": h,
-                        "cliente": p.get("Client", ""),
-                        "ambiente": p.get("Project", ""),
-                        "rotacao": 90 if rotated_piece else 0,
-                        "polygon": affinity.translate(p.get("polygon"), xoff=ref_esq, yoff=ref_inf),
-                    }
-                )
-                op_id += 1
-                if p.get("Filename") and config_layers:
-                    dxf_ops = _ops_from_dxf(
-                        pasta / p["Filename"],
-                        config_layers,
-                        p_x,
-                        p_y,
-                        rotated_piece,
-                        orig_l,
-                        orig_w,
-                    )
-                    for d in dxf_ops:
-                        d["id"] = op_id
-                        d["cliente"] = p.get("Client", "")
-                        d["ambiente"] = p.get("Project", "")
-                        operacoes.append(d)
-                        op_id += 1
-                x_min = min(x_min, p_x)
-                y_min = min(y_min, p_y)
-                x_max = max(x_max, p_x + w)
-                y_max = max(y_max, p_y + h)
-                pecas_polys.append(
-                    affinity.translate(p.get("polygon"), xoff=ref_esq, yoff=ref_inf)
-                )
+    chapas = _serialize_chapas(chapas)
+    cache_nesting.gravar(chave_preview, chapas)
+    return chapas
 
-            pecas_union = unary_union(pecas_polys) if pecas_polys else None
-
-            def add_sobra(px: float, py: float, w: float, h: float):
-                nonlocal op_id, sobras_polys
-                if w <= 0 or h <= 0:
-                    return
-                nova = box(px, py, px + w, py + h)
-                if pecas_union:
-                    nova = nova.difference(pecas_union)
-                for p_exist in sobras_polys:
-                    nova = nova.difference(p_exist)
-                    if nova.is_empty:
-                        return
-                geoms = [nova] if isinstance(nova, Polygon) else list(nova.geoms)
-                for g in geoms:
-                    if pecas_union:
-                        g = g.difference(pecas_union)
-                    if g.is_empty:
-                        continue
-                    for g_rect in _retangulos_sobra(g):
-                        minx, miny, maxx, maxy = g_rect.bounds
-                        operacoes.append(
-                            {
-                                "id": op_id,
-                                "nome": "Sobra",
-                                "tipo": "Sobra",
-                                "x": minx,
-                                "y": miny,
-                                "largura": maxx - minx,
-                                "altura": maxy - miny,
-                                "coords": [
-                                    [float(c[0]), float(c[1])]
-                                    for c in g_rect.exterior.coords
-                                ],
-                            }
-                        )
-                        sobras_polys.append(g_rect)
-                        op_id += 1
-
-            # Ajusta as sobras considerando o deslocamento das margens de refilo
-            cut_l = max(0.0, x_min)
-            cut_b = max(0.0, y_min)
-            cut_r = min(area_larg, x_max)
-            cut_t = min(area_alt, y_max)
-
-            add_sobra(ref_esq, ref_inf, cut_l, area_alt)
-            add_sobra(ref_esq + cut_r, ref_inf, area_larg - cut_r, area_alt)
-            add_sobra(ref_esq, ref_inf, area_larg, cut_b)
-            add_sobra(ref_esq, ref_inf + cut_t, area_larg, area_alt - cut_t)
-
-            # Sobras internas
-            internas = _calcular_sobras_polys(
-                pecas_polys, ref_esq, ref_inf, area_larg, area_alt, espaco
-            )
 
-            if sobras_polys:
-                internas = [g.difference(unary_union(sobras_polys)) for g in internas]
-            if pecas_union:
-                internas = [g.difference(pecas_union) for g in internas]
-            for g in internas:
-                if g.is_empty:
-                    continue
-                geoms = [g] if isinstance(g, Polygon) else list(g.geoms)
-                for geom in geoms:
-                    if pecas_union:
-                        geom = geom.difference(pecas_union)
-                    if geom.is_empty:
-                        continue
-                    for g_rect in _retangulos_sobra(geom):
-                        minx, miny, maxx, maxy = g_rect.bounds
-                        operacoes.append(
-                            {
-                                "id": op_id,
-                                "nome": "Sobra",
-                                "tipo": "Sobra",
-                                "x": minx,
-                                "y": miny,
-                                "largura": maxx - minx,
-                                "altura": maxy - miny,
-                                "coords": [
-                                    [float(c[0]), float(c[1])]
-                                    for c in g_rect.exterior.coords
-                                ],
-                            }
-                        )
-                        sobras_polys.append(g_rect)
-                        op_id += 1
-
-            if operacoes:
-                desc_chapa = cfg.get("propriedade", material)
-                desc_chapa = f"{desc_chapa} ({int(largura)} x {int(altura)})"
-                chapa = {
-                    "id": idx,
-                    "codigo": f"{idx:03d}",
-                    "descricao": desc_chapa,
-                    "temVeio": bool(cfg.get("possui_veio")),
-                    "largura": largura,
-                    "altura": altura,
-                    "operacoes": operacoes,
-                }
-                chapas.append(_rotate_plate_cw(chapa))
-                idx += 1
+def _nesting_material(
+    material: str,
+    lista: List[Dict],
+    cfg: Dict,
+    estoque: Optional[List[Dict]],
+    espaco: float,
+    ref_esq: float,
+    ref_inf: float,
+    area_larg: float,
+    area_alt: float,
+    ferramentas: Optional[List],
+    config_layers: Optional[List[Dict]],
+    config_maquina: Optional[Dict],
+    engine: str,
+    chave_cache: Optional[str] = None,
+    chave_lote: Optional[str] = None,
+    recalcular: bool = False,
+    incremental: bool = False,
+    orcamento: Optional[float] = None,
+    exigir_orcamento: bool = False,
+    progresso: Optional[Callable[..., None]] = None,
+) -> List[List[Dict]]:
+    """Aninha um grupo de material para o nesting final."""
+    rot = False if cfg.get("possui_veio") else True
+    largura = float(cfg.get("comprimento", area_larg))
+    altura = float(cfg.get("largura", area_alt))
+    chapas_polys, _ = _arranjar_material(
+        lista,
+        largura,
+        altura,
+        espaco,
+        rot,
+        estoque,
+        config_maquina,
+        config_layers,
+        ferramentas,
+        engine,
+        chave_cache,
+        chave_lote,
+        recalcular,
+        incremental,
+        orcamento,
+        exigir_orcamento,
+        _acompanhar_deepnest(progresso, material),
+    )
+    placas: List[List[Dict]] = []
+    for placa in chapas_polys:
+        for p in placa:
+            p["x"] += ref_esq
+            p["y"] += ref_inf
+            p["Material"] = material
+        if placa:
+            placas.append(_rotate_placa_cw(placa, largura))
+    return placas
+
+
+def _placas_para_preview(
+    chapas: List[List[Dict]],
+    sobras: List[List[Dict]],
+    largura_chapa: float,
+    altura_chapa: float,
+    tempos: Optional[List[Dict]] = None,
+) -> List[Dict]:
+    """Monta, a partir das placas finais, as chapas no formato da prévia.
 
-    return _serialize_chapas(chapas)
+    ``tempos`` traz o tempo de ciclo estimado de cada programa ``.nc``.
+    """
+    resultado: List[Dict] = []
+    for i, pecas in enumerate(chapas, start=1):
+        largura_placa, altura_placa = _dimensoes_placa(pecas, largura_chapa, altura_chapa)
+        operacoes: List[Dict] = []
+        todas = list(pecas) + list(sobras[i - 1] if i - 1 < len(sobras) else [])
+        for op_id, p in enumerate(todas, start=1):
+            sobra = p.get("PartName") == "SB"
+            operacoes.append(
+                {
+                    "id": op_id,
+                    "nome": "Sobra" if sobra else p.get("PartName", f"Peca {op_id}"),
+                    "tipo": "Sobra" if sobra else "Peca",
+                    "x": float(p.get("x", 0)),
+                    "y": float(p.get("y", 0)),
+                    "largura": float(p.get("Length", 0)),
+                    "altura": float(p.get("Width", 0)),
+                    "polygon": p.get("polygon"),
+                }
+            )
+        material = pecas[0].get("Material", "chapa") if pecas else "chapa"
+        chapa = {
+            "id": i,
+            "codigo": f"{i:03d}",
+            "descricao": f"{material} ({int(altura_placa)} x {int(largura_placa)})",
+            "largura": largura_placa,
+            "altura": altura_placa,
+            "operacoes": operacoes,
+        }
+        if tempos and i - 1 < len(tempos):
+            chapa["tempoCiclo"] = tempos[i - 1]
+        if pecas and pecas[0].get("sobraEstoque"):
+            chapa["sobraEstoque"] = dict(pecas[0]["sobraEstoque"])
+        resultado.append(chapa)
+    return _serialize_chapas(resultado)
 
 
 def gerar_nesting(
@@ -1994,8 +2849,27 @@ def gerar_nesting(
     config_layers: Optional[List[Dict]] = None,
     config_maquina: Optional[Dict] = None,
     estoque: Optional[Dict[str, List[Dict]]] = None,
+    engine: str = NESTING_ENGINE,
+    progresso: Optional[Callable[..., None]] = None,
+    recalcular: bool = False,
+    incremental: bool = False,
+    orcamento: Optional[float] = None,
+    pasta_saida: Optional[Path] = None,
 ) -> tuple[str, List[List[Dict]], List[List[Dict]]]:
-    pasta = Path(pasta_lote)
+    """Executa o nesting definitivo e gera os arquivos da máquina.
+
+    O arranjo de cada material é o mesmo da última prévia com os mesmos
+    parâmetros (``cache_nesting``), a não ser que ``recalcular`` seja
+    informado. ``incremental`` tem o mesmo efeito de ``gerar_nesting_preview``.
+    Materiais sem arranjo guardado usam ``DEEPNEST_ORCAMENTO_FINAL`` segundos
+    de busca no Deepnest; um ``orcamento`` explícito também refaz os arranjos
+    guardados com orçamento menor.
+
+    Os arquivos são gravados em ``pasta_saida`` (padrão ``<pasta>/nesting``).
+    Com o lote lido direto do zip (``PastaZip``) o padrão é uma pasta
+    temporária ``<tmp>/<lote>/nesting``.
+    """
+    pasta = caminho_lote(pasta_lote)
     if not pasta.is_dir():
         raise FileNotFoundError(f"Pasta '{pasta_lote}' não encontrada")
     dxt_path = _encontrar_dxt(pasta)
@@ -2033,35 +2907,42 @@ def gerar_nesting(
     area_larg = largura_chapa - ref_esq - ref_dir
     area_alt = altura_chapa - ref_inf - ref_sup
 
-    # Nesting poligonal via svgnest-python (não usa empacotamento retangular)
-    chapas: List[List[Dict]] = []
-    for material, lista in pecas_por_material.items():
-        cfg = chapas_cfg.get(material, {})
-        rot = False if cfg.get("possui_veio") else True
-        largura = float(cfg.get("comprimento", area_larg))
-        altura = float(cfg.get("largura", area_alt))
-        chapas_polys = arranjar_poligonos(
-            lista,
-            largura,
-            altura,
-            espaco,
-            rot,
-            estoque.get(material) if estoque else None,
-            config_maquina=config_maquina,
-            config_layers=config_layers,
-            ferramentas=ferramentas,
-        )
-        for placa in chapas_polys:
-            for p in placa:
-                p["x"] += ref_esq
-                p["y"] += ref_inf
-                p["Material"] = material
-            if placa:
-                chapas.append(_rotate_placa_cw(placa, largura))
-
-    pasta_saida = pasta / "nesting"
-    pasta_saida.mkdir(exist_ok=True)
-    sobras = _gerar_gcodes(
+    tarefas = [
+        {
+            "material": material,
+            "lista": lista,
+            "cfg": chapas_cfg.get(material, {}),
+            "estoque": estoque.get(material) if estoque else None,
+            "espaco": espaco,
+            "ref_esq": ref_esq,
+            "ref_inf": ref_inf,
+            "area_larg": area_larg,
+            "area_alt": area_alt,
+            "ferramentas": ferramentas,
+            "config_layers": config_layers,
+            "config_maquina": config_maquina,
+            "engine": engine,
+        }
+        for material, lista in pecas_por_material.items()
+    ]
+    _preparar_cache(tarefas, pasta.name, recalcular, incremental)
+    _preparar_orcamento(
+        tarefas,
+        orcamento or DEEPNEST_ORCAMENTO_FINAL or None,
+        orcamento is not None,
+        progresso,
+    )
+    resultados = _executar_por_material(_nesting_material, tarefas, engine, progresso)
+    chapas: List[List[Dict]] = [placa for placas in resultados for placa in placas]
+
+    if pasta_saida is None:
+        if isinstance(pasta, Path):
+            pasta_saida = pasta / "nesting"
+        else:
+            pasta_saida = Path(tempfile.mkdtemp(prefix="nesting_")) / pasta.name / "nesting"
+    pasta_saida.mkdir(parents=True, exist_ok=True)
+
+    sobras, tempos = _gerar_artefatos(
         chapas,
         pasta_saida,
         altura_chapa,
@@ -2069,28 +2950,11 @@ def gerar_nesting(
         ferramentas,
         config_layers,
         config_maquina,
-        Path(pasta_lote),
+        pasta,
+        progresso,
     )
-    _gerar_cyc(chapas, pasta_saida, altura_chapa, sobras)
-    _gerar_xml_chapas(
-        chapas,
-        pasta_saida,
-        altura_chapa,
-        largura_chapa,
-        pasta.name,
-    )
-    _gerar_imagens_chapas(
-        chapas,
-        pasta_saida,
-        altura_chapa,
-        largura_chapa,
-        config_maquina,
-        sobras,
-    )
-    _gerar_etiquetas(
-        chapas,
-        pasta_saida,
-        config_maquina,
+    return (
+        str(pasta_saida),
         sobras,
+        _placas_para_preview(chapas, sobras, altura_chapa, largura_chapa, tempos),
     )
-    return str(pasta_saida), sobras, _serialize_chapas(chapas)
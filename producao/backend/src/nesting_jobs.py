@@ -0,0 +1,308 @@
+"""Fila assíncrona de jobs de nesting.
+
+Os endpoints de nesting executam trabalho pesado de CPU (arranjo, G-code,
+compactação e upload). Este módulo executa esse trabalho em um pool de
+threads separado do loop de eventos do FastAPI, expõe o progresso de cada
+job e permite cancelamento cooperativo: a função do job recebe um callback
+``progresso(etapa, **info)`` que levanta :class:`JobCancelado` quando o
+cancelamento foi solicitado.
+
+O estado de cada job também é gravado na tabela ``nestings`` (colunas
+``job_id``, ``tipo``, ``status``, ``progresso``, ``erro`` e ``resultado``)
+para que o status continue disponível após reinícios do backend. O
+resultado de uma prévia (chapas com todas as operações) não vai para o banco:
+fica em ``cache_nesting`` e a linha guarda só a quantidade de chapas e a chave
+da cache. Linhas finalizadas sem zip no bucket (prévias, erros e cancelamentos)
+são apagadas após ``NESTING_JOB_TTL``, como os jobs em memória.
+"""
+
+import json
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+import cache_nesting
+from database import PLACEHOLDER, get_db_connection, schema
+
+SCHEMA_PREFIX = f"{schema}." if schema else ""
+
+# Quantidade de jobs de nesting executados simultaneamente.
+NESTING_JOB_WORKERS = int(os.getenv("NESTING_JOB_WORKERS", "2"))
+# Jobs finalizados são mantidos em memória (e, sem zip, no banco) por este
+# tempo (segundos).
+NESTING_JOB_TTL = int(os.getenv("NESTING_JOB_TTL", "3600"))
+
+PENDENTE = "pendente"
+EXECUTANDO = "executando"
+CONCLUIDO = "concluido"
+ERRO = "erro"
+CANCELADO = "cancelado"
+FINALIZADOS = (CONCLUIDO, ERRO, CANCELADO)
+
+
+class JobCancelado(Exception):
+    """Levantada dentro do job quando o cancelamento foi solicitado."""
+
+
+class NestingJob:
+    """Estado de um job de nesting em execução ou finalizado."""
+
+    def __init__(self, tipo: str, lote: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.tipo = tipo
+        self.lote = lote
+        self.status = PENDENTE
+        self.progresso: Dict = {"etapa": "fila"}
+        self.resultado: Optional[Dict] = None
+        self.erro: Optional[str] = None
+        self.criado_em = datetime.now().isoformat()
+        self.finalizado_em: Optional[datetime] = None
+        self.nesting_id: Optional[int] = None
+        self._cancelar = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelamento_solicitado(self) -> bool:
+        return self._cancelar.is_set()
+
+    def reportar(self, etapa: str, **info) -> None:
+        """Atualiza o progresso e interrompe o job se foi cancelado."""
+        if self._cancelar.is_set():
+            raise JobCancelado(self.id)
+        with self._lock:
+            self.progresso = {"etapa": etapa, **info}
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            dados = {
+                "job_id": self.id,
+                "tipo": self.tipo,
+                "lote": self.lote,
+                "status": self.status,
+                "progresso": dict(self.progresso),
+                "criado_em": self.criado_em,
+            }
+            if self.nesting_id is not None:
+                dados["nesting_id"] = self.nesting_id
+            if self.erro:
+                dados["erro"] = self.erro
+            if self.status == CONCLUIDO:
+                dados["resultado"] = self.resultado
+            return dados
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_jobs: Dict[str, NestingJob] = {}
+_lock = threading.Lock()
+
+
+def _obter_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max(1, NESTING_JOB_WORKERS),
+                thread_name_prefix="nesting-job",
+            )
+        return _executor
+
+
+def _limpar_finalizados() -> None:
+    agora = datetime.now()
+    with _lock:
+        for job_id in [
+            j.id
+            for j in _jobs.values()
+            if j.finalizado_em
+            and (agora - j.finalizado_em).total_seconds() > NESTING_JOB_TTL
+        ]:
+            _jobs.pop(job_id, None)
+    limite = (agora - timedelta(seconds=NESTING_JOB_TTL)).isoformat()
+    try:
+        with get_db_connection() as conn:
+            conn.exec_driver_sql(
+                f"DELETE FROM {SCHEMA_PREFIX}nestings WHERE obj_key IS NULL "
+                f"AND status IN ({PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}) "
+                f"AND COALESCE(finalizado_em, criado_em) < {PLACEHOLDER}",
+                (*FINALIZADOS, limite),
+            )
+            conn.commit()
+    except Exception as e:
+        logging.warning("Falha ao remover jobs de nesting finalizados: %s", e)
+
+
+def _registrar_db(job: NestingJob) -> None:
+    try:
+        with get_db_connection() as conn:
+            job.nesting_id = conn.exec_driver_sql(
+                f"INSERT INTO {SCHEMA_PREFIX}nestings (lote, criado_em, job_id, tipo, status, progresso) "
+                f"VALUES ({', '.join([PLACEHOLDER] * 6)}) RETURNING id",
+                (
+                    job.lote,
+                    job.criado_em,
+                    job.id,
+                    job.tipo,
+                    job.status,
+                    json.dumps(job.progresso),
+                ),
+            ).scalar()
+            conn.commit()
+    except Exception as e:
+        logging.warning("Falha ao registrar job de nesting %s: %s", job.id, e)
+
+
+def _resultado_db(job: NestingJob) -> Optional[Dict]:
+    """Resultado gravado na linha do job.
+
+    O do nesting final é pequeno (chave do zip no bucket). O da prévia vai
+    para ``cache_nesting``; a linha guarda a quantidade de chapas e a chave.
+    """
+    if job.status != CONCLUIDO or job.resultado is None:
+        return None
+    if job.tipo != "preview":
+        return job.resultado
+    chave_cache = cache_nesting.chave_job(job.id)
+    try:
+        cache_nesting.gravar(chave_cache, job.resultado)
+    except Exception as e:
+        logging.warning("Falha ao guardar a prévia do job %s: %s", job.id, e)
+        chave_cache = None
+    return {"chapas": len(job.resultado.get("chapas") or []), "cache": chave_cache}
+
+
+def _atualizar_db(job: NestingJob) -> None:
+    if job.nesting_id is None:
+        return
+    resultado = _resultado_db(job)
+    obj_key = (resultado or {}).get("pasta_resultado")
+    finalizado_em = job.finalizado_em.isoformat() if job.finalizado_em else None
+    try:
+        with get_db_connection() as conn:
+            conn.exec_driver_sql(
+                f"UPDATE {SCHEMA_PREFIX}nestings SET status={PLACEHOLDER}, progresso={PLACEHOLDER}, "
+                f"erro={PLACEHOLDER}, resultado={PLACEHOLDER}, obj_key=COALESCE({PLACEHOLDER}, obj_key), "
+                f"finalizado_em={PLACEHOLDER} WHERE id={PLACEHOLDER}",
+                (
+                    job.status,
+                    json.dumps(job.progresso),
+                    job.erro,
+                    json.dumps(resultado) if resultado is not None else None,
+                    obj_key,
+                    finalizado_em,
+                    job.nesting_id,
+                ),
+            )
+            conn.commit()
+    except Exception as e:
+        logging.warning("Falha ao atualizar job de nesting %s: %s", job.id, e)
+
+
+def _executar(job: NestingJob, func: Callable[..., Dict]) -> None:
+    if job.cancelamento_solicitado:
+        job.status = CANCELADO
+    else:
+        job.status = EXECUTANDO
+        _atualizar_db(job)
+        try:
+            job.reportar("iniciando")
+            resultado = func(job.reportar)
+            if isinstance(resultado, dict) and resultado.get("erro"):
+                job.erro = str(resultado["erro"])
+                job.status = ERRO
+            else:
+                job.resultado = resultado
+                job.status = CONCLUIDO
+        except JobCancelado:
+            job.status = CANCELADO
+        except Exception as e:
+            logging.exception("Job de nesting %s falhou", job.id)
+            job.erro = str(e)
+            job.status = ERRO
+    job.progresso = {**job.progresso, "etapa": job.status}
+    job.finalizado_em = datetime.now()
+    _atualizar_db(job)
+    logging.info("Job de nesting %s finalizado: %s", job.id, job.status)
+
+
+def submeter(
+    tipo: str, func: Callable[[Callable[..., None]], Dict], lote: Optional[str] = None
+) -> NestingJob:
+    """Agenda ``func(progresso)`` no pool e retorna o job criado."""
+    _limpar_finalizados()
+    job = NestingJob(tipo, lote)
+    _registrar_db(job)
+    with _lock:
+        _jobs[job.id] = job
+    _obter_executor().submit(_executar, job, func)
+    return job
+
+
+def obter(job_id: str) -> Optional[Dict]:
+    """Retorna o estado do job, consultando o banco se não estiver em memória."""
+    with _lock:
+        job = _jobs.get(job_id)
+    if job:
+        return job.to_dict()
+    try:
+        with get_db_connection() as conn:
+            row = (
+                conn.exec_driver_sql(
+                    f"SELECT id, lote, criado_em, job_id, tipo, status, progresso, erro, resultado "
+                    f"FROM {SCHEMA_PREFIX}nestings WHERE job_id={PLACEHOLDER}",
+                    (job_id,),
+                )
+                .mappings()
+                .first()
+            )
+    except Exception as e:
+        logging.warning("Falha ao consultar job de nesting %s: %s", job_id, e)
+        return None
+    if not row:
+        return None
+    dados = {
+        "job_id": row["job_id"],
+        "tipo": row["tipo"],
+        "lote": row["lote"],
+        "status": row["status"],
+        "progresso": json.loads(row["progresso"]) if row["progresso"] else {},
+        "criado_em": row["criado_em"],
+        "nesting_id": row["id"],
+    }
+    if row["erro"]:
+        dados["erro"] = row["erro"]
+    if row["status"] == CONCLUIDO and row["resultado"]:
+        resultado = json.loads(row["resultado"])
+        if row["tipo"] == "preview":
+            # Sem a cópia em cache (removida pelo limite) só resta o resumo
+            resultado = cache_nesting.obter(resultado.get("cache")) or resultado
+        dados["resultado"] = resultado
+    return dados
+
+
+def cancelar(job_id: str) -> Optional[Dict]:
+    """Solicita o cancelamento do job; retorna ``None`` se não existir."""
+    with _lock:
+        job = _jobs.get(job_id)
+    if not job:
+        return None
+    if job.status not in FINALIZADOS:
+        job._cancelar.set()
+    return job.to_dict()
+
+
+def marcar_interrompidos() -> None:
+    """Marca como erro os jobs que ficaram pendentes em uma execução anterior."""
+    try:
+        with get_db_connection() as conn:
+            conn.exec_driver_sql(
+                f"UPDATE {SCHEMA_PREFIX}nestings SET status={PLACEHOLDER}, erro={PLACEHOLDER} "
+                f"WHERE status IN ({PLACEHOLDER}, {PLACEHOLDER})",
+                (ERRO, "Job interrompido pelo reinício do servidor", PENDENTE, EXECUTANDO),
+            )
+            conn.commit()
+    except Exception as e:
+        logging.warning("Falha ao marcar jobs de nesting interrompidos: %s", e)
@@ -0,0 +1,227 @@
+"""Nesting bottom-left-fill baseado em no-fit polygons (NFP).
+
+Para cada peça e rotação a posição é escolhida entre os pontos candidatos
+da região viável: o retângulo interno da chapa (inner-fit rectangle) menos a
+união dos NFPs das peças já posicionadas. Entre os candidatos válidos vence
+o mais baixo e, em empate, o mais à esquerda.
+
+* O NFP de um par de formas é a soma de Minkowski ``A ⊕ (−B)``, calculada
+  sobre uma decomposição convexa das peças (a própria envoltória quando a
+  peça é praticamente convexa, senão triângulos de Delaunay restritos) e
+  guardado em cache por ``(forma, rotação, forma, rotação)``.
+* Os candidatos (vértices da região viável, vértices dos NFPs e cantos do
+  retângulo interno) são avaliados de uma vez com as funções vetorizadas do
+  shapely.
+* A união dos NFPs é mantida de forma incremental por forma/rotação em cada
+  chapa, recebendo apenas as peças posicionadas desde a última consulta.
+
+Não depende do Node.js; é o motor ``blf`` de ``nesting.arranjar_poligonos``.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import shapely
+from shapely import affinity
+from shapely.geometry import JOIN_STYLE, Polygon, box
+from shapely.ops import unary_union
+
+# Peças cuja área difere menos que isto da envoltória convexa são tratadas
+# como convexas no cálculo do NFP.
+TOLERANCIA_CONVEXA = 0.02
+# Distância abaixo da qual um candidato é considerado sobre a borda de um NFP.
+_TOL = 1e-6
+
+Posicao = Tuple[int, int, float, float]
+
+
+class _Forma:
+    """Peça rotacionada e normalizada (canto inferior esquerdo na origem)."""
+
+    __slots__ = ("chave", "poligono", "largura", "altura", "partes")
+
+    def __init__(self, poligono: Polygon, espaco: float):
+        minx, miny, maxx, maxy = poligono.bounds
+        self.poligono = affinity.translate(poligono, -minx, -miny)
+        self.largura = maxx - minx
+        self.altura = maxy - miny
+        coords = np.round(np.asarray(self.poligono.exterior.coords), 6)
+        self.chave = coords.tobytes()
+        contorno = Polygon(self.poligono.exterior)
+        if espaco > 0:
+            contorno = contorno.buffer(espaco / 2, join_style=JOIN_STYLE.mitre)
+        self.partes = _partes_convexas(contorno)
+
+
+def _partes_convexas(poligono: Polygon) -> List[np.ndarray]:
+    """Decompõe ``poligono`` em partes convexas (vértices de cada parte)."""
+    envoltoria = poligono.convex_hull
+    if envoltoria.area - poligono.area <= TOLERANCIA_CONVEXA * envoltoria.area:
+        return [np.asarray(envoltoria.exterior.coords)[:-1]]
+    triangulos = shapely.get_parts(shapely.constrained_delaunay_triangles(poligono))
+    return [np.asarray(t.exterior.coords)[:-1] for t in triangulos if t.area > 0]
+
+
+def no_fit_polygon(fixa: Sequence[np.ndarray], movel: Sequence[np.ndarray]):
+    """NFP da forma ``movel`` orbitando ``fixa`` (ambas na origem).
+
+    Posições do ponto de referência de ``movel`` no interior do resultado
+    fazem as formas se sobreporem; na borda elas apenas se tocam.
+    """
+    nuvens = [
+        (a[:, None, :] - b[None, :, :]).reshape(-1, 2) for a in fixa for b in movel
+    ]
+    cascos = shapely.convex_hull(shapely.multipoints(nuvens))
+    return unary_union(cascos)
+
+
+class _Chapa:
+    """Estado de uma chapa em preenchimento."""
+
+    def __init__(self, largura: float, altura: float):
+        self.largura = largura
+        self.altura = altura
+        self.posicionadas: List[Tuple[_Forma, float, float]] = []
+        # chave da forma móvel -> (peças já incluídas, união dos NFPs)
+        self._unioes: Dict[bytes, Tuple[int, object]] = {}
+
+    def uniao_nfp(self, forma: _Forma, nfps: "CacheNFP"):
+        incluidas, uniao = self._unioes.get(forma.chave, (0, None))
+        novas = [
+            affinity.translate(nfps.obter(fixa, forma), x, y)
+            for fixa, x, y in self.posicionadas[incluidas:]
+        ]
+        if novas:
+            if uniao is not None:
+                novas.append(uniao)
+            uniao = unary_union(novas)
+            self._unioes[forma.chave] = (len(self.posicionadas), uniao)
+        return uniao
+
+    def melhor_posicao(
+        self, forma: _Forma, nfps: "CacheNFP"
+    ) -> Optional[Tuple[float, float]]:
+        """Ponto mais abaixo/à esquerda onde ``forma`` cabe, ou ``None``."""
+        livre_x = self.largura - forma.largura
+        livre_y = self.altura - forma.altura
+        if livre_x < -_TOL or livre_y < -_TOL:
+            return None
+        livre_x = max(livre_x, 0.0)
+        livre_y = max(livre_y, 0.0)
+        interno = box(0, 0, livre_x, livre_y)
+        cantos = np.array(
+            [[0, 0], [livre_x, 0], [0, livre_y], [livre_x, livre_y]], dtype=float
+        )
+        uniao = self.uniao_nfp(forma, nfps)
+        if uniao is None:
+            return 0.0, 0.0
+
+        viavel = interno.difference(uniao)
+        candidatos = [cantos, shapely.get_coordinates(uniao)]
+        if not viavel.is_empty:
+            candidatos.append(shapely.get_coordinates(viavel))
+        pts = np.concatenate(candidatos)
+        dentro = (
+            (pts[:, 0] >= -_TOL)
+            & (pts[:, 1] >= -_TOL)
+            & (pts[:, 0] <= livre_x + _TOL)
+            & (pts[:, 1] <= livre_y + _TOL)
+        )
+        pts = np.unique(np.clip(pts[dentro], 0, [livre_x, livre_y]), axis=0)
+        if not len(pts):
+            return None
+        # Ordena de baixo para cima e da esquerda para a direita; só os
+        # pontos necessários são testados contra a união dos NFPs.
+        pts = pts[np.lexsort((pts[:, 0], pts[:, 1]))]
+        shapely.prepare(uniao)
+        borda = uniao.boundary
+        for inicio in range(0, len(pts), 256):
+            lote = shapely.points(pts[inicio : inicio + 256])
+            invalidos = shapely.contains_properly(uniao, lote)
+            if invalidos.any():
+                # Pontos sobre a borda (erro numérico) continuam válidos.
+                invalidos[invalidos] = shapely.distance(borda, lote[invalidos]) > _TOL
+            validos = np.flatnonzero(~invalidos)
+            if len(validos):
+                x, y = pts[inicio + validos[0]]
+                return float(x), float(y)
+        return None
+
+    def posicionar(self, forma: _Forma, x: float, y: float) -> None:
+        self.posicionadas.append((forma, x, y))
+
+
+class CacheNFP:
+    """NFPs por par de formas (cada forma já inclui a rotação)."""
+
+    def __init__(self):
+        self._nfps: Dict[Tuple[bytes, bytes], object] = {}
+
+    def obter(self, fixa: _Forma, movel: _Forma):
+        chave = (fixa.chave, movel.chave)
+        nfp = self._nfps.get(chave)
+        if nfp is None:
+            nfp = no_fit_polygon(fixa.partes, movel.partes)
+            self._nfps[chave] = nfp
+        return nfp
+
+    def __len__(self) -> int:
+        return len(self._nfps)
+
+
+def posicionar_blf(
+    poligonos: Sequence[Polygon],
+    largura: float,
+    altura: float,
+    espaco: float = 0.0,
+    rotacoes: Sequence[int] = (0,),
+    cache: Optional[CacheNFP] = None,
+) -> List[List[Posicao]]:
+    """Distribui ``poligonos`` em chapas ``largura`` x ``altura``.
+
+    As peças são tentadas na ordem recebida (first-fit); para cada uma é
+    escolhida a rotação com a posição mais baixa/à esquerda. Retorna, por
+    chapa, ``(índice, ângulo, x, y)`` com ``x``/``y`` do canto inferior
+    esquerdo da peça rotacionada. Peças que não cabem nem em uma chapa vazia
+    são ignoradas.
+    """
+    cache = cache if cache is not None else CacheNFP()
+    formas: Dict[Tuple[int, int], _Forma] = {}
+    por_chave: Dict[Tuple[bytes, int], _Forma] = {}
+    for idx, poly in enumerate(poligonos):
+        for ang in rotacoes:
+            forma = _Forma(affinity.rotate(poly, ang, origin=(0, 0)), espaco)
+            # Peças iguais compartilham a mesma instância (e os mesmos NFPs).
+            formas[idx, ang] = por_chave.setdefault((forma.chave, ang), forma)
+
+    restantes = list(range(len(poligonos)))
+    chapas: List[List[Posicao]] = []
+    while restantes:
+        chapa = _Chapa(largura, altura)
+        posicoes: List[Posicao] = []
+        sem_lugar: set = set()
+        nao_colocadas: List[int] = []
+        for idx in restantes:
+            melhor = None
+            for ang in rotacoes:
+                forma = formas[idx, ang]
+                if forma.chave in sem_lugar:
+                    continue
+                pos = chapa.melhor_posicao(forma, cache)
+                if pos is None:
+                    # A união só cresce: peças iguais também não cabem.
+                    sem_lugar.add(forma.chave)
+                    continue
+                if melhor is None or (pos[1], pos[0]) < (melhor[2], melhor[1]):
+                    melhor = (forma, pos[0], pos[1], ang)
+            if melhor is None:
+                nao_colocadas.append(idx)
+                continue
+            forma, x, y, ang = melhor
+            chapa.posicionar(forma, x, y)
+            posicoes.append((idx, ang, x, y))
+        if not posicoes:
+            break
+        chapas.append(posicoes)
+        restantes = nao_colocadas
+    return chapas
@@ -7,6 +7,8 @@ from datetime import datetime
 import os
 from pathlib import Path
 
+from dxf_cache import memorizar_dxf
+
 
 def parse_float(value, default=0.0):
     """Converte valores numéricos tratando vírgula e ponto."""
@@ -25,7 +27,7 @@ def fix_dxf_content(file_path):
     encodings_to_try = ['cp1252', 'latin-1', 'utf-8']
     for enc in encodings_to_try:
         try:
-            with open(file_path, 'r', encoding=enc) as f:
+            with file_path.open('r', encoding=enc) as f:
                 content = f.read()
             return content.replace(',', '.')
         except (UnicodeDecodeError, Exception):
@@ -34,6 +36,18 @@ def fix_dxf_content(file_path):
     return None
 
 def processar_dxf_producao(caminho_dxf, dimensoes_xml, is_porta=False):
+    """Extrai as operações do DXF, reaproveitando o cache por conteúdo."""
+    operacoes = memorizar_dxf(
+        caminho_dxf,
+        "operacoes_producao",
+        lambda: _processar_dxf_producao(caminho_dxf, dimensoes_xml, is_porta),
+        sorted(dimensoes_xml.items()),
+        bool(is_porta),
+    )
+    return [dict(op) for op in operacoes]
+
+
+def _processar_dxf_producao(caminho_dxf, dimensoes_xml, is_porta=False):
     corrected_content = fix_dxf_content(caminho_dxf)
     if corrected_content is None: return []
 
@@ -315,7 +329,7 @@ def inferir_operacoes_por_nome(nome, largura, comprimento):
 def parse_bpp_furos_topo(file_path, peca_largura):
     face1_holes_raw = []
     try:
-        with open(file_path, 'r', encoding='latin-1') as f: content = f.read()
+        with file_path.open('r', encoding='latin-1') as f: content = f.read()
     except Exception as e:
         print(f"   -> Erro ao ler arquivo BPP {file_path.name}: {e}")
         return []
@@ -0,0 +1,89 @@
+"""Formato binário compacto da prévia do nesting.
+
+A prévia (lista de chapas com as operações) vira um único buffer::
+
+    "NPV1" | uint32 n | cabeçalho JSON (n bytes, completado com espaços até
+    múltiplo de 4) | uint32 offsets[operações + 1] | float32 coords[pontos * 2]
+
+O cabeçalho é a própria prévia sem os ``coords`` das operações. Os contornos
+de todas as operações, na ordem chapa → operação, ficam em um só array
+``float32`` e ``offsets[i]:offsets[i + 1]`` são os pontos da operação ``i``
+(vazio quando ela não tem ``coords``). Tudo em little-endian, o que permite ao
+navegador ler os arrays com ``Float32Array``/``Uint32Array`` sem conversão.
+
+``float32`` guarda as coordenadas com ~0,001 mm de precisão em chapas de até
+alguns metros, suficiente para a visualização.
+"""
+
+import gzip
+import json
+from typing import Dict, List
+
+import numpy as np
+
+MAGICO = b"NPV1"
+TIPO_MIDIA = "application/vnd.nesting-preview"
+# Casas decimais das coordenadas ao converter de volta para JSON
+CASAS_DECIMAIS = 3
+
+
+def codificar_preview(chapas: List[Dict]) -> bytes:
+    """Serializa a prévia (já passada por ``_serialize_chapas``)."""
+    cabecalho: List[Dict] = []
+    offsets = [0]
+    blocos: List[np.ndarray] = []
+    for chapa in chapas:
+        operacoes = []
+        for op in chapa.get("operacoes", []):
+            op = dict(op)
+            coords = op.pop("coords", None)
+            if coords:
+                pontos = np.asarray(coords, dtype="<f4").reshape(-1, 2)
+                blocos.append(pontos)
+                offsets.append(offsets[-1] + len(pontos))
+            else:
+                offsets.append(offsets[-1])
+            operacoes.append(op)
+        cabecalho.append({**chapa, "operacoes": operacoes})
+    texto = json.dumps(cabecalho, separators=(",", ":")).encode("utf-8")
+    texto += b" " * (-len(texto) % 4)
+    coords = np.concatenate(blocos) if blocos else np.empty((0, 2), dtype="<f4")
+    return b"".join(
+        (
+            MAGICO,
+            np.uint32(len(texto)).astype("<u4").tobytes(),
+            texto,
+            np.asarray(offsets, dtype="<u4").tobytes(),
+            coords.astype("<f4", copy=False).tobytes(),
+        )
+    )
+
+
+def decodificar_preview(dados: bytes) -> List[Dict]:
+    """Reconstrói a prévia no formato JSON a partir de ``codificar_preview``."""
+    if dados[:4] != MAGICO:
+        raise ValueError("Formato de prévia desconhecido")
+    tamanho = int(np.frombuffer(dados, dtype="<u4", count=1, offset=4)[0])
+    inicio = 8 + tamanho
+    chapas = json.loads(dados[8:inicio])
+    total = sum(len(c.get("operacoes", [])) for c in chapas)
+    offsets = np.frombuffer(dados, dtype="<u4", count=total + 1, offset=inicio)
+    coords = np.frombuffer(dados, dtype="<f4", offset=inicio + 4 * (total + 1))
+    coords = np.round(coords.astype(float), CASAS_DECIMAIS).reshape(-1, 2)
+    i = 0
+    for chapa in chapas:
+        for op in chapa.get("operacoes", []):
+            a, b = int(offsets[i]), int(offsets[i + 1])
+            if b > a:
+                op["coords"] = coords[a:b].tolist()
+            i += 1
+    return chapas
+
+
+def comprimir(dados: bytes) -> bytes:
+    """Compacta com gzip (o mesmo conteúdo serve como ``Content-Encoding``)."""
+    return gzip.compress(dados, compresslevel=6, mtime=0)
+
+
+def descomprimir(dados: bytes) -> bytes:
+    return gzip.decompress(dados)
@@ -3,6 +3,7 @@ import tempfile
 import shutil
 from pathlib import Path
 
+from lote_zip import caminho_lote
 from nesting import _encontrar_dxt, _ler_dxt
 
 
@@ -13,7 +14,7 @@ def gerar_seccionadora_preview(pasta_lote: str, largura_chapa: float, altura_cha
     Retorna uma lista de chapas, cada uma contendo itens posicionados como dicionários
     com chaves: x, y, width, height, Material.
     """
-    pasta = Path(pasta_lote)
+    pasta = caminho_lote(pasta_lote)
     dxt = _encontrar_dxt(pasta)
     if not dxt:
         raise FileNotFoundError("Arquivo DXT não encontrado para seccionadora")
@@ -63,7 +64,7 @@ def gerar_seccionadora(pasta_lote: str, largura_chapa: float, altura_chapa: floa
     sobras (chapas restantes) e preview semelhante a gerar_seccionadora_preview.
     """
     preview = gerar_seccionadora_preview(pasta_lote, largura_chapa, altura_chapa, estoque_sel)
-    pasta_saida = Path(pasta_lote).name
+    pasta_saida = caminho_lote(pasta_lote).name
     pasta_resultado = Path(tempfile.mkdtemp(prefix=f"Seccionadora_{pasta_saida}_"))
     # Salva preview em JSON
     arquivo = pasta_resultado / "preview_seccionadora.json"
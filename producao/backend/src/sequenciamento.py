@@ -0,0 +1,213 @@
+"""Sequenciamento das operações de usinagem de uma chapa.
+
+As operações de todas as peças da chapa são agrupadas por ferramenta para
+reduzir as trocas: primeiro as furações (brocas), depois as demais usinagens
+e por último os contornos. Dentro de cada grupo a ordem é uma rota de vizinho
+mais próximo refinada com 2-opt, partindo do ponto onde o grupo anterior
+terminou, o que reduz o deslocamento rápido entre as operações.
+
+Um contorno só é cortado depois dos contornos menores vizinhos (a menos de
+``DISTANCIA_VIZINHA``), enquanto a chapa ainda segura as peças pequenas pelo
+vácuo, qualquer que seja a ferramenta de cada um: os contornos de todas as
+peças recebem um nível (um a mais que o maior nível dos vizinhos menores) e
+são cortados nível a nível; dentro de um nível são agrupados por ferramenta,
+começando pela que já está na máquina. Os contornos das sobras ficam para o
+final.
+"""
+
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Distância (mm) entre os retângulos de duas peças para serem vizinhas: a
+# menor tem o contorno cortado antes.
+DISTANCIA_VIZINHA = float(os.getenv("NESTING_DISTANCIA_VIZINHA", "50"))
+# Limite de passadas do 2-opt por grupo de operações.
+MAX_PASSADAS_2OPT = int(os.getenv("NESTING_2OPT_PASSADAS", "20"))
+
+Ponto = Tuple[float, float]
+
+
+def _chave_ferramenta(ferramenta: Optional[Dict]) -> str:
+    return str(ferramenta.get("codigo")) if ferramenta else ""
+
+
+def vizinho_mais_proximo(pontos: np.ndarray, inicio: Ponto) -> np.ndarray:
+    """Rota gulosa: a cada passo visita o ponto mais próximo ainda livre."""
+    n = len(pontos)
+    ordem = np.empty(n, dtype=int)
+    livres = np.ones(n, dtype=bool)
+    atual = np.asarray(inicio, dtype=float)
+    for k in range(n):
+        dist = np.hypot(*(pontos - atual).T)
+        dist[~livres] = np.inf
+        prox = int(np.argmin(dist))
+        ordem[k] = prox
+        livres[prox] = False
+        atual = pontos[prox]
+    return ordem
+
+
+def dois_opt(
+    pontos: np.ndarray,
+    ordem: np.ndarray,
+    inicio: Ponto,
+    max_passadas: int = MAX_PASSADAS_2OPT,
+) -> np.ndarray:
+    """Melhora uma rota aberta (início fixo, fim livre) invertendo trechos.
+
+    Para cada início de trecho ``a`` todos os finais ``b`` são avaliados de
+    uma vez com NumPy; a melhor inversão com ganho é aplicada.
+    """
+    ordem = np.asarray(ordem).copy()
+    n = len(ordem)
+    if n < 2:
+        return ordem
+    for _ in range(max_passadas):
+        melhorou = False
+        for a in range(n - 1):
+            caminho = np.vstack([np.asarray(inicio, dtype=float), pontos[ordem]])
+            # caminho[i + 1] corresponde a ordem[i]
+            anterior = caminho[a]
+            primeiro = caminho[a + 1]
+            finais = caminho[a + 2 :]  # candidatos b = a+1 .. n-1
+            seguintes = caminho[a + 3 :]  # ponto após cada final (exceto o último)
+            removido = np.hypot(*(primeiro - anterior)) + np.zeros(len(finais))
+            adicionado = np.hypot(*(finais - anterior).T)
+            if len(seguintes):
+                removido[:-1] += np.hypot(*(seguintes - finais[:-1]).T)
+                adicionado[:-1] += np.hypot(*(seguintes - primeiro).T)
+            ganho = removido - adicionado
+            b = int(np.argmax(ganho))
+            if ganho[b] > 1e-9:
+                fim = a + 1 + b
+                ordem[a : fim + 1] = ordem[a : fim + 1][::-1]
+                melhorou = True
+        if not melhorou:
+            break
+    return ordem
+
+
+def ordenar_rota(pontos: Sequence[Ponto], inicio: Ponto) -> List[int]:
+    """Ordem de visita dos ``pontos`` partindo de ``inicio``."""
+    if not len(pontos):
+        return []
+    arr = np.asarray(pontos, dtype=float).reshape(-1, 2)
+    ordem = vizinho_mais_proximo(arr, inicio)
+    return [int(i) for i in dois_opt(arr, ordem, inicio)]
+
+
+def _ponto(op: Dict) -> Ponto:
+    return float(op.get("x", 0)), float(op.get("y", 0))
+
+
+def _rota(ops: List[Dict], inicio: Ponto) -> Tuple[List[Dict], Ponto]:
+    if not ops:
+        return [], inicio
+    ordem = ordenar_rota([_ponto(o) for o in ops], inicio)
+    ordenadas = [ops[i] for i in ordem]
+    return ordenadas, _ponto(ordenadas[-1])
+
+
+def niveis_contornos(contornos: List[Dict], distancia: float = DISTANCIA_VIZINHA) -> List[int]:
+    """Nível de corte de cada contorno: 0 sem vizinhos menores, senão um a
+    mais que o maior nível entre os vizinhos menores."""
+    n = len(contornos)
+    if not n:
+        return []
+    x = np.array([float(o.get("x", 0)) for o in contornos])
+    y = np.array([float(o.get("y", 0)) for o in contornos])
+    l = np.array([float(o.get("l", 0)) for o in contornos])
+    w = np.array([float(o.get("w", 0)) for o in contornos])
+    area = l * w
+    # Folga entre os retângulos nos dois eixos (negativa quando se sobrepõem)
+    folga_x = np.maximum(x[:, None], x[None, :]) - np.minimum((x + l)[:, None], (x + l)[None, :])
+    folga_y = np.maximum(y[:, None], y[None, :]) - np.minimum((y + w)[:, None], (y + w)[None, :])
+    vizinhos = np.maximum(folga_x, folga_y) <= distancia
+    niveis = np.zeros(n, dtype=int)
+    for i in np.argsort(area, kind="stable"):
+        menores = vizinhos[i] & (area < area[i])
+        if menores.any():
+            niveis[i] = niveis[menores].max() + 1
+    return [int(v) for v in niveis]
+
+
+def _grupos_ferramenta(ops: List[Dict]) -> Dict[str, List[Dict]]:
+    grupos: Dict[str, List[Dict]] = {}
+    for op in ops:
+        grupos.setdefault(_chave_ferramenta(op.get("tool")), []).append(op)
+    return grupos
+
+
+def _primeiro(chaves: List[str], chave: Optional[str]) -> List[str]:
+    """``chaves`` com ``chave`` (a ferramenta já na máquina) na frente."""
+    if chave in chaves:
+        return [chave] + [k for k in chaves if k != chave]
+    return chaves
+
+
+def agendar_operacoes(
+    operacoes: List[Dict],
+    inicio: Ponto = (0.0, 0.0),
+    distancia_vizinha: float = DISTANCIA_VIZINHA,
+) -> List[Dict]:
+    """Ordena as operações de uma chapa para minimizar trocas e deslocamentos.
+
+    ``operacoes`` usa o formato de ``nesting._operacoes_peca``: cada item tem
+    ``tool``, ``x`` e ``y``; contornos têm ``contorno=True`` e ``l``/``w``, e
+    os de sobras também ``sobra=True``.
+    """
+    usinagens = [o for o in operacoes if not o.get("contorno")]
+    contornos = [o for o in operacoes if o.get("contorno") and not o.get("sobra")]
+    sobras = [o for o in operacoes if o.get("contorno") and o.get("sobra")]
+
+    grupos = _grupos_ferramenta(usinagens)
+    furos = [k for k, g in grupos.items() if (g[0].get("tool") or {}).get("tipo") == "Broca"]
+    fresas = [k for k in grupos if k not in furos]
+    niveis = niveis_contornos(contornos, distancia_vizinha)
+    grupos_nivel = [
+        _grupos_ferramenta([o for o, n in zip(contornos, niveis) if n == nivel])
+        for nivel in sorted(set(niveis))
+    ]
+    grupos_sobra = _grupos_ferramenta(sobras)
+    # A fresa usada no primeiro contorno fica por último para evitar uma troca a mais
+    primeiros = list(grupos_nivel[0]) if grupos_nivel else list(grupos_sobra)
+    ferramenta_contorno = next((k for k in primeiros if k in fresas), None)
+    if ferramenta_contorno in fresas:
+        fresas.remove(ferramenta_contorno)
+        fresas.append(ferramenta_contorno)
+
+    sequencia: List[Dict] = []
+    posicao = inicio
+    for chave in furos + fresas:
+        ordenadas, posicao = _rota(grupos[chave], posicao)
+        sequencia.extend(ordenadas)
+
+    atual = fresas[-1] if fresas else (furos[-1] if furos else None)
+    for grupos_contorno in grupos_nivel:
+        for chave in _primeiro(list(grupos_contorno), atual):
+            ordenadas, posicao = _rota(grupos_contorno[chave], posicao)
+            sequencia.extend(ordenadas)
+            atual = chave
+    for chave in _primeiro(list(grupos_sobra), atual):
+        ordenadas, posicao = _rota(grupos_sobra[chave], posicao)
+        sequencia.extend(ordenadas)
+    return sequencia
+
+
+def trocas_e_deslocamento(operacoes: List[Dict], inicio: Ponto = (0.0, 0.0)) -> Tuple[int, float]:
+    """Quantidade de trocas de ferramenta e deslocamento (mm) de uma sequência."""
+    trocas = 0
+    atual = None
+    distancia = 0.0
+    posicao = np.asarray(inicio, dtype=float)
+    for op in operacoes:
+        chave = _chave_ferramenta(op.get("tool"))
+        if atual is not None and chave != atual:
+            trocas += 1
+        atual = chave
+        ponto = np.asarray(_ponto(op))
+        distancia += float(np.hypot(*(ponto - posicao)))
+        posicao = ponto
+    return trocas, distancia
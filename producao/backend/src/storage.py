@@ -1,5 +1,13 @@
 import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Union
+
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.client import Config
 from botocore.exceptions import ClientError
 from dotenv import load_dotenv, find_dotenv
@@ -23,6 +31,11 @@ PUBLIC_ENDPOINT = os.getenv(
 
 REGION = os.getenv("OBJECT_STORAGE_REGION", "nyc3")
 
+# Envios multipart: tamanho de cada parte (mínimo de 5 MB do S3) e partes
+# enviadas em paralelo
+UPLOAD_PARTE_MB = max(5, int(os.getenv("UPLOAD_PARTE_MB", "8")))
+UPLOAD_CONCORRENCIA = max(1, int(os.getenv("UPLOAD_CONCORRENCIA", "4")))
+
 client = None
 if ENDPOINT and ACCESS_KEY and SECRET_KEY and BUCKET:
     client = boto3.client(
@@ -55,10 +68,189 @@ def _full_key(name: str) -> str:
 
 
 
+_metricas_upload: Dict[str, float] = {"envios": 0, "bytes": 0, "partes": 0, "segundos": 0.0}
+_metricas_lock = threading.Lock()
+
+
+def _registrar_upload(object_name: str, tamanho: int, partes: int, inicio: float) -> Dict:
+    segundos = time.perf_counter() - inicio
+    with _metricas_lock:
+        _metricas_upload["envios"] += 1
+        _metricas_upload["bytes"] += tamanho
+        _metricas_upload["partes"] += partes
+        _metricas_upload["segundos"] += segundos
+    mb_s = tamanho / 1048576 / segundos if segundos else 0.0
+    logging.info(
+        "Upload de %s: %.1f MB em %d parte(s), %.2fs (%.1f MB/s)",
+        object_name, tamanho / 1048576, partes, segundos, mb_s,
+    )
+    return {"bytes": tamanho, "partes": partes, "segundos": round(segundos, 4), "mb_s": round(mb_s, 2)}
+
+
+def metricas_upload(zerar: bool = False) -> Dict:
+    """Totais dos envios desde o início (ou a última chamada com ``zerar``).
+
+    Retorna ``envios``, ``bytes``, ``partes``, ``segundos`` e a vazão média
+    ``mb_s``.
+    """
+    with _metricas_lock:
+        totais = dict(_metricas_upload)
+        if zerar:
+            _metricas_upload.update(envios=0, bytes=0, partes=0, segundos=0.0)
+    segundos = totais["segundos"]
+    totais["mb_s"] = round(totais["bytes"] / 1048576 / segundos, 2) if segundos else 0.0
+    totais["segundos"] = round(segundos, 4)
+    return totais
+
+
+def _transfer_config() -> TransferConfig:
+    parte = UPLOAD_PARTE_MB * 1024 * 1024
+    return TransferConfig(
+        multipart_threshold=parte,
+        multipart_chunksize=parte,
+        max_concurrency=UPLOAD_CONCORRENCIA,
+    )
+
+
 def upload_file(local_path: str, object_name: str) -> None:
     if client:
+        inicio = time.perf_counter()
+        tamanho = os.path.getsize(local_path)
         with open(local_path, "rb") as f:
-            client.upload_fileobj(f, BUCKET, _full_key(object_name))
+            client.upload_fileobj(
+                f, BUCKET, _full_key(object_name), Config=_transfer_config()
+            )
+        partes = max(1, -(-tamanho // (UPLOAD_PARTE_MB * 1024 * 1024)))
+        _registrar_upload(object_name, tamanho, partes, inicio)
+
+
+class _EnvioMultipart:
+    """Arquivo somente escrita que envia o conteúdo ao bucket em partes.
+
+    Cada parte completa é enviada em uma thread enquanto a escrita continua;
+    no máximo ``concorrencia`` partes ficam em memória aguardando envio. Um
+    conteúdo menor que uma parte é enviado com um único ``put_object``.
+    """
+
+    def __init__(self, object_name: str, parte_bytes: int, concorrencia: int):
+        self.chave = _full_key(object_name)
+        self.parte_bytes = parte_bytes
+        self.concorrencia = concorrencia
+        self.bytes = 0
+        self._buffer = bytearray()
+        self._partes = []
+        self._upload_id = None
+        self._executor = None
+        self._vagas = threading.BoundedSemaphore(concorrencia)
+        self._erro = None
+
+    def write(self, dados) -> int:
+        self._buffer += dados
+        self.bytes += len(dados)
+        while len(self._buffer) >= self.parte_bytes:
+            parte = bytes(self._buffer[: self.parte_bytes])
+            del self._buffer[: self.parte_bytes]
+            self._enviar(parte)
+        return len(dados)
+
+    def flush(self) -> None:
+        pass
+
+    def _enviar(self, parte: bytes) -> None:
+        if self._erro:
+            raise self._erro
+        if self._upload_id is None:
+            resp = client.create_multipart_upload(Bucket=BUCKET, Key=self.chave)
+            self._upload_id = resp["UploadId"]
+            self._executor = ThreadPoolExecutor(self.concorrencia)
+        # Espera uma vaga: limita a memória ocupada pelas partes pendentes
+        self._vagas.acquire()
+        futuro = self._executor.submit(self._enviar_parte, len(self._partes) + 1, parte)
+        futuro.add_done_callback(self._parte_enviada)
+        self._partes.append(futuro)
+
+    def _enviar_parte(self, numero: int, parte: bytes) -> Dict:
+        resp = client.upload_part(
+            Bucket=BUCKET,
+            Key=self.chave,
+            PartNumber=numero,
+            UploadId=self._upload_id,
+            Body=parte,
+        )
+        return {"PartNumber": numero, "ETag": resp["ETag"]}
+
+    def _parte_enviada(self, futuro) -> None:
+        self._vagas.release()
+        if futuro.exception() is not None and self._erro is None:
+            self._erro = futuro.exception()
+
+    @property
+    def partes(self) -> int:
+        return len(self._partes) or 1
+
+    def concluir(self) -> None:
+        if self._upload_id is None:
+            client.put_object(Bucket=BUCKET, Key=self.chave, Body=bytes(self._buffer))
+            return
+        if self._buffer:
+            self._enviar(bytes(self._buffer))
+            self._buffer.clear()
+        partes = [f.result() for f in self._partes]
+        client.complete_multipart_upload(
+            Bucket=BUCKET,
+            Key=self.chave,
+            UploadId=self._upload_id,
+            MultipartUpload={"Parts": partes},
+        )
+        self._executor.shutdown()
+
+    def abortar(self) -> None:
+        if self._upload_id is None:
+            return
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        try:
+            client.abort_multipart_upload(
+                Bucket=BUCKET, Key=self.chave, UploadId=self._upload_id
+            )
+        except Exception as e:
+            logging.warning("Falha ao abortar o upload de %s: %s", self.chave, e)
+
+
+def upload_pasta_zip(pasta: Union[str, Path], object_name: str) -> Dict:
+    """Compacta ``pasta`` e envia o zip para ``object_name`` sem gravá-lo em disco.
+
+    O zip tem a mesma estrutura de ``shutil.make_archive(pasta, "zip",
+    root_dir=pasta.parent, base_dir=pasta.name)``. As partes do upload
+    multipart (``UPLOAD_PARTE_MB``) são enviadas em paralelo
+    (``UPLOAD_CONCORRENCIA``) enquanto os arquivos seguintes são compactados.
+    Em caso de erro o upload é abortado e nada é publicado.
+
+    Retorna as métricas do envio (``bytes``, ``partes``, ``segundos``,
+    ``mb_s``); sem cliente configurado nada é feito e retorna ``{}``.
+    """
+    if not client:
+        return {}
+    pasta = Path(pasta)
+    inicio = time.perf_counter()
+    envio = _EnvioMultipart(object_name, UPLOAD_PARTE_MB * 1024 * 1024, UPLOAD_CONCORRENCIA)
+    try:
+        with zipfile.ZipFile(envio, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.write(pasta, pasta.name)
+            for raiz, dirs, arquivos in os.walk(pasta):
+                dirs.sort()
+                base = Path(raiz)
+                for nome in dirs:
+                    caminho = base / nome
+                    zf.write(caminho, caminho.relative_to(pasta.parent).as_posix())
+                for nome in sorted(arquivos):
+                    caminho = base / nome
+                    if caminho.is_file():
+                        zf.write(caminho, caminho.relative_to(pasta.parent).as_posix())
+        envio.concluir()
+    except BaseException:
+        envio.abortar()
+        raise
+    return _registrar_upload(object_name, envio.bytes, envio.partes, inicio)
 
 
 def upload_bytes(data: bytes, object_name: str) -> None:
@@ -69,24 +261,17 @@ def upload_bytes(data: bytes, object_name: str) -> None:
     normalmente.
     """
     if client:
+        inicio = time.perf_counter()
         client.put_object(Bucket=BUCKET, Key=_full_key(object_name), Body=data)
+        _registrar_upload(object_name, len(data), 1, inicio)
 
 
-def download_stream(object_name: str, fallback_path: str):
-    """Fetch ``object_name`` from storage and return a readable stream.
-
-    Para evitar o consumo excessivo de memória em arquivos grandes, o
-    conteúdo é baixado para ``fallback_path`` e lido diretamente do disco.
-    Caso o cliente S3 não esteja configurado ou o download falhe, o caminho
-    local é utilizado como está.
-    """
-
+def download_bytes(object_name: str) -> bytes | None:
+    """Retorna o conteúdo de ``object_name`` (``None`` sem cliente configurado)."""
     if client:
-        try:
-            client.download_file(BUCKET, _full_key(object_name), fallback_path)
-        except Exception:
-            pass
-    return open(fallback_path, "rb")
+        resp = client.get_object(Bucket=BUCKET, Key=_full_key(object_name))
+        return resp["Body"].read()
+    return None
 
 
 def delete_file(object_name: str) -> None:
@@ -165,6 +350,116 @@ def object_exists(object_name: str) -> bool | None:
         return None
 
 
+def listar_chaves(prefixo: str) -> set[str] | None:
+    """Chaves (sem ``PREFIX``) dos objetos sob ``prefixo``.
+
+    Percorre todas as páginas do ``list_objects_v2``; retorna ``None`` sem
+    cliente configurado ou se a listagem falhar.
+    """
+    if not client:
+        return None
+    params = {"Bucket": BUCKET, "Prefix": _full_key(prefixo)}
+    chaves: set[str] = set()
+    try:
+        while True:
+            resp = client.list_objects_v2(**params)
+            for obj in resp.get("Contents", []):
+                chave = obj["Key"]
+                chaves.add(chave[len(PREFIX) :] if chave.startswith(PREFIX) else chave)
+            if not resp.get("IsTruncated"):
+                break
+            params["ContinuationToken"] = resp["NextContinuationToken"]
+    except Exception as e:
+        logging.warning("Falha ao listar '%s' no bucket: %s", prefixo, e)
+        return None
+    return chaves
+
+
+def object_info(object_name: str) -> dict | None:
+    """Retorna ``{"tamanho", "etag"}`` do objeto ou ``None`` se indisponível."""
+    if client:
+        try:
+            resp = client.head_object(Bucket=BUCKET, Key=_full_key(object_name))
+        except Exception:
+            return None
+        return {"tamanho": resp.get("ContentLength"), "etag": resp.get("ETag")}
+    return None
+
+
+def download_range(
+    object_name: str, inicio: int, fim: int, etag: str | None = None
+) -> bytes:
+    """Retorna os bytes ``inicio``..``fim`` (inclusive) de ``object_name``.
+
+    Com ``etag`` a leitura falha se o objeto tiver sido substituído.
+    """
+    if not client:
+        raise FileNotFoundError(f"Objeto {object_name} nao encontrado")
+    extra = {"IfMatch": etag} if etag else {}
+    resp = client.get_object(
+        Bucket=BUCKET,
+        Key=_full_key(object_name),
+        Range=f"bytes={inicio}-{fim}",
+        **extra,
+    )
+    return resp["Body"].read()
+
+
+def abrir_objeto(
+    object_name: str, intervalo: str | None = None, se_etag: str | None = None
+) -> dict:
+    """Abre ``object_name`` para leitura em streaming, sem gravá-lo em disco.
+
+    ``intervalo`` é o cabeçalho ``Range`` (``bytes=inicio-fim``) a repassar ao
+    bucket. Com ``se_etag`` o intervalo só vale se o objeto ainda tiver esse
+    ETag; caso contrário o objeto inteiro é aberto (semântica de ``If-Range``).
+
+    Retorna ``{"corpo", "tamanho", "etag", "intervalo"}``: ``corpo`` é o
+    stream da resposta (deve ser fechado), ``tamanho`` os bytes do corpo e
+    ``intervalo`` o ``Content-Range`` quando a resposta é parcial.
+
+    Raises:
+        FileNotFoundError: o objeto não existe ou não há cliente configurado.
+        ValueError: o intervalo está fora do objeto.
+    """
+    if not client:
+        raise FileNotFoundError(f"Objeto {object_name} nao encontrado")
+    params = {"Bucket": BUCKET, "Key": _full_key(object_name)}
+    if intervalo:
+        params["Range"] = intervalo
+        if se_etag:
+            params["IfMatch"] = se_etag
+    try:
+        resp = client.get_object(**params)
+    except ClientError as e:
+        code = e.response.get("Error", {}).get("Code")
+        if code in {"404", "NoSuchKey"}:
+            raise FileNotFoundError(f"Objeto {object_name} nao encontrado") from e
+        if code == "InvalidRange":
+            raise ValueError(f"Intervalo invalido para {object_name}: {intervalo}") from e
+        if code in {"412", "PreconditionFailed"}:
+            return abrir_objeto(object_name)
+        raise
+    return {
+        "corpo": resp["Body"],
+        "tamanho": resp.get("ContentLength"),
+        "etag": resp.get("ETag"),
+        "intervalo": resp.get("ContentRange"),
+    }
+
+
+def url_assinada(
+    object_name: str, expira: int, disposicao: str | None = None
+) -> str | None:
+    """URL temporária de download de ``object_name`` (``None`` sem cliente)."""
+    if not client:
+        return None
+    params = {"Bucket": BUCKET, "Key": _full_key(object_name)}
+    if disposicao:
+        params["ResponseContentDisposition"] = disposicao
+    return client.generate_presigned_url("get_object", Params=params, ExpiresIn=expira)
+
+
 def get_object_size(object_name: str) -> int | None:
     """Retorna o tamanho (em bytes) do objeto, ou None se não disponível."""
     if client:
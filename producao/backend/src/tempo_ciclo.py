@@ -0,0 +1,190 @@
+"""Estimativa do tempo de ciclo de um programa G-code.
+
+O programa é lido linha a linha (movimentos ``G0``/``G1``/``G2``/``G3``,
+``G90``/``G91``, avanço ``F`` e trocas ``M6``) e cada movimento é cronometrado
+com um perfil trapezoidal de velocidade: a máquina acelera até o avanço
+programado e desacelera até parar no fim do bloco, o que deixa a estimativa
+conservadora em trechos curtos.
+
+Parâmetros lidos da configuração da máquina (ou das variáveis de ambiente):
+
+* ``velocidadeRapida`` (mm/min, ``NESTING_VELOCIDADE_RAPIDA``) para ``G0``;
+* ``aceleracao`` (mm/s², ``NESTING_ACELERACAO``);
+* ``tempoTrocaFerramenta`` (s, ``NESTING_TEMPO_TROCA``) por ``M6``.
+
+Movimentos de corte sem ``F`` usam ``velocidadeCorte`` da ferramenta ativa
+(``velocidadeEntrada`` nos mergulhos) e, na falta dela, ``AVANCO_PADRAO``.
+"""
+
+import math
+import os
+import re
+from typing import Dict, Iterable, List, Optional
+
+VELOCIDADE_RAPIDA = float(os.getenv("NESTING_VELOCIDADE_RAPIDA", "30000"))
+ACELERACAO = float(os.getenv("NESTING_ACELERACAO", "1000"))
+TEMPO_TROCA = float(os.getenv("NESTING_TEMPO_TROCA", "10"))
+# Avanço (mm/min) de cortes sem ``F`` nem velocidade cadastrada na ferramenta
+AVANCO_PADRAO = 5000.0
+
+_COMENTARIO = re.compile(r"\([^)]*\)|;.*$")
+_PALAVRA = re.compile(r"([A-Z])\s*([-+]?\d*\.?\d+)")
+
+
+def _numero(valor, padrao: float) -> float:
+    try:
+        numero = float(valor)
+    except (TypeError, ValueError):
+        return padrao
+    return numero if numero > 0 else padrao
+
+
+def tempo_movimento(comprimento: float, avanco: float, aceleracao: float) -> float:
+    """Segundos para percorrer ``comprimento`` mm partindo e terminando parado.
+
+    ``avanco`` em mm/min; se o trecho é curto demais para atingir o avanço o
+    perfil é triangular.
+    """
+    if comprimento <= 0:
+        return 0.0
+    v = avanco / 60.0
+    if aceleracao <= 0:
+        return comprimento / v
+    if comprimento >= v * v / aceleracao:
+        return comprimento / v + v / aceleracao
+    return 2.0 * math.sqrt(comprimento / aceleracao)
+
+
+class EstimadorCiclo:
+    """Acumula as métricas de um programa consumido em blocos de linhas."""
+
+    def __init__(
+        self,
+        ferramentas: Optional[List[Dict]] = None,
+        config_maquina: Optional[Dict] = None,
+    ):
+        cfg = config_maquina or {}
+        self.rapida = _numero(cfg.get("velocidadeRapida"), VELOCIDADE_RAPIDA)
+        self.aceleracao = _numero(cfg.get("aceleracao"), ACELERACAO)
+        self.tempo_troca = _numero(cfg.get("tempoTrocaFerramenta"), TEMPO_TROCA)
+        self.ferramentas = {str(f.get("codigo")): f for f in ferramentas or []}
+        self.posicao = [
+            _numero(cfg.get("xHoming"), 0.0),
+            _numero(cfg.get("yHoming"), 0.0),
+            _numero(cfg.get("zHoming"), 0.0),
+        ]
+        self.movimento = 0
+        self.absoluto = True
+        self.avanco: Optional[float] = None
+        self.ferramenta: Optional[Dict] = None
+        self.comprimento_corte = 0.0
+        self.comprimento_rapido = 0.0
+        self.tempo_corte = 0.0
+        self.tempo_rapido = 0.0
+        self.mergulhos = 0
+        self.trocas = 0
+
+    def consumir(self, linhas: Iterable[str]) -> None:
+        for linha in linhas:
+            self._linha(linha)
+
+    def _linha(self, linha: str) -> None:
+        palavras = _PALAVRA.findall(_COMENTARIO.sub("", linha).upper())
+        if not palavras:
+            return
+        destino = list(self.posicao)
+        centro: Dict[str, float] = {}
+        move = False
+        for letra, valor in palavras:
+            num = float(valor)
+            if letra == "G":
+                codigo = int(num)
+                if codigo in (0, 1, 2, 3):
+                    self.movimento = codigo
+                elif codigo == 90:
+                    self.absoluto = True
+                elif codigo == 91:
+                    self.absoluto = False
+            elif letra in "XYZ":
+                eixo = "XYZ".index(letra)
+                destino[eixo] = num if self.absoluto else destino[eixo] + num
+                move = True
+            elif letra in "IJ":
+                centro[letra] = num
+            elif letra == "F":
+                self.avanco = num if num > 0 else self.avanco
+            elif letra == "T":
+                self.ferramenta = self.ferramentas.get(str(int(num)))
+            elif letra == "M" and int(num) == 6:
+                self.trocas += 1
+        if move:
+            self._mover(destino, centro)
+
+    def _mover(self, destino: List[float], centro: Dict[str, float]) -> None:
+        origem = self.posicao
+        dx, dy, dz = (destino[i] - origem[i] for i in range(3))
+        comprimento = math.sqrt(dx * dx + dy * dy + dz * dz)
+        if self.movimento in (2, 3) and centro:
+            comprimento = _comprimento_arco(origem, destino, centro, self.movimento == 2)
+        self.posicao = destino
+        if self.movimento == 0:
+            self.comprimento_rapido += comprimento
+            self.tempo_rapido += tempo_movimento(comprimento, self.rapida, self.aceleracao)
+            return
+        mergulho = dz < 0
+        if mergulho:
+            self.mergulhos += 1
+        self.comprimento_corte += comprimento
+        self.tempo_corte += tempo_movimento(
+            comprimento, self._avanco(mergulho and not (dx or dy)), self.aceleracao
+        )
+
+    def _avanco(self, vertical: bool) -> float:
+        if self.avanco:
+            return self.avanco
+        ferramenta = self.ferramenta or {}
+        if vertical:
+            return _numero(
+                ferramenta.get("velocidadeEntrada"),
+                _numero(ferramenta.get("velocidadeCorte"), AVANCO_PADRAO),
+            )
+        return _numero(ferramenta.get("velocidadeCorte"), AVANCO_PADRAO)
+
+    def resultado(self) -> Dict:
+        tempo_trocas = self.trocas * self.tempo_troca
+        return {
+            "comprimentoCorte": round(self.comprimento_corte, 1),
+            "comprimentoRapido": round(self.comprimento_rapido, 1),
+            "mergulhos": self.mergulhos,
+            "trocasFerramenta": self.trocas,
+            "tempoCorte": round(self.tempo_corte, 1),
+            "tempoRapido": round(self.tempo_rapido, 1),
+            "tempoTrocas": round(tempo_trocas, 1),
+            "tempoEstimado": round(self.tempo_corte + self.tempo_rapido + tempo_trocas, 1),
+        }
+
+
+def _comprimento_arco(
+    origem: List[float], destino: List[float], centro: Dict[str, float], horario: bool
+) -> float:
+    cx = origem[0] + centro.get("I", 0.0)
+    cy = origem[1] + centro.get("J", 0.0)
+    raio = math.hypot(origem[0] - cx, origem[1] - cy)
+    inicio = math.atan2(origem[1] - cy, origem[0] - cx)
+    fim = math.atan2(destino[1] - cy, destino[0] - cx)
+    angulo = (inicio - fim) if horario else (fim - inicio)
+    angulo %= 2 * math.pi
+    if angulo == 0:
+        angulo = 2 * math.pi
+    return math.hypot(raio * angulo, destino[2] - origem[2])
+
+
+def estimar_programa(
+    linhas: Iterable[str],
+    ferramentas: Optional[List[Dict]] = None,
+    config_maquina: Optional[Dict] = None,
+) -> Dict:
+    """Métricas e tempo estimado (s) de um programa G-code."""
+    estimador = EstimadorCiclo(ferramentas, config_maquina)
+    estimador.consumir(linhas)
+    return estimador.resultado()
@@ -0,0 +1,41 @@
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT_DIR / "producao" / "backend" / "src"))
+sys.path.insert(0, str(ROOT_DIR / "producao" / "backend" / "benchmarks"))
+
+import api  # noqa: E402
+import nesting  # noqa: E402
+import pipeline_nesting  # noqa: E402
+import storage  # noqa: E402
+from lote_sintetico import gerar_lote  # noqa: E402
+
+
+def test_lote_sintetico_deterministico(tmp_path):
+    a = nesting._ler_dxt(gerar_lote(tmp_path / "a", 6, seed=3) / "Lote_1.dxt")
+    b = nesting._ler_dxt(gerar_lote(tmp_path / "b", 6, seed=3) / "Lote_1.dxt")
+    assert [p["Material"] for p in a] == [p["Material"] for p in b]
+    assert [(p["Length"], p["Width"]) for p in a] == [(p["Length"], p["Width"]) for p in b]
+    assert [p["geometria"].operacoes for p in a] == [p["geometria"].operacoes for p in b]
+    assert any(layer.startswith("FURO_") for p in a for layer in p["geometria"].operacoes_por_layer)
+
+
+def test_pipeline_offline_com_todas_as_etapas():
+    originais = (storage.client, api.get_db_connection, nesting._ler_dxt)
+    resultado = pipeline_nesting.executar(pecas=8, repeticoes=2, manter_cache=True)
+    assert (storage.client, api.get_db_connection, nesting._ler_dxt) == originais
+
+    primeira, segunda = resultado["repeticoes"]
+    for etapa in ("download", "leitura_dxt", "nesting", "sobras", "gcode", "imagens",
+                  "etiquetas", "zip_upload", "upload"):
+        assert etapa in primeira["etapas"]
+    assert primeira["chapas"] == segunda["chapas"] > 0
+    assert 0 < primeira["aproveitamento"] <= 1
+    assert resultado["resumo"]["total"]["min"] > 0
+    # O lote é lido do zip por intervalos, sem download completo
+    assert "download_file" not in resultado["armazenamento"]["chamadas"]
+    assert resultado["armazenamento"]["chamadas"]["get_object"] > 0
+    # A saída é compactada direto no upload, sem zip em disco
+    assert primeira["upload"]["envios"] == 2 and primeira["upload"]["bytes"] > 0
+    assert "upload_fileobj" not in resultado["armazenamento"]["chamadas"]
@@ -0,0 +1,170 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT_DIR / "producao" / "backend" / "src"))
+
+import cache_nesting  # noqa: E402
+import nesting  # noqa: E402
+from cache_disco import CacheDisco  # noqa: E402
+
+CONFIG = {"espacoEntrePecas": 4, "refiloInferior": 10, "refiloEsquerda": 10}
+ARRANJAR = nesting.arranjar_poligonos
+
+
+def _escrever_dxt(pasta, pecas):
+    partes = "".join(
+        "<Part>"
+        + "".join(f"<Field><Name>{k}</Name><Value>{v}</Value></Field>" for k, v in p.items())
+        + "</Part>"
+        for p in pecas
+    )
+    (pasta / "lote.dxt").write_text(f"<Root>{partes}</Root>", encoding="utf-8")
+
+
+def _peca(i, material, length=300, width=200):
+    return {
+        "PartName": f"P{i}",
+        "Length": length,
+        "Width": width,
+        "Material": material,
+        "Program1": f"{i:04d}",
+        "Thickness": 15,
+    }
+
+
+@pytest.fixture
+def lote(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_nesting, "cache", CacheDisco(tmp_path / "cache", 1 << 20, 0))
+    monkeypatch.setattr(nesting, "NESTING_WORKERS", 1)
+    chamadas = []
+    original = nesting.arranjar_poligonos
+
+    def contar(*args, **kwargs):
+        chamadas.append((args[0][0]["Material"], len(args[0])))
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(nesting, "arranjar_poligonos", contar)
+    pasta = tmp_path / "Lote_1"
+    pasta.mkdir()
+    _escrever_dxt(
+        pasta, [_peca(i, "MDF" if i % 2 else "MDP", 300 + 10 * i) for i in range(12)]
+    )
+    return pasta, chamadas
+
+
+def _preview(pasta, **kw):
+    return nesting.gerar_nesting_preview(
+        str(pasta), 1000, 800, None, None, CONFIG, {}, engine="rectpack", **kw
+    )
+
+
+def _posicoes(chapas):
+    return [
+        sorted((op["nome"], op["x"], op["y"]) for op in c["operacoes"] if op["tipo"] == "Peca")
+        for c in chapas
+    ]
+
+
+def test_preview_repetida_e_final_reaproveitam_o_arranjo(lote):
+    pasta, chamadas = lote
+    primeira = _preview(pasta)
+    assert sorted(m for m, _ in chamadas) == ["MDF", "MDP"]
+
+    repetida = _preview(pasta)
+    assert len(chamadas) == 2
+    assert _posicoes(repetida) == _posicoes(primeira)
+    assert [c["alterada"] for c in primeira] == [True] * len(primeira)
+    assert not any(c["alterada"] for c in repetida)
+
+    _, _, final = nesting.gerar_nesting(
+        str(pasta), 1000, 800, None, None, CONFIG, {}, engine="rectpack"
+    )
+    assert len(chamadas) == 2
+    assert _posicoes(final) == _posicoes(primeira)
+
+
+def test_parametros_e_recalcular_invalidam(lote):
+    pasta, chamadas = lote
+    _preview(pasta)
+    nesting.gerar_nesting_preview(
+        str(pasta), 1000, 800, None, None, {**CONFIG, "espacoEntrePecas": 8}, {},
+        engine="rectpack",
+    )
+    assert len(chamadas) == 4
+    _preview(pasta, recalcular=True)
+    assert len(chamadas) == 6
+
+
+def test_incremental_refaz_apenas_chapas_afetadas(lote):
+    pasta, chamadas = lote
+    pecas = [_peca(i, "MDF", 450, 350) for i in range(10)]
+    pecas += [_peca(20 + i, "MDP") for i in range(3)]
+    _escrever_dxt(pasta, pecas)
+    antes = _preview(pasta)
+    mdf = [p for p, c in zip(_posicoes(antes), antes) if "MDF" in c["descricao"]]
+    assert len(mdf) > 2
+    chamadas.clear()
+
+    # Uma peça de reposição: só a última chapa de MDF é refeita
+    pecas.append(_peca(30, "MDF", 450, 350))
+    _escrever_dxt(pasta, pecas)
+    depois = _preview(pasta, incremental=True)
+    assert chamadas == [("MDF", len(mdf[-1]) + 1)]
+    n = len(mdf) - 1
+    assert _posicoes(depois[:n]) == mdf[:n]
+    assert [c["alterada"] for c in depois] == [False] * n + [True] + [False]
+    assert _posicoes(depois[-1:]) == _posicoes(antes[-1:])
+    chamadas.clear()
+
+    # Peça removida: apenas as demais peças da chapa dela são refeitas
+    atual = _posicoes(depois)
+    chapa = next(i for i, p in enumerate(atual) if any(nome == "P0" for nome, _, _ in p))
+    _escrever_dxt(pasta, pecas[1:])
+    final = _preview(pasta, incremental=True)
+    assert chamadas == [("MDF", len(atual[chapa]) - 1)]
+    mantidas = [p for i, p in enumerate(atual) if i != chapa]
+    assert [p for p, c in zip(_posicoes(final), final) if not c["alterada"]] == mantidas
+
+
+def test_orcamento_deepnest_refina_e_final_reaproveita(lote, monkeypatch):
+    pasta, _ = lote
+    orcamentos, etapas = [], []
+
+    def deepnest(pecas, largura, altura, espaco, rot, estoque, cm, cl, fer,
+                 orcamento=None, ao_melhorar=None):
+        orcamentos.append(orcamento)
+        if ao_melhorar:
+            ao_melhorar(0.5)
+        return ARRANJAR(pecas, largura, altura, espaco, rot, None, cm, cl, fer, "rectpack")
+
+    monkeypatch.setattr(nesting, "_arranjar_poligonos_deepnest", deepnest)
+
+    def preview(**kw):
+        return nesting.gerar_nesting_preview(
+            str(pasta), 1000, 800, None, None, CONFIG, {}, engine="deepnest",
+            progresso=lambda etapa, **info: etapas.append((etapa, info)), **kw
+        )
+
+    def final(**kw):
+        nesting.gerar_nesting(
+            str(pasta), 1000, 800, None, None, CONFIG, {}, engine="deepnest", **kw
+        )
+
+    preview()
+    # Sem orçamento padrão a busca roda até o motor responder
+    assert orcamentos == [None] * 2
+    assert ("deepnest", {"material": "MDF", "aproveitamento": 0.5}) in etapas
+
+    # Orçamento maior refina a prévia; o padrão reaproveita o arranjo refinado
+    preview(orcamento=20)
+    assert orcamentos[2:] == [20, 20]
+    preview()
+    final()
+    assert len(orcamentos) == 4
+
+    # O final só refaz o arranjo aprovado com orçamento explícito maior
+    final(orcamento=60)
+    assert orcamentos[4:] == [60, 60]
@@ -0,0 +1,126 @@
+import os
+import shutil
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT_DIR / "producao" / "backend" / "src"))
+sys.path.insert(0, str(ROOT_DIR / "producao" / "backend" / "benchmarks"))
+
+import api  # noqa: E402
+import cache_pastas  # noqa: E402
+import storage  # noqa: E402
+from servicos_locais import ArmazenamentoLocal, BancoLocal, instalar  # noqa: E402
+
+
+def _publicar(tmp_path, nome, arquivos):
+    pasta = tmp_path / "origem" / nome
+    shutil.rmtree(pasta, ignore_errors=True)
+    pasta.mkdir(parents=True)
+    for arquivo, conteudo in arquivos.items():
+        (pasta / arquivo).write_text(conteudo)
+    zip_path = shutil.make_archive(str(pasta), "zip", root_dir=pasta.parent, base_dir=nome)
+    storage.upload_file(zip_path, f"lotes/{nome}.zip")
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    armazenamento = ArmazenamentoLocal(tmp_path / "bucket")
+    desfazer = instalar(armazenamento, BancoLocal())
+    novo = cache_pastas.CachePastas(tmp_path / "cache", 1 << 30, retencao=0)
+    monkeypatch.setattr(cache_pastas, "cache", novo)
+    yield novo, armazenamento
+    desfazer()
+
+
+def test_selo_confere_objeto_e_extracao_incompleta(cache, tmp_path):
+    pastas, armazenamento = cache
+    _publicar(tmp_path, "Lote_1", {"a.dxt": "v1"})
+    pasta = api.ensure_pasta_local("lotes/Lote_1.zip")
+    assert (pasta / "a.dxt").read_text() == "v1"
+    assert api.ensure_pasta_local("producao/lotes/Lote_1.zip") == pasta
+    assert armazenamento.chamadas["download_file"] == 1
+
+    # O objeto mudou no bucket: a pasta é extraída de novo
+    _publicar(tmp_path, "Lote_1", {"a.dxt": "v2"})
+    assert (api.ensure_pasta_local("lotes/Lote_1.zip") / "a.dxt").read_text() == "v2"
+    assert armazenamento.chamadas["download_file"] == 2
+
+    # Sem selo (extração interrompida) a pasta não é usada
+    (pasta.parent / ".selo.json").unlink()
+    (pasta / "a.dxt").write_text("parcial")
+    assert (api.ensure_pasta_local("lotes/Lote_1.zip") / "a.dxt").read_text() == "v2"
+    assert armazenamento.chamadas["download_file"] == 3
+    assert [p.name for p in pastas.diretorio.iterdir()] == ["lotes__Lote_1"]
+
+    assert pastas.descartar("lotes/Lote_1.zip")
+    assert not pasta.exists()
+    with pytest.raises(FileNotFoundError):
+        api.ensure_pasta_local("lotes/Lote_9.zip")
+
+
+def test_requisicoes_simultaneas_compartilham_o_download(cache, tmp_path, monkeypatch):
+    _, armazenamento = cache
+    _publicar(tmp_path, "Lote_1", {"a.dxt": "x" * 1000})
+    original = cache_pastas.download_file
+
+    def lento(*args):
+        time.sleep(0.2)
+        original(*args)
+
+    monkeypatch.setattr(cache_pastas, "download_file", lento)
+    resultados = []
+    threads = [
+        threading.Thread(target=lambda: resultados.append(api.ensure_pasta_local("lotes/Lote_1.zip")))
+        for _ in range(4)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(resultados)) == 1 and len(resultados) == 4
+    assert armazenamento.chamadas["download_file"] == 1
+
+
+def test_lru_respeita_limite(cache, tmp_path, monkeypatch):
+    pastas, _ = cache
+    monkeypatch.setattr(pastas, "limite_bytes", 2500)
+    for n in range(1, 4):
+        _publicar(tmp_path, f"Lote_{n}", {"a.dxt": "x" * 1000})
+    um = api.ensure_pasta_local("lotes/Lote_1.zip")
+    dois = api.ensure_pasta_local("lotes/Lote_2.zip")
+    # Lote_1 acessado por último: Lote_2 é o menos recente
+    os.utime(dois.parent / ".selo.json", (1, 1))
+    api.ensure_pasta_local("lotes/Lote_1.zip")
+    tres = api.ensure_pasta_local("lotes/Lote_3.zip")
+    assert um.exists() and tres.exists() and not dois.exists()
+
+
+def test_nesting_final_nao_escreve_na_pasta_da_cache(cache, tmp_path, monkeypatch):
+    _, armazenamento = cache
+    _publicar(tmp_path, "Lote_1", {"a.dxt": "v1"})
+    # Chave resolvida por ``ensure_pasta_local`` (pasta extraída na cache)
+    monkeypatch.setattr(api, "abrir_pasta_lote", api.ensure_pasta_local)
+    monkeypatch.setattr(api, "SAIDA_DIR", tmp_path / "saida")
+    saidas = []
+
+    def gerar(pasta, *_, pasta_saida=None, **__):
+        saidas.append(pasta_saida)
+        (pasta_saida / "Chapa_1").mkdir(parents=True)
+        (pasta_saida / "Chapa_1" / "a.nc").write_text("G0")
+        return str(pasta_saida), [], []
+
+    monkeypatch.setattr(api, "gerar_nesting", gerar)
+    resultado = api._nesting_final({"pasta_lote": "lotes/Lote_1.zip"}, registrar=False)
+    assert resultado.get("erro") is None
+
+    pasta = api.ensure_pasta_local("lotes/Lote_1.zip")
+    assert sorted(p.name for p in pasta.iterdir()) == ["a.dxt"]
+    assert armazenamento.chamadas["download_file"] == 1
+    assert saidas[0].is_relative_to(tmp_path / "saida") and not saidas[0].exists()
+    assert list((tmp_path / "saida").iterdir()) == []
+    assert storage.object_info("nestings/Nesting_Lote_1.zip") is not None
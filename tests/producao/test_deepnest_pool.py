@@ -0,0 +1,215 @@
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT_DIR / "producao" / "backend" / "src"))
+
+import deepnest_pool  # noqa: E402
+
+pytestmark = pytest.mark.skipif(shutil.which("node") is None, reason="node ausente")
+
+STUB = r"""
+function send(msg) {
+  const body = Buffer.from(JSON.stringify(msg));
+  const h = Buffer.alloc(4);
+  h.writeUInt32BE(body.length, 0);
+  process.stdout.write(Buffer.concat([h, body]));
+}
+process.stdin.on('data', (() => {
+  let buf = Buffer.alloc(0);
+  return chunk => {
+    buf = Buffer.concat([buf, chunk]);
+    while (buf.length >= 4) {
+      const n = buf.readUInt32BE(0);
+      if (buf.length < 4 + n) break;
+      const req = JSON.parse(buf.subarray(4, 4 + n).toString());
+      buf = buf.subarray(4 + n);
+      const p = req.payload;
+      if (p.crash) process.exit(3);
+      // Modo anytime: uma resposta parcial por aproveitamento em ``steps``
+      for (const u of p.timeBudgetMs ? p.steps || [] : []) {
+        send({ id: req.id, ok: true, partial: true, utilisation: u,
+               result: { placements: p.pieces, utilisation: u } });
+      }
+      if (p.hang) continue;
+      const final = {
+        id: req.id, ok: true, result: { placements: p.pieces, pid: process.pid },
+        timings: { parseMs: 1, nestMs: 2 },
+      };
+      if (p.delay) setTimeout(() => send(final), p.delay);
+      else send(final);
+    }
+  };
+})());
+"""
+
+
+@pytest.fixture
+def pool(tmp_path):
+    script = tmp_path / "stub.js"
+    script.write_text(STUB)
+    p = deepnest_pool.DeepnestPool(tamanho=2, script=script, cwd=tmp_path, timeout=5, folga=0.3)
+    yield p
+    p.encerrar()
+
+
+def test_reutiliza_worker(pool):
+    r1, t1 = pool.executar({"pieces": [1, 2]})
+    r2, t2 = pool.executar({"pieces": [3]})
+    assert r1["placements"] == [1, 2]
+    assert r2["placements"] == [3]
+    assert t1["pid"] == t2["pid"]
+    assert t1["nest"] == pytest.approx(0.002)
+
+
+def test_recicla_worker_apos_falha(pool):
+    _, t1 = pool.executar({"pieces": []})
+    with pytest.raises(deepnest_pool.DeepnestWorkerError):
+        pool.executar({"crash": True})
+    _, t2 = pool.executar({"pieces": []})
+    assert t2["pid"] != t1["pid"]
+
+
+def test_timeout_recicla_worker(pool):
+    with pytest.raises(TimeoutError):
+        pool.executar({"hang": True}, timeout=0.5)
+    resultado, _ = pool.executar({"pieces": [7]})
+    assert resultado["placements"] == [7]
+
+
+def test_jobs_concorrentes(pool):
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(4) as ex:
+        res = list(ex.map(lambda i: pool.executar({"pieces": [i]})[0], range(8)))
+    assert [r["placements"] for r in res] == [[i] for i in range(8)]
+
+
+def test_orcamento_relata_solucoes_parciais(pool):
+    parciais = []
+    resultado, tempos = pool.executar(
+        {"pieces": [1], "steps": [0.5, 0.7]},
+        orcamento=2,
+        ao_melhorar=lambda r, u: parciais.append(u),
+    )
+    assert parciais == [0.5, 0.7]
+    assert resultado["placements"] == [1]
+    assert not tempos["parcial"]
+
+
+def test_orcamento_esgotado_devolve_melhor_parcial(pool):
+    resultado, tempos = pool.executar(
+        {"pieces": [2], "steps": [0.4, 0.6], "hang": True}, orcamento=0.2
+    )
+    assert resultado["utilisation"] == 0.6
+    assert tempos["parcial"]
+    with pytest.raises(TimeoutError):
+        pool.executar({"pieces": [], "hang": True}, orcamento=0.2, timeout=0.8)
+
+
+def test_orcamento_sem_parcial_aguarda_resposta_final(pool):
+    resultado, tempos = pool.executar({"pieces": [4], "delay": 800}, orcamento=0.2)
+    assert resultado["placements"] == [4] and not tempos["parcial"]
+
+
+class Cancelado(Exception):
+    pass
+
+
+def test_cancelamento_durante_parciais_recicla_worker(pool):
+    def cancelar(resultado, aproveitamento):
+        raise Cancelado
+
+    _, t1 = pool.executar({"pieces": []})
+    with pytest.raises(Cancelado):
+        pool.executar(
+            {"pieces": [], "steps": [0.1], "hang": True}, orcamento=5, ao_melhorar=cancelar
+        )
+    resultado, t2 = pool.executar({"pieces": [3]})
+    assert resultado["placements"] == [3]
+    assert t2["pid"] != t1["pid"]
+
+
+ENGINE = r"""#!/usr/bin/env node
+// Electron/Deepnest falso em modo --serve: registra cada inicialização
+require('fs').appendFileSync(process.env.INICIOS, process.argv.slice(2).join(' ') + '\n');
+const send = m => process.stdout.write(JSON.stringify(m) + '\n');
+let pending = '';
+process.stdin.setEncoding('utf8');
+process.stdin.on('data', chunk => {
+  pending += chunk;
+  let nl;
+  while ((nl = pending.indexOf('\n')) >= 0) {
+    const msg = JSON.parse(pending.slice(0, nl));
+    pending = pending.slice(nl + 1);
+    if (msg.stop) { send({ id: msg.id, done: true }); continue; }
+    if (msg.input.timeBudgetMs) {
+      send({ id: msg.id, placements: [1], utilisation: 0.5 });
+      send({ id: msg.id, placements: [2], utilisation: 0.7 });
+    } else {
+      send({ id: msg.id, done: true, placements: msg.input.pieces, utilisation: 0.9 });
+    }
+  }
+});
+process.stdin.on('end', () => process.exit(0));
+"""
+
+
+def test_runner_reutiliza_uma_instancia_do_motor(tmp_path, monkeypatch):
+    motor = tmp_path / "electron"
+    motor.write_text(ENGINE)
+    motor.chmod(0o755)
+    inicios = tmp_path / "inicios.txt"
+    monkeypatch.setenv("DEEPNEST_ELECTRON", str(motor))
+    monkeypatch.setenv("INICIOS", str(inicios))
+    monkeypatch.setenv("DEEPNEST_SERVE", "1")
+    p = deepnest_pool.DeepnestPool(tamanho=1, cwd=tmp_path, timeout=10, folga=2)
+    try:
+        r1, _ = p.executar({"pieces": [{"polygon": []}]})
+        r2, _ = p.executar({"pieces": []})
+        parciais = []
+        r3, tempos = p.executar(
+            {"pieces": []}, orcamento=0.2, ao_melhorar=lambda r, u: parciais.append(u)
+        )
+    finally:
+        p.encerrar()
+    assert r1["placements"] == [{"polygon": []}] and r2["utilisation"] == 0.9
+    assert parciais == [0.5, 0.7] and r3["placements"] == [2] and not tempos["parcial"]
+    # Electron/Deepnest iniciado uma única vez para os três jobs
+    assert inicios.read_text().splitlines() == [". --headless --serve"]
+
+
+ENGINE_UNICO = r"""#!/usr/bin/env node
+// Electron/Deepnest falso sem --serve: um único documento JSON ao final
+require('fs').appendFileSync(process.env.INICIOS, process.argv.slice(2).join(' ') + '\n');
+let dados = '';
+process.stdin.on('data', chunk => { dados += chunk; });
+process.stdin.on('end', () => setTimeout(() => {
+  const input = JSON.parse(dados);
+  process.stdout.write(JSON.stringify({ placements: input.pieces, utilisation: 0.8 }, null, 2));
+}, 600));
+"""
+
+
+def test_runner_aguarda_motor_sem_solucoes_parciais(tmp_path, monkeypatch):
+    motor = tmp_path / "electron"
+    motor.write_text(ENGINE_UNICO)
+    motor.chmod(0o755)
+    inicios = tmp_path / "inicios.txt"
+    monkeypatch.setenv("DEEPNEST_ELECTRON", str(motor))
+    monkeypatch.setenv("INICIOS", str(inicios))
+    monkeypatch.delenv("DEEPNEST_SERVE", raising=False)
+    p = deepnest_pool.DeepnestPool(tamanho=1, cwd=tmp_path, timeout=10, folga=0.1)
+    try:
+        # O orçamento acaba antes do documento: o motor não é interrompido
+        resultado, tempos = p.executar({"pieces": [{"polygon": []}]}, orcamento=0.1)
+        p.executar({"pieces": []})
+    finally:
+        p.encerrar()
+    assert resultado["placements"] == [{"polygon": []}] and resultado["utilisation"] == 0.8
+    assert not tempos["parcial"]
+    # Sem DEEPNEST_SERVE o contrato é o de uma execução por job
+    assert inicios.read_text().splitlines() == [". --headless"] * 2
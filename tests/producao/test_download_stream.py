@@ -0,0 +1,68 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT_DIR / "producao" / "backend" / "src"))
+sys.path.insert(0, str(ROOT_DIR / "producao" / "backend" / "benchmarks"))
+
+import api  # noqa: E402
+import storage  # noqa: E402
+from servicos_locais import ArmazenamentoLocal, BancoLocal, instalar  # noqa: E402
+
+
+@pytest.fixture
+def cliente(tmp_path, monkeypatch):
+    armazenamento = ArmazenamentoLocal(tmp_path / "bucket")
+    banco = BancoLocal(
+        {
+            "lotes": [{"id": 1, "obj_key": "lotes/Lote_1.zip"}, {"id": 2, "obj_key": "lotes/Lote_2.zip"}],
+            "nestings": [{"id": 1, "obj_key": "nestings/Nesting_9.zip"}],
+        }
+    )
+    desfazer = instalar(armazenamento, banco)
+    monkeypatch.setattr(api, "DOWNLOAD_BLOCO_KB", 1)
+    conteudo = os.urandom(5000)
+    storage.upload_bytes(conteudo, "lotes/Lote_1.zip")
+    armazenamento.zerar_metricas()
+    yield TestClient(api.app), armazenamento, conteudo
+    desfazer()
+
+
+def test_download_repassa_o_bucket_com_range(cliente):
+    http, armazenamento, conteudo = cliente
+    resp = http.get("/download-lote/1")
+    assert resp.status_code == 200 and resp.content == conteudo
+    assert resp.headers["content-length"] == "5000"
+    assert resp.headers["accept-ranges"] == "bytes"
+    assert "attachment; filename=Lote_1.zip" == resp.headers["content-disposition"]
+    assert "download_file" not in armazenamento.chamadas
+    etag = resp.headers["etag"]
+
+    resp = http.get("/download-lote/1", headers={"Range": "bytes=1000-1999"})
+    assert resp.status_code == 206 and resp.content == conteudo[1000:2000]
+    assert resp.headers["content-range"] == "bytes 1000-1999/5000"
+
+    resp = http.get("/download-lote/1", headers={"Range": "bytes=-100", "If-Range": etag})
+    assert resp.status_code == 206 and resp.content == conteudo[-100:]
+    # Objeto alterado desde o download interrompido: recomeça do início
+    resp = http.get("/download-lote/1", headers={"Range": "bytes=100-", "If-Range": '"outro"'})
+    assert resp.status_code == 200 and resp.content == conteudo
+
+    resp = http.get("/download-lote/1", headers={"Range": "bytes=9000-"})
+    assert resp.status_code == 416 and resp.headers["content-range"] == "bytes */5000"
+
+    assert http.get("/download-lote/2").status_code == 404
+    assert http.get("/download-nesting/1").json() == {"erro": "Pasta não encontrada"}
+
+
+def test_download_por_url_assinada(cliente, monkeypatch):
+    http, armazenamento, _ = cliente
+    monkeypatch.setattr(api, "DOWNLOAD_MODO", "redirect")
+    resp = http.get("/download-lote/1", follow_redirects=False)
+    assert resp.status_code == 307 and "Lote_1.zip" in resp.headers["location"]
+    assert "get_object" not in armazenamento.chamadas
+    assert http.get("/download-lote/2", follow_redirects=False).status_code == 404
@@ -0,0 +1,129 @@
+import sys
+from pathlib import Path
+
+import ezdxf
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT_DIR / "producao" / "backend" / "src"))
+
+import cache_disco  # noqa: E402
+import dxf_cache  # noqa: E402
+import nesting  # noqa: E402
+
+
+def _criar_dxf(caminho: Path, largura: float = 400, altura: float = 300) -> Path:
+    doc = ezdxf.new()
+    msp = doc.modelspace()
+    msp.add_lwpolyline(
+        [(0, 0), (largura, 0), (largura, altura), (0, altura)],
+        close=True,
+        dxfattribs={"layer": "CONTORNO"},
+    )
+    msp.add_circle((50, 60), 4, dxfattribs={"layer": "FURO_8_12"})
+    msp.add_line((100, 100), (200, 100), dxfattribs={"layer": "USINAR_5_Desbaste"})
+    doc.saveas(caminho)
+    return caminho
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    novo = cache_disco.CacheDisco(tmp_path / "cache", 1024 * 1024, 16)
+    monkeypatch.setattr(dxf_cache, "cache", novo)
+    return novo
+
+
+def test_geometria_lida_uma_vez(tmp_path, cache, monkeypatch):
+    arquivo = _criar_dxf(tmp_path / "peca.dxf")
+    leituras = []
+    original = ezdxf.readfile
+
+    def contar(caminho, *args, **kwargs):
+        leituras.append(caminho)
+        return original(caminho, *args, **kwargs)
+
+    monkeypatch.setattr(dxf_cache.ezdxf, "readfile", contar)
+
+    assert nesting._medidas_dxf(arquivo) == (400, 300)
+    ops = nesting._ops_from_dxf(arquivo, [])
+    geo = dxf_cache.geometria_dxf(arquivo)
+    assert len(leituras) == 1
+    assert [o["layer"] for o in ops] == ["CONTORNO", "FURO_8_12", "USINAR_5_Desbaste"]
+    assert geo["poligono"].area == pytest.approx(400 * 300 - geo["furos"][0].area)
+    assert {"CONTORNO", "FURO_8_12", "USINAR_5_Desbaste"} <= set(geo["layers"])
+
+    # Sem o LRU em memória o registro vem do disco, sem reler o DXF
+    cache.limpar()
+    geo_disco = dxf_cache.geometria_dxf(arquivo)
+    assert len(leituras) == 1
+    assert geo_disco["poligono"].equals(geo["poligono"])
+    assert geo_disco["entidades"] == [list(e) for e in geo["entidades"]]
+
+
+def test_conteudo_alterado_invalida(tmp_path, cache):
+    arquivo = _criar_dxf(tmp_path / "peca.dxf")
+    assert nesting._medidas_dxf(arquivo) == (400, 300)
+    _criar_dxf(arquivo, 500, 250)
+    assert nesting._medidas_dxf(arquivo) == (500, 250)
+
+
+def test_limite_do_disco(tmp_path):
+    cache = cache_disco.CacheDisco(tmp_path / "c", 2000, 1)
+    for i in range(20):
+        cache.gravar(f"{i:040x}", b"x" * 300)
+    total = sum(f.stat().st_size for f in (tmp_path / "c").rglob("*.msgpack"))
+    assert total <= 2000
+    assert cache.obter(f"{19:040x}") == b"x" * 300
+
+
+def _criar_dxt(pasta: Path, arquivos) -> Path:
+    partes = []
+    for i, nome in enumerate(arquivos):
+        campos = {
+            "PartName": f"P{i}",
+            "Length": "1",
+            "Width": "1",
+            "Material": "MDF",
+            "Filename": nome,
+            "Program1": str(100 + i),
+        }
+        partes.append(
+            "<Part>"
+            + "".join(
+                f"<Field><Name>{k}</Name><Value>{v}</Value></Field>"
+                for k, v in campos.items()
+            )
+            + "</Part>"
+        )
+    dxt = pasta / "lote.dxt"
+    dxt.write_text(f"<Root>{''.join(partes)}</Root>", encoding="utf-8")
+    return dxt
+
+
+def test_peca_geometria_unica_leitura(tmp_path, cache, monkeypatch):
+    _criar_dxf(tmp_path / "a.dxf")
+    (tmp_path / "b.dxf").write_bytes((tmp_path / "a.dxf").read_bytes())
+    leituras = []
+    original = ezdxf.readfile
+    monkeypatch.setattr(
+        dxf_cache.ezdxf,
+        "readfile",
+        lambda c, *a, **k: leituras.append(c) or original(c, *a, **k),
+    )
+
+    pecas = nesting._ler_dxt_polygons(_criar_dxt(tmp_path, ["a.dxf", "b.dxf"]))
+    geo = pecas[0]["geometria"]
+    assert isinstance(geo, dxf_cache.PecaGeometria)
+    assert (pecas[0]["Length"], pecas[0]["Width"]) == (400, 300)
+    assert pecas[0]["polygon"].equals(geo.contorno)
+    assert set(geo.operacoes_por_layer) == {"CONTORNO", "FURO_8_12", "USINAR_5_Desbaste"}
+
+    ferramentas = [{"codigo": "1", "descricao": "Fresa", "tipo": "Fresa"}]
+    codigo, _, usadas = nesting._gcode_peca(
+        pecas[0], 0, 0, ferramentas, geo, etapa="fresas"
+    )
+    assert "(FURO_8_12)" in codigo
+    assert usadas == ["1 - Fresa"]
+    assert len(nesting._ops_from_dxf(geo)) == 3
+    # Mesmo conteúdo em dois arquivos: uma única leitura do DXF
+    assert len(leituras) == 1
@@ -0,0 +1,65 @@
+import sys
+from pathlib import Path
+
+import pytest
+from shapely.geometry import box
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT_DIR / "producao" / "backend" / "src"))
+
+import nesting  # noqa: E402
+
+ESTOQUE = [
+    {"id": 7, "descricao": "MDF (1000 x 450)", "comprimento": 1000, "largura": 450},
+    {"id": 8, "descricao": "MDF (300 x 300)", "comprimento": 300, "largura": 300},
+]
+
+
+def _pecas(qtd):
+    return [
+        {"PartName": f"P{i}", "Length": 500, "Width": 400, "polygon": box(0, 0, 500, 400)}
+        for i in range(qtd)
+    ]
+
+
+@pytest.mark.parametrize("engine", ["rectpack", "blf"])
+def test_sobras_preenchidas_antes_das_chapas(engine):
+    placas = nesting.arranjar_poligonos(
+        _pecas(6), 1000, 800, rotacionar=False, estoque=ESTOQUE, engine=engine
+    )
+    assert [len(p) for p in placas] == [2, 4]
+    assert all(p["sobraEstoque"]["id"] == 7 for p in placas[0])
+    assert not any("sobraEstoque" in p for p in placas[1])
+    assert sorted(p["PartName"] for placa in placas for p in placa) == [
+        f"P{i}" for i in range(6)
+    ]
+    assert not any("_indice" in p for placa in placas for p in placa)
+
+
+def test_chapas_novas_sem_limite():
+    placas = nesting.arranjar_poligonos(_pecas(9), 1000, 800, rotacionar=False, engine="rectpack")
+    assert [len(p) for p in placas] == [4, 4, 1]
+
+
+def test_preview_informa_sobra_por_chapa(tmp_path):
+    chapas = nesting._preview_material(
+        "MDF",
+        _pecas(3),
+        {"possui_veio": True, "comprimento": 1000, "largura": 800},
+        tmp_path,
+        ESTOQUE,
+        0,
+        0,
+        0,
+        1000,
+        800,
+        None,
+        None,
+        None,
+        "rectpack",
+    )
+    assert chapas[0]["sobraEstoque"]["id"] == 7
+    # A chapa é rotacionada na prévia: largura/altura trocadas
+    assert (chapas[0]["largura"], chapas[0]["altura"]) == (450, 1000)
+    assert "sobraEstoque" not in chapas[1]
+    assert nesting.sobras_estoque_utilizadas(chapas) == [chapas[0]["sobraEstoque"]]
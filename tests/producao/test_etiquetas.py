@@ -0,0 +1,97 @@
+import sys
+from pathlib import Path
+
+from PIL import Image, ImageChops, ImageDraw
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT_DIR / "producao" / "backend" / "src"))
+
+import nesting  # noqa: E402
+
+CONFIG = {
+    "layoutEtiqueta": [
+        {"campo": "PartName", "x": 2, "y": 2},
+        {"campo": "Material", "x": 2.3, "y": 9.6},
+        {"campo": "Client", "x": 30, "y": 2},
+        {"campo": "Length", "x": 30, "y": 20},
+    ],
+    "tamanhoEtiquetadoraX": 60,
+    "tamanhoEtiquetadoraY": 30,
+    "anguloRotacaoChapa": "90 graus",
+}
+
+
+def _etiqueta_legada(p, cfg):
+    """Renderização original: tela e texto novos para cada peça."""
+    escala = 4
+    largura = float(cfg.get("tamanhoEtiquetadoraX", 50))
+    altura = float(cfg.get("tamanhoEtiquetadoraY", 30))
+    img = Image.new("RGB", (int(largura * escala), int(altura * escala)), "white")
+    draw = ImageDraw.Draw(img)
+    for item in cfg["layoutEtiqueta"]:
+        x = float(item.get("x", 0)) * escala
+        y = float(item.get("y", 0)) * escala
+        draw.text((x, y), str(p.get(item["campo"], "")), fill="black")
+    return nesting._apply_image_orientation(img, cfg)
+
+
+def _chapas():
+    chapas = []
+    for c in range(2):
+        chapas.append(
+            [
+                {
+                    "PartName": f"Lateral {i % 4}",
+                    "Material": "MDF Branco" if c else "MDP Carvalho",
+                    "Client": "Cliente ç",
+                    "Length": 300 + i,
+                    "Program1": f"{c}{i:04d}",
+                }
+                for i in range(6)
+            ]
+        )
+    sobras = [[{"PartName": "SB", "Material": "MDF", "Program1": f"9{c}"}] for c in range(2)]
+    return chapas, sobras
+
+
+def test_renderizador_igual_a_renderizacao_original():
+    chapas, _ = _chapas()
+    renderizador = nesting._RenderizadorEtiqueta(CONFIG)
+    for p in chapas[0] + chapas[1]:
+        nova = renderizador.renderizar(p)
+        assert ImageChops.difference(nova, _etiqueta_legada(p, CONFIG)).getbbox() is None
+    # Textos repetidos reaproveitam o mesmo carimbo
+    assert len(renderizador._carimbos) < 4 * 12
+
+
+def test_carimbos_limitados_aos_mais_recentes():
+    chapas, _ = _chapas()
+    renderizador = nesting._RenderizadorEtiqueta(CONFIG)
+    renderizador.max_carimbos = 5
+    pecas = [{**p, "Length": 300.5 + i} for i, p in enumerate(chapas[0] * 4)]
+    for p in pecas:
+        nova = renderizador.renderizar(p)
+        assert ImageChops.difference(nova, _etiqueta_legada(p, CONFIG)).getbbox() is None
+    assert len(renderizador._carimbos) == 5
+    # Os campos repetidos continuam guardados; as medidas únicas saem
+    assert ("Cliente ç", 120.0, 8.0) in renderizador._carimbos
+
+
+def test_uma_imagem_por_peca(tmp_path):
+    chapas, sobras = _chapas()
+    nesting._gerar_etiquetas(chapas, tmp_path, CONFIG, sobras)
+    arquivos = sorted(f.name for f in tmp_path.iterdir())
+    assert len(arquivos) == 14
+    assert "90.bmp" in arquivos
+
+
+def test_tiff_multipagina_por_chapa(tmp_path):
+    chapas, sobras = _chapas()
+    nesting._gerar_etiquetas(chapas, tmp_path, {**CONFIG, "etiquetasPorChapa": "TIFF"}, sobras, inicio=3)
+    arquivos = sorted(f.name for f in tmp_path.iterdir())
+    assert arquivos == ["003-MDP Carvalho_Etiquetas.tif", "004-MDF Branco_Etiquetas.tif"]
+    with Image.open(tmp_path / arquivos[0]) as tif:
+        assert tif.n_frames == 7
+        tif.seek(6)
+        esperada = _etiqueta_legada(sobras[0][0], CONFIG)
+        assert ImageChops.difference(tif.convert("RGB"), esperada).getbbox() is None
@@ -0,0 +1,44 @@
+import io
+import re
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT_DIR / "producao" / "backend" / "src"))
+
+import nesting  # noqa: E402
+
+
+def _substituir_legado(texto, valores):
+    for k, v in valores.items():
+        texto = texto.replace(f"[{k}]", str(v))
+    return re.sub(r"\[[^\[\]]+\]", "", texto)
+
+
+def test_substituir_equivale_ao_replace():
+    valores = {
+        "T": 3,
+        "TOOL_DESCRIPTION": "Fresa 6mm",
+        "ZH": 100,
+        "XH": "",
+        "CMD_EXTRA": "M3 S[S]",
+    }
+    for tpl in (
+        nesting.DEFAULT_INTRO,
+        nesting.DEFAULT_HEADER,
+        nesting.DEFAULT_TROCA,
+        nesting.DEFAULT_FOOTER,
+        "G0 X[X] Y[Y] Z[Z]",
+        "sem campos",
+    ):
+        assert nesting._substituir(tpl, valores) == _substituir_legado(tpl, valores)
+
+
+def test_escritor_separa_blocos_com_crlf():
+    buf = io.StringIO()
+    nc = nesting._EscritorGcode(buf)
+    nc.escrever(["%", "G90"])
+    nc.escrever([])
+    nc.escrever([""])
+    nc.escrever(["M30"])
+    assert buf.getvalue() == "\r\n".join(["%", "G90", "", "M30"])
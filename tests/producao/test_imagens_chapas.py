@@ -0,0 +1,58 @@
+import sys
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from PIL import Image
+from shapely.geometry import Polygon
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT_DIR / "producao" / "backend" / "src"))
+
+import nesting  # noqa: E402
+
+
+def _chapa():
+    vazada = Polygon(
+        [(400, 100), (900, 100), (900, 600), (400, 600)],
+        [[(500, 200), (800, 200), (800, 500), (500, 500)]],
+    )
+    pecas = [
+        {"PartName": "Lateral", "Material": "MDF", "Program1": "0001", "x": 10,
+         "y": 10, "Length": 300, "Width": 200},
+        {"PartName": "Moldura", "Material": "MDF", "Program1": '00"2', "x": 400,
+         "y": 100, "Length": 500, "Width": 500, "polygon": vazada},
+    ]
+    sobras = [{"PartName": "SB", "Material": "MDF", "Program1": "0003", "x": 1000,
+               "y": 0, "Length": 800, "Width": 2750}]
+    return pecas, sobras
+
+
+def test_svg_e_bmp_por_chapa(tmp_path):
+    pecas, sobras = _chapa()
+    cfg = {"anguloRotacaoChapa": "90 graus"}
+    nesting._gerar_imagens_chapas([pecas], tmp_path, 1850, 2750, cfg, [sobras])
+
+    svg = ET.parse(tmp_path / "001-MDF.svg").getroot()
+    caminhos = svg.findall("{http://www.w3.org/2000/svg}path")
+    assert [c.get("class") for c in caminhos] == ["peca", "peca", "sobra"]
+    assert caminhos[1].get("data-codigo") == '00"2'
+    # O furo da moldura fica no mesmo caminho (regra evenodd)
+    assert caminhos[1].get("d").count("M") == 2
+    assert svg.get("viewBox") == "0 0 1850 2750"
+
+    with Image.open(tmp_path / "001-MDF_LargeImage.bmp") as img:
+        assert img.size == nesting.TAMANHO_IMAGEM_GRANDE
+    with Image.open(tmp_path / "001-MDF_SmallImage.bmp") as img:
+        assert img.size == nesting.TAMANHO_IMAGEM_PEQUENA
+
+
+def test_sem_bmp(tmp_path, monkeypatch):
+    monkeypatch.setattr(nesting, "NESTING_IMAGENS_BMP", False)
+    pecas, sobras = _chapa()
+    nesting._gerar_imagens_chapas([pecas], tmp_path, 1850, 2750, None, [sobras])
+    nesting._gerar_xml_chapas([pecas], tmp_path, 1850, 2750, "Lote_1")
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["001-MDF.svg", "Lote 1.xml"]
+    campos = {f.get("Name") for f in ET.parse(tmp_path / "Lote 1.xml").iter("Field")}
+    assert "PlateID" in campos
+    assert "LargeImage" not in campos
@@ -0,0 +1,82 @@
+import functools
+import sys
+import time
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT_DIR / "producao" / "backend" / "src"))
+sys.path.insert(0, str(ROOT_DIR / "producao" / "backend" / "benchmarks"))
+
+import api  # noqa: E402
+import inventario_bucket  # noqa: E402
+import storage  # noqa: E402
+from servicos_locais import ArmazenamentoLocal, BancoLocal, instalar  # noqa: E402
+
+ANTIGO = "2020-01-01T00:00:00"
+
+
+@pytest.fixture
+def ambiente(tmp_path, monkeypatch):
+    armazenamento = ArmazenamentoLocal(tmp_path / "bucket")
+    banco = BancoLocal(
+        {
+            "nestings": [
+                {"id": 1, "lote": "Lote_1", "obj_key": "nestings/Nesting_1.zip", "criado_em": ANTIGO},
+                {"id": 2, "lote": "Lote_2", "obj_key": "producao/nestings/Nesting_2.zip", "criado_em": ANTIGO},
+                {"id": 3, "lote": "Lote_3", "obj_key": "nestings/Nesting_3.zip", "criado_em": ANTIGO},
+            ],
+            "lotes": [{"id": n, "obj_key": f"lotes/Lote_{n}.zip", "criado_em": ANTIGO} for n in range(1, 6)],
+        }
+    )
+    desfazer = instalar(armazenamento, banco)
+    novo = inventario_bucket.InventarioBucket(ttl=60)
+    monkeypatch.setattr(api, "inventario", novo)
+    for n in (1, 2):
+        storage.upload_bytes(b"zip", f"nestings/Nesting_{n}.zip")
+    for n in range(1, 5):
+        storage.upload_bytes(b"zip", f"lotes/Lote_{n}.zip")
+    armazenamento.zerar_metricas()
+    yield TestClient(api.app), armazenamento, banco, novo
+    novo.parar_reconciliacao()
+    desfazer()
+
+
+def test_listagens_usam_uma_listagem_por_prefixo(ambiente, monkeypatch):
+    http, armazenamento, banco, _ = ambiente
+    # Páginas pequenas para percorrer a paginação
+    monkeypatch.setattr(
+        armazenamento,
+        "list_objects_v2",
+        functools.partial(armazenamento.list_objects_v2, MaxKeys=2),
+    )
+
+    assert http.get("/listar-lotes").json()["lotes"] == [f"lotes/Lote_{n}.zip" for n in range(1, 6)]
+    assert armazenamento.chamadas["list_objects_v2"] == 2
+    assert "head_object" not in armazenamento.chamadas
+
+    ids = [d["id"] for d in http.get("/nestings").json()["nestings"]]
+    assert ids == [2, 1]
+    # Só a chave ausente da listagem é conferida individualmente
+    assert armazenamento.chamadas["head_object"] == 1
+    assert any("DELETE" in sql and params == (3,) for sql, params in banco.comandos)
+
+    # Dentro do TTL a listagem é reaproveitada; um envio posterior é confirmado
+    storage.upload_bytes(b"zip", "nestings/Nesting_3.zip")
+    ids = [d["id"] for d in http.get("/nestings").json()["nestings"]]
+    assert ids == [3, 2, 1]
+    assert armazenamento.chamadas["list_objects_v2"] == 3
+    assert armazenamento.chamadas["head_object"] == 2
+
+
+def test_reconciliacao_em_segundo_plano(ambiente):
+    _, armazenamento, _, inventario = ambiente
+    inventario.iniciar_reconciliacao(["nestings/"], 0.05)
+    limite = time.monotonic() + 5
+    while armazenamento.chamadas["list_objects_v2"] < 2 and time.monotonic() < limite:
+        time.sleep(0.01)
+    inventario.parar_reconciliacao()
+    assert armazenamento.chamadas["list_objects_v2"] >= 2
+    assert inventario.chaves("nestings/") == {"nestings/Nesting_1.zip", "nestings/Nesting_2.zip"}
@@ -0,0 +1,111 @@
+import pickle
+import shutil
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT_DIR / "producao" / "backend" / "src"))
+sys.path.insert(0, str(ROOT_DIR / "producao" / "backend" / "benchmarks"))
+
+import api  # noqa: E402
+import cache_disco  # noqa: E402
+import dxf_cache  # noqa: E402
+import lote_zip  # noqa: E402
+import nesting  # noqa: E402
+import storage  # noqa: E402
+from cache_disco import CacheDisco  # noqa: E402
+from lote_sintetico import gerar_lote  # noqa: E402
+from servicos_locais import ArmazenamentoLocal, BancoLocal, instalar  # noqa: E402
+
+
+@pytest.fixture
+def bucket(tmp_path, monkeypatch):
+    armazenamento = ArmazenamentoLocal(tmp_path / "bucket")
+    desfazer = instalar(armazenamento, BancoLocal())
+    monkeypatch.setattr(dxf_cache, "cache", CacheDisco(tmp_path / "dxf", 1 << 30, 0))
+    monkeypatch.setattr(lote_zip, "LOTE_ZIP_DIR", tmp_path / "zips")
+    monkeypatch.setattr(api, "SAIDA_DIR", tmp_path / "saida")
+    lote_zip.fechar_lotes()
+    pasta = gerar_lote(tmp_path / "lotes", 6, seed=2)
+    arquivo = shutil.make_archive(
+        str(pasta), "zip", root_dir=pasta.parent, base_dir=pasta.name
+    )
+    storage.upload_file(arquivo, "lotes/Lote_1.zip")
+    armazenamento.zerar_metricas()
+    yield armazenamento, pasta
+    lote_zip.fechar_lotes()
+    desfazer()
+
+
+def _resumo(pecas):
+    return [(p["Filename"], p["Length"], p["Width"], p["geometria"].operacoes) for p in pecas]
+
+
+def test_leitura_por_intervalo_sem_extrair(bucket):
+    armazenamento, pasta = bucket
+    lote = api.abrir_pasta_lote("lotes/Lote_1.zip")
+    assert isinstance(lote, lote_zip.PastaZip) and lote.name == "Lote_1"
+
+    pecas = nesting._ler_dxt(nesting._encontrar_dxt(lote))
+    assert _resumo(pecas) == _resumo(nesting._ler_dxt(pasta / "Lote_1.dxt"))
+    assert api.coletar_layers(lote) == api.coletar_layers(str(pasta))
+    assert "download_file" not in armazenamento.chamadas
+    assert not api.SAIDA_DIR.exists()
+
+    # Com a geometria em cache só o DXT é lido novamente
+    armazenamento.zerar_metricas()
+    lote = api.abrir_pasta_lote("lotes/Lote_1.zip")
+    nesting._ler_dxt(nesting._encontrar_dxt(lote))
+    assert armazenamento.chamadas["head_object"] == 1
+    assert armazenamento.bytes_recebidos < (pasta / "Lote_1.dxt").stat().st_size + 2 * 1024 * 1024
+
+    # A pasta pode ser enviada ao pool de processos
+    copia = pickle.loads(pickle.dumps(lote / "0001.DXF"))
+    assert copia.read_bytes() == (pasta / "0001.DXF").read_bytes()
+
+
+def test_copia_local_mapeada_por_versao(bucket, monkeypatch, tmp_path):
+    armazenamento, pasta = bucket
+    monkeypatch.setattr(lote_zip, "LOTE_ACESSO", "local")
+    lote = lote_zip.abrir_lote("lotes/Lote_1.zip")
+    assert len(nesting._ler_dxt(nesting._encontrar_dxt(lote))) == 6
+    lote_zip.fechar_lotes()
+    lote_zip.abrir_lote("producao/lotes/Lote_1.zip")
+    assert armazenamento.chamadas["download_file"] == 1
+    assert "get_object" not in armazenamento.chamadas
+
+    # Um novo conteúdo no bucket substitui a cópia local
+    (pasta / "extra.txt").write_text("x")
+    arquivo = shutil.make_archive(
+        str(tmp_path / "novo"), "zip", root_dir=pasta.parent, base_dir=pasta.name
+    )
+    storage.upload_file(arquivo, "lotes/Lote_1.zip")
+    lote = lote_zip.abrir_lote("lotes/Lote_1.zip")
+    assert (lote / "extra.txt").read_text() == "x"
+    assert len(list((tmp_path / "zips").rglob("*.zip"))) == 1
+
+    with pytest.raises(FileNotFoundError):
+        lote_zip.abrir_lote("lotes/Lote_2.zip")
+
+
+def test_hash_do_membro_identifica_o_lote(bucket, tmp_path):
+    _, pasta = bucket
+    # Mesmo conteúdo (nome, CRC e tamanho) publicado como outro lote
+    storage.upload_file(
+        shutil.make_archive(str(tmp_path / "copia"), "zip", root_dir=pasta.parent, base_dir=pasta.name),
+        "ocorrencias/Lote_1.zip",
+    )
+    um = lote_zip.abrir_lote("lotes/Lote_1.zip") / "0001.DXF"
+    dois = lote_zip.abrir_lote("ocorrencias/Lote_1.zip") / "0001.DXF"
+    assert cache_disco.hash_arquivo(um) == cache_disco.hash_arquivo(
+        lote_zip.abrir_lote("lotes/Lote_1.zip") / "0001.DXF"
+    )
+    assert cache_disco.hash_arquivo(um) != cache_disco.hash_arquivo(dois)
+    assert cache_disco.hash_arquivo(um) != cache_disco.hash_arquivo(um.parent / "0002.DXF")
+
+    # Zip sem origem no bucket: o hash é o do conteúdo do membro
+    local = zipfile.Path(zipfile.ZipFile(tmp_path / "copia.zip"), "Lote_1/0001.DXF")
+    assert cache_disco.hash_arquivo(local) == cache_disco.hash_arquivo(pasta / "0001.DXF")
@@ -0,0 +1,109 @@
+import json
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT_DIR / "producao" / "backend" / "src"))
+sys.path.insert(0, str(ROOT_DIR / "producao" / "backend" / "benchmarks"))
+
+import cache_nesting  # noqa: E402
+import nesting_jobs  # noqa: E402
+from cache_disco import CacheDisco  # noqa: E402
+from servicos_locais import BancoLocal  # noqa: E402
+
+
+def _aguardar(job_id, status, timeout=5):
+    fim = time.time() + timeout
+    while time.time() < fim:
+        dados = nesting_jobs.obter(job_id)
+        if dados and dados["status"] == status:
+            return dados
+        time.sleep(0.02)
+    raise AssertionError(f"job não chegou ao status {status}: {dados}")
+
+
+def test_job_concluido_com_progresso():
+    liberar = threading.Event()
+
+    def trabalho(progresso):
+        progresso("nesting", material=1, total_materiais=2, chapas=3)
+        liberar.wait(5)
+        return {"chapas": [1, 2, 3]}
+
+    job = nesting_jobs.submeter("preview", trabalho, "lotes/Lote_1.zip")
+    dados = _aguardar(job.id, nesting_jobs.EXECUTANDO)
+    fim = time.time() + 5
+    while dados["progresso"]["etapa"] != "nesting" and time.time() < fim:
+        dados = nesting_jobs.obter(job.id)
+    assert dados["progresso"] == {
+        "etapa": "nesting",
+        "material": 1,
+        "total_materiais": 2,
+        "chapas": 3,
+    }
+    liberar.set()
+    dados = _aguardar(job.id, nesting_jobs.CONCLUIDO)
+    assert dados["resultado"] == {"chapas": [1, 2, 3]}
+
+
+def test_job_cancelado_no_proximo_progresso():
+    iniciou = threading.Event()
+    liberar = threading.Event()
+
+    def trabalho(progresso):
+        iniciou.set()
+        liberar.wait(5)
+        progresso("gcodes")
+        return {"status": "ok"}
+
+    job = nesting_jobs.submeter("final", trabalho)
+    assert iniciou.wait(5)
+    assert nesting_jobs.cancelar(job.id)["status"] == nesting_jobs.EXECUTANDO
+    liberar.set()
+    dados = _aguardar(job.id, nesting_jobs.CANCELADO)
+    assert "resultado" not in dados
+
+
+def test_job_com_erro_retornado():
+    job = nesting_jobs.submeter("preview", lambda progresso: {"erro": "DXT ausente"})
+    dados = _aguardar(job.id, nesting_jobs.ERRO)
+    assert dados["erro"] == "DXT ausente"
+
+
+def test_cancelar_job_inexistente():
+    assert nesting_jobs.cancelar("nao-existe") is None
+
+
+def test_previa_guardada_fora_do_banco_e_linhas_removidas(tmp_path, monkeypatch):
+    banco = BancoLocal()
+    monkeypatch.setattr(nesting_jobs, "get_db_connection", banco.conectar)
+    monkeypatch.setattr(cache_nesting, "cache", CacheDisco(tmp_path / "cache", 1 << 20, 0))
+    resultado = {"chapas": [{"id": 1, "operacoes": [[0, 0]] * 500}, {"id": 2}], "layers": ["A"]}
+    job = nesting_jobs.NestingJob("preview", "lotes/Lote_1.zip")
+    job.nesting_id, job.status, job.resultado = 7, nesting_jobs.CONCLUIDO, resultado
+    job.finalizado_em = datetime.now()
+    nesting_jobs._atualizar_db(job)
+
+    _, params = banco.comandos[-1]
+    gravado = json.loads(params[3])
+    assert gravado["chapas"] == 2 and "layers" not in gravado
+    assert params[4] is None and params[5] == job.finalizado_em.isoformat()
+
+    # Fora da memória o resultado completo vem da cache
+    banco.tabelas["nestings"] = [
+        {"id": 7, "lote": job.lote, "criado_em": job.criado_em, "job_id": job.id, "tipo": "preview",
+         "status": job.status, "progresso": params[1], "erro": None, "resultado": params[3]}
+    ]
+    assert nesting_jobs.obter(job.id)["resultado"] == resultado
+    # Removida pelo limite da cache: resta o resumo
+    shutil.rmtree(tmp_path / "cache")
+    assert nesting_jobs.obter(job.id)["resultado"] == gravado
+
+    nesting_jobs._limpar_finalizados()
+    sql, params = banco.comandos[-1]
+    assert sql.startswith("DELETE") and "obj_key IS NULL" in sql
+    assert params[:3] == nesting_jobs.FINALIZADOS
@@ -0,0 +1,107 @@
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from shapely.geometry import box
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT_DIR / "producao" / "backend" / "src"))
+
+import nesting  # noqa: E402
+
+
+def _tarefas():
+    base = dict(
+        cfg={},
+        estoque=None,
+        espaco=0,
+        ref_esq=10,
+        ref_inf=10,
+        area_larg=1000,
+        area_alt=800,
+        ferramentas=None,
+        config_layers=None,
+        config_maquina=None,
+        engine="rectpack",
+    )
+    tarefas = []
+    for material, qtd in (("A", 30), ("B", 5), ("C", 12)):
+        pecas = [
+            {
+                "PartName": f"{material}{i}",
+                "Length": 300,
+                "Width": 200,
+                "polygon": box(0, 0, 300, 200),
+            }
+            for i in range(qtd)
+        ]
+        tarefas.append(dict(base, material=material, lista=pecas))
+    return tarefas
+
+
+def _resumo(resultados):
+    return [
+        [(p["PartName"], p["Material"], round(p["x"], 3), round(p["y"], 3)) for p in placa]
+        for placas in resultados
+        for placa in placas
+    ]
+
+
+def test_paralelo_mesma_ordem_que_sequencial(monkeypatch):
+    monkeypatch.setattr(nesting, "NESTING_WORKERS", 1)
+    seq = nesting._executar_por_material(nesting._nesting_material, _tarefas(), "rectpack")
+    monkeypatch.setattr(nesting, "NESTING_WORKERS", 3)
+    par = nesting._executar_por_material(nesting._nesting_material, _tarefas(), "rectpack")
+    assert _resumo(seq) == _resumo(par)
+    assert [p[0][1] for p in _resumo(par)][0] == "A"
+
+
+
+class _Relogio:
+    @staticmethod
+    def now():
+        return datetime(2024, 1, 1)
+
+
+def _arquivos(pasta):
+    return {f.name: f.read_bytes() for f in sorted(pasta.iterdir())}
+
+
+def test_artefatos_paralelos_iguais_aos_sequenciais(monkeypatch, tmp_path):
+    resultados = nesting._executar_por_material(
+        nesting._nesting_material, _tarefas(), "rectpack"
+    )
+    chapas = [placa for placas in resultados for placa in placas]
+    for i, placa in enumerate(chapas):
+        for p in placa:
+            p.update(Program1=f"{i:03d}{p['PartName']}", Thickness=15, Filename="")
+    config = {
+        "layoutEtiqueta": [{"campo": "PartName", "x": 2, "y": 2}],
+        "refiloEsquerda": 10,
+        "refiloInferior": 10,
+    }
+    monkeypatch.setattr(nesting, "datetime", _Relogio)
+    progresso = []
+
+    saidas = {}
+    for workers in (1, 3):
+        monkeypatch.setattr(nesting, "NESTING_WORKERS", workers)
+        saida = tmp_path / str(workers)
+        saida.mkdir()
+        sobras, tempos = nesting._gerar_artefatos(
+            chapas,
+            saida,
+            800,
+            1000,
+            config_maquina=config,
+            pasta_lote=tmp_path / "lote",
+            progresso=lambda etapa, **info: progresso.append((etapa, info)),
+        )
+        assert len(sobras) == len(tempos) == len(chapas)
+        saidas[workers] = _arquivos(saida)
+
+    assert saidas[1] == saidas[3]
+    assert sum(n.endswith(".nc") for n in saidas[3]) == len(chapas)
+    assert sum(n.endswith("_LargeImage.bmp") for n in saidas[3]) == len(chapas)
+    assert progresso[-1][0] == "artefatos"
+    assert progresso[-1][1]["concluidas"] == progresso[-1][1]["total_etapas"]
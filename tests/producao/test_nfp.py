@@ -0,0 +1,58 @@
+import sys
+from pathlib import Path
+
+from shapely.geometry import Polygon, box
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT_DIR / "producao" / "backend" / "src"))
+
+import nesting  # noqa: E402
+import nfp  # noqa: E402
+
+
+def _peca(nome, poly):
+    minx, miny, maxx, maxy = poly.bounds
+    return {"PartName": nome, "Length": maxx - minx, "Width": maxy - miny, "polygon": poly}
+
+
+def test_nfp_de_retangulos():
+    a = nfp._Forma(box(0, 0, 100, 50), 0)
+    b = nfp._Forma(box(0, 0, 30, 20), 0)
+    assert nfp.no_fit_polygon(a.partes, b.partes).bounds == (-30, -20, 100, 50)
+
+
+def test_blf_preenche_de_baixo_para_cima():
+    pecas = [_peca(str(i), box(0, 0, 500, 400)) for i in range(4)]
+    chapas = nesting.arranjar_poligonos(pecas, 1000, 800, engine="blf")
+    assert len(chapas) == 1
+    assert sorted((p["x"], p["y"]) for p in chapas[0]) == [
+        (0, 0),
+        (0, 400),
+        (500, 0),
+        (500, 400),
+    ]
+
+
+def test_blf_encaixa_em_peca_nao_convexa():
+    l_forma = Polygon([(0, 0), (600, 0), (600, 200), (200, 200), (200, 600), (0, 600)])
+    pecas = [_peca("L", l_forma), _peca("Q", box(0, 0, 350, 350))]
+    chapas = nesting.arranjar_poligonos(pecas, 600, 600, rotacionar=False, engine="blf")
+    assert len(chapas) == 1
+    q = next(p for p in chapas[0] if p["PartName"] == "Q")
+    assert (q["x"], q["y"]) == (200, 200)
+
+
+def test_blf_respeita_espaco_e_limites():
+    pecas = [
+        _peca(str(i), box(0, 0, 120 + 37 * (i % 5), 90 + 23 * (i % 7))) for i in range(40)
+    ]
+    chapas = nesting.arranjar_poligonos(pecas, 1200, 900, espaco=6, engine="blf")
+    assert sum(len(c) for c in chapas) == len(pecas)
+    for placa in chapas:
+        polys = [p["polygon"] for p in placa]
+        for i, a in enumerate(polys):
+            minx, miny, maxx, maxy = a.bounds
+            assert minx >= -1e-6 and miny >= -1e-6
+            assert maxx <= 1200 + 1e-6 and maxy <= 900 + 1e-6
+            for b in polys[i + 1 :]:
+                assert a.distance(b) >= 6 - 1e-6
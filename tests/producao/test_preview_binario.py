@@ -0,0 +1,72 @@
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+from shapely.geometry import MultiPolygon, Point, Polygon, box
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT_DIR / "producao" / "backend" / "src"))
+
+import nesting  # noqa: E402
+import preview_binario  # noqa: E402
+
+
+def _preview():
+    chapas = []
+    for c in range(3):
+        operacoes = [
+            {"id": 1, "nome": "Lateral ç", "tipo": "Peca", "x": 10.5, "y": 0,
+             "largura": 300, "altura": 200, "polygon": box(10.5, 0, 310.5, 200)},
+            {"id": 2, "nome": "Sem contorno", "tipo": "Peca", "x": 400, "y": 0,
+             "largura": 50, "altura": 50},
+            {"id": 3, "nome": "Sobra", "tipo": "Sobra", "x": 0, "y": 700.123,
+             "largura": 2750, "altura": 1000,
+             "polygon": MultiPolygon([box(0, 700.123, 10, 710), box(20, 700, 30, 710)])},
+            {"id": 4, "nome": "Curva", "tipo": "Peca", "x": 0, "y": 0, "largura": 100,
+             "altura": 100,
+             "polygon": Polygon([(0, 0), (100, 0), (100, 100), (0, 100)])},
+        ]
+        chapas.append({"id": c, "codigo": f"{c:03d}", "descricao": "MDF",
+                       "largura": 2750, "altura": 1850, "operacoes": operacoes,
+                       "tempoCiclo": {"tempoEstimado": 12.5}})
+    return nesting._serialize_chapas(chapas)
+
+
+def test_ida_e_volta():
+    chapas = _preview()
+    dados = preview_binario.codificar_preview(chapas)
+    assert dados[:4] == preview_binario.MAGICO
+    # Cabeçalho alinhado para a leitura direta dos arrays no navegador
+    assert int.from_bytes(dados[4:8], "little") % 4 == 0
+
+    volta = preview_binario.decodificar_preview(
+        preview_binario.descomprimir(preview_binario.comprimir(dados))
+    )
+    assert len(volta) == len(chapas)
+    for original, lida in zip(chapas, volta):
+        assert lida["tempoCiclo"] == original["tempoCiclo"]
+        for op, op_lida in zip(original["operacoes"], lida["operacoes"]):
+            assert op_lida.keys() == op.keys()
+            if "coords" in op:
+                np.testing.assert_allclose(op_lida["coords"], op["coords"], atol=1e-3)
+
+
+def test_menor_que_json():
+    chapas = _preview()
+    for i in range(200):
+        # Peças com contornos curvos (muitos pontos), como as lidas dos DXF
+        chapas[0]["operacoes"].append(
+            {"id": 10 + i, "nome": "Tampo", "tipo": "Peca", "x": i, "y": i,
+             "largura": 200, "altura": 200, "polygon": Point(i + 100.37, i + 100.11).buffer(100)}
+        )
+    chapas = nesting._serialize_chapas(chapas)
+    texto = json.dumps(chapas).encode("utf-8")
+    dados = preview_binario.codificar_preview(chapas)
+    assert len(dados) < len(texto) / 2
+
+
+def test_formato_desconhecido():
+    with pytest.raises(ValueError):
+        preview_binario.decodificar_preview(b"[]")
@@ -0,0 +1,45 @@
+import random
+import sys
+from pathlib import Path
+
+from shapely.geometry import Polygon, box
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT_DIR / "producao" / "backend" / "src"))
+sys.path.insert(0, str(ROOT_DIR / "producao" / "backend" / "benchmarks"))
+
+import nesting  # noqa: E402
+from retangulos_sobra import retangulos_sobra_legado, sobra_irregular  # noqa: E402
+
+
+def _bounds(rects):
+    return [tuple(round(v, 6) for v in r.bounds) for r in rects]
+
+
+def test_formato_em_l():
+    g = Polygon([(0, 0), (2000, 0), (2000, 500), (600, 500), (600, 1500), (0, 1500)])
+    rects = nesting._retangulos_sobra(g)
+    assert _bounds(rects) == _bounds(retangulos_sobra_legado(g))
+    assert _bounds(rects)[0] == (0, 0, 2000, 500)
+    for a in rects:
+        assert a.within(g.buffer(1e-6))
+        assert a.area >= nesting.AREA_MIN_SOBRA
+
+
+def test_com_furo():
+    g = box(0, 0, 2000, 1500).difference(box(800, 600, 1200, 900))
+    assert _bounds(nesting._retangulos_sobra(g)) == _bounds(retangulos_sobra_legado(g))
+
+
+def test_equivalente_ao_legado():
+    rng = random.Random(7)
+    for _ in range(8):
+        g = sobra_irregular(rng, 16)
+        assert _bounds(nesting._retangulos_sobra(g)) == _bounds(
+            retangulos_sobra_legado(g)
+        )
+
+
+def test_sem_area_util():
+    g = Polygon([(0, 0), (50, 0), (50, 50), (0, 50)])
+    assert nesting._retangulos_sobra(g) == []
@@ -0,0 +1,126 @@
+import random
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT_DIR / "producao" / "backend" / "src"))
+
+import numpy as np  # noqa: E402
+
+from sequenciamento import (  # noqa: E402
+    agendar_operacoes,
+    dois_opt,
+    niveis_contornos,
+    trocas_e_deslocamento,
+    vizinho_mais_proximo,
+)
+
+BROCA_8 = {"codigo": 2, "descricao": "Broca 8", "tipo": "Broca"}
+BROCA_5 = {"codigo": 3, "descricao": "Broca 5", "tipo": "Broca"}
+FRESA = {"codigo": 1, "descricao": "Fresa 6mm", "tipo": "Fresa"}
+
+
+def _operacoes_por_peca(rng):
+    """Operações na ordem antiga: peça a peça, ferramentas alternando."""
+    ops = []
+    for i in range(12):
+        x, y = rng.uniform(0, 2000), rng.uniform(0, 1500)
+        ops.append({"tool": BROCA_8, "x": x + 20, "y": y + 20, "layer": "F8"})
+        ops.append({"tool": BROCA_5, "x": x + 40, "y": y + 20, "layer": "F5"})
+        ops.append({"tool": FRESA, "x": x + 60, "y": y + 20, "layer": "RASGO"})
+        lado = 150 if i % 3 == 0 else 600
+        ops.append(
+            {"tool": FRESA, "contorno": True, "x": x, "y": y, "l": lado, "w": lado}
+        )
+    ops.append(
+        {"tool": FRESA, "contorno": True, "sobra": True, "x": 0, "y": 0, "l": 500, "w": 400}
+    )
+    return ops
+
+
+def test_agrupa_ferramentas_e_corta_contornos_no_final():
+    ops = _operacoes_por_peca(random.Random(3))
+    seq = agendar_operacoes(ops, distancia_vizinha=50)
+
+    assert sorted(map(id, seq)) == sorted(map(id, ops))
+    trocas, _ = trocas_e_deslocamento(seq)
+    assert trocas == 2
+    assert trocas < trocas_e_deslocamento(ops)[0]
+
+    # Furações primeiro, contornos por último
+    tipos = [o["tool"]["tipo"] for o in seq]
+    assert tipos[: tipos.index("Fresa")].count("Broca") == 24
+    contornos = [o for o in seq if o.get("contorno")]
+    assert seq[-len(contornos) :] == contornos
+    # Nenhum contorno antes de um vizinho menor; a sobra no final
+    pecas = contornos[:-1]
+    for i, o in enumerate(pecas):
+        for menor in pecas[i + 1 :]:
+            if menor["l"] * menor["w"] < o["l"] * o["w"]:
+                assert not _vizinhos(o, menor, 50)
+    assert contornos[-1].get("sobra")
+
+
+def _vizinhos(a, b, distancia):
+    folga_x = max(a["x"], b["x"]) - min(a["x"] + a["l"], b["x"] + b["l"])
+    folga_y = max(a["y"], b["y"]) - min(a["y"] + a["w"], b["y"] + b["w"])
+    return max(folga_x, folga_y) <= distancia
+
+
+def _contorno(tool, x, y, l, w):
+    return {"tool": tool, "contorno": True, "x": x, "y": y, "l": l, "w": w}
+
+
+def test_peca_menor_antes_da_vizinha_maior_em_qualquer_tamanho():
+    grande = _contorno(FRESA, 0, 0, 1000, 1000)  # 1 m²
+    media = _contorno(FRESA, 1010, 0, 400, 300)  # 0,12 m², vizinha da grande
+    pequena = _contorno(FRESA, 1420, 0, 100, 100)  # vizinha da média
+    isolada = _contorno(FRESA, 3000, 2000, 800, 800)
+    ops = [grande, media, pequena, isolada]
+    assert niveis_contornos(ops, 50) == [2, 1, 0, 0]
+    seq = agendar_operacoes(ops, inicio=(0.0, 0.0), distancia_vizinha=50)
+    assert seq.index(pequena) < seq.index(media) < seq.index(grande)
+
+
+def test_contornos_agrupados_por_ferramenta():
+    fresa_10 = {"codigo": 4, "descricao": "Fresa 10mm", "tipo": "Fresa"}
+    ops = [
+        _contorno(FRESA, 0, 0, 100, 100),
+        _contorno(fresa_10, 120, 0, 100, 100),
+        _contorno(FRESA, 240, 0, 100, 100),
+        _contorno(fresa_10, 360, 0, 100, 100),
+        {"tool": fresa_10, "x": 10, "y": 10, "layer": "RASGO"},
+    ]
+    seq = agendar_operacoes(ops)
+    assert trocas_e_deslocamento(seq)[0] == 1
+    # A fresa já na máquina corta os seus contornos primeiro
+    assert [o["tool"]["codigo"] for o in seq] == [4, 4, 4, 1, 1]
+
+
+def test_peca_menor_antes_da_vizinha_maior_com_outra_ferramenta():
+    fresa_10 = {"codigo": 4, "descricao": "Fresa 10mm", "tipo": "Fresa"}
+    grande = _contorno(FRESA, 0, 0, 1000, 1000)
+    pequena = _contorno(fresa_10, 1010, 0, 100, 100)
+    outra = _contorno(FRESA, 3000, 0, 100, 100)
+    media = _contorno(fresa_10, 3000, 110, 400, 300)  # vizinha de ``outra``
+    seq = agendar_operacoes([grande, pequena, outra, media], distancia_vizinha=50)
+    assert seq.index(pequena) < seq.index(grande)
+    assert seq.index(outra) < seq.index(media)
+    # Nível 0 (pequena, outra) e nível 1 (grande, media), cada um por ferramenta
+    assert {id(o) for o in seq[:2]} == {id(pequena), id(outra)}
+    assert trocas_e_deslocamento(seq)[0] == 2
+
+
+def test_dois_opt_nao_piora_a_rota():
+    rng = np.random.default_rng(5)
+    pontos = rng.uniform(0, 2000, size=(60, 2))
+
+    def comprimento(ordem):
+        caminho = np.vstack([[0.0, 0.0], pontos[ordem]])
+        return float(np.hypot(*np.diff(caminho, axis=0).T).sum())
+
+    vizinho = vizinho_mais_proximo(pontos, (0.0, 0.0))
+    melhorada = dois_opt(pontos, vizinho, (0.0, 0.0))
+    assert sorted(melhorada) == list(range(60))
+    assert comprimento(melhorada) <= comprimento(vizinho) + 1e-9
+    assert comprimento(vizinho) < comprimento(np.arange(60))
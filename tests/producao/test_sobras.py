@@ -0,0 +1,60 @@
+import random
+import sys
+from pathlib import Path
+
+from shapely.geometry import box
+from shapely.ops import unary_union
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT_DIR / "producao" / "backend" / "src"))
+
+import nesting  # noqa: E402
+
+
+def _bordas(pecas, ref_esq, ref_inf, area_larg, area_alt):
+    x_min = min(p.bounds[0] for p in pecas) - ref_esq
+    y_min = min(p.bounds[1] for p in pecas) - ref_inf
+    x_max = max(p.bounds[2] for p in pecas) - ref_esq
+    y_max = max(p.bounds[3] for p in pecas) - ref_inf
+    return [
+        (ref_esq, ref_inf, x_min, area_alt),
+        (ref_esq + x_max, ref_inf, area_larg - x_max, area_alt),
+        (ref_esq, ref_inf, area_larg, y_min),
+        (ref_esq, ref_inf + y_max, area_larg, area_alt - y_max),
+    ]
+
+
+def test_sobras_de_borda_e_internas():
+    pecas = [box(10, 10, 1010, 1010), box(1510, 10, 2010, 1010)]
+    sobras = nesting._extrair_sobras(
+        pecas, _bordas(pecas, 10, 10, 2500, 1800), 10, 10, 2500, 1800
+    )
+    bounds = [tuple(round(v, 6) for v in s.bounds) for s in sobras]
+    assert bounds == [
+        (2010, 10, 2510, 1810),
+        (10, 1010, 2010, 1810),
+        (1010, 10, 1510, 1010),
+    ]
+
+
+def test_sobras_nao_sobrepoem_pecas_nem_entre_si():
+    rng = random.Random(3)
+    pecas = []
+    for _ in range(60):
+        w = rng.randrange(80, 300, 10)
+        h = rng.randrange(80, 300, 10)
+        x = rng.randrange(0, 2750 - w, 10)
+        y = rng.randrange(0, 1850 - h, 10)
+        nova = box(x, y, x + w, y + h)
+        if not any(nova.intersects(p) for p in pecas):
+            pecas.append(nova)
+    sobras = nesting._extrair_sobras(
+        pecas, _bordas(pecas, 0, 0, 2750, 1850), 0, 0, 2750, 1850
+    )
+    assert sobras
+    uniao = unary_union(pecas)
+    for i, s in enumerate(sobras):
+        assert s.intersection(uniao).area < 1e-6
+        assert s.area >= nesting.AREA_MIN_SOBRA
+        for outra in sobras[i + 1 :]:
+            assert s.intersection(outra).area < 1e-6
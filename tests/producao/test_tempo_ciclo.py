@@ -0,0 +1,62 @@
+import math
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT_DIR / "producao" / "backend" / "src"))
+
+from tempo_ciclo import estimar_programa, tempo_movimento  # noqa: E402
+
+CONFIG = {"velocidadeRapida": 6000, "aceleracao": 1000, "tempoTrocaFerramenta": 5}
+
+
+def test_perfil_trapezoidal_e_triangular():
+    # 100 mm/s: acelera em 5 mm, percorre o resto em velocidade constante
+    assert tempo_movimento(100, 6000, 1000) == pytest.approx(1.1)
+    # Trecho curto demais para atingir o avanço
+    assert tempo_movimento(4, 6000, 1000) == pytest.approx(2 * math.sqrt(0.004))
+    assert tempo_movimento(100, 6000, 0) == pytest.approx(1.0)
+
+
+def test_programa_com_troca_mergulho_e_avanco_da_ferramenta():
+    ferramentas = [{"codigo": "1", "velocidadeCorte": 3000, "velocidadeEntrada": 600}]
+    programa = [
+        "%",
+        "( NUMERO DA FERRAMENTA: 1 - Fresa )",
+        "M6 T1",
+        "G90",
+        "G0 X100 Y0 Z20",
+        "G1 Z0",  # mergulho sem F: velocidadeEntrada
+        "G1 X100 Y300",  # corte sem F: velocidadeCorte
+        "G1 X0 Y300 Z0 F6000",
+        "G0 Z20",
+        "M30",
+    ]
+    r = estimar_programa(programa, ferramentas, CONFIG)
+    assert r["trocasFerramenta"] == 1
+    assert r["mergulhos"] == 1
+    assert r["comprimentoCorte"] == pytest.approx(420)
+    assert r["comprimentoRapido"] == pytest.approx(math.hypot(100, 20) + 20, abs=0.1)
+    corte = (
+        tempo_movimento(20, 600, 1000)
+        + tempo_movimento(300, 3000, 1000)
+        + tempo_movimento(100, 6000, 1000)
+    )
+    assert r["tempoCorte"] == pytest.approx(corte, abs=0.05)
+    assert r["tempoTrocas"] == 5
+    assert r["tempoEstimado"] == pytest.approx(
+        r["tempoCorte"] + r["tempoRapido"] + r["tempoTrocas"], abs=0.1
+    )
+
+
+def test_arco_e_coordenadas_incrementais():
+    programa = [
+        "G0 X0 Y0 Z0",
+        "G2 X100 Y0 I50 J0 F6000",  # meia volta horária acima do eixo X
+        "G91",
+        "G1 X0 Y-50",
+    ]
+    r = estimar_programa(programa, config_maquina=CONFIG)
+    assert r["comprimentoCorte"] == pytest.approx(50 * math.pi + 50, abs=0.1)
@@ -0,0 +1,76 @@
+import io
+import os
+import shutil
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT_DIR / "producao" / "backend" / "src"))
+sys.path.insert(0, str(ROOT_DIR / "producao" / "backend" / "benchmarks"))
+
+import storage  # noqa: E402
+from servicos_locais import ArmazenamentoLocal, BancoLocal, instalar  # noqa: E402
+
+
+@pytest.fixture
+def armazenamento(tmp_path):
+    armazenamento = ArmazenamentoLocal(tmp_path / "bucket")
+    desfazer = instalar(armazenamento, BancoLocal())
+    storage.metricas_upload(zerar=True)
+    yield armazenamento
+    desfazer()
+
+
+def _pasta(tmp_path, tamanho):
+    pasta = tmp_path / "Nesting_1" / "nesting"
+    (pasta / "Chapa_1").mkdir(parents=True)
+    (pasta / "vazia").mkdir()
+    (pasta / "Chapa_1" / "a.nc").write_text("G0 X0 Y0\n" * 1000)
+    # Conteúdo pouco compressível para gerar várias partes
+    (pasta / "b.bin").write_bytes(os.urandom(tamanho))
+    return pasta
+
+
+def test_zip_enviado_em_partes_igual_ao_make_archive(armazenamento, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "UPLOAD_PARTE_MB", 1)
+    monkeypatch.setattr(storage, "UPLOAD_CONCORRENCIA", 2)
+    pasta = _pasta(tmp_path, 3 * 1024 * 1024 + 10)
+
+    metricas = storage.upload_pasta_zip(pasta, "nestings/Nesting_1.zip")
+    assert metricas["partes"] == 4 and metricas["bytes"] > 3 * 1024 * 1024
+    assert armazenamento.chamadas["upload_part"] == 4
+    assert armazenamento.chamadas["complete_multipart_upload"] == 1
+
+    enviado = zipfile.ZipFile(io.BytesIO(storage.download_bytes("nestings/Nesting_1.zip")))
+    assert enviado.testzip() is None
+    referencia = zipfile.ZipFile(
+        shutil.make_archive(str(tmp_path / "ref"), "zip", root_dir=pasta.parent, base_dir=pasta.name)
+    )
+    assert enviado.namelist() == referencia.namelist()
+    for nome in referencia.namelist():
+        assert enviado.read(nome) == referencia.read(nome)
+
+    totais = storage.metricas_upload()
+    assert totais["envios"] == 1 and totais["bytes"] == metricas["bytes"]
+
+
+def test_zip_pequeno_em_um_put_e_falha_aborta(armazenamento, tmp_path, monkeypatch):
+    pasta = _pasta(tmp_path, 10)
+    storage.upload_pasta_zip(pasta, "lotes/Lote_1.zip")
+    assert armazenamento.chamadas["put_object"] == 1
+    assert "create_multipart_upload" not in armazenamento.chamadas
+
+    monkeypatch.setattr(storage, "UPLOAD_PARTE_MB", 1)
+    pasta = _pasta(tmp_path / "grande", 3 * 1024 * 1024)
+
+    def falha(**_):
+        raise OSError("conexao perdida")
+
+    monkeypatch.setattr(armazenamento, "upload_part", falha)
+    with pytest.raises(OSError):
+        storage.upload_pasta_zip(pasta, "lotes/Lote_2.zip")
+    assert armazenamento.chamadas["abort_multipart_upload"] == 1
+    assert storage.object_info("lotes/Lote_2.zip") is None